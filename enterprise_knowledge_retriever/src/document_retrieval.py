@@ -27,6 +27,8 @@ sys.path.append(kit_dir)
 sys.path.append(repo_dir)
 
 from utils.model_wrappers.api_gateway import APIGateway
+from utils.vectordb.hybrid_retrieval import HybridRetriever
+from utils.vectordb.query_cache import QueryResultCache
 from utils.vectordb.vector_db import VectorDb
 from utils.visual.env_utils import get_wandb_key
 
@@ -99,6 +101,9 @@ class RetrievalQAChain(Chain):
     is summarized using the llm
 
     When reranking enabled, reranker model is used to filter final_k_retrieved_documents
+
+    When a query cache is set, answers are cached per vector store version, so repeated (or, with a semantic cache,
+    similar) questions skip the retrieval and the QA call
     """
 
     retriever: BaseRetriever
@@ -111,6 +116,8 @@ class RetrievalQAChain(Chain):
     # instead of answer over raw user query with our using history
     summary_prompt: Optional[ChatPromptTemplate]
     condensed_query_prompt: Optional[ChatPromptTemplate]
+    query_cache: Optional[QueryResultCache] = None
+    vdb_version: Optional[str] = None
 
     @property
     def input_keys(self) -> List[str]:
@@ -226,13 +233,22 @@ class RetrievalQAChain(Chain):
         else:
             query = inputs['question']
 
-        documents = self.retriever.invoke(query)
-        if self.rerank:
-            documents = self.rerank_docs(query, documents, self.final_k_retrieved_documents)
-        docs = self._format_docs(documents)
+        cached_response = None
+        if self.query_cache is not None and self.vdb_version is not None:
+            cached_response = self.query_cache.get(query, self.vdb_version)
+
         response: Dict[str, Any] = {}
-        response['answer'] = qa_chain.invoke({'question': query, 'context': docs})
-        response['source_documents'] = documents
+        if cached_response is not None:
+            response.update(cached_response)
+        else:
+            documents = self.retriever.invoke(query)
+            if self.rerank:
+                documents = self.rerank_docs(query, documents, self.final_k_retrieved_documents)
+            docs = self._format_docs(documents)
+            response['answer'] = qa_chain.invoke({'question': query, 'context': docs})
+            response['source_documents'] = documents
+            if self.query_cache is not None and self.vdb_version is not None:
+                self.query_cache.set(query, self.vdb_version, dict(response))
 
         # Update memory when conversational mode is enabled
         if self.conversational:
@@ -254,6 +270,13 @@ class DocumentRetrieval:
         self.retriever = None
         self.sambanova_api_key = sambanova_api_key
         self.llm = self.set_llm()
+        self.embeddings: Optional[Embeddings] = None
+        self.query_cache: Optional[QueryResultCache] = None
+        if self.retrieval_info.get('query_cache', False):
+            self.query_cache = QueryResultCache(
+                similarity_threshold=self.retrieval_info.get('semantic_cache_threshold') or 1.0,
+                max_entries=self.retrieval_info.get('query_cache_max_entries', 1024),
+            )
 
     def get_config_info(self) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any], Dict[str, str], bool, bool]:
         """
@@ -329,38 +352,41 @@ class DocumentRetrieval:
         collection_name: Optional[str] = None,
     ) -> Any:
         logger.info(f'Created collection, name is {collection_name}')
+        self.embeddings = embeddings
         vectorstore = self.vectordb.create_vector_store(
             text_chunks,
             embeddings,
             output_db=output_db,
             collection_name=collection_name,
             db_type=self.retrieval_info['db_type'],
+            hybrid=self.retrieval_info.get('hybrid_search', False),
         )
         return vectorstore
 
     def load_vdb(self, db_path: str, embeddings: Any, collection_name: Optional[str] = None) -> Any:
         logger.info(f'Loading collection, name is {collection_name}')
+        self.embeddings = embeddings
         vectorstore = self.vectordb.load_vdb(
             db_path, embeddings, db_type=self.retrieval_info['db_type'], collection_name=collection_name
         )
+        if self.retrieval_info.get('hybrid_search', False):
+            self.vectordb.load_bm25_index(db_path)
         return vectorstore
 
     def init_retriever(self, vectorstore: Any) -> None:
         if self.retrieval_info['rerank']:
-            self.retriever = vectorstore.as_retriever(
-                search_type='similarity_score_threshold',
-                search_kwargs={
-                    'score_threshold': self.retrieval_info['score_threshold'],
-                    'k': self.retrieval_info['k_retrieved_documents'],
-                },
+            k = self.retrieval_info['k_retrieved_documents']
+        else:
+            k = self.retrieval_info['final_k_retrieved_documents']
+        search_kwargs = {'score_threshold': self.retrieval_info['score_threshold'], 'k': k}
+        if self.retrieval_info.get('hybrid_search', False):
+            # Dense and BM25 rankings are fused, so exact-term queries are matched without increasing k
+            self.retriever = self.vectordb.get_hybrid_retriever(
+                vectorstore, k=k, search_kwargs=search_kwargs, search_type='similarity_score_threshold'
             )
         else:
             self.retriever = vectorstore.as_retriever(
-                search_type='similarity_score_threshold',
-                search_kwargs={
-                    'score_threshold': self.retrieval_info['score_threshold'],
-                    'k': self.retrieval_info['final_k_retrieved_documents'],
-                },
+                search_type='similarity_score_threshold', search_kwargs=search_kwargs
             )
 
     def get_qa_retrieval_chain(self, conversational: bool = False) -> RetrievalQAChain:
@@ -378,8 +404,12 @@ class DocumentRetrieval:
         RetrievalQA: A chain ready for QA without memory
         """
         assert isinstance(
-            self.retriever, VectorStoreRetriever
-        ), f'The Retriever must be VectorStoreRetriever. Got type {type(self.retriever)}'
+            self.retriever, (VectorStoreRetriever, HybridRetriever)
+        ), f'The Retriever must be VectorStoreRetriever or HybridRetriever. Got type {type(self.retriever)}'
+        if self.query_cache is not None:
+            # The semantic tier is only enabled with a similarity threshold, reusing the vector store embeddings
+            semantic_cache = self.retrieval_info.get('semantic_cache_threshold') is not None
+            self.query_cache.embeddings = self.embeddings if semantic_cache else None
         retrievalQAChain = RetrievalQAChain(
             retriever=self.retriever,
             llm=self.llm,
@@ -389,5 +419,7 @@ class DocumentRetrieval:
             conversational=conversational,
             summary_prompt=load_chat_prompt(os.path.join(repo_dir, self.prompts['summary_prompt'])),
             condensed_query_prompt=load_chat_prompt(os.path.join(repo_dir, self.prompts['condensed_query_prompt'])),
+            query_cache=self.query_cache,
+            vdb_version=self.vectordb.vdb_version,
         )
         return retrievalQAChain
@@ -38,6 +38,111 @@ RETRIEVE_HEADLINES = False
 TOP_K = 10
 MAX_URLS = 1000
 
+# Number of rows inserted at once when storing dataframes in the SQLite database
+SQLITE_INSERT_CHUNK_SIZE = 10000
+# Number of sample rows of each SQL table in the schemas given to the LLM
+SQL_TABLE_SAMPLE_ROWS = 3
+
+# Persistent caches shared across sessions
+SHARED_CACHE_DIR = os.path.join(kit_dir, 'streamlit/shared_cache')
+HTTP_CACHE_DIR = os.path.join(SHARED_CACHE_DIR, 'http')
+HTTP_CACHE_MAX_SIZE_MB = 256
+# Seconds before refreshing the Yahoo Finance quote and news listing pages
+NEWS_LISTING_TTL = 15 * 60
+# Seconds before refreshing an already downloaded Yahoo Finance news article
+NEWS_ARTICLE_TTL = 24 * 60 * 60
+# Maximum number of concurrent Yahoo Finance News requests
+NEWS_MAX_WORKERS = 8
+# SEC company ticker table, used to resolve ticker symbols without calling the LLM
+SEC_COMPANY_TICKERS_URL = 'https://www.sec.gov/files/company_tickers.json'
+# Seconds before refreshing the SEC company ticker table
+SEC_COMPANY_TICKERS_TTL = 7 * 24 * 60 * 60
+# Seconds before retrying to download the SEC company ticker table after a failure
+SEC_COMPANY_TICKERS_RETRY_DELAY = 5 * 60
+# Seconds before resolving again the ticker symbol of a company
+TICKER_SYMBOL_TTL = 30 * 24 * 60 * 60
+# On-disk store of the SEC filings text, keyed by accession number
+FILINGS_CACHE_DIR = os.path.join(SHARED_CACHE_DIR, 'filings')
+# Seconds before refreshing the list of filings of a company
+SEC_FILING_METADATAS_TTL = 24 * 60 * 60
+# Maximum number of requests per second to SEC EDGAR (the SEC fair access policy allows 10)
+SEC_MAX_REQUESTS_PER_SECOND = 8
+# Maximum number of companies whose filings are retrieved concurrently
+SEC_MAX_WORKERS = 4
+
+# Persistent vectorstores of the filings, news, and PDF reports used for RAG
+VECTORSTORE_CACHE_DIR = os.path.join(SHARED_CACHE_DIR, 'vectorstores')
+# Maximum number of persistent vectorstores kept on disk
+VECTORSTORE_CACHE_MAX_ENTRIES = 64
+# Maximum number of vectorstores kept open in memory
+VECTORSTORE_MAX_OPEN = 8
+
+# Seconds before summarizing again a PDF report section with the same content
+PDF_SUMMARY_TTL = 30 * 24 * 60 * 60
+# Maximum number of PDF report sections summarized concurrently
+PDF_SUMMARY_MAX_WORKERS = 8
+# Maximum number of PDF reports generated concurrently across sessions
+PDF_REPORT_MAX_JOBS = 4
+# Seconds between two updates of the PDF report progress bar
+PDF_REPORT_POLL_INTERVAL = 1
+
+# Maximum number of `pandasai` agents kept across sessions
+PANDASAI_MAX_AGENTS = 32
+# Seconds after which an unused `pandasai` agent is evicted
+PANDASAI_AGENT_TTL = 30 * 60
+# Maximum number of codes generated by `pandasai` cached per LLM
+PANDASAI_CODE_CACHE_MAX_ENTRIES = 256
+
+# Yahoo Finance data cache
+YFINANCE_CACHE_DIR = os.path.join(SHARED_CACHE_DIR, 'yfinance')
+# Maximum size of the Yahoo Finance data cache, in megabytes
+YFINANCE_CACHE_MAX_SIZE_MB = 512
+# Seconds between two removals of the expired Yahoo Finance cache entries
+YFINANCE_CACHE_SWEEP_INTERVAL = 60 * 60
+# Maximum number of concurrent Yahoo Finance requests
+YFINANCE_MAX_WORKERS = 8
+# Seconds before dropping the cached price history of a symbol (it is otherwise extended incrementally)
+YFINANCE_HISTORY_TTL = 30 * 24 * 60 * 60
+# Seconds before refreshing each Yahoo Finance attribute
+YFINANCE_ATTRIBUTE_TTLS = {
+    'info': 24 * 60 * 60,
+    'history_metadata': 24 * 60 * 60,
+    'actions': 24 * 60 * 60,
+    'dividends': 24 * 60 * 60,
+    'splits': 24 * 60 * 60,
+    'capital_gains': 24 * 60 * 60,
+    'shares': 24 * 60 * 60,
+    'income_stmt': 7 * 24 * 60 * 60,
+    'quarterly_income_stmt': 24 * 60 * 60,
+    'balance_sheet': 7 * 24 * 60 * 60,
+    'quarterly_balance_sheet': 24 * 60 * 60,
+    'cashflow': 7 * 24 * 60 * 60,
+    'quarterly_cashflow': 24 * 60 * 60,
+    'major_holders': 7 * 24 * 60 * 60,
+    'institutional_holders': 7 * 24 * 60 * 60,
+    'mutualfund_holders': 7 * 24 * 60 * 60,
+    'insider_transactions': 24 * 60 * 60,
+    'insider_purchases': 24 * 60 * 60,
+    'insider_roster_holders': 24 * 60 * 60,
+    'sustainability': 7 * 24 * 60 * 60,
+    'recommendations': 24 * 60 * 60,
+    'recommendations_summary': 24 * 60 * 60,
+    'upgrades_downgrades': 24 * 60 * 60,
+    'earnings_dates': 24 * 60 * 60,
+    'isin': 30 * 24 * 60 * 60,
+    'options': 60 * 60,
+    'news': 15 * 60,
+    'option_chain': 15 * 60,
+}
+
+# Price analytics
+# Number of trading days per year, used to annualize the returns and the volatility
+TRADING_DAYS_PER_YEAR = 252
+# Default number of trading days of the rolling volatility window (about one month)
+DEFAULT_VOLATILITY_WINDOW = 21
+# Default numbers of trading days of the moving averages
+DEFAULT_MOVING_AVERAGE_WINDOWS = [20, 50, 200]
+
 # SambaNova
 SAMBANOVA_LOGO = 'https://sambanova.ai/hubfs/logotype_sambanova_orange.png'
 SAMBANOVA_ORANGE = (238, 118, 36)
@@ -50,6 +155,7 @@ DEFAULT_COMPANY_NAME = 'Meta'
 DEFAULT_DATAFRAME_NAME = 'income_stmt'
 DEFAULT_STOCK_QUERY = 'What is the research and development spending trend for Meta?'
 DEFAULT_HISTORICAL_STOCK_PRICE_QUERY = 'Meta close value'
+DEFAULT_PRICE_ANALYTICS_QUERY = 'What was the maximum drawdown of Meta and Microsoft?'
 DEFAULT_RAG_QUERY = (
     'Have there been changes in strategy, products, and research for Meta? Can you provide some examples?'
 )
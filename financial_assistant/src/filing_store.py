@@ -0,0 +1,140 @@
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+from sec_downloader import Downloader
+from sec_edgar_downloader import _sec_gateway
+from sec_downloader.types import RequestedFilings
+
+from financial_assistant.constants import *
+from financial_assistant.src.tools import parse_html
+from financial_assistant.src.utilities import get_logger
+from utils.web.http_cache import get_shared_http_cache, make_cache_key
+
+logger = get_logger()
+
+
+class SecRateLimiter:
+    """Thread-safe limiter spacing the requests to SEC EDGAR, which allows at most 10 requests per second."""
+
+    def __init__(self, max_requests_per_second: float) -> None:
+        """
+        Initialize the rate limiter.
+
+        Args:
+            max_requests_per_second: The maximum number of requests per second.
+        """
+        self.min_interval = 1 / max_requests_per_second
+        self._next_request_time = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Wait until the next request is allowed."""
+        with self._lock:
+            now = time.monotonic()
+            wait_time = self._next_request_time - now
+            self._next_request_time = max(now, self._next_request_time) + self.min_interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+# Rate limiter shared by all the sessions
+sec_rate_limiter = SecRateLimiter(SEC_MAX_REQUESTS_PER_SECOND)
+
+
+def rate_limit_sec_requests() -> None:
+    """
+    Apply `sec_rate_limiter` to each HTTP request sent to SEC EDGAR by `Downloader`.
+
+    A single `Downloader` call can send several requests, e.g. the list of filings of a company may span several
+    pages, and all of them go through `sec_edgar_downloader._sec_gateway._call_sec`, which is wrapped once.
+    """
+    call_sec = _sec_gateway._call_sec
+    if getattr(call_sec, 'is_rate_limited', False):
+        return
+
+    @functools.wraps(call_sec)
+    def rate_limited_call_sec(*args: Any, **kwargs: Any) -> Any:
+        sec_rate_limiter.wait()
+        return call_sec(*args, **kwargs)
+
+    setattr(rate_limited_call_sec, 'is_rate_limited', True)
+    _sec_gateway._call_sec = rate_limited_call_sec
+
+
+rate_limit_sec_requests()
+
+
+def get_filing_metadatas(
+    downloader: Downloader, ticker_symbol: str, filing_type: str, limit: int
+) -> List[Dict[str, Any]]:
+    """
+    Get the metadata of the latest filings of a company, reusing the metadata retrieved during the last day.
+
+    Args:
+        downloader: Downloader object to download the filings from SEC website.
+        ticker_symbol: Ticker symbol of the company.
+        filing_type: Filing type, e.g. `10-K` or `10-Q`.
+        limit: Maximum number of filings.
+
+    Returns:
+        The list of the metadata of the filings, with the keys `accession_number`, `report_date`,
+        and `primary_doc_url`.
+    """
+    http_cache = get_shared_http_cache(HTTP_CACHE_DIR, max_size_mb=HTTP_CACHE_MAX_SIZE_MB)
+    cache_key = make_cache_key('sec_filing_metadatas', ticker_symbol, {'form_type': filing_type, 'limit': limit})
+    metadatas: List[Dict[str, Any]] = http_cache.get(cache_key)
+    if metadatas is not None:
+        return metadatas
+
+    metadatas = [
+        {
+            'accession_number': metadata.accession_number,
+            'report_date': metadata.report_date,
+            'primary_doc_url': metadata.primary_doc_url,
+        }
+        for metadata in downloader.get_filing_metadatas(
+            RequestedFilings(ticker_or_cik=ticker_symbol, form_type=filing_type, limit=limit)
+        )
+    ]
+    http_cache.set(cache_key, metadatas, SEC_FILING_METADATAS_TTL)
+    return metadatas
+
+
+def get_filing_text(downloader: Downloader, metadata: Dict[str, Any]) -> str:
+    """
+    Get the text of a filing from the on-disk filing store, downloading and parsing it on first use.
+
+    Filings never change once published, so they are stored without expiration, keyed by accession number.
+
+    Args:
+        downloader: Downloader object to download the filings from SEC website.
+        metadata: The metadata of the filing, as returned by `get_filing_metadatas`.
+
+    Returns:
+        The text of the filing.
+    """
+    filing_path = os.path.join(FILINGS_CACHE_DIR, f'{metadata["accession_number"]}.json')
+    try:
+        with open(filing_path, 'r') as filing_file:
+            return str(json.load(filing_file)['text'])
+    except FileNotFoundError:
+        pass
+
+    # Download the matching filing
+    html_text = downloader.download_filing(url=metadata['primary_doc_url'])
+
+    # Convert html to text
+    text = parse_html(html_text).get_text(separator=' ', strip=True)
+
+    # Write to a temporary file first, so that concurrent readers never see a partial filing
+    os.makedirs(FILINGS_CACHE_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile('w', dir=FILINGS_CACHE_DIR, delete=False) as filing_file:
+        json.dump({**metadata, 'text': text}, filing_file)
+    os.replace(filing_file.name, filing_path)
+    logger.info(f'Filing {metadata["accession_number"]} stored.')
+    return text
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas
+from pandasai import Agent
+
+from financial_assistant.constants import *
+from financial_assistant.src.llm import SambaNovaLLM
+from financial_assistant.src.utilities import get_logger
+
+logger = get_logger()
+
+# Prefix of the `pandasai` answers when the code generation or execution failed
+PANDASAI_ERROR_PREFIX = 'Unfortunately, I was not able to'
+
+
+def get_dataframe_key(dataframe: pandas.DataFrame) -> str:
+    """
+    Get a key identifying the content of a dataframe, used as the data source key of its agent.
+
+    Args:
+        dataframe: The dataframe.
+
+    Returns:
+        The hash of the dataframe index, columns, and values.
+    """
+    try:
+        row_hashes = pandas.util.hash_pandas_object(dataframe, index=True).values
+        content = row_hashes.tobytes() + '|'.join(map(str, dataframe.columns)).encode('utf-8')
+    except TypeError:
+        # Unhashable values, e.g. dictionaries
+        content = dataframe.to_csv().encode('utf-8')
+    return 'dataframe_' + hashlib.sha256(content).hexdigest()
+
+
+class PandasAICodeCache:
+    """
+    In-memory LRU cache of the code generated by `pandasai`, shared by the agents using the same LLM.
+
+    It implements the interface of `pandasai.helpers.cache.Cache` used by the chat pipeline. As in `pandasai`,
+    the code is keyed by the question and the columns of the data, so that the same question asked on tables with
+    the same columns (e.g. the same table of different companies) reuses the generated code. The code is stored
+    by the pipeline before it is executed, so it is only committed once the agent answered successfully.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached codes, the least recently used ones are evicted first.
+        """
+        self.max_entries = max_entries
+        self._codes: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = threading.local()
+
+    def get_cache_key(self, context: Any) -> str:
+        """Get the cache key of the current question, from the normalized question and the column hashes."""
+        question = re.sub(r'\s+', ' ', context.memory.get_conversation().lower()).strip()
+        return question + ''.join(str(df.column_hash) for df in context.dfs)
+
+    def get(self, key: str) -> Optional[str]:
+        """Get the code generated for a question, or None on a cache miss."""
+        with self._lock:
+            code = self._codes.get(key)
+            if code is not None:
+                self._codes.move_to_end(key)
+                self._pending.hit_key = key
+            return code
+
+    def set(self, key: str, value: str) -> None:
+        """Store the code generated for a question, until it is committed."""
+        self._pending.entry = (key, value)
+
+    def commit(self) -> None:
+        """Cache the code generated by the current thread, after a successful answer."""
+        entry: Optional[Tuple[str, str]] = getattr(self._pending, 'entry', None)
+        self._pending.entry = None
+        self._pending.hit_key = None
+        if entry is None:
+            return
+        with self._lock:
+            self._codes[entry[0]] = entry[1]
+            self._codes.move_to_end(entry[0])
+            while len(self._codes) > self.max_entries:
+                self._codes.popitem(last=False)
+
+    def discard(self) -> None:
+        """Drop the code generated by the current thread, or the cached code it reused, after a failed answer."""
+        hit_key: Optional[str] = getattr(self._pending, 'hit_key', None)
+        self._pending.entry = None
+        self._pending.hit_key = None
+        if hit_key is not None:
+            self.delete(hit_key)
+
+    def delete(self, key: str) -> None:
+        """Remove the code of a question."""
+        with self._lock:
+            self._codes.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all the cached codes."""
+        with self._lock:
+            self._codes.clear()
+
+    def close(self) -> None:
+        """Nothing to close, the cache is in memory."""
+
+    def destroy(self) -> None:
+        """Remove all the cached codes."""
+        self.clear()
+
+
+class PandasAIAgentPool:
+    """
+    Pool of `pandasai` agents shared by the sessions, keyed by session, data source, and LLM.
+
+    Each agent keeps its data connectors and configuration between questions, and the code generated by the LLM
+    is cached per LLM, so that repeated questions skip the agent setup and the code generation.
+    The agents are evicted when unused for `ttl` seconds, when the pool is full, or when their session is cleared.
+    """
+
+    def __init__(self, max_agents: int, ttl: float, max_cached_codes: int) -> None:
+        """
+        Initialize the pool.
+
+        Args:
+            max_agents: Maximum number of agents, the least recently used ones are evicted first.
+            ttl: Seconds after which an unused agent is evicted.
+            max_cached_codes: Maximum number of cached codes per LLM.
+        """
+        self.max_agents = max_agents
+        self.ttl = ttl
+        self.max_cached_codes = max_cached_codes
+        self._agents: OrderedDict[Tuple[str, str, str], Tuple[Agent, threading.Lock, float]] = OrderedDict()
+        self._code_caches: Dict[str, PandasAICodeCache] = dict()
+        self._lock = threading.Lock()
+
+    def get_agent(
+        self,
+        session_id: str,
+        source_key: str,
+        llm_key: str,
+        create_agent: Callable[[], Agent],
+    ) -> Tuple[Agent, threading.Lock]:
+        """
+        Get the agent of a data source, creating it if it is not in the pool.
+
+        Args:
+            session_id: The id of the session using the agent.
+            source_key: The key identifying the data source and its version.
+            llm_key: The key identifying the LLM.
+            create_agent: The function creating the agent.
+
+        Returns:
+            A tuple of the agent and of the lock to hold while using it.
+        """
+        key = (session_id, source_key, llm_key)
+        now = time.time()
+        with self._lock:
+            # Evict the expired agents
+            for expired_key in [
+                agent_key for agent_key, (_, _, last_used) in self._agents.items() if now - last_used > self.ttl
+            ]:
+                del self._agents[expired_key]
+
+            if key in self._agents:
+                agent, agent_lock, _ = self._agents.pop(key)
+                self._agents[key] = (agent, agent_lock, now)
+                return agent, agent_lock
+            code_cache = self._code_caches.setdefault(llm_key, PandasAICodeCache(self.max_cached_codes))
+
+        # Create the agent outside of the lock, since the connectors may query their data source
+        agent = create_agent()
+        agent_lock = threading.Lock()
+        # Replace the on-disk `pandasai` cache by the code cache of the LLM
+        agent.context.cache = code_cache
+        agent.context.config.enable_cache = True
+
+        with self._lock:
+            self._agents[key] = (agent, agent_lock, now)
+            while len(self._agents) > self.max_agents:
+                self._agents.popitem(last=False)
+        return agent, agent_lock
+
+    def chat(
+        self,
+        session_id: str,
+        source_key: str,
+        sambanova_llm: SambaNovaLLM,
+        create_agent: Callable[[], Agent],
+        user_query: str,
+    ) -> Any:
+        """
+        Answer a question with the agent of a data source.
+
+        Each question starts a new conversation, so that the answers do not depend on the previous questions.
+
+        Args:
+            session_id: The id of the session asking the question.
+            source_key: The key identifying the data source and its version.
+            sambanova_llm: The LLM used by the agent of the data source.
+            create_agent: The function creating the agent of the data source.
+            user_query: The question.
+
+        Returns:
+            The answer of the agent.
+        """
+        # The LLM object is replaced when the credentials are updated
+        llm_key = json.dumps(sambanova_llm.llm_info, sort_keys=True, default=str) + str(id(sambanova_llm.llm))
+        agent, agent_lock = self.get_agent(session_id, source_key, llm_key, create_agent)
+        code_cache: PandasAICodeCache = agent.context.cache
+        with agent_lock:
+            agent.start_new_conversation()
+            response = agent.chat(user_query)
+            if agent.last_error is not None or (
+                isinstance(response, str) and response.startswith(PANDASAI_ERROR_PREFIX)
+            ):
+                # Do not reuse a code that failed
+                code_cache.discard()
+                agent.pipeline.last_error = None
+            else:
+                code_cache.commit()
+        return response
+
+    def evict_session(self, session_id: str) -> None:
+        """
+        Evict the agents of a session.
+
+        Args:
+            session_id: The id of the session.
+        """
+        with self._lock:
+            for key in [key for key in self._agents if key[0] == session_id]:
+                del self._agents[key]
+
+
+# Pool of agents shared by all the sessions
+pandasai_agent_pool = PandasAIAgentPool(PANDASAI_MAX_AGENTS, PANDASAI_AGENT_TTL, PANDASAI_CODE_CACHE_MAX_ENTRIES)
@@ -1,6 +1,14 @@
-from typing import Any, Dict, List, Tuple
+import hashlib
+import json
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import yaml
+from chromadb.api.client import SharedSystemClient
 from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.schema import Document
@@ -14,20 +22,34 @@ from langchain_huggingface import HuggingFaceEmbeddings
 from financial_assistant.constants import *
 from financial_assistant.prompts.retrieval_prompts import QA_RETRIEVAL_PROMPT_TEMPLATE
 from financial_assistant.src.exceptions import VectorStoreException
-from financial_assistant.src.utilities import _get_config_info, get_logger, time_llm
+from financial_assistant.src.utilities import get_logger, time_llm
 from financial_assistant.streamlit.llm_model import sambanova_llm
 from utils.model_wrappers.api_gateway import APIGateway
 
 logger = get_logger()
 
 
-def get_qa_response(user_request: str, documents: List[Document]) -> Any:
+# Process-wide embedding model
+_embedding_model: Optional[HuggingFaceEmbeddings | Embeddings] = None
+_embedding_model_lock = threading.Lock()
+
+# Open vectorstores, by vectorstore key, in least recently used order
+_vectorstores: OrderedDict[str, Chroma] = OrderedDict()
+_vectorstore_locks: Dict[str, threading.Lock] = dict()
+# Number of questions being answered with each vectorstore, by vectorstore key
+_vectorstore_users: Dict[str, int] = dict()
+_vectorstores_lock = threading.Lock()
+
+
+def get_qa_response(user_request: str, documents: List[Document], vectorstore_name: Optional[str] = None) -> Any:
     """
     Elaborate an answer to user request using RetrievalQA chain.
 
     Args:
         user_request: User request to answer.
         documents: List of documents to use for retrieval.
+        vectorstore_name: Readable name of the documents, e.g. the ticker symbol, filing type, year, and quarter
+            of a filing, used to name their persistent vectorstore.
 
     Returns:
         Answer to the user request.
@@ -42,14 +64,19 @@ def get_qa_response(user_request: str, documents: List[Document]) -> Any:
     if not all(isinstance(doc, Document) for doc in documents):
         raise TypeError(f'All documents must be of type `langchain.schema.Document`.')
 
-    # Get the vectostore registry
-    vectorstore, retriever = get_vectorstore_retriever(documents)
+    # Hash the documents once for the whole question
+    key = get_vectorstore_key(documents, vectorstore_name)
+
+    # Keep the vectorstore on disk until the answer is generated
+    with checkout_vectorstore(key):
+        # Get the vectostore registry
+        vectorstore, retriever = get_vectorstore_retriever(documents, key)
 
-    # Get the QA chain from the retriever
-    qa_chain = get_qa_chain(retriever)
+        # Get the QA chain from the retriever
+        qa_chain = get_qa_chain(retriever)
 
-    # Invoke the QA chain to get an answer to the user
-    response = invoke_qa_chain(qa_chain, user_request)
+        # Invoke the QA chain to get an answer to the user
+        response = invoke_qa_chain(qa_chain, user_request)
 
     return response
 
@@ -94,33 +121,195 @@ def load_embedding_model(embedding_model_info: Dict[str, Any]) -> HuggingFaceEmb
         )
 
 
-def get_vectorstore_retriever(documents: List[Document]) -> Tuple[Chroma, VectorStoreRetriever]:
+def get_embedding_model() -> HuggingFaceEmbeddings | Embeddings:
+    """Get the process-wide embedding model, loading it on first use."""
+    global _embedding_model
+
+    with _embedding_model_lock:
+        if _embedding_model is None:
+            embedding_model_info, _ = get_retrieval_config_info()
+            _embedding_model = load_embedding_model(embedding_model_info)
+        return _embedding_model
+
+
+def get_vectorstore_key(documents: List[Document], vectorstore_name: Optional[str] = None) -> str:
+    """
+    Get the key of the persistent vectorstore of a list of documents.
+
+    The key is a hash of the documents and of the embedding model configuration,
+    prefixed by the readable name of the documents, if any.
+
+    Args:
+        documents: List of documents to be used for retrieval.
+        vectorstore_name: Readable name of the documents.
+
+    Returns:
+        The vectorstore key, usable as a directory and collection name.
+    """
+    embedding_model_info, _ = get_retrieval_config_info()
+    documents_hash = hashlib.sha256(json.dumps(embedding_model_info, sort_keys=True).encode('utf-8'))
+    for document in documents:
+        documents_hash.update(json.dumps([document.page_content, document.metadata], default=str).encode('utf-8'))
+    key = documents_hash.hexdigest()[:32]
+    if vectorstore_name is not None:
+        key = re.sub(r'[^a-zA-Z0-9_-]+', '_', vectorstore_name)[:24].strip('_-') + '_' + key
+    return key
+
+
+@contextmanager
+def checkout_vectorstore(key: str) -> Iterator[None]:
+    """
+    Protect a persistent vectorstore from the eviction while it is used, e.g. by another session.
+
+    Args:
+        key: The vectorstore key.
+    """
+    with _vectorstores_lock:
+        _vectorstore_users[key] = _vectorstore_users.get(key, 0) + 1
+    try:
+        yield
+    finally:
+        with _vectorstores_lock:
+            _vectorstore_users[key] -= 1
+            if _vectorstore_users[key] == 0:
+                del _vectorstore_users[key]
+
+
+def get_vectorstore_directory(key: str) -> str:
+    """Get the persist directory of a vectorstore."""
+    return os.path.join(VECTORSTORE_CACHE_DIR, key)
+
+
+def stop_vectorstore_system(persist_directory: str) -> None:
+    """
+    Stop the `chromadb` system of a persist directory before the directory is deleted.
+
+    `chromadb` caches one system per persist directory for the whole process. If it were kept, a vectorstore created
+    again in the same directory would reuse it, and fail to write to the deleted SQLite database.
+
+    Args:
+        persist_directory: The persist directory of the vectorstore.
     """
-    Get the retriever for a given session id and documents.
+    system = SharedSystemClient._identifier_to_system.pop(persist_directory, None)
+    getattr(SharedSystemClient, '_identifier_to_refcount', dict()).pop(persist_directory, None)
+    if system is not None:
+        system.stop()
+
+
+def is_vectorstore_in_use(key: str) -> bool:
+    """Whether a vectorstore is open or checked out. To be called while holding `_vectorstores_lock`."""
+    return key in _vectorstores or _vectorstore_users.get(key, 0) > 0
+
+
+def evict_vectorstores() -> None:
+    """
+    Delete the least recently used persistent vectorstores above `VECTORSTORE_CACHE_MAX_ENTRIES`.
+
+    The vectorstores which are open, checked out, or being created are skipped.
+    """
+    if not os.path.isdir(VECTORSTORE_CACHE_DIR):
+        return
+    directories = sorted(
+        (entry for entry in os.scandir(VECTORSTORE_CACHE_DIR) if entry.is_dir()),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in directories[: max(0, len(directories) - VECTORSTORE_CACHE_MAX_ENTRIES)]:
+        with _vectorstores_lock:
+            if is_vectorstore_in_use(entry.name):
+                continue
+            key_lock = _vectorstore_locks.setdefault(entry.name, threading.Lock())
+        # The vectorstore is being created or opened by another thread
+        if not key_lock.acquire(blocking=False):
+            continue
+        try:
+            with _vectorstores_lock:
+                if is_vectorstore_in_use(entry.name):
+                    continue
+            persist_directory = get_vectorstore_directory(entry.name)
+            stop_vectorstore_system(persist_directory)
+            shutil.rmtree(persist_directory, ignore_errors=True)
+        finally:
+            key_lock.release()
+
+
+def open_vectorstore(key: str, persist_directory: str) -> Chroma:
+    """Open, or create, a persistent vectorstore."""
+    return Chroma(
+        collection_name=f'documents_{key[-32:]}',
+        embedding_function=get_embedding_model(),
+        persist_directory=persist_directory,
+    )
+
+
+def get_vectorstore(documents: List[Document], key: str) -> Chroma:
+    """
+    Get the persistent vectorstore of a list of documents, embedding them only if they have not been embedded yet.
+
+    Args:
+        documents: List of documents to be used for retrieval.
+        key: The vectorstore key of the documents, as returned by `get_vectorstore_key`.
+
+    Returns:
+        The vectorstore of the documents.
+    """
+    persist_directory = get_vectorstore_directory(key)
+
+    with _vectorstores_lock:
+        key_lock = _vectorstore_locks.setdefault(key, threading.Lock())
+
+    with key_lock:
+        with _vectorstores_lock:
+            vectorstore = _vectorstores.get(key)
+            if vectorstore is not None:
+                _vectorstores.move_to_end(key)
+
+        if vectorstore is None:
+            vectorstore = open_vectorstore(key, persist_directory)
+            # Only embed the documents if the persisted vectorstore is empty or incomplete
+            num_stored_documents = len(vectorstore.get(include=[])['ids'])
+            if num_stored_documents != len(documents):
+                if num_stored_documents > 0:
+                    vectorstore.delete_collection()
+                    vectorstore = open_vectorstore(key, persist_directory)
+                vectorstore.add_documents(documents)
+                logger.info(f'Vectorstore {key} created with {len(documents)} documents.')
+            else:
+                logger.info(f'Vectorstore {key} loaded from the cache.')
+
+            with _vectorstores_lock:
+                _vectorstores[key] = vectorstore
+                while len(_vectorstores) > VECTORSTORE_MAX_OPEN:
+                    _vectorstores.popitem(last=False)
+            evict_vectorstores()
+
+        # Mark the vectorstore as recently used
+        os.utime(persist_directory)
+
+    return vectorstore
+
+
+def get_vectorstore_retriever(documents: List[Document], key: str) -> Tuple[Chroma, VectorStoreRetriever]:
+    """
+    Get the retriever for a given list of documents.
+
+    The documents are embedded once in a persistent vectorstore, which is reused by the following questions.
 
     Args:
         documents: List of documents to be used for retrieval.
-        vectorstore_registry: Registry of vectorstores to be used in retrieval.
-            Defaults to an empty registry.
+        key: The vectorstore key of the documents, as returned by `get_vectorstore_key`.
 
     Returns:
-        A tuple with the vectorstore registry and the current session id.
+        A tuple with the vectorstore and its retriever.
 
     Raisese:
         Exception: If a vectorstore and a retriever cannot be instantiated.
     """
-    # Load config
-    config = _get_config_info(CONFIG_PATH)
-
     # Retrieve RAG config information
-    embedding_model_info, retrieval_info = get_retrieval_config_info()
-
-    # Instantiate the embedding model
-    embedding_model = load_embedding_model(embedding_model_info)
+    _, retrieval_info = get_retrieval_config_info()
 
-    # Instantiate the vectorstore with an explicit in-memory configuration
+    # Get the persistent vectorstore of the documents
     try:
-        vectorstore = Chroma.from_documents(documents=documents, embedding=embedding_model, persist_directory=None)
+        vectorstore = get_vectorstore(documents, key)
     except:
         raise VectorStoreException('Could not instantiate the vectorstore.')
 
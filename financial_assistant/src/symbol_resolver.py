@@ -0,0 +1,226 @@
+import bisect
+import difflib
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from financial_assistant.constants import *
+from financial_assistant.src.utilities import get_logger
+from utils.web.http_cache import HttpCache, cached_get, get_shared_http_cache, make_cache_key
+
+logger = get_logger()
+
+# Trailing words that do not identify a company, e.g. `Apple Inc.` or `Amazon.com, Inc.`
+COMPANY_NAME_SUFFIXES = {
+    'ag',
+    'co',
+    'com',
+    'company',
+    'corp',
+    'corporation',
+    'de',
+    'group',
+    'holding',
+    'holdings',
+    'inc',
+    'incorporated',
+    'limited',
+    'llc',
+    'lp',
+    'ltd',
+    'nv',
+    'plc',
+    'sa',
+    'se',
+    'the',
+}
+# Minimum `difflib` similarity ratio for a fuzzy company name match
+FUZZY_MATCH_CUTOFF = 0.9
+
+
+def normalize_company_name(company_name: str) -> str:
+    """
+    Normalize a company name for the ticker symbol lookup.
+
+    Args:
+        company_name: The company name.
+
+    Returns:
+        The lowercased company name, without punctuation, leading `the`, and legal suffixes.
+    """
+    words = re.sub(r'[^a-z0-9]+', ' ', company_name.lower().replace('&', ' and ')).split()
+    if len(words) > 1 and words[0] == 'the':
+        words = words[1:]
+    while len(words) > 1 and words[-1] in COMPANY_NAME_SUFFIXES:
+        words = words[:-1]
+    return ' '.join(words)
+
+
+class TickerIndex:
+    """
+    Compact index of company names and ticker symbols, stored as sorted arrays.
+
+    Company names are matched exactly, then on a word prefix (e.g. `meta` for `Meta Platforms, Inc.`),
+    and finally with a fuzzy match tolerating typos. When several companies match, the one listed first,
+    i.e. the largest company in the SEC table, is preferred.
+    """
+
+    def __init__(self, companies: List[Tuple[str, str]]) -> None:
+        """
+        Build the index.
+
+        Args:
+            companies: The pairs of company names and ticker symbols, by order of preference.
+        """
+        entries: Dict[str, Tuple[int, str]] = dict()
+        for rank, (company_name, symbol) in enumerate(companies):
+            entries.setdefault(normalize_company_name(company_name), (rank, symbol.upper()))
+        self.names = sorted(entries)
+        self.ranks = [entries[name][0] for name in self.names]
+        self.symbols = [entries[name][1] for name in self.names]
+        self.symbol_set = set(self.symbols)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def lookup(self, company_name: str) -> Optional[str]:
+        """
+        Look up the ticker symbol of a company.
+
+        Args:
+            company_name: The company name, or its ticker symbol.
+
+        Returns:
+            The ticker symbol, or None if the company could not be matched.
+        """
+        # The LLM often passes the ticker symbol itself
+        if company_name.strip().isupper() and company_name.strip() in self.symbol_set:
+            return company_name.strip()
+
+        name = normalize_company_name(company_name)
+        if len(name) == 0:
+            return None
+
+        # Exact match
+        index = bisect.bisect_left(self.names, name)
+        if index < len(self.names) and self.names[index] == name:
+            return self.symbols[index]
+
+        # Word prefix match, preferring the company listed first
+        prefix = name + ' '
+        start = end = bisect.bisect_left(self.names, prefix)
+        while end < len(self.names) and self.names[end].startswith(prefix):
+            end += 1
+        if end > start:
+            best_index = min(range(start, end), key=self.ranks.__getitem__)
+            return self.symbols[best_index]
+
+        # Fuzzy match
+        matches = difflib.get_close_matches(name, self.names, n=1, cutoff=FUZZY_MATCH_CUTOFF)
+        if len(matches) > 0:
+            return self.symbols[bisect.bisect_left(self.names, matches[0])]
+        return None
+
+
+_ticker_index: Optional[TickerIndex] = None
+_ticker_index_loaded_at = 0.0
+_ticker_index_failed_at = 0.0
+_ticker_index_lock = threading.Lock()
+
+
+def get_symbols_http_cache() -> HttpCache:
+    """Get the on-disk cache shared by all the sessions for the SEC ticker table and the resolved symbols."""
+    return get_shared_http_cache(HTTP_CACHE_DIR, max_size_mb=HTTP_CACHE_MAX_SIZE_MB)
+
+
+def get_ticker_index() -> Optional[TickerIndex]:
+    """
+    Get the index of the SEC company ticker table, downloading it at most once per `SEC_COMPANY_TICKERS_TTL`.
+
+    When the download fails, the expired on-disk copy of the table is used if any, and the download is not retried
+    before `SEC_COMPANY_TICKERS_RETRY_DELAY`, so that an SEC outage does not delay every symbol resolution.
+
+    Returns:
+        The ticker index, or None if the SEC table could not be downloaded.
+    """
+    global _ticker_index, _ticker_index_loaded_at, _ticker_index_failed_at
+
+    with _ticker_index_lock:
+        now = time.time()
+        if _ticker_index is not None and now - _ticker_index_loaded_at < SEC_COMPANY_TICKERS_TTL:
+            return _ticker_index
+        if now - _ticker_index_failed_at < SEC_COMPANY_TICKERS_RETRY_DELAY:
+            return _ticker_index
+        http_cache = get_symbols_http_cache()
+        # The SEC requires a user agent with a contact email
+        headers = {'User-Agent': f'{os.getenv("SEC_API_ORGANIZATION")} {os.getenv("SEC_API_EMAIL")}'}
+        try:
+            content = cached_get(
+                SEC_COMPANY_TICKERS_URL,
+                http_cache,
+                ttl=SEC_COMPANY_TICKERS_TTL,
+                headers=headers,
+                timeout=30,
+            )
+        except Exception as e:
+            logger.warning(f'Could not download the SEC company ticker table: {e}')
+            content = None
+        is_stale = content is None
+        if is_stale:
+            _ticker_index_failed_at = now
+            stale_page = http_cache.lookup(make_cache_key('page', SEC_COMPANY_TICKERS_URL))
+            if _ticker_index is not None or stale_page is None:
+                return _ticker_index
+            logger.warning('Using the expired copy of the SEC company ticker table.')
+            content = str(stale_page.value['content'])
+        try:
+            companies = [(company['title'], company['ticker']) for company in json.loads(content).values()]
+        except Exception as e:
+            logger.warning(f'Could not load the SEC company ticker table: {e}')
+            _ticker_index_failed_at = now
+            return _ticker_index
+        _ticker_index = TickerIndex(companies)
+        # An expired copy is replaced as soon as the download succeeds again
+        _ticker_index_loaded_at = 0.0 if is_stale else now
+        logger.info(f'Ticker index loaded with {len(_ticker_index)} companies.')
+        return _ticker_index
+
+
+def resolve_symbols_locally(company_names_list: List[str]) -> Dict[str, Optional[str]]:
+    """
+    Resolve the ticker symbols of companies from the cache of resolved symbols and the SEC ticker table.
+
+    Args:
+        company_names_list: List of company names.
+
+    Returns:
+        A dictionary with the ticker symbol (value) of each company name (key), or None if it could not be resolved.
+    """
+    http_cache = get_symbols_http_cache()
+    ticker_index: Optional[TickerIndex] = None
+    symbols: Dict[str, Optional[str]] = dict()
+    for company in company_names_list:
+        symbol = http_cache.get(make_cache_key('ticker_symbol', normalize_company_name(company)))
+        if symbol is None:
+            ticker_index = ticker_index or get_ticker_index()
+            if ticker_index is not None:
+                symbol = ticker_index.lookup(company)
+                if symbol is not None:
+                    cache_symbols({company: symbol})
+        symbols[company] = symbol
+    return symbols
+
+
+def cache_symbols(symbols: Dict[str, str]) -> None:
+    """
+    Store resolved ticker symbols in the cache shared by all the sessions.
+
+    Args:
+        symbols: A dictionary with the ticker symbol (value) of each company name (key).
+    """
+    http_cache = get_symbols_http_cache()
+    for company, symbol in symbols.items():
+        http_cache.set(make_cache_key('ticker_symbol', normalize_company_name(company)), symbol, TICKER_SYMBOL_TTL)
@@ -1,17 +1,21 @@
 import ast
 import datetime
 import json
-from typing import Any, Dict, List, Optional, Protocol
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Protocol, Tuple
 
 import pandas
 import yfinance
+from bs4 import BeautifulSoup, FeatureNotFound
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 
+from financial_assistant.constants import *
 from financial_assistant.prompts.conversational_prompts import CONVERSATIONAL_RESPONSE_PROMPT_TEMPLATE
 from financial_assistant.src.utilities import get_logger
+from financial_assistant.src.yfinance_cache import get_yfinance_cache
 from financial_assistant.streamlit.llm_model import sambanova_llm
 
 
@@ -79,215 +83,224 @@ def get_conversational_response(user_query: str, response_object: Any) -> Any:
     return response
 
 
-def extract_yfinance_data(
-    symbol: str, start_date: datetime.date, end_date: datetime.date
-) -> Dict[str, pandas.DataFrame | Dict[Any, Any]]:
+# Getters of the Yahoo Finance data, by name of the extracted dataframe
+YFINANCE_GETTERS: Dict[str, Callable[[yfinance.Ticker, datetime.date, datetime.date], Any]] = {
+    # Get all the stock information
+    'info': lambda company, start_date, end_date: company.info,
+    # Get historical market data (the price history is extended incrementally in the cache)
+    'history': lambda company, start_date, end_date: company.history(start=start_date, end=end_date),
+    # Get meta information about the history
+    'history_metadata': lambda company, start_date, end_date: company.history_metadata,
+    # Get actions, dividends, splits, and capital gains (only for mutual funds & etfs)
+    'actions': lambda company, start_date, end_date: company.actions,
+    'dividends': lambda company, start_date, end_date: company.dividends,
+    'splits': lambda company, start_date, end_date: company.splits,
+    'capital_gains': lambda company, start_date, end_date: company.capital_gains,
+    # Get share count
+    'shares': lambda company, start_date, end_date: company.get_shares_full(start=start_date, end=end_date),
+    # Get financials: income statement, balance sheet, and cash flow statement
+    # see `Ticker.get_income_stmt()` for more options
+    'income_stmt': lambda company, start_date, end_date: convert_index_to_column(company.income_stmt.T, 'Date'),
+    'quarterly_income_stmt': lambda company, start_date, end_date: convert_index_to_column(
+        company.quarterly_income_stmt.T, 'Date'
+    ),
+    'balance_sheet': lambda company, start_date, end_date: convert_index_to_column(company.balance_sheet.T, 'Date'),
+    'quarterly_balance_sheet': lambda company, start_date, end_date: convert_index_to_column(
+        company.quarterly_balance_sheet.T, 'Date'
+    ),
+    'cashflow': lambda company, start_date, end_date: convert_index_to_column(company.cashflow.T, 'Date'),
+    'quarterly_cashflow': lambda company, start_date, end_date: convert_index_to_column(
+        company.quarterly_cashflow.T, 'Date'
+    ),
+    # Get holders
+    'major_holders': lambda company, start_date, end_date: company.major_holders,
+    'institutional_holders': lambda company, start_date, end_date: company.institutional_holders,
+    'mutualfund_holders': lambda company, start_date, end_date: company.mutualfund_holders,
+    # Get insider transactions, purchases, and sales
+    'insider_transactions': lambda company, start_date, end_date: company.insider_transactions,
+    'insider_purchases': lambda company, start_date, end_date: company.insider_purchases,
+    'insider_roster_holders': lambda company, start_date, end_date: company.insider_roster_holders,
+    # Get sustainability
+    'sustainability': lambda company, start_date, end_date: company.sustainability,
+    # Get recommendations, recommendations summary, and upgrades downgrades
+    'recommendations': lambda company, start_date, end_date: company.recommendations,
+    'recommendations_summary': lambda company, start_date, end_date: company.recommendations_summary,
+    'upgrades_downgrades': lambda company, start_date, end_date: company.upgrades_downgrades,
+    # Get future and historic earnings dates, returns at most next 4 quarters and last 8 quarters by default.
+    # Note: If more are needed use company.get_earnings_dates(limit=XX) with increased limit argument.
+    'earnings_dates': lambda company, start_date, end_date: company.earnings_dates,
+    # Get ISIN code - *experimental*
+    # ISIN = International Securities Identification Number
+    'isin': lambda company, start_date, end_date: company.isin,
+    # Get options expirations
+    'options': lambda company, start_date, end_date: company.options,
+    # Get news
+    'news': lambda company, start_date, end_date: company.news,
+    # Get option chain for specific expiration
+    # data available via: opt.calls, opt.puts
+    'option_chain': lambda company, start_date, end_date: company.option_chain(),
+}
+
+# Yahoo Finance data that depend on the requested date range
+YFINANCE_DATE_RANGE_ATTRIBUTES = {'shares'}
+
+# Thread pool shared by all the Yahoo Finance extractions, bounding the number of concurrent requests
+yfinance_executor = ThreadPoolExecutor(max_workers=YFINANCE_MAX_WORKERS, thread_name_prefix='yfinance')
+
+
+def extract_yfinance_attribute(symbol: str, attribute: str, start_date: datetime.date, end_date: datetime.date) -> Any:
     """
-    Extracts all the data of a given company using Yahoo Finance for specified dates.
+    Extracts one piece of data of a given company using Yahoo Finance, reusing the cached data if it has not expired.
+
+    The `yfinance.Ticker` lazily loads and caches its data without locking, so each extraction uses its own
+    `yfinance.Ticker`, created only on a cache miss.
 
     Args:
-        symbol: The ticker symbol of the company to extract data from.
+        symbol: The ticker symbol of the company.
+        attribute: The name of the data to extract, i.e. a key of `YFINANCE_GETTERS`.
+        start_date: The start date of the data to retrieve.
+        end_date: The end date of the data to retrieve.
+
+    Returns:
+        The extracted data.
+    """
+    yfinance_cache = get_yfinance_cache()
+
+    # Only the dates of the price history that are not cached yet are downloaded
+    if attribute == 'history':
+        return yfinance_cache.get_history(
+            symbol,
+            start_date,
+            end_date,
+            lambda fetch_start_date, fetch_end_date: YFINANCE_GETTERS['history'](
+                yfinance.Ticker(ticker=symbol), fetch_start_date, fetch_end_date
+            ),
+        )
+
+    key = f'{symbol}:{attribute}'
+    if attribute in YFINANCE_DATE_RANGE_ATTRIBUTES:
+        key += f':{start_date}:{end_date}'
+    data = yfinance_cache.get(key)
+    if data is None:
+        data = YFINANCE_GETTERS[attribute](yfinance.Ticker(ticker=symbol), start_date, end_date)
+        if data is not None:
+            yfinance_cache.set(key, data, YFINANCE_ATTRIBUTE_TTLS[attribute])
+    return data
+
+
+def extract_yfinance_data_batch(
+    symbol_list: List[str],
+    start_date: datetime.date,
+    end_date: datetime.date,
+    attributes: Optional[List[str]] = None,
+) -> Dict[str, Dict[str, pandas.DataFrame | Dict[Any, Any]]]:
+    """
+    Concurrently extracts the data of several companies using Yahoo Finance for specified dates.
+
+    All the data of all the companies are extracted in parallel, in the shared `yfinance_executor` thread pool.
+
+    Args:
+        symbol_list: The ticker symbols of the companies to extract data from.
         start_date: The start date of the historical price data to retrieve.
         end_date: The end date of the historical price data to retrieve.
+        attributes: The names of the data to extract. Defaults to all the keys of `YFINANCE_GETTERS`.
 
     Returns:
-        A dictionary containing the data of the company extracted from Yahoo Finance.
+        A dictionary with the ticker symbols as keys
+        and the dictionaries of the data extracted from Yahoo Finance as values.
 
     Raises:
-        TypeError: If `symbol` is not a string or `start_date` and `end_date` are not of type `datetime.date`.
+        TypeError: If `symbol_list` is not a list of strings
+            or `start_date` and `end_date` are not of type `datetime.date`.
     """
     # Check inputs
-    if not isinstance(symbol, str):
-        raise TypeError('Symbol must be a string.')
+    if not isinstance(symbol_list, list) or not all([isinstance(symbol, str) for symbol in symbol_list]):
+        raise TypeError('Symbol list must be a list of strings.')
     if not isinstance(start_date, datetime.date):
         raise TypeError('Start date must be of type datetime.date.')
     if not isinstance(end_date, datetime.date):
         raise TypeError('End date must be of type datetime.date.')
 
-    # Extract the data from Yahoo Finance for the given ticker symbol
-
-    company = yfinance.Ticker(ticker=symbol)
-
-    # Initialize the return dictionary
-    company_dict = dict()
-
-    # Get all the stock information
-    try:
-        company_dict['info'] = company.info
-    except:
-        logger.warning('Could not retrieve the `info` dataframe.')
-
-    # Get historical market data
-    try:
-        company_dict['history'] = company.history(start=start_date, end=end_date)
-    except:
-        logger.warning('Could not retrieve the `history` dataframe.')
-
-    # Get meta information about the history (requires history() to be called first)
-    company_dict['history_metadata'] = company.history_metadata
-
-    # Get actions
-    try:
-        company_dict['actions'] = company.actions
-    except:
-        logger.warning('Could not retrieve the `actions` dataframe.')
-
-    # Get dividends
-    try:
-        company_dict['dividends'] = company.dividends
-    except:
-        logger.warning('Could not retrieve the `dividends` dataframe.')
-
-    # Get splits
-    try:
-        company_dict['splits'] = company.splits
-    except:
-        logger.warning('Could not retrieve the `splits` dataframe.')
-
-    # Get capital gains
-    try:
-        company_dict['capital_gains'] = company.capital_gains  # only for mutual funds & etfs
-    except:
-        logger.warning('Could not retrieve the `capital gains` dataframe.')
-
-    # Get share count
-    try:
-        company_dict['shares'] = company.get_shares_full(start=start_date, end=end_date)
-    except:
-        logger.warning('Could not retrieve the `shares` dataframe.')
-
-    # Get financials
-    # Get income statement
-    try:
-        company_dict['income_stmt'] = convert_index_to_column(company.income_stmt.T, 'Date')
-    except:
-        logger.warning('Could not retrieve the `income_stmt` dataframe.')
-
-    # Get quarterly income statement
-    try:
-        company_dict['quarterly_income_stmt'] = convert_index_to_column(company.quarterly_income_stmt.T, 'Date')
-    except:
-        logger.warning('Could not retrieve the `quarterly_income_stmt` dataframe.')
-
-    # Get balance sheet
-    try:
-        company_dict['balance_sheet'] = convert_index_to_column(company.balance_sheet.T, 'Date')
-    except:
-        logger.warning('Could not retrieve the `balance_sheet` dataframe.')
-
-    # Get quarterly balance sheet
-    try:
-        company_dict['quarterly_balance_sheet'] = convert_index_to_column(company.quarterly_balance_sheet.T, 'Date')
-    except:
-        logger.warning('Could not retrieve the `quarterly_balance_sheet` dataframe.')
-
-    # Get cash flow statement
-    try:
-        company_dict['cashflow'] = convert_index_to_column(company.cashflow.T, 'Date')
-    except:
-        logger.warning('Could not retrieve the `cashflow` dataframe.')
-
-    # Get quarterly cash flow
-    try:
-        company_dict['quarterly_cashflow'] = convert_index_to_column(company.quarterly_cashflow.T, 'Date')
-    except:
-        logger.warning('Could not retrieve the `quarterly_cashflow` dataframe.')
-    # see `Ticker.get_income_stmt()` for more options
-
-    # Get major holders
-    try:
-        company_dict['major_holders'] = company.major_holders
-    except:
-        logger.warning('Could not retrieve the `major_holders` dataframe.')
-
-    # Get institutional holders
-    try:
-        company_dict['institutional_holders'] = company.institutional_holders
-    except:
-        logger.warning('Could not retrieve the `institutional_holders` dataframe.')
+    if attributes is None:
+        attributes = list(YFINANCE_GETTERS)
+
+    # Submit the extraction of each piece of data of each company
+    futures: Dict[Tuple[str, str], Future[Any]] = dict()
+    for symbol in symbol_list:
+        for attribute in attributes:
+            futures[(symbol, attribute)] = yfinance_executor.submit(
+                extract_yfinance_attribute, symbol, attribute, start_date, end_date
+            )
+
+    # Collect the data in the order of the getters
+    company_data_dict: Dict[str, Dict[str, pandas.DataFrame | Dict[Any, Any]]] = {
+        symbol: dict() for symbol in symbol_list
+    }
+    for (symbol, attribute), future in futures.items():
+        try:
+            company_data_dict[symbol][attribute] = future.result()
+        except:
+            logger.warning(f'Could not retrieve the `{attribute}` dataframe for {symbol}.')
 
-    # Get mutual fund holders
-    try:
-        company_dict['mutualfund_holders'] = company.mutualfund_holders
-    except:
-        logger.warning('Could not retrieve the `mutualfund_holders` dataframe.')
+    return company_data_dict
 
-    # Get insider transactions
-    try:
-        company_dict['insider_transactions'] = company.insider_transactions
-    except:
-        logger.warning('Could not retrieve the `insider_transactions` dataframe.')
 
-    # Get insider purchases
-    try:
-        company_dict['insider_purchases'] = company.insider_purchases
-    except:
-        logger.warning('Could not retrieve the `insider_purchases` dataframe.')
-
-    # Get insider sales
-    try:
-        company_dict['insider_roster_holders'] = company.insider_roster_holders
-    except:
-        logger.warning('Could not retrieve the `insider_roster_holders` dataframe.')
+def extract_yfinance_data(
+    symbol: str, start_date: datetime.date, end_date: datetime.date, attributes: Optional[List[str]] = None
+) -> Dict[str, pandas.DataFrame | Dict[Any, Any]]:
+    """
+    Extracts all the data of a given company using Yahoo Finance for specified dates.
 
-    # Get sustainability
-    try:
-        company_dict['sustainability'] = company.sustainability
-    except:
-        logger.warning('Could not retrieve the `sustainability` dataframe.')
+    Args:
+        symbol: The ticker symbol of the company to extract data from.
+        start_date: The start date of the historical price data to retrieve.
+        end_date: The end date of the historical price data to retrieve.
+        attributes: The names of the data to extract. Defaults to all the keys of `YFINANCE_GETTERS`.
 
-    # Get recommendations
-    try:
-        company_dict['recommendations'] = company.recommendations
-    except:
-        logger.warning('Could not retrieve the `recommendations` dataframe.')
+    Returns:
+        A dictionary containing the data of the company extracted from Yahoo Finance.
 
-    # Get recommendations summary
-    try:
-        company_dict['recommendations_summary'] = company.recommendations_summary
-    except:
-        logger.warning('Could not retrieve the `recommendations` dataframe.')
+    Raises:
+        TypeError: If `symbol` is not a string or `start_date` and `end_date` are not of type `datetime.date`.
+    """
+    # Check inputs
+    if not isinstance(symbol, str):
+        raise TypeError('Symbol must be a string.')
 
-    # Get upgrades downgrades
-    try:
-        company_dict['upgrades_downgrades'] = company.upgrades_downgrades
-    except:
-        logger.warning('Could not retrieve the `upgrades_downgrades` dataframe.')
+    return extract_yfinance_data_batch([symbol], start_date, end_date, attributes)[symbol]
 
-    # Get future and historic earnings dates, returns at most next 4 quarters and last 8 quarters by default.
-    # Note: If more are needed use company.get_earnings_dates(limit=XX) with increased limit argument.
-    try:
-        company_dict['earnings_dates'] = company.earnings_dates
-    except:
-        logger.warning('Could not retrieve the `earnings_dates` dataframe.')
 
-    # Get ISIN code - *experimental*
-    # ISIN = International Securities Identification Number
-    try:
-        company_dict['isin'] = company.isin
-    except:
-        logger.warning('Could not retrieve the `isin` dataframe.')
+def get_price_history(
+    symbol_list: List[str], start_date: datetime.date, end_date: datetime.date, quantity: str = 'Close'
+) -> pandas.DataFrame:
+    """
+    Get the price history of several companies from the cached Yahoo Finance data.
 
-    # Get options expirations
-    try:
-        company_dict['options'] = company.options
-    except:
-        logger.warning('Could not retrieve the `options` dataframe.')
+    Args:
+        symbol_list: The ticker symbols of the companies.
+        start_date: The start date of the price history.
+        end_date: The end date (excluded) of the price history.
+        quantity: The quantity of the price history, e.g. `Close` or `Volume`.
 
-    # Get news
-    try:
-        company_dict['news'] = company.news
-    except:
-        logger.warning('Could not retrieve the `news` dataframe.')
+    Returns:
+        A dataframe with the trading dates as index and the ticker symbols as columns.
+        Companies without price history are left out.
+    """
+    company_data_dict = extract_yfinance_data_batch(symbol_list, start_date, end_date, attributes=['history'])
 
-    # # Get option chain for specific expiration
-    try:
-        company_dict['option_chain'] = company.option_chain()
-    except:
-        logger.warning('Could not retrieve the `option chain` dataframe.')
-    # data available via: opt.calls, opt.puts
+    prices: Dict[str, pandas.Series] = dict()
+    for symbol in symbol_list:
+        history = company_data_dict[symbol].get('history')
+        if not isinstance(history, pandas.DataFrame) or history.empty or quantity not in history.columns:
+            logger.warning(f'No `{quantity}` price history found for {symbol}.')
+            continue
+        # Align the companies listed in different time zones on the trading dates
+        series = pandas.Series(history[quantity].to_numpy(), index=pandas.DatetimeIndex(history.index.date))
+        prices[symbol] = series[~series.index.duplicated(keep='last')]
 
-    return company_dict
+    price_history = pandas.DataFrame(prices).sort_index()
+    price_history.index.name = 'Date'
+    return price_history
 
 
 def convert_data_to_frame(data: Any, df_name: str) -> pandas.DataFrame:
@@ -441,6 +454,14 @@ def coerce_str_to_list(input_string: str | List[str]) -> List[str]:
         raise TypeError(f'Input must be a string or a list of strings. Got {type(input_string)}.')
 
 
+def parse_html(content: str) -> BeautifulSoup:
+    """Parse an HTML page with the `lxml` parser, falling back to the pure-Python `html.parser`."""
+    try:
+        return BeautifulSoup(content, 'lxml')
+    except FeatureNotFound:
+        return BeautifulSoup(content, 'html.parser')
+
+
 def sort_dataframe_by_date(df: pandas.DataFrame, column_name: Optional[str] = None) -> pandas.DataFrame:
     """
     Sort a pandas DataFrame by chronological dates.
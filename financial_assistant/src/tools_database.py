@@ -1,8 +1,9 @@
 import datetime
 import json
+import os
 import re
-import shutil
-from typing import Any, Dict, List
+import threading
+from typing import Any, Dict, List, Optional, Tuple
 
 import pandas
 import streamlit
@@ -12,19 +13,20 @@ from langchain_community.utilities import SQLDatabase
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.runnables import RunnableLambda
 from langchain_core.tools import tool
-from pandasai import SmartDataframe
+from pandasai import Agent
 from pandasai.connectors import SqliteConnector
 from pydantic import BaseModel, Field
-from sqlalchemy import Inspector, create_engine
+from sqlalchemy import Boolean, DateTime, Engine, Float, Integer, Text, create_engine, event, inspect
 
 from financial_assistant.constants import *
 from financial_assistant.prompts.pandasai_prompts import PLOT_INSTRUCTIONS, TITLE_INSTRUCTIONS_TEMPLATE
 from financial_assistant.prompts.sql_queries_prompt import SQL_QUERY_PROMPT_TEMPLATE
 from financial_assistant.src.exceptions import TableNotFoundException
+from financial_assistant.src.pandasai_agents import pandasai_agent_pool
 from financial_assistant.src.tools import (
     coerce_str_to_list,
     convert_data_to_frame,
-    extract_yfinance_data,
+    extract_yfinance_data_batch,
     get_conversational_response,
 )
 from financial_assistant.src.tools_stocks import retrieve_symbol_list
@@ -79,10 +81,10 @@ def create_stock_database(
     if start_date >= end_date:
         raise ValueError('Start date must be before the end date.')
 
-    # Extract yfinance data
-    company_data_dict = dict()
-    for symbol in symbol_list:
-        company_data_dict[symbol] = extract_yfinance_data(symbol, start_date, end_date)
+    # Extract yfinance data for all the companies concurrently
+    company_data_dict: Dict[str, pandas.DataFrame | Dict[Any, Any]] = dict(
+        extract_yfinance_data_batch(symbol_list, start_date, end_date)
+    )
 
     # Create SQL database
     company_tables_dict = store_company_dataframes_to_sqlite(
@@ -92,12 +94,248 @@ def create_stock_database(
     return company_tables_dict
 
 
+def create_sqlite_engine(db_path: str) -> Engine:
+    """
+    Create an SQLAlchemy engine for an SQLite database in WAL mode.
+
+    WAL mode lets the queries read the database while it is being written,
+    and `synchronous=NORMAL` avoids a disk sync for each transaction.
+
+    Args:
+        db_path: The path to the SQLite database file.
+
+    Returns:
+        The SQLAlchemy engine.
+    """
+    engine = create_engine(f'sqlite:///{db_path}')
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+    return engine
+
+
+class DatabaseInfo:
+    """
+    Cached description of the SQL tables of one version of a database.
+
+    The column names are inspected once, and the description of each table, with its `CREATE TABLE` statement
+    giving the column types and a few sample rows, is built on first use. The `SQLDatabase` used to run the SQL
+    queries is shared, so that its reflected tables are reused by the next queries.
+    """
+
+    def __init__(self, version: str, engine: Engine) -> None:
+        """
+        Inspect the SQL tables of a database.
+
+        Args:
+            version: The version of the database, see `get_database_version`.
+            engine: The SQLAlchemy engine of the database.
+        """
+        self.version = version
+        inspector = inspect(engine)
+        self.table_columns = {
+            table: [column['name'] for column in inspector.get_columns(table)] for table in inspector.get_table_names()
+        }
+        self.sql_database = SQLDatabase(
+            engine=engine,
+            lazy_table_reflection=True,
+            sample_rows_in_table_info=SQL_TABLE_SAMPLE_ROWS,
+        )
+        self._table_descriptions: Dict[str, str] = dict()
+        self._lock = threading.Lock()
+
+    def get_table_description(self, table: str) -> str:
+        """
+        Get the description of a table, with its `CREATE TABLE` statement and sample rows.
+
+        Args:
+            table: The name of the SQL table.
+
+        Returns:
+            The description of the table.
+        """
+        with self._lock:
+            if table not in self._table_descriptions:
+                self._table_descriptions[table] = self.sql_database.get_table_info([table])
+            return self._table_descriptions[table]
+
+
+# Shared pooled engines, by database path, with the inode of the database file they are connected to
+_sqlite_engines: Dict[str, Tuple[Engine, Optional[int]]] = dict()
+# Cached descriptions of the SQL tables, by database path
+_database_info_cache: Dict[str, DatabaseInfo] = dict()
+# Number of writes to each database, by database path
+_database_write_counts: Dict[str, int] = dict()
+_sqlite_engines_lock = threading.Lock()
+
+
+def get_sqlite_engine(db_path: str) -> Engine:
+    """
+    Get the pooled SQLAlchemy engine shared by all the tools for an SQLite database.
+
+    The engine is recreated if the database file has been deleted or replaced, e.g. when the session cache is cleared.
+
+    Args:
+        db_path: The path to the SQLite database file.
+
+    Returns:
+        The shared SQLAlchemy engine.
+    """
+    db_path = os.path.abspath(db_path)
+    inode = os.stat(db_path).st_ino if os.path.exists(db_path) else None
+    with _sqlite_engines_lock:
+        if db_path in _sqlite_engines:
+            engine, engine_inode = _sqlite_engines[db_path]
+            if engine_inode is None or engine_inode == inode:
+                _sqlite_engines[db_path] = (engine, inode)
+                return engine
+            engine.dispose()
+            _database_info_cache.pop(db_path, None)
+        engine = create_sqlite_engine(db_path)
+        _sqlite_engines[db_path] = (engine, inode)
+        return engine
+
+
+def bump_database_version(db_path: str) -> None:
+    """
+    Bump the version of a database after writing to it, which invalidates the cached description of its tables.
+
+    Args:
+        db_path: The path to the SQLite database file.
+    """
+    db_path = os.path.abspath(db_path)
+    with _sqlite_engines_lock:
+        _database_write_counts[db_path] = _database_write_counts.get(db_path, 0) + 1
+        _database_info_cache.pop(db_path, None)
+
+
+def get_database_version(db_path: str) -> str:
+    """
+    Get a key identifying the version of the content of a database.
+
+    The modification time of the database file is not used, since it does not change when the writes
+    are still in the WAL file. Instead, the version combines the number of writes of this process,
+    bumped by `store_company_dataframes_to_sqlite`, and the SQLite schema version,
+    which changes when another connection creates or replaces a table.
+
+    Args:
+        db_path: The path to the SQLite database file.
+
+    Returns:
+        The version of the database.
+    """
+    db_path = os.path.abspath(db_path)
+    with get_sqlite_engine(db_path).connect() as connection:
+        schema_version = connection.exec_driver_sql('PRAGMA schema_version').scalar()
+    with _sqlite_engines_lock:
+        write_count = _database_write_counts.get(db_path, 0)
+    return f'{write_count}_{schema_version}'
+
+
+def get_database_info(db_path: str) -> DatabaseInfo:
+    """
+    Get the cached description of the SQL tables of a database.
+
+    The tables are only inspected again when the version of the database has changed.
+
+    Args:
+        db_path: The path to the SQLite database file.
+
+    Returns:
+        The description of the SQL tables of the current version of the database.
+    """
+    db_path = os.path.abspath(db_path)
+    version = get_database_version(db_path)
+    with _sqlite_engines_lock:
+        database_info = _database_info_cache.get(db_path)
+    if database_info is not None and database_info.version == version:
+        return database_info
+
+    database_info = DatabaseInfo(version, get_sqlite_engine(db_path))
+    with _sqlite_engines_lock:
+        _database_info_cache[db_path] = database_info
+    return database_info
+
+
+def get_table_columns(db_path: str) -> Dict[str, List[str]]:
+    """
+    Get the column names of all the SQL tables of a database.
+
+    Args:
+        db_path: The path to the SQLite database file.
+
+    Returns:
+        A dictionary with the SQL table names as keys and the lists of their column names as values.
+    """
+    return get_database_info(db_path).table_columns
+
+
+def prepare_dataframe_for_sqlite(df: pandas.DataFrame) -> pandas.DataFrame:
+    """
+    Make a dataframe SQLite-friendly.
+
+    Column names are sanitized at once, and list-type and dict-type entries are converted to JSON strings,
+    only scanning the columns of `object` type.
+
+    Args:
+        df: The dataframe to store.
+
+    Returns:
+        The SQLite-friendly dataframe.
+    """
+    df = df.copy()
+
+    # Make sure the column names are SQLite-friendly
+    df.columns = [f'{column}'.replace(' ', '_') for column in df.columns]
+
+    # Convert list-type and dict-type entries to JSON strings
+    for position in range(df.shape[1]):
+        column = df.iloc[:, position]
+        if column.dtype == object:
+            df.iloc[:, position] = column.map(lambda x: json.dumps(x) if isinstance(x, (list, dict)) else x)
+
+    return df
+
+
+def get_sqlite_dtypes(df: pandas.DataFrame) -> Dict[str, Any]:
+    """
+    Get the SQL types of the columns of a dataframe, so that every table is created with an explicit typed schema.
+
+    Args:
+        df: The dataframe to store.
+
+    Returns:
+        A dictionary with the column names as keys and the SQLAlchemy types as values.
+    """
+    dtypes: Dict[str, Any] = dict()
+    for column, dtype in df.dtypes.items():
+        if pandas.api.types.is_bool_dtype(dtype):
+            dtypes[str(column)] = Boolean()
+        elif pandas.api.types.is_integer_dtype(dtype):
+            dtypes[str(column)] = Integer()
+        elif pandas.api.types.is_float_dtype(dtype):
+            dtypes[str(column)] = Float()
+        elif pandas.api.types.is_datetime64_any_dtype(dtype):
+            dtypes[str(column)] = DateTime(timezone=isinstance(dtype, pandas.DatetimeTZDtype))
+        else:
+            dtypes[str(column)] = Text()
+    return dtypes
+
+
 def store_company_dataframes_to_sqlite(
     db_name: str, company_data_dict: Dict[str, pandas.DataFrame | Dict[Any, Any]]
 ) -> Dict[str, List[str]]:
     """
     Store multiple dataframes for each company into an SQLite database.
 
+    All the tables are written in a single transaction with bulk inserts,
+    and their date columns are indexed to speed up the time-range queries.
+
     Args:
         db_name: The name of the SQLite database file.
         company_data_dict: Dictionary where the key is the company name,
@@ -107,13 +345,11 @@ def store_company_dataframes_to_sqlite(
     Returns:
         A dictionary with company symbols as keys and a list of SQL table names as values.
     """
-    # Connect to the SQLite database
-    engine = create_engine(f'sqlite:///{streamlit.session_state.db_path}')
-
     # Create a dictionary with company names as keys and SQL tables as values
     company_tables: Dict[str, List[str]] = dict()
 
-    # Process each company
+    # Convert all the data before opening the transaction
+    tables: List[Tuple[str, str, str, pandas.DataFrame]] = list()
     for company, company_data in company_data_dict.items():
         # Ensure that the company name is SQLite-friendly
         company_base_name = company.replace(' ', '_').lower()
@@ -131,27 +367,51 @@ def store_company_dataframes_to_sqlite(
                 logger.warning(f'Could not convert {df_name} to `pandas.DataFrame`.')
                 continue
 
-            # Make sure the column names are SQLite-friendly
-            for column in df.columns:
-                df = df.rename({column: f'{column}'.replace(' ', '_')}, axis='columns')
-
-            # Convert list-type and dict-type entries to JSON strings
             try:
-                df = df.applymap(lambda x: json.dumps(x) if isinstance(x, (list, dict)) else x)
+                df = prepare_dataframe_for_sqlite(df)
             except:
                 logger.warning(f'Could not convert {df_name} to JSON.')
                 continue
 
-            # Store the dataframe in an SQLite database table
+            tables.append((company, df_name, table_name, df))
+
+    # Connect to the SQLite database
+    engine = get_sqlite_engine(db_name)
+
+    # Store all the dataframes in one transaction
+    with engine.begin() as connection:
+        for company, df_name, table_name, df in tables:
+            # Each table is written in a savepoint, so that a failed table is rolled back without the other ones
+            savepoint = connection.begin_nested()
             try:
-                df.to_sql(table_name, engine, if_exists='replace', index=False)
+                # `executemany` bulk inserts
+                df.to_sql(
+                    table_name,
+                    connection,
+                    if_exists='replace',
+                    index=False,
+                    dtype=get_sqlite_dtypes(df),
+                    chunksize=SQLITE_INSERT_CHUNK_SIZE,
+                )
+                # Index the date columns
+                for column, dtype in df.dtypes.items():
+                    if pandas.api.types.is_datetime64_any_dtype(dtype):
+                        connection.exec_driver_sql(
+                            f'CREATE INDEX IF NOT EXISTS "ix_{table_name}_{column}" ON "{table_name}" ("{column}")'
+                        )
+                savepoint.commit()
                 logger.info(f"DataFrame '{df_name}' for {company} stored in table '{table_name}'.")
             except:
+                savepoint.rollback()
                 logger.warning(f'Could not store {df_name} to SQLite database.')
+                continue
 
             # Populated company tables list with table name
             company_tables[company].append(table_name)
 
+    # The schemas of the replaced tables must be inspected again, and their agents recreated
+    bump_database_version(db_name)
+
     return company_tables
 
 
@@ -244,9 +504,8 @@ def query_stock_database_sql(user_query: str, symbol_list: List[str]) -> Any:
     # Get the SQL queries that are relevant to the user query
     queries_list = get_sql_queries(selected_schemas, user_query)
 
-    # Create a SQL database engine and connect to it using the selected tables
-    engine = create_engine(f'sqlite:///{streamlit.session_state.db_path}')
-    db = SQLDatabase(engine=engine, include_tables=selected_tables)
+    # Reuse the SQL database of the current version of the database, with its shared engine and reflected tables
+    db = get_database_info(streamlit.session_state.db_path).sql_database
 
     # TODO: With larger context windows
     # https://python.langchain.com/v0.1/docs/use_cases/sql/quickstart/#convert-question-to-sql-query
@@ -375,6 +634,8 @@ def interrogate_table(db_path: str, table: str, user_query: str) -> Any:
     """
     Interrogate a SQL table using `pandasai`.
 
+    The `pandasai` agent of the table is taken from the agent pool, and reused until the database is rebuilt.
+
     Args:
         db_path: The path to the SQL database file.
         table: The name of the SQL table to interrogate.
@@ -383,34 +644,37 @@ def interrogate_table(db_path: str, table: str, user_query: str) -> Any:
     Returns:
         The answer to the user query.
     """
-    # Instantiate the connector to the SQL database
-    connector = SqliteConnector(
-        config={
-            'database': streamlit.session_state.db_path,
-            'table': table,
-            'enable_cache': False,
-        }
-    )
 
-    # Instantiate the `pandasai.SmartDataframe` dataframe
-    df = SmartDataframe(
-        connector,
-        config={
-            'llm': sambanova_llm.llm,
-            'open_charts': False,
-            'save_charts': True,
-            'save_charts_path': streamlit.session_state.db_query_figures_dir,
-            'enable_cache': False,
-        },
+    def create_agent() -> Agent:
+        # Instantiate the connector to the SQL database
+        connector = SqliteConnector(
+            config={
+                'database': db_path,
+                'table': table,
+                'enable_cache': False,
+            }
+        )
+
+        # Instantiate the `pandasai.Agent` of the table
+        return Agent(
+            [connector],
+            config={
+                'llm': sambanova_llm.llm,
+                'open_charts': False,
+                'save_charts': True,
+                'save_charts_path': streamlit.session_state.db_query_figures_dir,
+                'enable_cache': False,
+            },
+        )
+
+    # The agents of the previous versions of the database are not reused
+    source_key = f'sqlite_{os.path.abspath(db_path)}_{get_database_version(db_path)}_{table}'
+
+    # Interrogate the table
+    answer = pandasai_agent_pool.chat(
+        streamlit.session_state.session_id, source_key, sambanova_llm, create_agent, user_query
     )
-
-    # Interrogate the dataframe
-    response = 'Table ' + table + ': ' + str(df.chat(user_query))
-
-    # Delete the pandasai cache
-    shutil.rmtree(streamlit.session_state.pandasai_cache, ignore_errors=True)
-
-    return response
+    return 'Table ' + table + ': ' + str(answer)
 
 
 class TableNames(BaseModel):
@@ -487,11 +751,11 @@ def get_table_summaries_from_symbols(symbol_list: List[str]) -> str:
     Raises:
         Exception: If there is no SQL table in the database.
     """
-    # Instantiate the inspector for the database
-    inspector = Inspector.from_engine(create_engine('sqlite:///' + streamlit.session_state.db_path))
+    # Get the cached column names of the SQL tables in the database
+    table_columns = get_table_columns(streamlit.session_state.db_path)
 
     # Get the list of SQL tables in the database
-    tables_names = inspector.get_table_names()
+    tables_names = list(table_columns)
 
     # Check that there are SQL tables
     if len(tables_names) == 0:
@@ -506,10 +770,8 @@ def get_table_summaries_from_symbols(symbol_list: List[str]) -> str:
         if table_symbol not in [symbol.lower() for symbol in symbol_list]:
             continue
 
-        # Get the columns of each SQL table
-        columns = inspector.get_columns(table)
-        # Get the column names
-        column_names = [col['name'] for col in columns]
+        # Get the column names of each SQL table
+        column_names = table_columns[table]
 
         # Summarize the content of the table based on its column names
         table_summaries[table] = ', '.join(column_names)
@@ -523,7 +785,8 @@ def get_table_summaries_from_names(table_names: List[str]) -> str:
     """
     Get a text summary of SQL tables by their names.
 
-    The summary is a JSON string that maps SQL table names to their column names.
+    The summary is made of the cached description of each table, with its `CREATE TABLE` statement,
+    giving the column names and types, and a few sample rows.
 
     Args:
         table_names: List of SQL table names to be summarized.
@@ -531,13 +794,14 @@ def get_table_summaries_from_names(table_names: List[str]) -> str:
     Returns:
         A text summary of SQL tables by their names.
     """
-    inspector = Inspector.from_engine(create_engine('sqlite:///' + streamlit.session_state.db_path))
-    inspected_tables_names = inspector.get_table_names()
+    database_info = get_database_info(streamlit.session_state.db_path)
+    table_columns = database_info.table_columns
+    inspected_tables_names = list(table_columns)
     inspected_tables_names_symbols = [
         inspected_table.split('_')[0].lower() for inspected_table in inspected_tables_names
     ]
 
-    table_summaries = dict()
+    table_summaries = list()
     for table in table_names:
         # Extract the first word from the name string to get the symbol
         table_symbol = table.split('_')[0].lower()
@@ -546,11 +810,11 @@ def get_table_summaries_from_names(table_names: List[str]) -> str:
         if table_symbol not in [symbol.lower() for symbol in inspected_tables_names_symbols]:
             continue
 
-        columns = inspector.get_columns(table)
-        column_names = [col['name'] for col in columns]
+        if table not in table_columns:
+            continue
 
-        # Summarize the content of the table based on its column names
-        table_summaries[table] = ', '.join(column_names)
+        # Describe the columns of the table, and its content with a few sample rows
+        table_summaries.append(database_info.get_table_description(table))
 
-    summary_text = json.dumps(table_summaries)
+    summary_text = '\n\n'.join(table_summaries)
     return summary_text
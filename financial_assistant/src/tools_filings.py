@@ -1,20 +1,20 @@
 import datetime
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Tuple
 
 import pandas
 import requests
 import streamlit
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 from sec_downloader import Downloader
-from sec_downloader.types import RequestedFilings
 
 from financial_assistant.constants import *
+from financial_assistant.src.filing_store import get_filing_metadatas, get_filing_text
 from financial_assistant.src.retrieval import get_qa_response
 from financial_assistant.src.tools import coerce_str_to_list
 from financial_assistant.src.tools_stocks import retrieve_symbol_list
@@ -24,6 +24,21 @@ load_dotenv(os.path.join(repo_dir, '.env'))
 
 logger = get_logger()
 
+# Text splitter of the filings, shared by all the calls
+FILING_TEXT_SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=MAX_CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    length_function=len,
+    separators=[
+        r'\n\n',  # Split on double newlines (paragraphs)
+        r'(?<=[.!?])\s+(?=[A-Z])',  # Split on sentence boundaries
+        r'\n',  # Split on single newlines
+        r'\s+',  # Split on whitespace
+        r'',  # Split on characters as a last resort
+    ],
+    is_separator_regex=True,
+)
+
 
 class SecEdgarFilingsInput(BaseModel):
     """Tool for retrieving a financial filing from SEC Edgar and then answering the original user question."""
@@ -128,13 +143,24 @@ def retrieve_filings(
 
     response_dict: Dict[str, str] = dict()
 
-    for symbol in symbol_list:
-        # Parse filings
-        filename, report_date = parse_filings(downloader, symbol, filing_type, filing_quarter, year, delta)
+    # Parse the filings of all the companies concurrently,
+    # passing the sources directory explicitly because the streamlit session state is not available in threads
+    sources_dir = streamlit.session_state.sources_dir
+    with ThreadPoolExecutor(max_workers=SEC_MAX_WORKERS, thread_name_prefix='sec_filings') as executor:
+        parsed_filings = list(
+            executor.map(
+                lambda symbol: parse_filings(
+                    downloader, symbol, filing_type, filing_quarter, year, delta, sources_dir=sources_dir
+                ),
+                symbol_list,
+            )
+        )
 
+    # The QA calls stay in the main thread, because they are timed in the streamlit session state
+    for symbol, (filename, report_date) in zip(symbol_list, parsed_filings):
         # Load the dataframe from the text file
         try:
-            df = pandas.read_csv(os.path.join(streamlit.session_state.sources_dir, f'{filename}.csv'))
+            df = pandas.read_csv(os.path.join(sources_dir, f'{filename}.csv'))
         except FileNotFoundError:
             logger.error('No scraped data found.')
 
@@ -145,7 +171,9 @@ def retrieve_filings(
             documents.append(document)
 
         # Return the QA response
-        response = get_qa_response(user_question, documents)
+        response = get_qa_response(
+            user_question, documents, vectorstore_name=f'{symbol}_{filing_type}_{year}_{filing_quarter}'
+        )
 
         # Ensure that response is indexable
         if not isinstance(response, dict):
@@ -172,12 +200,19 @@ def retrieve_filings(
 
 
 def parse_filings(
-    downloader: Downloader, ticker_symbol: str, filing_type: str, filing_quarter: int, year: int, delta: int = 10
-) -> Tuple[str, str]:
+    downloader: Downloader,
+    ticker_symbol: str,
+    filing_type: str,
+    filing_quarter: int,
+    year: int,
+    delta: int = 10,
+    sources_dir: Optional[str] = None,
+) -> Tuple[str, datetime.datetime]:
     """
     Search the filing, parse it, and save it.
 
     The relevant filing refers to a company by ticker symbol, filing type, for a specific quarter and year.
+    The filing metadata and text are read from the filing store when available, and downloaded otherwise.
 
     Args:
         downloader: Downloader object to download the filings from SEC website.
@@ -186,26 +221,25 @@ def parse_filings(
         filing_quarter: Filing quarter of the company to be parsed.
         year: Year of the company to be parsed.
         delta: Maximum number of years to be searched.
+        sources_dir: The directory where the parsed filing is saved.
+            Defaults to the sources directory of the streamlit session.
 
     Returns:
         A tuple of the followimg pair:
             1. The filename of the relevant parsed filing.
             2. The report date of the relevant parsed filing.
     """
+    if sources_dir is None:
+        sources_dir = streamlit.session_state.sources_dir
 
     # Extract the metadata of the filings
-    metadatas = downloader.get_filing_metadatas(
-        RequestedFilings(ticker_or_cik=ticker_symbol, form_type=filing_type, limit=delta)
-    )
+    metadatas = get_filing_metadatas(downloader, ticker_symbol, filing_type, delta)
 
     # Extract the filing text
     filename = None
     for metadata in metadatas:
-        # Extract the filing date
-        report_date = metadata.report_date
-
-        # Convert string to datetime
-        report_date = datetime.datetime.strptime(report_date, '%Y-%m-%d')
+        # Convert the filing date string to datetime
+        report_date = datetime.datetime.strptime(metadata['report_date'], '%Y-%m-%d')
 
         # Check the matching year in the time delta
         if report_date.year == year:
@@ -213,31 +247,11 @@ def parse_filings(
             if filing_quarter == 0 or (filing_quarter is not None and (report_date.month - filing_quarter * 3) <= 1):
                 # Logging
                 logger.info(f'Found filing: {metadata}')
-                # Download the matching filing
-                html_text = downloader.download_filing(url=metadata.primary_doc_url)
-
-                # Convert html to text
-                soup = BeautifulSoup(html_text, 'html.parser')
-                # Extract text from the parsed HTML
-                text = soup.get_text(separator=' ', strip=True)
-
-                # Instantiate the text splitter
-                splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=MAX_CHUNK_SIZE,
-                    chunk_overlap=CHUNK_OVERLAP,
-                    length_function=len,
-                    separators=[
-                        r'\n\n',  # Split on double newlines (paragraphs)
-                        r'(?<=[.!?])\s+(?=[A-Z])',  # Split on sentence boundaries
-                        r'\n',  # Split on single newlines
-                        r'\s+',  # Split on whitespace
-                        r'',  # Split on characters as a last resort
-                    ],
-                    is_separator_regex=True,
-                )
+                # Get the filing text from the filing store
+                text = get_filing_text(downloader, metadata)
 
                 # Split the text into chunks
-                chunks = splitter.split_text(text)
+                chunks = FILING_TEXT_SPLITTER.split_text(text)
 
                 # Save chunks to csv
                 df = pandas.DataFrame(chunks, columns=['text'])
@@ -245,7 +259,7 @@ def parse_filings(
                     f"filing_id_{filing_type.replace('-', '')}_{filing_quarter}_"
                     + f'{ticker_symbol}_{report_date.date().year}'
                 )
-                df.to_csv(os.path.join(streamlit.session_state.sources_dir, f'{filename}.csv'), index=False)
+                df.to_csv(os.path.join(sources_dir, f'{filename}.csv'), index=False)
                 break
 
     # If neither the year nor the quarter match, raise an error
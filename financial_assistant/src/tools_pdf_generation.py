@@ -1,8 +1,11 @@
+import contextvars
+import hashlib
 import os
 import re
 import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import streamlit
 from fpdf import FPDF
@@ -18,11 +21,15 @@ from pydantic import BaseModel, Field
 from financial_assistant.constants import *
 from financial_assistant.src.retrieval import get_qa_response
 from financial_assistant.src.tools import coerce_str_to_list
-from financial_assistant.src.utilities import get_logger, time_llm
+from financial_assistant.src.utilities import get_logger, time_llm, time_llm_path_context
 from financial_assistant.streamlit.llm_model import sambanova_llm
+from utils.web.http_cache import HttpCache, get_shared_http_cache, make_cache_key
 
 logger = get_logger()
 
+# Callback receiving the progress (between 0 and 1) and the status of the report generation
+ProgressCallback = Callable[[float, str], None]
+
 EMPTY_TEXT_PLACEHOLDER = 'Empty text content'
 
 BACKGROUND_COLOUR = (255, 229, 180)
@@ -33,6 +40,11 @@ LOGO_WIDTH = 25
 
 FONT = 'helvetica'
 
+# Share of the report generation progress taken by the summarization, and the rest by the rendering
+SUMMARY_PROGRESS_SHARE = 0.9
+# Share of the summarization progress taken by the section summaries, and the rest by the final summary
+SECTIONS_PROGRESS_SHARE = 0.8
+
 
 class PDFReport(FPDF):  # type: ignore
     """Class for generating PDF reports."""
@@ -232,6 +244,7 @@ def generate_pdf(
     output_file: str,
     title_name: str,
     include_summary: bool = False,
+    progress_callback: Optional[ProgressCallback] = None,
 ) -> bytes:
     """
     Generate a PDF report from the given parsed content.
@@ -242,7 +255,13 @@ def generate_pdf(
         title_name: The name of the PDF report.
         include_summary: Whether or not to include a summary at the end of each section
             and general abstract and summary at the beginning of the report.
+        progress_callback: Optional callback receiving the progress and the status of the generation.
     """
+
+    def report_progress(progress: float, status: str) -> None:
+        if progress_callback is not None:
+            progress_callback(progress, status)
+
     pdf = PDFReport()
     pdf.set_font(FONT)
     pdf.set_page_background(BACKGROUND_COLOUR)
@@ -289,8 +308,12 @@ def generate_pdf(
     if include_summary:
         progress_text = f'Summarizing {len(content_list)} queries...'
         logger.info(progress_text)
+        report_progress(0.0, progress_text)
 
-        intermediate_summaries, intermediate_titles, final_summary, abstract = summarize_text(split_docs)
+        # The summarization takes most of the generation time
+        intermediate_summaries, intermediate_titles, final_summary, abstract = summarize_text(
+            split_docs, lambda progress, status: report_progress(SUMMARY_PROGRESS_SHARE * progress, status)
+        )
         if len(abstract) > 0:
             pdf.chapter_title('Abstract')
             pdf.chapter_summary(abstract)
@@ -301,6 +324,10 @@ def generate_pdf(
 
         for idx, item in enumerate(content_list):
             time.sleep(0.01)
+            report_progress(
+                SUMMARY_PROGRESS_SHARE + (1 - SUMMARY_PROGRESS_SHARE) * idx / len(content_list),
+                f'Rendering section {idx + 1}/{len(content_list)}...',
+            )
 
             # Add the section title
             if len(intermediate_titles[idx]) > 0:
@@ -324,6 +351,7 @@ def generate_pdf(
         time.sleep(0.01)
     else:
         for idx, item in enumerate(content_list):
+            report_progress(idx / len(content_list), f'Rendering section {idx + 1}/{len(content_list)}...')
             pdf.chapter_title('Query ' + str(idx))
             if item['text'] is not None and item['text'] != EMPTY_TEXT_PLACEHOLDER and isinstance(item['text'], str):
                 pdf.chapter_body(item['text'])
@@ -335,6 +363,96 @@ def generate_pdf(
     return bytes(pdf.output())
 
 
+# Executor running the PDF report jobs of all the sessions
+pdf_report_executor = ThreadPoolExecutor(max_workers=PDF_REPORT_MAX_JOBS, thread_name_prefix='pdf_report')
+
+
+class PDFReportJob:
+    """
+    Background job generating a PDF report with `generate_pdf`.
+
+    The job exposes its progress and status, so that the app can poll it instead of blocking on the LLM calls.
+    """
+
+    def __init__(
+        self,
+        report_content: List[Tuple[str, Optional[str]]],
+        output_file: str,
+        title_name: str,
+        include_summary: bool,
+        time_llm_path: str,
+    ) -> None:
+        """
+        Initialize the job.
+
+        Args:
+            report_content: The parsed content as a list of tuples with text and figure paths.
+            output_file: The path to the output file.
+            title_name: The name of the PDF report.
+            include_summary: Whether or not to include a summary at the end of each section
+                and general abstract and summary at the beginning of the report.
+            time_llm_path: The path of the file storing the duration of the LLM calls.
+        """
+        self.report_content = report_content
+        self.output_file = output_file
+        self.title_name = title_name
+        self.include_summary = include_summary
+        self.time_llm_path = time_llm_path
+        self.progress = 0.0
+        self.status = 'Waiting for a worker...'
+        self._future: Optional[Future[bytes]] = None
+
+    def start(self) -> 'PDFReportJob':
+        """Submit the job to the PDF report executor."""
+        self._future = pdf_report_executor.submit(self._run)
+        return self
+
+    def _update_progress(self, progress: float, status: str) -> None:
+        self.progress = min(max(progress, 0.0), 1.0)
+        self.status = status
+
+    def _run(self) -> bytes:
+        """Generate the PDF report."""
+        token = time_llm_path_context.set(self.time_llm_path)
+        try:
+            pdf_handler = generate_pdf(
+                self.report_content,
+                self.output_file,
+                self.title_name,
+                self.include_summary,
+                progress_callback=self._update_progress,
+            )
+        except Exception as e:
+            logger.error(f'Error while generating the PDF report: {e}', exc_info=True)
+            self._update_progress(1.0, 'PDF report generation failed.')
+            raise
+        finally:
+            time_llm_path_context.reset(token)
+        self._update_progress(1.0, 'PDF report generated.')
+        return pdf_handler
+
+    def done(self) -> bool:
+        """Whether the job has finished, successfully or not."""
+        return self._future is not None and self._future.done()
+
+    def result(self, timeout: Optional[float] = None) -> bytes:
+        """
+        Wait for the PDF report.
+
+        Args:
+            timeout: The maximum number of seconds to wait. Defaults to no limit.
+
+        Returns:
+            The PDF report.
+
+        Raises:
+            Exception: If the job has not been started, or if the PDF report generation failed.
+        """
+        if self._future is None:
+            raise Exception('The PDF report job has not been started.')
+        return self._future.result(timeout)
+
+
 class Summary(BaseModel):
     """Model representing the title and summary of a document."""
 
@@ -348,12 +466,53 @@ class ReduceSummary(BaseModel):
     summary: str = Field(..., description='The final concise summary of the documents.')
 
 
-def summarize_text(split_docs: List[Document]) -> Tuple[List[str], List[str], str, str]:
+def get_summary_http_cache() -> HttpCache:
+    """Get the on-disk cache shared by all the sessions for the section summaries."""
+    return get_shared_http_cache(HTTP_CACHE_DIR, max_size_mb=HTTP_CACHE_MAX_SIZE_MB)
+
+
+def get_summary_cache_key(namespace: str, text: str) -> str:
+    """Get the cache key of a summary from the hash of the summarized text and the LLM parameters."""
+    return make_cache_key(namespace, hashlib.sha256(text.encode('utf-8')).hexdigest(), sambanova_llm.llm_info)
+
+
+def get_section_summary(doc: Document) -> Summary:
+    """
+    Get the title and summary of a section, reusing the summary of a section with the same content.
+
+    Args:
+        doc: The section to summarize.
+
+    Returns:
+        The title and summary of the section, which are empty if the LLM call failed.
+    """
+    http_cache = get_summary_http_cache()
+    cache_key = get_summary_cache_key('pdf_section_summary', doc.page_content)
+    cached_summary = http_cache.get(cache_key)
+    if cached_summary is not None:
+        return Summary(**cached_summary)
+
+    try:
+        summary = invoke_summary_map_chain(doc)
+    except:
+        # Failed summaries are not cached, so that they are retried with the next report
+        return Summary(title='', summary='')
+    http_cache.set(cache_key, {'title': summary.title, 'summary': summary.summary}, PDF_SUMMARY_TTL)
+    return summary
+
+
+def summarize_text(
+    split_docs: List[Document], progress_callback: Optional[ProgressCallback] = None
+) -> Tuple[List[str], List[str], str, str]:
     """
     Summarize the text in `split_docs` using the LLM.
 
+    The sections are summarized concurrently, and the summaries are cached by content hash,
+    so that the sections shared by successive reports are only summarized once.
+
     Args:
         split_docs: List of documents to summarize.
+        progress_callback: Optional callback receiving the progress and the status of the summarization.
     Returns:
         A tuple containing the following elements:
             - Intermediate summaries of each section.
@@ -361,29 +520,57 @@ def summarize_text(split_docs: List[Document]) -> Tuple[List[str], List[str], st
             - Final summary of the document.
             - Abstract of the document.
     """
-    # Extract intermediate titles and summaries for each document in the split docs
-    intermediate_results = list()
-    for doc in split_docs:
-        try:
-            intermediate_results.append(invoke_summary_map_chain(doc))
-        except:
-            intermediate_results.append(Summary(title='', summary=''))
+    # The worker threads have no access to the streamlit session state
+    token = time_llm_path_context.set(time_llm_path_context.get() or streamlit.session_state.time_llm_path)
+    try:
+        # Extract intermediate titles and summaries for each document in the split docs
+        intermediate_results: List[Summary] = [Summary(title='', summary='')] * len(split_docs)
+        with ThreadPoolExecutor(max_workers=PDF_SUMMARY_MAX_WORKERS, thread_name_prefix='pdf_summary') as executor:
+            futures = {
+                executor.submit(contextvars.copy_context().run, get_section_summary, doc): idx
+                for idx, doc in enumerate(split_docs)
+            }
+            for num_done, future in enumerate(as_completed(futures), start=1):
+                intermediate_results[futures[future]] = future.result()
+                if progress_callback is not None:
+                    progress_callback(
+                        SECTIONS_PROGRESS_SHARE * num_done / len(split_docs),
+                        f'Summarized {num_done}/{len(split_docs)} sections...',
+                    )
+    finally:
+        time_llm_path_context.reset(token)
 
     intermediate_summaries = [item.summary for item in intermediate_results]
     intermediate_titles = [item.title for item in intermediate_results]
 
+    # Reuse the final summary and abstract of the same intermediate summaries
+    http_cache = get_summary_http_cache()
+    cache_key = get_summary_cache_key('pdf_final_summary', '\n'.join(intermediate_summaries))
+    cached_summary = http_cache.get(cache_key)
+    if cached_summary is not None:
+        return intermediate_summaries, intermediate_titles, cached_summary['summary'], cached_summary['abstract']
+
+    if progress_callback is not None:
+        progress_callback(SECTIONS_PROGRESS_SHARE, 'Writing the summary...')
+
     # Extract final summary from intermediate summaries
     try:
         final_summary = invoke_reduction_chain(intermediate_summaries)
     except:
         final_summary = ''
 
+    if progress_callback is not None:
+        progress_callback((1 + SECTIONS_PROGRESS_SHARE) / 2, 'Writing the abstract...')
+
     # Extract abstract from the final summary
     try:
         abstract = invoke_abstract_chain(final_summary)
     except:
         abstract = ''
 
+    if len(final_summary) > 0 and len(abstract) > 0:
+        http_cache.set(cache_key, {'summary': final_summary, 'abstract': abstract}, PDF_SUMMARY_TTL)
+
     return intermediate_summaries, intermediate_titles, final_summary, abstract
 
 
@@ -522,7 +709,7 @@ def pdf_rag(user_query: str, pdf_files_names: List[str] | str) -> Any:
     chunked_documents = text_splitter.split_documents(documents)
 
     # Retrieve the QA response
-    response = get_qa_response(user_query, chunked_documents)['answer']
+    response = get_qa_response(user_query, chunked_documents, vectorstore_name='pdf_report')['answer']
 
     return response
 
@@ -0,0 +1,395 @@
+import datetime
+from typing import Any, Dict, List
+
+import numpy
+import pandas
+from langchain_core.tools import tool
+from pydantic import BaseModel, Field
+
+from financial_assistant.constants import *
+from financial_assistant.src.tools import coerce_str_to_list, get_price_history
+from financial_assistant.src.tools_stocks import retrieve_symbol_list
+from financial_assistant.src.utilities import get_logger
+
+logger = get_logger()
+
+
+def compute_returns(prices: pandas.DataFrame) -> pandas.DataFrame:
+    """
+    Compute the daily returns of the prices of several companies.
+
+    The missing prices, e.g. on the holidays of only one of the exchanges, are filled with the previous price,
+    so that they do not break the return of the next trading day.
+
+    Args:
+        prices: A dataframe with the trading dates as index and the ticker symbols as columns.
+
+    Returns:
+        A dataframe of the daily returns, with the same index and columns as `prices`.
+    """
+    filled_prices = prices.ffill()
+    return filled_prices / filled_prices.shift(1) - 1
+
+
+def compute_return_summary(prices: pandas.DataFrame) -> pandas.DataFrame:
+    """
+    Compute the total, annualized, best daily, and worst daily returns of several companies.
+
+    Args:
+        prices: A dataframe with the trading dates as index and the ticker symbols as columns.
+
+    Returns:
+        A dataframe with the metrics as index and the ticker symbols as columns.
+    """
+    returns = compute_returns(prices)
+    first_prices = prices.bfill().iloc[0]
+    last_prices = prices.ffill().iloc[-1]
+    num_returns = prices.notna().sum() - 1
+
+    total_returns = last_prices / first_prices - 1
+    annualized_returns = (1 + total_returns) ** (TRADING_DAYS_PER_YEAR / num_returns) - 1
+
+    return pandas.DataFrame(
+        {
+            'Start price': first_prices.round(2),
+            'End price': last_prices.round(2),
+            'Total return (%)': (total_returns * 100).round(2),
+            'Annualized return (%)': (annualized_returns * 100).round(2),
+            'Best daily return (%)': (returns.max() * 100).round(2),
+            'Best day': returns.idxmax().dt.date,
+            'Worst daily return (%)': (returns.min() * 100).round(2),
+            'Worst day': returns.idxmin().dt.date,
+            'Trading days': num_returns + 1,
+        }
+    ).T
+
+
+def compute_volatility_summary(prices: pandas.DataFrame, window: int) -> pandas.DataFrame:
+    """
+    Compute the annualized volatility of several companies, over the whole period and over a rolling window.
+
+    Args:
+        prices: A dataframe with the trading dates as index and the ticker symbols as columns.
+        window: The number of trading days of the rolling window.
+
+    Returns:
+        A dataframe with the metrics as index and the ticker symbols as columns.
+    """
+    returns = compute_returns(prices)
+    annualization_factor = numpy.sqrt(TRADING_DAYS_PER_YEAR)
+    rolling_volatility = returns.rolling(window, min_periods=window).std() * annualization_factor
+
+    return pandas.DataFrame(
+        {
+            'Annualized volatility (%)': (returns.std() * annualization_factor * 100).round(2),
+            f'Latest {window}-day volatility (%)': (rolling_volatility.iloc[-1] * 100).round(2),
+            f'Average {window}-day volatility (%)': (rolling_volatility.mean() * 100).round(2),
+            f'Highest {window}-day volatility (%)': (rolling_volatility.max() * 100).round(2),
+            f'Lowest {window}-day volatility (%)': (rolling_volatility.min() * 100).round(2),
+        }
+    ).T
+
+
+def compute_moving_average_summary(prices: pandas.DataFrame, windows: List[int]) -> pandas.DataFrame:
+    """
+    Compute the latest simple moving averages of several companies, and the position of the price against them.
+
+    Args:
+        prices: A dataframe with the trading dates as index and the ticker symbols as columns.
+        windows: The numbers of trading days of the moving averages.
+
+    Returns:
+        A dataframe with the metrics as index and the ticker symbols as columns.
+        The moving averages longer than the price history are left empty.
+    """
+    filled_prices = prices.ffill()
+    last_prices = filled_prices.iloc[-1]
+
+    summary: Dict[str, pandas.Series] = {'Last price': last_prices.round(2)}
+    for window in windows:
+        moving_average = filled_prices.rolling(window, min_periods=window).mean().iloc[-1]
+        distance = last_prices / moving_average - 1
+        summary[f'{window}-day moving average'] = moving_average.round(2)
+        summary[f'Price vs {window}-day moving average (%)'] = (distance * 100).round(2)
+        summary[f'Price above {window}-day moving average'] = (distance > 0).where(moving_average.notna())
+
+    return pandas.DataFrame(summary).T
+
+
+def compute_drawdown_summary(prices: pandas.DataFrame) -> pandas.DataFrame:
+    """
+    Compute the maximum and current drawdowns of several companies.
+
+    Args:
+        prices: A dataframe with the trading dates as index and the ticker symbols as columns.
+
+    Returns:
+        A dataframe with the metrics as index and the ticker symbols as columns.
+        The recovery date is empty if the price has not recovered its peak yet.
+    """
+    filled_prices = prices.ffill()
+    running_peaks = filled_prices.cummax()
+    drawdowns = filled_prices / running_peaks - 1
+
+    max_drawdowns = drawdowns.min()
+    trough_dates = drawdowns.idxmin()
+
+    peak_dates: Dict[str, Any] = dict()
+    recovery_dates: Dict[str, Any] = dict()
+    for symbol in prices.columns:
+        # The peak is the last date before the trough with the running peak price
+        peak_price = running_peaks.at[trough_dates[symbol], symbol]
+        before_trough = filled_prices.loc[: trough_dates[symbol], symbol]
+        peak_dates[symbol] = before_trough[before_trough == peak_price].index[-1].date()
+
+        # The recovery is the first date after the trough with a price back to the peak price
+        after_trough = filled_prices.loc[trough_dates[symbol] :, symbol]
+        recovered = after_trough[after_trough >= peak_price]
+        recovery_dates[symbol] = recovered.index[0].date() if len(recovered) > 0 else None
+
+    return pandas.DataFrame(
+        {
+            'Maximum drawdown (%)': (max_drawdowns * 100).round(2),
+            'Peak date': pandas.Series(peak_dates),
+            'Trough date': trough_dates.dt.date,
+            'Recovery date': pandas.Series(recovery_dates),
+            'Current drawdown (%)': (drawdowns.iloc[-1] * 100).round(2),
+        }
+    ).T
+
+
+def compute_return_correlation(prices: pandas.DataFrame) -> pandas.DataFrame:
+    """
+    Compute the correlation matrix of the daily returns of several companies.
+
+    Args:
+        prices: A dataframe with the trading dates as index and the ticker symbols as columns.
+
+    Returns:
+        The correlation matrix, with the ticker symbols as index and columns.
+    """
+    return compute_returns(prices).corr().round(4)
+
+
+def get_analytics_price_history(
+    company_list: List[str] | str, start_date: datetime.date, end_date: datetime.date, quantity: str
+) -> pandas.DataFrame:
+    """
+    Get the price history of the companies of the price analytics tools.
+
+    Args:
+        company_list: List of required companies.
+        start_date: The start date of the price history.
+        end_date: The end date of the price history.
+        quantity: Quantity to analyze.
+
+    Returns:
+        A dataframe with the trading dates as index and the ticker symbols as columns.
+        Companies with less than two prices are left out.
+
+    Raises:
+        TypeError: If `company_list` is not a string or a list of strings.
+        ValueError: If `start_date` is not before `end_date`, or if no company has enough price history.
+    """
+    if not isinstance(company_list, (list, str)):
+        raise TypeError(f'`company_list` must be of type list or string. Got {(type(company_list))}.')
+    if start_date >= end_date:
+        raise ValueError('Start date must be before the end date.')
+
+    # If `symbol_list` is a string, coerce it to a list of strings
+    company_list = coerce_str_to_list(company_list)
+
+    if not all([isinstance(name, str) for name in company_list]):
+        raise TypeError('`company_names_list` must be a list of strings.')
+
+    # Retrieve the list of ticker symbols
+    symbol_list = retrieve_symbol_list(company_list)
+
+    # Retrieve the cached price history
+    prices = get_price_history(symbol_list, start_date, end_date, quantity)
+
+    # Returns need at least two prices
+    enough_history = prices.notna().sum() >= 2
+    for symbol in prices.columns[~enough_history]:
+        logger.warning(f'Not enough `{quantity}` price history for {symbol}.')
+    prices = prices.loc[:, enough_history]
+
+    if prices.shape[1] == 0:
+        raise ValueError(f'Not enough `{quantity}` price history for {", ".join(symbol_list)}.')
+
+    return prices
+
+
+class PriceAnalyticsSchema(BaseModel):
+    """Tool for computing price analytics for a given list of companies from `start_date` to `end_date`."""
+
+    company_list: List[str] | str = Field(
+        ..., description='List of required companies.', examples=['Google', 'Microsoft']
+    )
+    start_date: datetime.date = Field(
+        description='The start date of the analyzed period.'
+        + 'Default to one year before the end date if the period is not specified. Must be before the end date.',
+    )
+    end_date: datetime.date = Field(
+        description='The end date of the analyzed period.'
+        + 'Typically today unless a specific end date is provided. Must be greater than the start date.',
+    )
+    quantity: str = Field(
+        'Close',
+        description='The specific quantity to analyze. Defaults to "Close" if not specified.',
+        examples=['Open', 'High', 'Low', 'Close'],
+    )
+
+
+class PriceVolatilitySchema(PriceAnalyticsSchema):
+    """Tool for computing the price volatility for a given list of companies from `start_date` to `end_date`."""
+
+    window: int = Field(
+        DEFAULT_VOLATILITY_WINDOW,
+        description='The number of trading days of the rolling volatility window. '
+        + f'Defaults to {DEFAULT_VOLATILITY_WINDOW} (one month) if not specified.',
+    )
+
+
+class MovingAveragesSchema(PriceAnalyticsSchema):
+    """Tool for computing the moving averages for a given list of companies from `start_date` to `end_date`."""
+
+    windows: List[int] = Field(
+        DEFAULT_MOVING_AVERAGE_WINDOWS,
+        description='The numbers of trading days of the moving averages. '
+        + f'Defaults to {DEFAULT_MOVING_AVERAGE_WINDOWS} if not specified.',
+    )
+
+
+@tool(args_schema=PriceAnalyticsSchema)
+def get_price_returns(
+    company_list: List[str] | str, start_date: datetime.date, end_date: datetime.date, quantity: str = 'Close'
+) -> pandas.DataFrame:
+    """
+    Tool for computing the stock returns for a given list of companies from `start_date` to `end_date`.
+
+    It answers questions about the performance, the total or annualized return, and the best or worst days.
+
+    Args:
+        company_list: List of required companies.
+        start_date: Set explicitly, or calculated as 'end_date - date interval'
+            (for example, if prompted 'over the past 6 months',
+            date interval = 6 months so start_date would be 6 months earlier than today's date).
+            Default to one year before the end date if the period is not specified.
+        end_date: Typically today unless a specific end date is provided. End date MUST be greater than start date.
+        quantity: Quantity to analize. Default is `Close`.
+
+    Returns:
+        A dataframe with the return metrics as index and the ticker symbols as columns.
+    """
+    prices = get_analytics_price_history(company_list, start_date, end_date, quantity)
+    return compute_return_summary(prices)
+
+
+@tool(args_schema=PriceVolatilitySchema)
+def get_price_volatility(
+    company_list: List[str] | str,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    quantity: str = 'Close',
+    window: int = DEFAULT_VOLATILITY_WINDOW,
+) -> pandas.DataFrame:
+    """
+    Tool for computing the annualized stock volatility for a given list of companies from `start_date` to `end_date`.
+
+    It answers questions about the volatility or the risk, over the whole period and over a rolling window.
+
+    Args:
+        company_list: List of required companies.
+        start_date: Set explicitly, or calculated as 'end_date - date interval'
+            (for example, if prompted 'over the past 6 months',
+            date interval = 6 months so start_date would be 6 months earlier than today's date).
+            Default to one year before the end date if the period is not specified.
+        end_date: Typically today unless a specific end date is provided. End date MUST be greater than start date.
+        quantity: Quantity to analize. Default is `Close`.
+        window: Number of trading days of the rolling volatility window.
+
+    Returns:
+        A dataframe with the volatility metrics as index and the ticker symbols as columns.
+    """
+    prices = get_analytics_price_history(company_list, start_date, end_date, quantity)
+    return compute_volatility_summary(prices, window)
+
+
+@tool(args_schema=MovingAveragesSchema)
+def get_moving_averages(
+    company_list: List[str] | str,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    quantity: str = 'Close',
+    windows: List[int] = DEFAULT_MOVING_AVERAGE_WINDOWS,
+) -> pandas.DataFrame:
+    """
+    Tool for computing the stock moving averages for a given list of companies at `end_date`.
+
+    It answers questions about the moving averages and whether the price trades above or below them.
+
+    Args:
+        company_list: List of required companies.
+        start_date: Set explicitly, or calculated as 'end_date - date interval'.
+            Must cover the longest moving average, default to one year before the end date if not specified.
+        end_date: Typically today unless a specific end date is provided. End date MUST be greater than start date.
+        quantity: Quantity to analize. Default is `Close`.
+        windows: Numbers of trading days of the moving averages.
+
+    Returns:
+        A dataframe with the moving average metrics as index and the ticker symbols as columns.
+    """
+    prices = get_analytics_price_history(company_list, start_date, end_date, quantity)
+    return compute_moving_average_summary(prices, windows)
+
+
+@tool(args_schema=PriceAnalyticsSchema)
+def get_price_drawdowns(
+    company_list: List[str] | str, start_date: datetime.date, end_date: datetime.date, quantity: str = 'Close'
+) -> pandas.DataFrame:
+    """
+    Tool for computing the stock drawdowns for a given list of companies from `start_date` to `end_date`.
+
+    It answers questions about the maximum or current drawdown, i.e. the decline from a previous peak,
+    and about when the price peaked, bottomed, and recovered.
+
+    Args:
+        company_list: List of required companies.
+        start_date: Set explicitly, or calculated as 'end_date - date interval'
+            (for example, if prompted 'over the past 6 months',
+            date interval = 6 months so start_date would be 6 months earlier than today's date).
+            Default to one year before the end date if the period is not specified.
+        end_date: Typically today unless a specific end date is provided. End date MUST be greater than start date.
+        quantity: Quantity to analize. Default is `Close`.
+
+    Returns:
+        A dataframe with the drawdown metrics as index and the ticker symbols as columns.
+    """
+    prices = get_analytics_price_history(company_list, start_date, end_date, quantity)
+    return compute_drawdown_summary(prices)
+
+
+@tool(args_schema=PriceAnalyticsSchema)
+def get_price_correlation(
+    company_list: List[str] | str, start_date: datetime.date, end_date: datetime.date, quantity: str = 'Close'
+) -> pandas.DataFrame:
+    """
+    Tool for computing the correlation of the daily stock returns of a given list of companies.
+
+    It answers questions about how the stocks of several companies move together from `start_date` to `end_date`.
+
+    Args:
+        company_list: List of required companies.
+        start_date: Set explicitly, or calculated as 'end_date - date interval'
+            (for example, if prompted 'over the past 6 months',
+            date interval = 6 months so start_date would be 6 months earlier than today's date).
+            Default to one year before the end date if the period is not specified.
+        end_date: Typically today unless a specific end date is provided. End date MUST be greater than start date.
+        quantity: Quantity to analize. Default is `Close`.
+
+    Returns:
+        The correlation matrix of the daily returns, with the ticker symbols as index and columns.
+    """
+    prices = get_analytics_price_history(company_list, start_date, end_date, quantity)
+    return compute_return_correlation(prices)
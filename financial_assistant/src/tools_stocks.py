@@ -1,30 +1,33 @@
 import datetime
-import shutil
 from typing import Any, Dict, List, Optional
 
 import pandas
 import streamlit
-import yfinance
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_core.tools import tool
 from matplotlib import dates as mdates
 from matplotlib import pyplot
 from matplotlib.figure import Figure
-from pandasai import SmartDataframe
+from pandasai import Agent
 from pandasai.connectors.yahoo_finance import YahooFinanceConnector
 from pydantic import BaseModel, Field
 
 from financial_assistant.constants import *
 from financial_assistant.prompts.pandasai_prompts import PLOT_INSTRUCTIONS
+from financial_assistant.src.pandasai_agents import get_dataframe_key, pandasai_agent_pool
+from financial_assistant.src.symbol_resolver import cache_symbols, resolve_symbols_locally
 from financial_assistant.src.tools import (
     coerce_str_to_list,
     convert_data_to_frame,
     extract_yfinance_data,
+    get_price_history,
 )
-from financial_assistant.src.utilities import time_llm
+from financial_assistant.src.utilities import get_logger, time_llm
 from financial_assistant.streamlit.llm_model import sambanova_llm
 
+logger = get_logger()
+
 
 class StockInfoSchema(BaseModel):
     """Tool for retrieving accurate stock information for a list of companies using the specified dataframe name."""
@@ -40,6 +43,19 @@ class TickerSymbol(BaseModel):
     symbol: str = Field(..., description='The ticker symbol of the company.')
 
 
+class CompanyTickerSymbol(BaseModel):
+    """Model for the stock ticker symbol of a company in a list."""
+
+    company: str = Field(..., description='The company name, as given in the list.')
+    symbol: str = Field(..., description='The ticker symbol of the company.')
+
+
+class TickerSymbolList(BaseModel):
+    """Model for the stock ticker symbols of a list of companies."""
+
+    symbols: List[CompanyTickerSymbol] = Field(..., description='The ticker symbol of each company in the list.')
+
+
 @tool(args_schema=StockInfoSchema)
 def get_stock_info(
     user_query: str, company_list: List[str] | str, dataframe_name: Optional[str] = None
@@ -129,6 +145,7 @@ def get_pandasai_answer_from_dataframe(user_query: str, symbol: str, dataframe_n
         symbol,
         start_date=DEFAULT_START_DATE,
         end_date=DEFAULT_END_DATE,
+        attributes=[dataframe_name],
     )
 
     # Extract the relevant dataframe from the yfinance data dictionary
@@ -171,45 +188,50 @@ def get_yahoo_connector_answer(user_query: str, symbol: str) -> Any:
         config={'enable_cache': False},
     )
 
-    # Delete the pandasai cache
-    shutil.rmtree(streamlit.session_state.pandasai_cache, ignore_errors=True)
-
     # Answer the user query by symbol
-    return interrogate_dataframe_pandasai(yahoo_connector, user_query)
+    return interrogate_dataframe_pandasai(yahoo_connector, user_query, source_key=f'yahoo_finance_{symbol}')
 
 
 @time_llm
-def interrogate_dataframe_pandasai(df_pandas: pandas.DataFrame, user_query: str) -> Any:
+def interrogate_dataframe_pandasai(
+    df_pandas: pandas.DataFrame | YahooFinanceConnector, user_query: str, source_key: Optional[str] = None
+) -> Any:
     """
     Interrogate a dataframe via `pandasai` with the user query.
 
+    The `pandasai` agent of the dataframe is taken from the agent pool, and reused by the next queries.
+
     Args:
         df_pandas: The dataframe to interrogate.
         user_query: The user query to answer with information from the dataframe.
+        source_key: The key identifying the data source in the agent pool.
+            Defaults to the hash of the dataframe content.
 
     Returns:
         The response to the user query, generated by the LLM via `pandasai`.
     """
-
-    # Instantiate a `pandasai.SmartDataframe` object with the relevant `pandas.DataFrame` and user query
-    df = SmartDataframe(
-        df_pandas,
-        config={
-            'llm': sambanova_llm.llm,
-            'open_charts': False,
-            'save_charts': True,
-            'save_charts_path': streamlit.session_state.stock_query_figures_dir,
-            'enable_cache': False,
-        },
-    )
-
-    # Delete the pandasai cache
-    shutil.rmtree(streamlit.session_state.pandasai_cache, ignore_errors=True)
+    if source_key is None:
+        source_key = get_dataframe_key(df_pandas)
+
+    def create_agent() -> Agent:
+        # Instantiate a `pandasai.Agent` object with the relevant `pandas.DataFrame`
+        return Agent(
+            [df_pandas],
+            config={
+                'llm': sambanova_llm.llm,
+                'open_charts': False,
+                'save_charts': True,
+                'save_charts_path': streamlit.session_state.stock_query_figures_dir,
+                'enable_cache': False,
+            },
+        )
 
     # Add the plot instructions to the user query
     final_query = user_query + '\n' + PLOT_INSTRUCTIONS
 
-    return df.chat(final_query)
+    return pandasai_agent_pool.chat(
+        streamlit.session_state.session_id, source_key, sambanova_llm, create_agent, final_query
+    )
 
 
 @time_llm
@@ -240,33 +262,85 @@ def retrieve_symbol_list(company_names_list: List[str] | str = list()) -> List[s
     if not all([isinstance(name, str) for name in company_names_list]):
         raise TypeError('`company_names_list` must be a list of strings.')
 
-    symbol_list = list()
+    # Resolve the symbols from the cache and the SEC ticker table first
+    symbols = resolve_symbols_locally(company_names_list)
 
-    # Iterate over the JSON data to extract ticker symbols
-    for company in company_names_list:
-        # The prompt template
-        prompt_template_symbol = (
-            'What is the ticker symbol for {company}?\n' 'Format instructions: {format_instructions}'
-        )
+    # Resolve the remaining symbols with one LLM call
+    missing_companies = [company for company, symbol in symbols.items() if symbol is None]
+    if len(missing_companies) > 0:
+        llm_symbols = retrieve_symbols_llm(missing_companies)
+        cache_symbols(llm_symbols)
+        symbols.update(llm_symbols)
 
-        # The parser
-        parser_symbol = PydanticOutputParser(pydantic_object=TickerSymbol)
+    symbol_list = [symbol for symbol in symbols.values() if symbol is not None]
 
-        # The prompt
-        prompt_symbol = PromptTemplate(
-            template=prompt_template_symbol,
-            input_variables=['company'],
-            partial_variables={'format_instructions': parser_symbol.get_format_instructions()},
-        )
+    return list(set(symbol_list))
 
-        # The chain
-        chain_symbol = prompt_symbol | sambanova_llm.llm | parser_symbol
 
-        # Invoke the chain to derive the ticker symbol of the company
-        symbol = chain_symbol.invoke(company).symbol  # type: ignore
-        symbol_list.append(symbol)
+def retrieve_symbols_llm(company_names_list: List[str]) -> Dict[str, str]:
+    """
+    Retrieve the ticker symbols of a list of companies with a single LLM call.
 
-    return list(set(symbol_list))
+    Companies missing in the batched answer are retrieved one by one.
+
+    Args:
+        company_names_list: List of company names.
+
+    Returns:
+        A dictionary with the ticker symbol (value) of each company name (key).
+    """
+    # The prompt template
+    prompt_template_symbols = (
+        'What are the ticker symbols of the following companies: {companies}?\n'
+        'Format instructions: {format_instructions}'
+    )
+
+    # The parser
+    parser_symbols = PydanticOutputParser(pydantic_object=TickerSymbolList)
+
+    # The prompt
+    prompt_symbols = PromptTemplate(
+        template=prompt_template_symbols,
+        input_variables=['companies'],
+        partial_variables={'format_instructions': parser_symbols.get_format_instructions()},
+    )
+
+    # The chain
+    chain_symbols = prompt_symbols | sambanova_llm.llm | parser_symbols
+
+    symbols: Dict[str, str] = dict()
+    try:
+        # Invoke the chain to derive the ticker symbols of all the companies at once
+        response = chain_symbols.invoke(', '.join(company_names_list))
+        answered_symbols = {item.company.lower(): item.symbol for item in response.symbols}
+        for company in company_names_list:
+            if company.lower() in answered_symbols:
+                symbols[company] = answered_symbols[company.lower()]
+    except Exception as e:
+        logger.warning(f'Could not retrieve the ticker symbols with a single LLM call: {e}')
+
+    # The prompt template
+    prompt_template_symbol = 'What is the ticker symbol for {company}?\n' 'Format instructions: {format_instructions}'
+
+    # The parser
+    parser_symbol = PydanticOutputParser(pydantic_object=TickerSymbol)
+
+    # The prompt
+    prompt_symbol = PromptTemplate(
+        template=prompt_template_symbol,
+        input_variables=['company'],
+        partial_variables={'format_instructions': parser_symbol.get_format_instructions()},
+    )
+
+    # The chain
+    chain_symbol = prompt_symbol | sambanova_llm.llm | parser_symbol
+
+    for company in company_names_list:
+        if company not in symbols:
+            # Invoke the chain to derive the ticker symbol of the company
+            symbols[company] = chain_symbol.invoke(company).symbol  # type: ignore
+
+    return symbols
 
 
 class HistoricalPriceSchema(BaseModel):
@@ -345,7 +419,7 @@ def download_data_history(
     end_date: datetime.date,
 ) -> pandas.DataFrame:
     """
-    Download historical price data from Yahoo Finance.
+    Download historical price data from Yahoo Finance, reusing the cached price history.
 
     Args:
         symbol_list: A list of company ticker symbols.
@@ -356,16 +430,8 @@ def download_data_history(
     Returns:
         A `pandas.DataFrame` object containing the historical price data for each symbol.
     """
-    # Initialise a pandas DataFrame with symbols as columns and dates as index
-    data_price = pandas.DataFrame(columns=symbol_list)
-
-    # Fetch historical price data from Yahoo Finance
-    for symbol in symbol_list:
-        data = yfinance.Ticker(symbol)
-        data_history = data.history(start=start_date, end=end_date)
-        data_price[symbol] = data_history[quantity]
-
-    return data_price
+    # Fetch historical price data from Yahoo Finance, with symbols as columns and dates as index
+    return get_price_history(symbol_list, start_date, end_date, quantity).reindex(columns=symbol_list)
 
 
 def plot_price_over_time(data_close: pandas.DataFrame) -> Figure:
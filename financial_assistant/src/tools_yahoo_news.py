@@ -1,11 +1,12 @@
 import re
-from typing import List, Optional, Set, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
 
 import pandas
 import requests
 import streamlit
 import yfinance
-from bs4 import BeautifulSoup
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.tools import tool
@@ -13,14 +14,30 @@ from pydantic import BaseModel, Field
 
 from financial_assistant.constants import *
 from financial_assistant.src.retrieval import get_qa_response
-from financial_assistant.src.tools import coerce_str_to_list
+from financial_assistant.src.tools import coerce_str_to_list, parse_html
 from financial_assistant.src.tools_stocks import retrieve_symbol_list
 from financial_assistant.src.utilities import get_logger
+from utils.web.http_cache import HttpCache, cached_get, get_shared_http_cache, make_cache_key
 
 RETRIEVE_HEADLINES = False
 
 logger = get_logger()
 
+# The text splitter of the news texts
+NEWS_TEXT_SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=MAX_CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    length_function=len,
+    separators=[
+        r'\n\n',  # Split on double newlines (paragraphs)
+        r'(?<=[.!?])\s+(?=[A-Z])',  # Split on sentence boundaries
+        r'\n',  # Split on single newlines
+        r'\s+',  # Split on whitespace
+        r'',  # Split on characters as a last resort
+    ],
+    is_separator_regex=True,
+)
+
 
 class YahooFinanceNewsInput(BaseModel):
     """Tool for searching financial news on Yahoo Finance through web scraping."""
@@ -73,71 +90,116 @@ def scrape_yahoo_finance_news(company_list: List[str] | str, user_query: str) ->
     link_urls = get_url_list(symbol_list)
 
     # Scrape the news articles
-    retrieve_text_yahoo_finance_news(link_urls)
+    documents = retrieve_text_yahoo_finance_news(link_urls)
     logger.info('News from Yahoo Finance successfully extracted and saved.')
 
-    return get_qa_response_from_news(streamlit.session_state.web_scraping_path, user_query)
+    return get_qa_response_from_news(documents, user_query)
+
+
+def get_news_http_cache() -> HttpCache:
+    """Get the on-disk HTTP cache shared by all the sessions for Yahoo Finance News."""
+    return get_shared_http_cache(HTTP_CACHE_DIR, max_size_mb=HTTP_CACHE_MAX_SIZE_MB)
+
+
+_news_session: Optional[requests.Session] = None
+_news_session_lock = threading.Lock()
 
 
-def retrieve_text_yahoo_finance_news(link_urls: List[str]) -> None:
+def get_news_session() -> requests.Session:
+    """Get the HTTP session shared by all the Yahoo Finance News requests, with a connection pool per host."""
+    global _news_session
+
+    with _news_session_lock:
+        if _news_session is None:
+            _news_session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=NEWS_MAX_WORKERS)
+            _news_session.mount('https://', adapter)
+            _news_session.mount('http://', adapter)
+        return _news_session
+
+
+def get_article_texts(link_url: str) -> Optional[Dict[str, List[str]]]:
+    """
+    Get the cleaned texts of a news article, by type of HTML element.
+
+    The cleaned texts are cached by URL, so an article is only downloaded and parsed once.
+
+    Args:
+        link_url: The url of the news article.
+
+    Returns:
+        A dictionary with the element types (`h1`, `h2`, `h3`, `p`) as keys and the lists of cleaned texts as values,
+        or None if the article could not be downloaded.
+    """
+    http_cache = get_news_http_cache()
+    article_cache_key = make_cache_key('yfinance_article', link_url)
+    article_texts: Optional[Dict[str, List[str]]] = http_cache.get(article_cache_key)
+    if article_texts is not None:
+        return article_texts
+
+    # Send an HTTP GET request to the link, unless the article has already been downloaded
+    try:
+        link_content = cached_get(link_url, http_cache, NEWS_ARTICLE_TTL, session=get_news_session(), timeout=30)
+    except requests.exceptions.RequestException as e:
+        logger.warning(f'Could not retrieve {link_url}: {e}')
+        return None
+    if link_content is None:
+        return None
+
+    # Parse the content of the link's page
+    soup = parse_html(link_content)
+    article_texts = {
+        # Find elements with 'data-test-locator="headline"'
+        'h1': [clean_text(element.text.strip()) for element in soup.find_all(attrs={'data-test-locator': 'headline'})],
+        # Find and extract all <h2> headings
+        'h2': [clean_text(element.get_text(strip=True)) for element in soup.find_all('h2')],
+        # Find and extract all <h3> headings
+        'h3': [clean_text(element.get_text(strip=True)) for element in soup.find_all('h3')],
+        # Find and extract all <p> paragraphs
+        'p': [clean_text(element.get_text(strip=True)) for element in soup.find_all('p')],
+    }
+    http_cache.set(article_cache_key, article_texts, NEWS_ARTICLE_TTL)
+    return article_texts
+
+
+def retrieve_text_yahoo_finance_news(link_urls: List[str]) -> List[Document]:
     """
     Scrapes news articles from Yahoo Finance for a given list of ticker symbols.
 
+    The articles are downloaded and parsed concurrently.
+
     Args:
         link_urls: A list of urls that point to news articles.
+
+    Returns:
+        The documents of the filtered texts of the news articles, with their url and element type as metadata.
     """
     # Initialize lists to store the extracted data
     headlines = set()
     h2_headings = set()
     h3_headings = set()
     paragraphs = set()
-    data = list()
-    # Loop through the links to visit each page and extract headlines
-    for link_url in link_urls:
-        # Send an HTTP GET request to the link
-        link_response = requests.get(link_url)
-        if link_response.status_code == 200:
-            # Parse the content of the link's page
-            soup = BeautifulSoup(link_response.content, 'html.parser')
-
-            if RETRIEVE_HEADLINES:
-                # Find elements with 'data-test-locator="headline"'
-                headline_elements = soup.find_all(attrs={'data-test-locator': 'headline'})
-                # Extract and append the headline text to the headlines list
-                for headline_element in headline_elements:
-                    text = clean_text(headline_element.text.strip())
-                    headlines.add(text)
-                    filtered_texts = filter_text(text)
-                    for filtered_text in filtered_texts:
-                        data.append({'type': 'h1', 'url': link_url, 'text': filtered_text})
-
-                # Find and extract all <h2> headings
-                for h2_tag in soup.find_all('h2'):
-                    text = clean_text(h2_tag.get_text(strip=True))
-                    h2_headings.add(text)
-                    filtered_texts = filter_text(text)
-                    for filtered_text in filtered_texts:
-                        data.append({'type': 'h2', 'url': link_url, 'text': filtered_text})
-
-                # Find and extract all <h3> headings
-                for h3_tag in soup.find_all('h3'):
-                    text = clean_text(h3_tag.get_text(strip=True))
-                    h3_headings.add(text)
-                    filtered_texts = filter_text(text)
-                    for filtered_text in filtered_texts:
-                        data.append({'type': 'h3', 'url': link_url, 'text': filtered_text})
-
-            # Find and extract all <p> paragraphs
-            for p_tag in soup.find_all('p'):
-                text = clean_text(p_tag.get_text(strip=True))
-                paragraphs.add(text)
-                filtered_texts = filter_text(text)
-                for filtered_text in filtered_texts:
-                    data.append({'type': 'p', 'url': link_url, 'text': filtered_text})
-
-            logger.info('News articles have been successfully scraped')
-        else:
-            logger.warning(f'Failed to retrieve the page. Status code: {link_response.status_code}')
+    documents = list()
+    texts_by_type = {'h1': headlines, 'h2': h2_headings, 'h3': h3_headings, 'p': paragraphs}
+
+    # Visit the links concurrently to extract their texts
+    with ThreadPoolExecutor(max_workers=NEWS_MAX_WORKERS) as executor:
+        articles_texts = list(executor.map(get_article_texts, link_urls))
+
+    for link_url, article_texts in zip(link_urls, articles_texts):
+        if article_texts is None:
+            continue
+
+        text_types = ['h1', 'h2', 'h3', 'p'] if RETRIEVE_HEADLINES else ['p']
+        for text_type in text_types:
+            for text in article_texts[text_type]:
+                texts_by_type[text_type].add(text)
+                for filtered_text in filter_text(text):
+                    documents.append(
+                        Document(page_content=filtered_text, metadata={'url': link_url, 'type': text_type})
+                    )
+
+    logger.info('News articles have been successfully scraped')
 
     # Filter all texts
     headlines_list = filter_texts_set(headlines)
@@ -172,10 +234,7 @@ def retrieve_text_yahoo_finance_news(link_urls: List[str]) -> None:
         for item in paragraphs_list:
             file.write(f'{item}\n')
 
-    # Convert the list to a DataFrame
-    df_text_url = pandas.DataFrame(data)
-    # Save the DataFrame to a CSV file
-    df_text_url.to_csv(streamlit.session_state.web_scraping_path, index=False)
+    return documents
 
 
 def get_url_list(symbol_list: Optional[List[str]] = None) -> List[str]:
@@ -194,13 +253,20 @@ def get_url_list(symbol_list: Optional[List[str]] = None) -> List[str]:
     general_urls = []
     singular_urls = []
 
+    http_cache = get_news_http_cache()
+
     # For each symbol determine the list of URLs to scrape
     if symbol_list is not None and len(symbol_list) > 0:
         for symbol in symbol_list:
             try:
                 general_urls.append(f'https://finance.yahoo.com/quote/{symbol}/')
-                news = yfinance.Ticker(symbol).news
-                singular_urls.extend([news[i]['link'] for i, _ in enumerate(news)])
+                news_cache_key = make_cache_key('yfinance_news', symbol)
+                news_links = http_cache.get(news_cache_key)
+                if news_links is None:
+                    news = yfinance.Ticker(symbol).news
+                    news_links = [news[i]['link'] for i, _ in enumerate(news)]
+                    http_cache.set(news_cache_key, news_links, NEWS_LISTING_TTL)
+                singular_urls.extend(news_links)
             except:
                 pass
     else:
@@ -209,24 +275,34 @@ def get_url_list(symbol_list: Optional[List[str]] = None) -> List[str]:
     link_urls = list()
 
     # Webscraping by url
-    for url in general_urls + singular_urls:
-        # Send a GET request to the URL
-        response = requests.get(url)
-
+    def get_url_content(url: str) -> Optional[str]:
+        # Send a GET request to the URL, unless it has recently been downloaded
+        try:
+            return cached_get(
+                url,
+                http_cache,
+                NEWS_LISTING_TTL if url in general_urls else NEWS_ARTICLE_TTL,
+                session=get_news_session(),
+                timeout=30,
+            )
+        except requests.exceptions.RequestException as e:
+            logger.warning(f'Could not retrieve {url}: {e}')
+            return None
+
+    urls = general_urls + singular_urls
+    with ThreadPoolExecutor(max_workers=NEWS_MAX_WORKERS) as executor:
+        contents = list(executor.map(get_url_content, urls))
+
+    for url, content in zip(urls, contents):
         # Check if the request was successful
-        if response.status_code == 200:
-            # Parse the HTML content
-            soup = BeautifulSoup(response.content, 'html.parser')
-
+        if content is not None:
             # Find all links on the page
             if url in general_urls:
-                # Find all the links mentioned in the webpage
-                links = soup.find_all('a')
+                # Parse the HTML content and find all the links mentioned in the webpage
+                links = parse_html(content).find_all('a', href=True)
                 link_urls.extend([link['href'] for link in links])
             else:
                 link_urls.append(url)
-        else:
-            logger.warning(f'Failed to retrieve the page. Status code: {response.status_code}')
 
     # Remove duplicate URLs from the list of links
     link_urls = list(set(link_urls))
@@ -241,14 +317,13 @@ def get_url_list(symbol_list: Optional[List[str]] = None) -> List[str]:
     return link_urls[0:MAX_URLS]
 
 
-def get_qa_response_from_news(web_scraping_path: str, user_query: str) -> Tuple[str, List[str]]:
+def get_qa_response_from_news(documents: List[Document], user_query: str) -> Tuple[str, List[str]]:
     """
     Answer questions after retrieving the relevant Yahoo Finance News scraping data.
 
     Args:
-        web_scraping_path: Path to the Yahoo Finance News scraping data file.
-        user_query: The user query to be answered after retrieving the Yahoo Finance News scraping data.
         documents: List of Yahoo Finance News scraping data.
+        user_query: The user query to be answered after retrieving the Yahoo Finance News scraping data.
 
     Returns:
         A tuple containing the following pair:
@@ -258,23 +333,11 @@ def get_qa_response_from_news(web_scraping_path: str, user_query: str) -> Tuple[
     Raises:
         Exception: If the LLM response is not a dictionary.
     """
-    # Load the dataframe from the text file
-    try:
-        df = pandas.read_csv(web_scraping_path)
-    except FileNotFoundError:
+    if len(documents) == 0:
         logger.error('No scraped data found.')
 
-    # Convert DataFrame rows into Document objects
-    documents = []
-    for _, row in df.iterrows():
-        document = Document(
-            page_content=row['text'],
-            metadata={'url': row['url'], 'type': row['type']},
-        )
-        documents.append(document)
-
     # Get the QA response
-    response = get_qa_response(user_query, documents)
+    response = get_qa_response(user_query, documents, vectorstore_name='yahoo_news')
 
     # Ensure that response is indexable
     if not isinstance(response, dict):
@@ -344,23 +407,12 @@ def filter_text(text: str) -> List[str]:
     # Remove extra whitespace
     text = re.sub(r'\s+', ' ', text).strip()
 
-    # Instantiate the text splitter
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=MAX_CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-        length_function=len,
-        separators=[
-            r'\n\n',  # Split on double newlines (paragraphs)
-            r'(?<=[.!?])\s+(?=[A-Z])',  # Split on sentence boundaries
-            r'\n',  # Split on single newlines
-            r'\s+',  # Split on whitespace
-            r'',  # Split on characters as a last resort
-        ],
-        is_separator_regex=True,
-    )
+    # Short texts are kept whole without running the splitter
+    if len(text) <= MAX_CHUNK_SIZE:
+        return [text] if len(text) > 0 else []
 
     # Split the long text into smaller chunks
-    chunks = splitter.split_text(text)
+    chunks = NEWS_TEXT_SPLITTER.split_text(text)
 
     return chunks
 
@@ -1,8 +1,10 @@
 import json
 import logging
 import os
+import threading
 import time
-from typing import Any, Callable, Dict, TypeVar
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, TypeVar
 
 import streamlit
 import yaml
@@ -69,6 +71,11 @@ def get_logger(logger_name: str = 'logger') -> logging.Logger:
 # Get the loggers
 logger = get_logger()
 
+# Path of the LLM durations file, for the threads that have no access to the streamlit session state
+time_llm_path_context: ContextVar[Optional[str]] = ContextVar('time_llm_path', default=None)
+# Lock serializing the updates of the LLM durations file by concurrent LLM calls
+_time_llm_lock = threading.Lock()
+
 
 def time_llm(func: F) -> Any:
     """
@@ -110,20 +117,22 @@ def time_llm(func: F) -> Any:
         # Create a row for the csv file
         row = [func.__name__, duration]
 
-        if os.path.exists(streamlit.session_state.time_llm_path):
-            # Read the existing data from the JSON file
-            with open(streamlit.session_state.time_llm_path, 'r') as file:
-                data = json.load(file)
-        else:
-            # If the file does not exist, start with an empty list
-            data = list()
-
-        # Append the row to the list of rows
-        data.append(row)
-
-        # Save the new list of rows to a JSON file
-        with open(streamlit.session_state.time_llm_path, 'w') as file:
-            json.dump(data, file, indent=4)
+        time_llm_path = time_llm_path_context.get() or streamlit.session_state.time_llm_path
+        with _time_llm_lock:
+            if os.path.exists(time_llm_path):
+                # Read the existing data from the JSON file
+                with open(time_llm_path, 'r') as file:
+                    data = json.load(file)
+            else:
+                # If the file does not exist, start with an empty list
+                data = list()
+
+            # Append the row to the list of rows
+            data.append(row)
+
+            # Save the new list of rows to a JSON file
+            with open(time_llm_path, 'w') as file:
+                json.dump(data, file, indent=4)
 
         # Return only result
         return result
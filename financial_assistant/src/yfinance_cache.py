@@ -0,0 +1,220 @@
+import datetime
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas
+
+from financial_assistant.constants import *
+from financial_assistant.src.utilities import get_logger
+
+logger = get_logger()
+
+
+class YFinanceCache:
+    """
+    On-disk cache of Yahoo Finance data, shared by all the sessions.
+
+    Each entry is a pickle file holding a `pandas` object (or any picklable value) and its expiration time.
+    The price history of each symbol is stored once with the date range it covers, and extended incrementally.
+
+    The modification time of each file is set to its expiration time and its access time to its last use,
+    so that the expired entries are removed periodically, and the least recently used ones when the cache grows
+    over `max_size_mb`, without reading the files.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_size_mb: float = YFINANCE_CACHE_MAX_SIZE_MB,
+        sweep_interval: float = YFINANCE_CACHE_SWEEP_INTERVAL,
+    ) -> None:
+        """
+        Initialize the cache, removing its expired entries.
+
+        Args:
+            directory: The directory where the cache files are stored.
+            max_size_mb: Maximum size of the cache files, in megabytes.
+            sweep_interval: Seconds between two removals of the expired entries.
+        """
+        self.directory = directory
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.sweep_interval = sweep_interval
+        os.makedirs(directory, exist_ok=True)
+        self._history_locks: Dict[str, threading.Lock] = dict()
+        self._history_locks_lock = threading.Lock()
+        # Estimated total size of the cache files, recomputed by each sweep
+        self._size = 0
+        self._last_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+        self.sweep()
+
+    def _get_path(self, key: str) -> str:
+        """Get the path of the cache file of a key."""
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.pkl')
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        """Remove a cache file, if it still exists."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def sweep(self) -> None:
+        """Remove the expired entries, and then the least recently used ones until the cache fits in its size."""
+        with self._sweep_lock:
+            now = time.time()
+            entries: List[Tuple[float, int, str]] = list()
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith('.pkl'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime < now:
+                    self._remove(entry.path)
+                else:
+                    entries.append((stat.st_atime, stat.st_size, entry.path))
+
+            size = sum(entry_size for _, entry_size, _ in entries)
+            for _, entry_size, path in sorted(entries):
+                if size <= self.max_size_bytes:
+                    break
+                self._remove(path)
+                size -= entry_size
+            self._size = size
+            self._last_sweep = now
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Get a value if it is cached and has not expired.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            The cached value, or None on a cache miss.
+        """
+        path = self._get_path(key)
+        try:
+            with open(path, 'rb') as cache_file:
+                expires_at, value = pickle.load(cache_file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f'Could not read the yfinance cache entry {key}: {e}')
+            return None
+        now = time.time()
+        if expires_at < now:
+            self._remove(path)
+            return None
+        try:
+            # Record the use of the entry for the least recently used eviction
+            os.utime(path, (now, expires_at))
+        except FileNotFoundError:
+            pass
+        return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """
+        Store a value.
+
+        Args:
+            key: The cache key.
+            value: The value to store.
+            ttl: Time to live of the entry, in seconds.
+        """
+        path = self._get_path(key)
+        now = time.time()
+        try:
+            # Write to a temporary file first, so that concurrent readers never see a partial entry
+            with tempfile.NamedTemporaryFile('wb', dir=self.directory, delete=False) as cache_file:
+                pickle.dump((now + ttl, value), cache_file)
+            os.utime(cache_file.name, (now, now + ttl))
+            size = os.path.getsize(cache_file.name)
+            replaced_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(cache_file.name, path)
+        except Exception as e:
+            logger.warning(f'Could not store the yfinance cache entry {key}: {e}')
+            return
+
+        with self._sweep_lock:
+            self._size += size - replaced_size
+            needs_sweep = self._size > self.max_size_bytes or now - self._last_sweep > self.sweep_interval
+        if needs_sweep:
+            self.sweep()
+
+    def get_history(
+        self,
+        symbol: str,
+        start_date: datetime.date,
+        end_date: datetime.date,
+        fetch: Callable[[datetime.date, datetime.date], pandas.DataFrame],
+    ) -> pandas.DataFrame:
+        """
+        Get the price history of a symbol, only fetching the dates that are not cached yet.
+
+        Args:
+            symbol: The ticker symbol.
+            start_date: The start date of the price history.
+            end_date: The end date (excluded) of the price history.
+            fetch: The function fetching the price history between two dates.
+
+        Returns:
+            The price history from `start_date` to `end_date`.
+        """
+        key = f'{symbol}:history'
+        with self._history_locks_lock:
+            lock = self._history_locks.setdefault(symbol, threading.Lock())
+
+        with lock:
+            record = self.get(key)
+            # The prices of the current day are not final, so they are always fetched again
+            covered_end = min(end_date, datetime.date.today())
+
+            if record is None or start_date > record['end'] or end_date < record['start']:
+                history = fetch(start_date, end_date)
+                record = {'start': start_date, 'end': covered_end, 'data': history}
+            else:
+                segments = [record['data']]
+                if start_date < record['start']:
+                    segments.insert(0, fetch(start_date, record['start']))
+                if end_date > record['end']:
+                    segments.append(fetch(record['end'], end_date))
+                if len(segments) > 1:
+                    logger.info(f'Price history of {symbol} extended from the cache.')
+                    history = pandas.concat([segment for segment in segments if not segment.empty])
+                    history = history[~history.index.duplicated(keep='last')].sort_index()
+                    record = {
+                        'start': min(start_date, record['start']),
+                        'end': max(covered_end, record['end']),
+                        'data': history,
+                    }
+            if len(record['data']) > 0:
+                self.set(key, record, YFINANCE_HISTORY_TTL)
+
+        history = record['data']
+        if len(history) == 0:
+            return history
+        dates = history.index.date
+        return history[(dates >= start_date) & (dates < end_date)]
+
+
+_yfinance_cache: Optional[YFinanceCache] = None
+_yfinance_cache_lock = threading.Lock()
+
+
+def get_yfinance_cache() -> YFinanceCache:
+    """Get the Yahoo Finance cache shared by all the sessions."""
+    global _yfinance_cache
+
+    with _yfinance_cache_lock:
+        if _yfinance_cache is None:
+            _yfinance_cache = YFinanceCache(YFINANCE_CACHE_DIR)
+        return _yfinance_cache
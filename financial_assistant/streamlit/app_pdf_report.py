@@ -7,7 +7,7 @@ import streamlit
 from streamlit.runtime.uploaded_file_manager import UploadedFile
 
 from financial_assistant.constants import *
-from financial_assistant.src.tools_pdf_generation import generate_pdf, parse_documents, read_txt_files
+from financial_assistant.src.tools_pdf_generation import PDFReportJob, parse_documents, read_txt_files
 from financial_assistant.src.utilities import get_logger
 from financial_assistant.streamlit.llm_model import sambanova_llm
 from financial_assistant.streamlit.utilities_app import clear_directory, save_output_callback
@@ -123,38 +123,26 @@ def include_pdf_report() -> None:
     if include_summary:
         streamlit.write(r':red[Warning: This will take longer!]')
 
-    # Generate the report
+    # Generate the report in the background
     if streamlit.button('Generate Report'):
         streamlit.session_state.mp_events.input_submitted('generate_report')
-        with streamlit.expander('**Execution scratchpad**', expanded=True):
-            with streamlit.spinner('Processing...'):
-                report_name = title_name.lower().replace(' ', '_') + '.pdf'
-
-                # Generate the PDF report
-                pdf_handler = handle_pdf_generation(title_name, report_name, data_paths, include_summary)
-
-                # Embed PDF to display it:
-                if pdf_handler is not None:
-                    # Stream the duration of the LLM calls
-                    stream_time_llm()
-
-                    # Delete LLM time json file
-                    os.remove(streamlit.session_state.time_llm_path)
-
-                    base64_pdf = b64encode(pdf_handler).decode('utf-8')
-                    pdf_display = (
-                        f'<embed src="data:application/pdf;base64,{base64_pdf}"'
-                        ' width="700" height="400" type="application/pdf">'
-                    )
-                    streamlit.markdown(pdf_display, unsafe_allow_html=True)
-                    # Add download button
-                    streamlit.download_button(
-                        label='Download Report',
-                        data=pdf_handler,
-                        file_name=report_name,
-                        mime='application/pdf',
-                    )
-                    streamlit.write('PDF report generated successfully.')
+        with streamlit.spinner('Processing...'):
+            report_name = title_name.lower().replace(' ', '_') + '.pdf'
+
+            # Start the PDF report job
+            streamlit.session_state.pdf_report_job = start_pdf_generation(
+                title_name, report_name, data_paths, include_summary
+            )
+
+    # Display the progress of the PDF report job, or the PDF report once generated
+    pdf_report_job = streamlit.session_state.get('pdf_report_job')
+    if pdf_report_job is not None:
+        if pdf_report_job.done():
+            del streamlit.session_state.pdf_report_job
+            with streamlit.expander('**Execution scratchpad**', expanded=True):
+                display_pdf_report(pdf_report_job)
+        else:
+            display_pdf_report_progress()
 
     # Use PDF report for RAG
     streamlit.markdown('<h2> Use PDF Report for RAG </h2>', unsafe_allow_html=True)
@@ -317,7 +305,7 @@ def handle_pdf_generation(
     include_summary: bool = False,
 ) -> Optional[bytes]:
     """
-    Generate a PDF report using the provided data paths.
+    Generate a PDF report using the provided data paths, waiting for the PDF report job.
 
     Args:
         title_name: The title of the report.
@@ -329,9 +317,36 @@ def handle_pdf_generation(
             and an abstract and a general summary at the beginning of the document.
             Default is False.
 
-    Raises:
-        Exception: If there are no values for selected or uploaded sources in the `data_paths` dictionary.
-        Exception: If there are no file in `data_paths` from which to generate a PDF.
+    Returns:
+        The PDF report, or None if there is no data source.
+    """
+    pdf_report_job = start_pdf_generation(title_name, report_name, data_paths, include_summary)
+    if pdf_report_job is None:
+        return None
+    return pdf_report_job.result()
+
+
+def start_pdf_generation(
+    title_name: str = DEFAULT_PDF_TITLE,
+    report_name: str = 'financial_report',
+    data_paths: Dict[str, str] = dict(),
+    include_summary: bool = False,
+) -> Optional[PDFReportJob]:
+    """
+    Start a background job generating a PDF report using the provided data paths.
+
+    Args:
+        title_name: The title of the report.
+            Default is `Financial Report`.
+        report_name: The name of the report file.
+            Default is `financial_report`.
+        data_paths: A dictionary of data paths to be used for the PDF generation.
+        include_summary: Whether to include a summary for each section,
+            and an abstract and a general summary at the beginning of the document.
+            Default is False.
+
+    Returns:
+        The started PDF report job, or None if there is no data source.
     """
 
     # Clean the sources directory if it exists
@@ -371,10 +386,50 @@ def handle_pdf_generation(
     # Parse the documents into a list of tuples of text and figure paths
     report_content = parse_documents(documents)
 
-    # Generate the PDF report
-    pdf_handler = generate_pdf(report_content, output_file, title_name, include_summary)
+    # Generate the PDF report in the background
+    return PDFReportJob(
+        report_content, output_file, title_name, include_summary, streamlit.session_state.time_llm_path
+    ).start()
 
-    return pdf_handler
+
+@streamlit.fragment(run_every=PDF_REPORT_POLL_INTERVAL)
+def display_pdf_report_progress() -> None:
+    """Display the progress of the PDF report job, and rerun the app once the PDF report is generated."""
+    pdf_report_job = streamlit.session_state.get('pdf_report_job')
+    if pdf_report_job is None or pdf_report_job.done():
+        streamlit.rerun()
+    streamlit.progress(pdf_report_job.progress, text=pdf_report_job.status)
+
+
+def display_pdf_report(pdf_report_job: PDFReportJob) -> None:
+    """Display a generated PDF report with its download button."""
+    try:
+        pdf_handler = pdf_report_job.result()
+    except Exception as e:
+        streamlit.error(f'Error while generating the PDF report: {e}')
+        return
+
+    # Stream the duration of the LLM calls
+    stream_time_llm()
+
+    # Delete LLM time json file
+    if os.path.exists(streamlit.session_state.time_llm_path):
+        os.remove(streamlit.session_state.time_llm_path)
+
+    # Embed PDF to display it:
+    base64_pdf = b64encode(pdf_handler).decode('utf-8')
+    pdf_display = (
+        f'<embed src="data:application/pdf;base64,{base64_pdf}"' ' width="700" height="400" type="application/pdf">'
+    )
+    streamlit.markdown(pdf_display, unsafe_allow_html=True)
+    # Add download button
+    streamlit.download_button(
+        label='Download Report',
+        data=pdf_handler,
+        file_name=os.path.basename(pdf_report_job.output_file),
+        mime='application/pdf',
+    )
+    streamlit.write('PDF report generated successfully.')
 
 
 def check_generate_from_history() -> None:
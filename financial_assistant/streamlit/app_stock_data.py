@@ -150,6 +150,39 @@ def get_stock_data_analysis() -> None:
             ):
                 pass
 
+    streamlit.markdown('<br><br>', unsafe_allow_html=True)
+    streamlit.markdown('<h3> Price analytics </h3>', unsafe_allow_html=True)
+    user_request = streamlit.text_input(
+        label='Enter a question about the returns, volatility, moving averages, drawdowns, '
+        'or correlations of given companies. '
+        f':sparkles: :violet[{DEFAULT_PRICE_ANALYTICS_QUERY}]',
+        key='price-analytics-query',
+        placeholder='E.g. ' + DEFAULT_PRICE_ANALYTICS_QUERY,
+    )
+    start_date = streamlit.date_input('Start Date', value=DEFAULT_START_DATE, key='analytics-start-date')
+    end_date = streamlit.date_input('End Date', value=DEFAULT_END_DATE, key='analytics-end-date')
+
+    # Compute price analytics
+    if streamlit.button('Compute Price Analytics'):
+        if len(user_request) == 0:
+            logger.error('No query entered.')
+            streamlit.error('No query entered.')
+        else:
+            streamlit.session_state.mp_events.input_submitted('compute_price_analytics')
+            with streamlit.expander('**Execution scratchpad**', expanded=True):
+                response = handle_price_analytics(user_request, start_date, end_date)
+
+                # Save the output to the history file
+                save_output_callback(response, streamlit.session_state.history_path, user_request)
+
+                # Save the output to the stock query file
+                if streamlit.button(
+                    'Save Analytics',
+                    on_click=save_output_callback,
+                    args=(response, streamlit.session_state.stock_query_path, user_request),
+                ):
+                    pass
+
 
 def handle_stock_query(
     user_question: Optional[str],
@@ -256,3 +289,61 @@ def handle_stock_data_analysis(
         raise Exception(f'Invalid response: {response}.')
 
     return response
+
+
+def handle_price_analytics(
+    user_question: str, start_date: DateWidgetReturn, end_date: DateWidgetReturn
+) -> pandas.DataFrame:
+    """
+    Handle the user request for the price analytics.
+
+    The LLM only selects the analytics tool and its parameters, the analytics are computed on the price history.
+
+    Args:
+       user_question: The user's question.
+       start_date: The start date of the analyzed period.
+       end_date: The end date of the analyzed period.
+
+    Returns:
+        A dataframe with the requested metrics as index and the ticker symbols as columns,
+        or the correlation matrix of the ticker symbols.
+
+    Raises:
+        ValueError: If `start_date` and `end_date` are both None.
+        Exception: If the LLM response does not conform to the expected return type.
+    """
+    # Check inputs
+    if start_date is None and end_date is None:
+        raise ValueError('Start date or end date must be provided.')
+
+    # Declare the permitted tools for function calling
+    tools = [
+        'get_price_returns',
+        'get_price_volatility',
+        'get_moving_averages',
+        'get_price_drawdowns',
+        'get_price_correlation',
+    ]
+
+    # Set the tools for the LLM to use
+    sambanova_llm.tools = [TOOLS[name] for name in tools]
+
+    # Compose the user request
+    user_request = f"""
+        Compute the requested price analytics for a given list of companies from {start_date} to {end_date}.
+        Extract the company (or companies) from the user query.
+
+        User query: {user_question}
+    """
+
+    # Call the LLM on the user request with the attached tools
+    response = handle_userinput(user_question, user_request)
+
+    # Reset tools
+    sambanova_llm.tools = None
+
+    # Check the final answer of the LLM
+    if not isinstance(response, pandas.DataFrame):
+        raise Exception(f'Invalid response: {response}.')
+
+    return response
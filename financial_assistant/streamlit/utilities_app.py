@@ -19,6 +19,7 @@ from matplotlib.figure import Figure
 from streamlit.elements.widgets.time_widgets import DateWidgetReturn
 
 from financial_assistant.constants import *
+from financial_assistant.src.pandasai_agents import pandasai_agent_pool
 from financial_assistant.src.utilities import get_logger
 from utils.visual.env_utils import initialize_env_variables
 
@@ -434,6 +435,9 @@ def clear_directory(directory: str, delete_subdirectories: bool = False) -> None
 def clear_cache(delete: bool = False, verbose: bool = False) -> None:
     """Clear and/or delete the cache."""
 
+    # Evict the `pandasai` agents of the session
+    pandasai_agent_pool.evict_session(streamlit.session_state.session_id)
+
     try:
         streamlit.session_state.cache_dir = streamlit.session_state.cache_dir
 
@@ -21,6 +21,13 @@ from financial_assistant.src.tools import get_conversational_response
 from financial_assistant.src.tools_database import create_stock_database, query_stock_database
 from financial_assistant.src.tools_filings import retrieve_filings
 from financial_assistant.src.tools_pdf_generation import pdf_rag
+from financial_assistant.src.tools_price_analytics import (
+    get_moving_averages,
+    get_price_correlation,
+    get_price_drawdowns,
+    get_price_returns,
+    get_price_volatility,
+)
 from financial_assistant.src.tools_stocks import (
     get_historical_price,
     get_stock_info,
@@ -35,6 +42,11 @@ logger = get_logger()
 TOOLS = {
     'get_stock_info': get_stock_info,
     'get_historical_price': get_historical_price,
+    'get_price_returns': get_price_returns,
+    'get_price_volatility': get_price_volatility,
+    'get_moving_averages': get_moving_averages,
+    'get_price_drawdowns': get_price_drawdowns,
+    'get_price_correlation': get_price_correlation,
     'scrape_yahoo_finance_news': scrape_yahoo_finance_news,
     'get_conversational_response': get_conversational_response,
     'retrieve_filings': retrieve_filings,
@@ -0,0 +1,887 @@
+"""
+Financial Assistant Offline Test Script.
+
+This script tests the parts of the Financial Assistant starter kit which do not call the LLM, SEC EDGAR,
+or Yahoo Finance, using `unittest`.
+
+Usage:
+    python financial_assistant/tests/offline_test.py
+
+Returns:
+    0 if all tests pass, or 1 otherwise.
+"""
+
+import datetime
+import importlib
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from typing import Any, List, Optional, Tuple
+from unittest import mock
+
+import chromadb
+import numpy
+import pandas
+import requests
+from langchain_core.documents import Document
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import RunnableLambda
+
+# Main directories
+current_dir = os.path.dirname(os.path.abspath(__file__))
+kit_dir = os.path.abspath(os.path.join(current_dir, '..'))
+repo_dir = os.path.abspath(os.path.join(kit_dir, '..'))
+sys.path.append(kit_dir)
+sys.path.append(repo_dir)
+
+from financial_assistant.src import (
+    filing_store,
+    pandasai_agents,
+    retrieval,
+    symbol_resolver,
+    tools_database,
+    tools_pdf_generation,
+    tools_price_analytics,
+    tools_yahoo_news,
+)
+from financial_assistant.src.symbol_resolver import TickerIndex, normalize_company_name
+from financial_assistant.src.utilities import time_llm_path_context
+from financial_assistant.src.yfinance_cache import YFinanceCache
+from utils.web.http_cache import HttpCache
+
+# Pairs of company names and ticker symbols, by order of the SEC table
+COMPANIES = [
+    ('Apple Inc.', 'AAPL'),
+    ('Meta Platforms, Inc.', 'META'),
+    ('Meta Materials Inc.', 'MMAT'),
+    ('Amazon.com, Inc.', 'AMZN'),
+    ('Johnson & Johnson', 'JNJ'),
+    ('The Coca-Cola Company', 'KO'),
+]
+
+
+class ConstantsTest(unittest.TestCase):
+    """Test class for the constants of the Financial Assistant starter kit."""
+
+    def test_import_constants(self) -> None:
+        """Test that the constants can be imported and that the caches are in the shared cache."""
+
+        constants = importlib.import_module('financial_assistant.constants')
+
+        for cache_dir in [constants.HTTP_CACHE_DIR, constants.FILINGS_CACHE_DIR, constants.VECTORSTORE_CACHE_DIR]:
+            self.assertEqual(os.path.dirname(cache_dir), constants.SHARED_CACHE_DIR)
+
+
+class SymbolResolverTest(unittest.TestCase):
+    """Test class for the local resolution of the ticker symbols."""
+
+    def test_normalize_company_name(self) -> None:
+        """Test that the punctuation, the leading `the` and the legal suffixes are removed."""
+
+        self.assertEqual(normalize_company_name('Amazon.com, Inc.'), 'amazon')
+        self.assertEqual(normalize_company_name('The Coca-Cola Company'), 'coca cola')
+        self.assertEqual(normalize_company_name('Johnson & Johnson'), 'johnson and johnson')
+        # A company name made only of a suffix is kept
+        self.assertEqual(normalize_company_name('The Company'), 'company')
+
+    def test_ticker_index_lookup(self) -> None:
+        """Test the exact, prefix, fuzzy and ticker symbol matches of the ticker index."""
+
+        ticker_index = TickerIndex(COMPANIES)
+        self.assertEqual(len(ticker_index), len(COMPANIES))
+        self.assertEqual(ticker_index.lookup('apple'), 'AAPL')
+        self.assertEqual(ticker_index.lookup('Coca Cola'), 'KO')
+        # The prefix matches several companies, the one listed first is preferred
+        self.assertEqual(ticker_index.lookup('Meta'), 'META')
+        self.assertEqual(ticker_index.lookup('Johnson and Jonson'), 'JNJ')
+        self.assertEqual(ticker_index.lookup('AMZN'), 'AMZN')
+        self.assertIsNone(ticker_index.lookup('Unknown Corporation'))
+        self.assertIsNone(ticker_index.lookup('...'))
+
+    def test_resolve_symbols_locally(self) -> None:
+        """Test that the resolved symbols are cached, and that the unknown companies are left unresolved."""
+
+        http_cache = HttpCache()
+        get_ticker_index = mock.Mock(return_value=TickerIndex(COMPANIES))
+        with (
+            mock.patch.object(symbol_resolver, 'get_symbols_http_cache', return_value=http_cache),
+            mock.patch.object(symbol_resolver, 'get_ticker_index', get_ticker_index),
+        ):
+            symbols = symbol_resolver.resolve_symbols_locally(['Apple Inc', 'Unknown Corporation'])
+            self.assertEqual(symbols, {'Apple Inc': 'AAPL', 'Unknown Corporation': None})
+            self.assertEqual(get_ticker_index.call_count, 1)
+
+            # The cached symbols do not need the ticker index, e.g. the ones resolved by the LLM
+            symbol_resolver.cache_symbols({'Alphabet': 'GOOGL'})
+            symbols = symbol_resolver.resolve_symbols_locally(['apple', 'Alphabet Inc.'])
+            self.assertEqual(symbols, {'apple': 'AAPL', 'Alphabet Inc.': 'GOOGL'})
+            self.assertEqual(get_ticker_index.call_count, 1)
+
+
+class YFinanceCacheTest(unittest.TestCase):
+    """Test class for the on-disk cache of the Yahoo Finance data."""
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = YFinanceCache(self.temp_dir.name)
+        self.fetched_ranges: List[Tuple[datetime.date, datetime.date]] = list()
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def fetch(self, start_date: datetime.date, end_date: datetime.date) -> pandas.DataFrame:
+        """Fetch a fake daily price history, recording the fetched date ranges."""
+
+        self.fetched_ranges.append((start_date, end_date))
+        dates = pandas.date_range(start_date, end_date, inclusive='left')
+        return pandas.DataFrame({'Close': [float(date.day) for date in dates]}, index=dates)
+
+    def test_get_set(self) -> None:
+        """Test that the cached values are shared with other caches of the same directory, until they expire."""
+
+        self.cache.set('AAPL:info', {'sector': 'Technology'}, ttl=60)
+        self.assertEqual(YFinanceCache(self.temp_dir.name).get('AAPL:info'), {'sector': 'Technology'})
+        self.cache.set('AAPL:info', {'sector': 'Technology'}, ttl=-1)
+        self.assertIsNone(self.cache.get('AAPL:info'))
+        self.assertIsNone(self.cache.get('MSFT:info'))
+
+    def count_entries(self) -> int:
+        """Count the cache files."""
+
+        return len([name for name in os.listdir(self.temp_dir.name) if name.endswith('.pkl')])
+
+    def test_expired_entries_removed(self) -> None:
+        """Test that the expired entries are removed when read, and by the sweep of a new cache."""
+
+        self.cache.set('AAPL:info', {'sector': 'Technology'}, ttl=-1)
+        self.assertIsNone(self.cache.get('AAPL:info'))
+        self.assertEqual(self.count_entries(), 0)
+
+        self.cache.set('AAPL:info', {'sector': 'Technology'}, ttl=0.05)
+        self.cache.set('MSFT:info', {'sector': 'Technology'}, ttl=60)
+        time.sleep(0.1)
+        YFinanceCache(self.temp_dir.name)
+        self.assertEqual(self.count_entries(), 1)
+        self.assertEqual(self.cache.get('MSFT:info'), {'sector': 'Technology'})
+
+    def test_size_eviction(self) -> None:
+        """Test that the least recently used entries are removed when the cache grows over its maximum size."""
+
+        value = 'x' * 10000
+        self.cache.set('AAPL:info', value, ttl=60)
+        entry_size = os.path.getsize(self.cache._get_path('AAPL:info'))
+        cache = YFinanceCache(self.temp_dir.name, max_size_mb=2.5 * entry_size / (1024 * 1024))
+        time.sleep(0.01)
+        cache.set('MSFT:info', value, ttl=60)
+        time.sleep(0.01)
+        # Reading the oldest entry makes the second one the least recently used
+        self.assertEqual(cache.get('AAPL:info'), value)
+        time.sleep(0.01)
+
+        cache.set('GOOGL:info', value, ttl=60)
+        self.assertEqual(self.count_entries(), 2)
+        self.assertIsNone(cache.get('MSFT:info'))
+        self.assertEqual(cache.get('AAPL:info'), value)
+        self.assertEqual(cache.get('GOOGL:info'), value)
+
+    def test_get_history_extends_cached_range(self) -> None:
+        """Test that only the dates which are not cached yet are fetched."""
+
+        history = self.cache.get_history('AAPL', datetime.date(2024, 1, 10), datetime.date(2024, 1, 20), self.fetch)
+        self.assertEqual(len(history), 10)
+
+        # The cached range covers the requested dates
+        history = self.cache.get_history('AAPL', datetime.date(2024, 1, 12), datetime.date(2024, 1, 15), self.fetch)
+        self.assertEqual(history['Close'].tolist(), [12.0, 13.0, 14.0])
+        self.assertEqual(len(self.fetched_ranges), 1)
+
+        # The cached range is extended on both sides
+        history = self.cache.get_history('AAPL', datetime.date(2024, 1, 5), datetime.date(2024, 1, 25), self.fetch)
+        self.assertEqual(len(history), 20)
+        self.assertTrue(history.index.is_monotonic_increasing)
+        self.assertEqual(
+            self.fetched_ranges[1:],
+            [
+                (datetime.date(2024, 1, 5), datetime.date(2024, 1, 10)),
+                (datetime.date(2024, 1, 20), datetime.date(2024, 1, 25)),
+            ],
+        )
+
+    def test_get_history_disjoint_range(self) -> None:
+        """Test that a date range not overlapping the cached range is fetched entirely."""
+
+        self.cache.get_history('AAPL', datetime.date(2024, 1, 1), datetime.date(2024, 1, 5), self.fetch)
+        history = self.cache.get_history('AAPL', datetime.date(2024, 3, 1), datetime.date(2024, 3, 5), self.fetch)
+        self.assertEqual(len(history), 4)
+        self.assertEqual(self.fetched_ranges[-1], (datetime.date(2024, 3, 1), datetime.date(2024, 3, 5)))
+
+
+class StockDatabaseTest(unittest.TestCase):
+    """Test class for the typed SQLite ingestion and the shared engines of the stock database."""
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, 'stocks.db')
+
+    def tearDown(self) -> None:
+        tools_database.get_sqlite_engine(self.db_path).dispose()
+        self.temp_dir.cleanup()
+
+    def test_prepare_dataframe_for_sqlite(self) -> None:
+        """Test that the column names are sanitized and that the lists and dictionaries are converted to JSON."""
+
+        df = pandas.DataFrame({'Company Officers': [[{'name': 'Jane'}], 'none'], 'Employees': [10, 20]})
+        prepared_df = tools_database.prepare_dataframe_for_sqlite(df)
+        self.assertEqual(prepared_df.columns.tolist(), ['Company_Officers', 'Employees'])
+        self.assertEqual(json.loads(prepared_df['Company_Officers'][0]), [{'name': 'Jane'}])
+        self.assertEqual(prepared_df['Company_Officers'][1], 'none')
+        # The original dataframe is not modified
+        self.assertIsInstance(df['Company Officers'][0], list)
+
+    def test_get_sqlite_dtypes(self) -> None:
+        """Test the SQL types of the dataframe columns."""
+
+        df = pandas.DataFrame(
+            {
+                'flag': [True],
+                'count': [1],
+                'price': [1.5],
+                'date': pandas.to_datetime(['2024-01-02']).tz_localize('UTC'),
+                'name': ['Apple'],
+            }
+        )
+        dtypes = tools_database.get_sqlite_dtypes(df)
+        self.assertEqual(
+            {column: type(dtype).__name__ for column, dtype in dtypes.items()},
+            {'flag': 'Boolean', 'count': 'Integer', 'price': 'Float', 'date': 'DateTime', 'name': 'Text'},
+        )
+        self.assertTrue(dtypes['date'].timezone)
+
+    def test_store_company_dataframes_to_sqlite(self) -> None:
+        """Test that the tables are created with a typed schema and an index on their date columns."""
+
+        history = pandas.DataFrame(
+            {'Date': pandas.date_range('2024-01-01', periods=3), 'Close': [1.0, 2.0, 3.0], 'Volume': [10, 20, 30]}
+        )
+        company_tables = tools_database.store_company_dataframes_to_sqlite(
+            self.db_path, {'AAPL': {'history': history, 'unsupported': object()}}
+        )
+        # The data which cannot be converted to a dataframe is skipped
+        self.assertEqual(company_tables, {'AAPL': ['aapl_history']})
+
+        engine = tools_database.get_sqlite_engine(self.db_path)
+        with engine.connect() as connection:
+            column_types = {
+                row[1]: row[2] for row in connection.exec_driver_sql('PRAGMA table_info("aapl_history")').fetchall()
+            }
+            index_names = [row[1] for row in connection.exec_driver_sql('PRAGMA index_list("aapl_history")')]
+            num_rows = connection.exec_driver_sql('SELECT COUNT(*) FROM aapl_history').scalar()
+        self.assertEqual(column_types, {'Date': 'DATETIME', 'Close': 'FLOAT', 'Volume': 'INTEGER'})
+        self.assertEqual(index_names, ['ix_aapl_history_Date'])
+        self.assertEqual(num_rows, 3)
+
+    def test_store_failed_table_rolled_back(self) -> None:
+        """Test that a table failing to be stored is rolled back, without the other tables."""
+
+        history = pandas.DataFrame({'Date': pandas.date_range('2024-01-01', periods=2), 'Close': [1.0, 2.0]})
+        tools_database.store_company_dataframes_to_sqlite(self.db_path, {'AAPL': {'history': history}})
+
+        # The set cannot be inserted, after the old table has been replaced
+        invalid_history = pandas.DataFrame({'Date': pandas.date_range('2024-01-01', periods=1), 'Close': [{1.0}]})
+        info = pandas.DataFrame({'name': ['Apple']})
+        company_tables = tools_database.store_company_dataframes_to_sqlite(
+            self.db_path, {'AAPL': {'history': invalid_history, 'info': info}}
+        )
+        self.assertEqual(company_tables, {'AAPL': ['aapl_info']})
+
+        engine = tools_database.get_sqlite_engine(self.db_path)
+        with engine.connect() as connection:
+            closes = [row[0] for row in connection.exec_driver_sql('SELECT Close FROM aapl_history')]
+            names = [row[0] for row in connection.exec_driver_sql('SELECT name FROM aapl_info')]
+        self.assertEqual(closes, [1.0, 2.0])
+        self.assertEqual(names, ['Apple'])
+
+    def test_shared_sqlite_engine(self) -> None:
+        """Test that the engine is shared, and recreated when the database file is replaced."""
+
+        engine = tools_database.get_sqlite_engine(self.db_path)
+        with engine.connect() as connection:
+            self.assertEqual(connection.exec_driver_sql('PRAGMA journal_mode').scalar(), 'wal')
+        self.assertIs(tools_database.get_sqlite_engine(os.path.join(self.temp_dir.name, '.', 'stocks.db')), engine)
+
+        # The database file is replaced, e.g. when the session cache is cleared
+        new_db_path = os.path.join(self.temp_dir.name, 'new_stocks.db')
+        with open(new_db_path, 'wb'):
+            pass
+        os.replace(new_db_path, self.db_path)
+        self.assertIsNot(tools_database.get_sqlite_engine(self.db_path), engine)
+
+    def test_table_columns_cache(self) -> None:
+        """Test that the cached column names are refreshed when the tables change."""
+
+        history = pandas.DataFrame({'Date': pandas.date_range('2024-01-01', periods=2), 'Close': [1.0, 2.0]})
+        tools_database.store_company_dataframes_to_sqlite(self.db_path, {'AAPL': {'history': history}})
+        table_columns = tools_database.get_table_columns(self.db_path)
+        self.assertEqual(table_columns, {'aapl_history': ['Date', 'Close']})
+        self.assertIs(tools_database.get_table_columns(self.db_path), table_columns)
+
+        # A table written by another connection changes the SQLite schema version
+        other_engine = tools_database.create_sqlite_engine(self.db_path)
+        with other_engine.begin() as connection:
+            connection.exec_driver_sql('CREATE TABLE msft_info (name TEXT)')
+        other_engine.dispose()
+        self.assertEqual(
+            tools_database.get_table_columns(self.db_path), {'aapl_history': ['Date', 'Close'], 'msft_info': ['name']}
+        )
+
+    def test_table_descriptions_cache(self) -> None:
+        """Test that the table descriptions and the SQL database are reused until the database is written."""
+
+        history = pandas.DataFrame({'Date': pandas.date_range('2024-01-01', periods=2), 'Close': [1.0, 2.0]})
+        tools_database.store_company_dataframes_to_sqlite(self.db_path, {'AAPL': {'history': history}})
+        session_state = SimpleNamespace(db_path=self.db_path)
+        with mock.patch.object(tools_database, 'streamlit', SimpleNamespace(session_state=session_state)):
+            database_info = tools_database.get_database_info(self.db_path)
+            summary_text = tools_database.get_table_summaries_from_names(['aapl_history', 'msft_history'])
+            # The schema gives the column types and sample rows of the existing tables
+            self.assertIn('CREATE TABLE aapl_history', summary_text)
+            self.assertIn('"Close" FLOAT', summary_text)
+            self.assertIn('2024-01-02 00:00:00\t2.0', summary_text)
+            self.assertNotIn('msft_history', summary_text)
+
+            with mock.patch.object(tools_database, 'inspect', side_effect=AssertionError('inspected again')):
+                self.assertEqual(tools_database.get_table_summaries_from_names(['aapl_history']), summary_text)
+            self.assertIs(tools_database.get_database_info(self.db_path).sql_database, database_info.sql_database)
+
+            # Writing to the database invalidates the cached descriptions
+            history['Close'] = [3.0, 4.0]
+            tools_database.store_company_dataframes_to_sqlite(self.db_path, {'AAPL': {'history': history}})
+            self.assertIsNot(tools_database.get_database_info(self.db_path), database_info)
+            self.assertIn('2024-01-02 00:00:00\t4.0', tools_database.get_table_summaries_from_names(['aapl_history']))
+
+    def test_database_version(self) -> None:
+        """Test that the version of the database changes with each write, even if the file is not modified."""
+
+        history = pandas.DataFrame({'Date': pandas.date_range('2024-01-01', periods=2), 'Close': [1.0, 2.0]})
+        tools_database.store_company_dataframes_to_sqlite(self.db_path, {'AAPL': {'history': history}})
+        version = tools_database.get_database_version(self.db_path)
+        self.assertEqual(tools_database.get_database_version(self.db_path), version)
+
+        # In WAL mode, the modification time of the database file does not change with the new rows
+        mtime = os.stat(self.db_path).st_mtime_ns
+        history['Close'] = [3.0, 4.0]
+        tools_database.store_company_dataframes_to_sqlite(self.db_path, {'AAPL': {'history': history}})
+        self.assertEqual(os.stat(self.db_path).st_mtime_ns, mtime)
+        self.assertNotEqual(tools_database.get_database_version(self.db_path), version)
+
+
+class FakeAgent:
+    """Stub of a `pandasai.Agent`, whose chat pipeline stores the generated code in the cache of its context."""
+
+    def __init__(self, answer: str = 'answer') -> None:
+        self.context = SimpleNamespace(cache=None, config=SimpleNamespace(enable_cache=False))
+        self.pipeline = SimpleNamespace(last_error=None)
+        self.answer = answer
+        self.generated_codes: List[str] = list()
+
+    @property
+    def last_error(self) -> Optional[str]:
+        return self.pipeline.last_error  # type: ignore[no-any-return]
+
+    def start_new_conversation(self) -> None:
+        pass
+
+    def chat(self, user_query: str) -> str:
+        if self.context.cache.get(user_query) is None:
+            self.generated_codes.append(user_query)
+            self.context.cache.set(user_query, f'code of {user_query}')
+        return self.answer
+
+
+class PandasAIAgentsTest(unittest.TestCase):
+    """Test class for the pool of `pandasai` agents and the cache of their generated code."""
+
+    def setUp(self) -> None:
+        self.llm = SimpleNamespace(llm_info={'model': 'llama'}, llm=object())
+
+    def test_code_cache_key(self) -> None:
+        """Test that the code is keyed by the normalized question and the columns of the data."""
+
+        code_cache = pandasai_agents.PandasAICodeCache(max_entries=2)
+        context = SimpleNamespace(
+            memory=SimpleNamespace(get_conversation=lambda: '  What is the\n MAX close? '),
+            dfs=[SimpleNamespace(column_hash='abc')],
+        )
+        self.assertEqual(code_cache.get_cache_key(context), 'what is the max close?abc')
+
+    def test_code_cache_eviction(self) -> None:
+        """Test that the least recently used code is evicted when the cache is full."""
+
+        code_cache = pandasai_agents.PandasAICodeCache(max_entries=2)
+        for key in ['a', 'b']:
+            code_cache.set(key, f'code {key}')
+            code_cache.commit()
+        # Reading the oldest code makes the second one the least recently used
+        self.assertEqual(code_cache.get('a'), 'code a')
+        code_cache.commit()
+        code_cache.set('c', 'code c')
+        code_cache.commit()
+
+        self.assertIsNone(code_cache.get('b'))
+        self.assertEqual(code_cache.get('a'), 'code a')
+        self.assertEqual(code_cache.get('c'), 'code c')
+
+    def test_code_cache_commit_discard(self) -> None:
+        """Test that the generated code is only cached after a successful answer."""
+
+        code_cache = pandasai_agents.PandasAICodeCache(max_entries=2)
+        code_cache.set('failed', 'code')
+        code_cache.discard()
+        self.assertIsNone(code_cache.get('failed'))
+
+        # The code generated by another thread is not committed by this thread
+        thread = threading.Thread(target=code_cache.set, args=('other thread', 'code'))
+        thread.start()
+        thread.join()
+        code_cache.commit()
+        self.assertIsNone(code_cache.get('other thread'))
+
+        # A cached code which failed is removed
+        code_cache.set('reused', 'code')
+        code_cache.commit()
+        self.assertEqual(code_cache.get('reused'), 'code')
+        code_cache.discard()
+        self.assertIsNone(code_cache.get('reused'))
+
+    def test_agent_reused(self) -> None:
+        """Test that the agent of a data source is reused, and that the agents of an LLM share its code cache."""
+
+        agent_pool = pandasai_agents.PandasAIAgentPool(max_agents=4, ttl=60, max_cached_codes=8)
+        create_agent = mock.Mock(side_effect=FakeAgent)
+        agent, agent_lock = agent_pool.get_agent('session', 'table_a', 'llm', create_agent)
+        self.assertEqual(agent_pool.get_agent('session', 'table_a', 'llm', create_agent), (agent, agent_lock))
+        self.assertEqual(create_agent.call_count, 1)
+        self.assertTrue(agent.context.config.enable_cache)
+
+        other_agent, _ = agent_pool.get_agent('session', 'table_b', 'llm', create_agent)
+        self.assertIsNot(other_agent, agent)
+        self.assertIs(other_agent.context.cache, agent.context.cache)
+        other_llm_agent, _ = agent_pool.get_agent('session', 'table_a', 'other llm', create_agent)
+        self.assertIsNot(other_llm_agent.context.cache, agent.context.cache)
+
+    def test_agent_eviction(self) -> None:
+        """Test that the agents are evicted when the pool is full, when they expire, and with their session."""
+
+        agent_pool = pandasai_agents.PandasAIAgentPool(max_agents=2, ttl=60, max_cached_codes=8)
+        create_agent = mock.Mock(side_effect=FakeAgent)
+        agent_pool.get_agent('session_1', 'table_a', 'llm', create_agent)
+        agent_pool.get_agent('session_2', 'table_a', 'llm', create_agent)
+        agent_pool.get_agent('session_2', 'table_b', 'llm', create_agent)
+        # The least recently used agent was evicted
+        agent_pool.get_agent('session_1', 'table_a', 'llm', create_agent)
+        self.assertEqual(create_agent.call_count, 4)
+
+        agent_pool.evict_session('session_2')
+        agent_pool.get_agent('session_1', 'table_a', 'llm', create_agent)
+        self.assertEqual(create_agent.call_count, 4)
+        agent_pool.get_agent('session_2', 'table_b', 'llm', create_agent)
+        self.assertEqual(create_agent.call_count, 5)
+
+        with mock.patch.object(pandasai_agents.time, 'time', return_value=time.time() + 120):
+            agent_pool.get_agent('session_2', 'table_b', 'llm', create_agent)
+        self.assertEqual(create_agent.call_count, 6)
+
+    def test_chat(self) -> None:
+        """Test that the code of a successful answer is reused, and that the code of a failed answer is not."""
+
+        agent_pool = pandasai_agents.PandasAIAgentPool(max_agents=4, ttl=60, max_cached_codes=8)
+        agent = FakeAgent()
+        agent_pool.chat('session', 'table_a', self.llm, lambda: agent, 'What is the max close?')  # type: ignore[arg-type]
+        agent_pool.chat('session', 'table_a', self.llm, lambda: agent, 'What is the max close?')  # type: ignore[arg-type]
+        self.assertEqual(agent.generated_codes, ['What is the max close?'])
+
+        failing_agent = FakeAgent(answer=pandasai_agents.PANDASAI_ERROR_PREFIX + ' answer.')
+        for _ in range(2):
+            agent_pool.chat('session', 'table_b', self.llm, lambda: failing_agent, 'Plot it.')  # type: ignore[arg-type]
+        self.assertEqual(failing_agent.generated_codes, ['Plot it.', 'Plot it.'])
+
+
+class StubSummaryLLM:
+    """Stub LLM answering the summary prompts in JSON, which counts its concurrent calls."""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.prompts: List[str] = list()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt_value: PromptValue) -> str:
+        prompt = prompt_value.to_string()
+        with self._lock:
+            self.prompts.append(prompt)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            if 'The following is a document' in prompt:
+                section = re.search(r'Section \d+', prompt).group(0)  # type: ignore[union-attr]
+                if section == 'Section 0':
+                    raise ValueError('Invalid LLM output')
+                return json.dumps({'title': f'Title of {section}', 'summary': f'Summary of {section}'})
+            return json.dumps({'summary': 'Summary of the report'})
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def get_section_prompts(self) -> List[str]:
+        return [prompt for prompt in self.prompts if 'The following is a document' in prompt]
+
+
+class PDFReportTest(unittest.TestCase):
+    """Test class for the concurrent summarization and the background jobs of the PDF reports."""
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.time_llm_path = os.path.join(self.temp_dir.name, 'time_llm.json')
+        self.token = time_llm_path_context.set(self.time_llm_path)
+        self.llm = StubSummaryLLM(latency=0.2)
+        patchers = [
+            mock.patch.object(
+                tools_pdf_generation,
+                'sambanova_llm',
+                SimpleNamespace(llm=RunnableLambda(self.llm.invoke), llm_info={'model': 'stub'}),
+            ),
+            mock.patch.object(tools_pdf_generation, 'get_summary_http_cache', return_value=HttpCache()),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        time_llm_path_context.reset(self.token)
+        self.temp_dir.cleanup()
+
+    def get_docs(self, *section_numbers: int) -> List[Document]:
+        """Build the documents of the given sections."""
+
+        return [Document(page_content=f'Section {number}: the revenue grew.') for number in section_numbers]
+
+    def test_summarize_text_concurrently(self) -> None:
+        """Test that the sections are summarized concurrently, in order, with the progress of the summarization."""
+
+        progress_updates: List[Tuple[float, str]] = list()
+        summaries, titles, final_summary, abstract = tools_pdf_generation.summarize_text(
+            self.get_docs(1, 2, 3, 4), lambda progress, status: progress_updates.append((progress, status))
+        )
+        self.assertEqual(titles, [f'Title of Section {number}' for number in range(1, 5)])
+        self.assertEqual(summaries, [f'Summary of Section {number}' for number in range(1, 5)])
+        self.assertEqual((final_summary, abstract), ('Summary of the report', 'Summary of the report'))
+        self.assertEqual(self.llm.max_in_flight, 4)
+
+        # The progress increases, from the sections to the final summary and the abstract
+        progresses = [progress for progress, _ in progress_updates]
+        self.assertEqual(progresses, sorted(progresses))
+        self.assertIn((tools_pdf_generation.SECTIONS_PROGRESS_SHARE, 'Summarized 4/4 sections...'), progress_updates)
+        self.assertEqual(progress_updates[-1][1], 'Writing the abstract...')
+        # The LLM durations are logged to the file of the session
+        with open(self.time_llm_path) as file:
+            self.assertEqual(len(json.load(file)), 6)
+
+    def test_section_summary_cache(self) -> None:
+        """Test that the summaries are reused for the sections with the same content, but not the failed ones."""
+
+        tools_pdf_generation.summarize_text(self.get_docs(1, 2))
+        self.assertEqual(len(self.llm.get_section_prompts()), 2)
+
+        summaries, _, _, _ = tools_pdf_generation.summarize_text(self.get_docs(2, 3, 0))
+        # Only the new sections are summarized
+        self.assertEqual(len(self.llm.get_section_prompts()), 4)
+        self.assertEqual(summaries, ['Summary of Section 2', 'Summary of Section 3', ''])
+
+        # Only the failed section is summarized again, and the same summaries reuse the final summary and abstract
+        num_prompts = len(self.llm.prompts)
+        tools_pdf_generation.summarize_text(self.get_docs(2, 3, 0))
+        self.assertEqual(len(self.llm.get_section_prompts()), 5)
+        self.assertEqual(len(self.llm.prompts), num_prompts + 1)
+
+    def test_pdf_report_job(self) -> None:
+        """Test that the job reports the progress of the generation, and runs with the LLM durations file."""
+
+        generation_started = threading.Event()
+        generation_allowed = threading.Event()
+        time_llm_paths: List[Optional[str]] = list()
+
+        def generate_pdf(*args: Any, progress_callback: Any) -> bytes:
+            time_llm_paths.append(time_llm_path_context.get())
+            progress_callback(0.5, 'Summarized 1/2 sections...')
+            generation_started.set()
+            generation_allowed.wait(5)
+            return b'%PDF'
+
+        job = tools_pdf_generation.PDFReportJob([('text', None)], 'report.pdf', 'Report', True, 'job_time_llm.json')
+        with mock.patch.object(tools_pdf_generation, 'generate_pdf', side_effect=generate_pdf):
+            job.start()
+            self.assertTrue(generation_started.wait(5))
+            self.assertFalse(job.done())
+            self.assertEqual((job.progress, job.status), (0.5, 'Summarized 1/2 sections...'))
+
+            generation_allowed.set()
+            self.assertEqual(job.result(5), b'%PDF')
+        self.assertTrue(job.done())
+        self.assertEqual((job.progress, job.status), (1.0, 'PDF report generated.'))
+        self.assertEqual(time_llm_paths, ['job_time_llm.json'])
+
+    def test_pdf_report_job_error(self) -> None:
+        """Test that the error of a job is raised by its result."""
+
+        job = tools_pdf_generation.PDFReportJob([('text', None)], 'report.pdf', 'Report', True, self.time_llm_path)
+        with self.assertRaises(Exception):
+            job.result()
+
+        with mock.patch.object(tools_pdf_generation, 'generate_pdf', side_effect=ValueError('Invalid figure')):
+            job.start()
+            with self.assertRaisesRegex(ValueError, 'Invalid figure'):
+                job.result(5)
+        self.assertTrue(job.done())
+        self.assertEqual((job.progress, job.status), (1.0, 'PDF report generation failed.'))
+
+
+class YahooNewsTest(unittest.TestCase):
+    """Test class for the parsing and the cache of the Yahoo Finance News articles."""
+
+    ARTICLE_URL = 'https://finance.yahoo.com/news/article.html'
+    ARTICLE_CONTENT = (
+        '<html><body><h1 data-test-locator="headline">Apple beats   estimates!</h1><h2>Results</h2>'
+        '<p>Revenue grew by 5%.</p><p>Shares rose.</p></body></html>'
+    )
+
+    def test_get_article_texts(self) -> None:
+        """Test that an article is downloaded and parsed once."""
+
+        cached_get = mock.Mock(return_value=self.ARTICLE_CONTENT)
+        with (
+            mock.patch.object(tools_yahoo_news, 'get_news_http_cache', return_value=HttpCache()),
+            mock.patch.object(tools_yahoo_news, 'cached_get', cached_get),
+        ):
+            article_texts = tools_yahoo_news.get_article_texts(self.ARTICLE_URL)
+            self.assertEqual(
+                article_texts,
+                {
+                    'h1': ['Apple beats estimates'],
+                    'h2': ['Results'],
+                    'h3': [],
+                    'p': ['Revenue grew by 5', 'Shares rose'],
+                },
+            )
+            self.assertEqual(tools_yahoo_news.get_article_texts(self.ARTICLE_URL), article_texts)
+            self.assertEqual(cached_get.call_count, 1)
+
+    def test_get_article_texts_download_error(self) -> None:
+        """Test that an article which cannot be downloaded is skipped, and not cached."""
+
+        cached_get = mock.Mock(side_effect=requests.exceptions.ConnectionError('offline'))
+        with (
+            mock.patch.object(tools_yahoo_news, 'get_news_http_cache', return_value=HttpCache()),
+            mock.patch.object(tools_yahoo_news, 'cached_get', cached_get),
+        ):
+            self.assertIsNone(tools_yahoo_news.get_article_texts(self.ARTICLE_URL))
+            self.assertIsNone(tools_yahoo_news.get_article_texts(self.ARTICLE_URL))
+            self.assertEqual(cached_get.call_count, 2)
+
+    def test_filter_text(self) -> None:
+        """Test that the short texts are kept whole and that the long texts are split into chunks."""
+
+        self.assertEqual(tools_yahoo_news.filter_text('  Shares   rose 5%! '), ['Shares rose 5'])
+        self.assertEqual(tools_yahoo_news.filter_text('$%!'), [])
+        long_text = ' '.join(['Shares rose.'] * 200)
+        chunks = tools_yahoo_news.filter_text(long_text)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) <= tools_yahoo_news.MAX_CHUNK_SIZE for chunk in chunks))
+
+
+class FilingStoreTest(unittest.TestCase):
+    """Test class for the rate limit of the SEC EDGAR requests and the on-disk filing store."""
+
+    METADATA = {'accession_number': '0000320193-24-000123', 'report_date': '2024-09-28', 'primary_doc_url': 'url'}
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.downloader = mock.Mock()
+        self.downloader.download_filing.return_value = '<html><body><p>Annual</p><p>report</p></body></html>'
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_sec_rate_limiter(self) -> None:
+        """Test that the requests are spaced by the minimum interval."""
+
+        rate_limiter = filing_store.SecRateLimiter(max_requests_per_second=50)
+        start_time = time.monotonic()
+        for _ in range(3):
+            rate_limiter.wait()
+        self.assertGreaterEqual(time.monotonic() - start_time, 2 * rate_limiter.min_interval)
+
+    def test_rate_limit_sec_requests(self) -> None:
+        """Test that the SEC EDGAR requests of `Downloader` are only wrapped once by the rate limiter."""
+
+        call_sec = filing_store._sec_gateway._call_sec
+        self.assertTrue(getattr(call_sec, 'is_rate_limited', False))
+        filing_store.rate_limit_sec_requests()
+        self.assertIs(filing_store._sec_gateway._call_sec, call_sec)
+
+    def test_get_filing_metadatas(self) -> None:
+        """Test that the metadata of the filings is reused."""
+
+        self.downloader.get_filing_metadatas.return_value = [SimpleNamespace(**self.METADATA)]
+        with mock.patch.object(filing_store, 'get_shared_http_cache', return_value=HttpCache()):
+            for _ in range(2):
+                metadatas = filing_store.get_filing_metadatas(self.downloader, 'AAPL', '10-K', 1)
+                self.assertEqual(metadatas, [self.METADATA])
+        self.assertEqual(self.downloader.get_filing_metadatas.call_count, 1)
+
+    def test_get_filing_text(self) -> None:
+        """Test that a filing is downloaded once, and stored by accession number."""
+
+        with mock.patch.object(filing_store, 'FILINGS_CACHE_DIR', self.temp_dir.name):
+            for _ in range(2):
+                self.assertEqual(filing_store.get_filing_text(self.downloader, self.METADATA), 'Annual report')
+        self.assertEqual(self.downloader.download_filing.call_count, 1)
+        self.assertEqual(os.listdir(self.temp_dir.name), [f'{self.METADATA["accession_number"]}.json'])
+
+
+class PriceAnalyticsTest(unittest.TestCase):
+    """Test class for the price analytics computed over the cached price history."""
+
+    def setUp(self) -> None:
+        # `MSFT` is not traded on the second day
+        self.dates = pandas.date_range('2024-01-01', periods=4)
+        self.prices = pandas.DataFrame(
+            {'AAPL': [100.0, 110.0, 99.0, 121.0], 'MSFT': [50.0, numpy.nan, 55.0, 44.0]}, index=self.dates
+        )
+
+    def test_compute_returns(self) -> None:
+        """Test that the missing prices do not break the returns."""
+
+        returns = tools_price_analytics.compute_returns(self.prices)
+        self.assertTrue(numpy.allclose(returns['AAPL'][1:], [0.1, -0.1, 0.22222222]))
+        self.assertTrue(numpy.allclose(returns['MSFT'][1:], [0.0, 0.1, -0.2]))
+
+    def test_compute_return_summary(self) -> None:
+        """Test the total, best daily and worst daily returns."""
+
+        summary = tools_price_analytics.compute_return_summary(self.prices)
+        self.assertEqual(summary.at['Total return (%)', 'AAPL'], 21.0)
+        self.assertEqual(summary.at['Total return (%)', 'MSFT'], -12.0)
+        self.assertEqual(summary.at['Best daily return (%)', 'AAPL'], 22.22)
+        self.assertEqual(summary.at['Best day', 'AAPL'], self.dates[3].date())
+        self.assertEqual(summary.at['Worst day', 'MSFT'], self.dates[3].date())
+        self.assertEqual(summary.at['Trading days', 'AAPL'], 4)
+        self.assertEqual(summary.at['Trading days', 'MSFT'], 3)
+
+    def test_compute_moving_average_summary(self) -> None:
+        """Test that the moving averages longer than the price history are left empty."""
+
+        summary = tools_price_analytics.compute_moving_average_summary(self.prices, [2, 10])
+        self.assertEqual(summary.at['2-day moving average', 'AAPL'], 110.0)
+        self.assertEqual(summary.at['Price vs 2-day moving average (%)', 'AAPL'], 10.0)
+        self.assertTrue(summary.at['Price above 2-day moving average', 'AAPL'])
+        self.assertFalse(summary.at['Price above 2-day moving average', 'MSFT'])
+        self.assertTrue(pandas.isna(summary.at['10-day moving average', 'AAPL']))
+        self.assertTrue(pandas.isna(summary.at['Price above 10-day moving average', 'AAPL']))
+
+    def test_compute_drawdown_summary(self) -> None:
+        """Test the peak, trough and recovery dates of the maximum drawdowns."""
+
+        summary = tools_price_analytics.compute_drawdown_summary(self.prices)
+        self.assertEqual(summary.at['Maximum drawdown (%)', 'AAPL'], -10.0)
+        self.assertEqual(summary.at['Peak date', 'AAPL'], self.dates[1].date())
+        self.assertEqual(summary.at['Trough date', 'AAPL'], self.dates[2].date())
+        self.assertEqual(summary.at['Recovery date', 'AAPL'], self.dates[3].date())
+        self.assertEqual(summary.at['Current drawdown (%)', 'AAPL'], 0.0)
+        # The price of `MSFT` has not recovered its peak yet
+        self.assertEqual(summary.at['Maximum drawdown (%)', 'MSFT'], -20.0)
+        self.assertEqual(summary.at['Peak date', 'MSFT'], self.dates[2].date())
+        self.assertIsNone(summary.at['Recovery date', 'MSFT'])
+
+    def test_compute_return_correlation(self) -> None:
+        """Test that the correlation matrix is symmetric, with the ticker symbols as index and columns."""
+
+        correlation = tools_price_analytics.compute_return_correlation(self.prices)
+        self.assertEqual(correlation.index.tolist(), ['AAPL', 'MSFT'])
+        self.assertEqual(correlation.columns.tolist(), ['AAPL', 'MSFT'])
+        self.assertEqual(correlation.at['AAPL', 'AAPL'], 1.0)
+        self.assertEqual(correlation.at['AAPL', 'MSFT'], correlation.at['MSFT', 'AAPL'])
+
+    def test_get_analytics_price_history(self) -> None:
+        """Test that the companies with less than two prices are left out."""
+
+        prices = self.prices.assign(NVDA=[numpy.nan, numpy.nan, numpy.nan, 130.0])
+        with (
+            mock.patch.object(tools_price_analytics, 'retrieve_symbol_list', return_value=['AAPL', 'MSFT', 'NVDA']),
+            mock.patch.object(tools_price_analytics, 'get_price_history', return_value=prices),
+        ):
+            analytics_prices = tools_price_analytics.get_analytics_price_history(
+                ['Apple', 'Microsoft', 'Nvidia'], self.dates[0].date(), self.dates[-1].date(), 'Close'
+            )
+            self.assertEqual(analytics_prices.columns.tolist(), ['AAPL', 'MSFT'])
+
+            with self.assertRaises(ValueError):
+                tools_price_analytics.get_analytics_price_history(
+                    ['Apple'], self.dates[-1].date(), self.dates[0].date(), 'Close'
+                )
+
+        with (
+            mock.patch.object(tools_price_analytics, 'retrieve_symbol_list', return_value=['NVDA']),
+            mock.patch.object(tools_price_analytics, 'get_price_history', return_value=prices[['NVDA']]),
+        ):
+            with self.assertRaises(ValueError):
+                tools_price_analytics.get_analytics_price_history(
+                    ['Nvidia'], self.dates[0].date(), self.dates[-1].date(), 'Close'
+                )
+
+
+class VectorstoreCacheTest(unittest.TestCase):
+    """Test class for the eviction of the persistent vectorstores."""
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        for entry in os.scandir(self.temp_dir.name):
+            retrieval.stop_vectorstore_system(entry.path)
+        self.temp_dir.cleanup()
+
+    def add_document(self, key: str) -> int:
+        """Add a document to the vectorstore of a key, and return the number of stored documents."""
+
+        client = chromadb.PersistentClient(path=retrieval.get_vectorstore_directory(key))
+        collection = client.get_or_create_collection(f'documents_{key}')
+        collection.add(ids=['0'], documents=['Apple beats estimates.'], embeddings=[[1.0, 0.0]])
+        return collection.count()
+
+    def test_evicted_vectorstore_created_again(self) -> None:
+        """Test that an evicted vectorstore can be created again in the same directory."""
+
+        with (
+            mock.patch.object(retrieval, 'VECTORSTORE_CACHE_DIR', self.temp_dir.name),
+            mock.patch.object(retrieval, 'VECTORSTORE_CACHE_MAX_ENTRIES', 0),
+        ):
+            self.add_document('aapl')
+            with retrieval.checkout_vectorstore('msft'):
+                self.add_document('msft')
+                retrieval.evict_vectorstores()
+            # The vectorstore checked out by a question is not evicted
+            self.assertEqual(os.listdir(self.temp_dir.name), ['msft'])
+            self.assertEqual(self.add_document('aapl'), 1)
+
+
+if __name__ == '__main__':
+    test_program = unittest.main(exit=False)
+    sys.exit(0 if test_program.result.wasSuccessful() else 1)
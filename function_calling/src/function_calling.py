@@ -2,8 +2,11 @@ import json
 import os
 import re
 import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pprint import pprint
-from typing import Any, Dict, List, Optional, Tuple, Type, Union
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Type, Union
 
 import yaml
 from dotenv import load_dotenv
@@ -42,6 +45,14 @@ else:
 
 
 CONFIG_PATH = os.path.join(kit_dir, 'config.yaml')
+DEFAULT_MAX_CONCURRENT_TOOLS = 8
+DEFAULT_TOOL_TIMEOUT = 120
+# Tools which are not thread safe, e.g. the python REPL swaps sys.stdout and shares its globals between runs
+DEFAULT_SERIALIZED_TOOLS = ['python_repl']
+
+# Locks running the serialized tools one at a time, shared by all the instances since the tools are module objects
+_serialized_tool_locks: Dict[str, threading.Lock] = {}
+_serialized_tool_locks_lock = threading.Lock()
 
 FUNCTION_CALLING_SYSTEM_PROMPT = """you are an helpful assistant and you have access to the following tools:
 
@@ -116,6 +127,10 @@ class FunctionCallingLlm:
         configs = self.get_config_info(config_path)
         self.llm_info = configs[0]
         self.prod_mode = configs[1]
+        self.tool_execution_info = configs[2]
+        # Executor running the tools, shared by the calls so a timed out tool does not block the next ones
+        self._tools_executor: Optional[ThreadPoolExecutor] = None
+        self._tools_executor_lock = threading.Lock()
         self.llm = self.set_llm()
         self.kwargs = kwargs
         if tools is None:
@@ -166,7 +181,7 @@ class FunctionCallingLlm:
                 'ToolClass or str with tool name in TOOLS mapping dict'
             )
 
-    def get_config_info(self, config_path: str) -> Tuple[Dict[str, Any], bool]:
+    def get_config_info(self, config_path: str) -> Tuple[Dict[str, Any], bool, Dict[str, Any]]:
         """
         Loads json config file
         """
@@ -175,8 +190,9 @@ class FunctionCallingLlm:
             config = yaml.safe_load(yaml_file)
         llm_info = config['llm']
         prod_mode = config['prod_mode']
+        tool_execution_info = config.get('tool_execution', {}) or {}
 
-        return (llm_info, prod_mode)
+        return (llm_info, prod_mode, tool_execution_info)
 
     def set_llm(self) -> BaseChatModel:
         """
@@ -242,11 +258,74 @@ class FunctionCallingLlm:
 
         return tools_schemas
 
-    def execute(self, invoked_tools: List[Dict[str, Any]]) -> Tuple[bool, List[str]]:
+    def _get_tools_executor(self) -> ThreadPoolExecutor:
+        with self._tools_executor_lock:
+            if self._tools_executor is None:
+                self._tools_executor = ThreadPoolExecutor(
+                    max_workers=self.tool_execution_info.get('max_concurrent_tools', DEFAULT_MAX_CONCURRENT_TOOLS)
+                )
+            return self._tools_executor
+
+    def get_tool_timeout(self, tool_name: str) -> float:
         """
-        Given a list of tool executions the llm return as required
-        execute them given the name with the mane in tools_map and the input arguments
-        if there is only one tool call and it is default conversational one, the response is marked as final response
+        Get the maximum number of seconds to wait for a tool.
+
+        Args:
+            tool_name (str): The name of the tool.
+        """
+        timeouts = self.tool_execution_info.get('timeouts', {}) or {}
+        timeout: float = timeouts.get(tool_name, self.tool_execution_info.get('default_timeout', DEFAULT_TOOL_TIMEOUT))
+        return timeout
+
+    def _get_tool_lock(self, tool_name: str) -> Optional[threading.Lock]:
+        """
+        Get the lock to hold while running a tool, so the tools which are not thread safe run one at a time.
+
+        Args:
+            tool_name (str): The name of the tool.
+
+        Returns:
+            Optional[threading.Lock]: The lock of the tool, or None if the tool is thread safe.
+        """
+        serialized_tools = self.tool_execution_info.get('serialized_tools', DEFAULT_SERIALIZED_TOOLS) or []
+        if tool_name not in serialized_tools:
+            return None
+        with _serialized_tool_locks_lock:
+            return _serialized_tool_locks.setdefault(tool_name, threading.Lock())
+
+    def _invoke_tool(
+        self,
+        tool: Union[StructuredTool, Tool],
+        tool_input: Any,
+        position: int,
+        start_times: Dict[int, float],
+        start_deadline: float,
+    ) -> str:
+        # a tool which did not get its lock before its start deadline is abandoned, e.g. behind a hung run
+        lock = self._get_tool_lock(tool.name)
+        if lock is not None and not lock.acquire(timeout=max(0.0, start_deadline - time.time())):
+            raise TimeoutError(f'waited for the previous {tool.name} run until the start deadline')
+        try:
+            # the timeout of the tool starts once it runs, not while it waits for a worker or for its lock
+            start_times[position] = time.time()
+            print(f'\n\n---\nTool {tool.name} invoked with input {tool_input}\n')
+            response = tool.invoke(tool_input)
+            print(f'Tool {tool.name} response: {str(response)}\n---\n\n')
+        finally:
+            if lock is not None:
+                lock.release()
+        return str(response)
+
+    def iter_execute(self, invoked_tools: List[Dict[str, Any]]) -> Iterator[Tuple[int, str]]:
+        """
+        Execute the tool calls concurrently, yielding the response of each tool as soon as it finishes.
+        The tools invoked in the same llm response are independent, given the llm is instructed to not call a tool
+        depending on the output of another one, so they can run at the same time, except the serialized tools,
+        which are not thread safe and run one at a time.
+        A tool failing or exceeding its timeout yields an error message, so the llm can react to it.
+        The timeout of a tool starts when it starts running. A timed out tool is abandoned, its result is ignored,
+        but its thread can not be interrupted, so it keeps its worker until it finishes.
+        A tool waiting for a worker or for its lock longer than its timeout, e.g. behind hung tools, is abandoned too.
 
         Args:
             invoked_tools (List[dict]): The list of tool executions generated by the LLM.
@@ -256,18 +335,99 @@ class FunctionCallingLlm:
         else:
             tools_map = {}
         tool_msg = "Tool '{name}'response: {response}"
-        tools_msgs = []
-        if len(invoked_tools) == 1 and invoked_tools[0]['tool'].lower() == 'conversationalresponse':
+        tool_error_msg = "Tool '{name}' error: {error}"
+
+        # start time of the running tools, by position, set by the workers
+        start_times: Dict[int, float] = {}
+        # position, name, timeout and submission time of the tools not finished yet
+        pending: Dict[Future[str], Tuple[int, str, float, float]] = {}
+        for position, tool in enumerate(invoked_tools):
+            name = tool['tool']
+            if name.lower() == 'conversationalresponse':
+                continue
+            if name.lower() not in tools_map:
+                yield position, tool_error_msg.format(name=name, error='tool not found')
+                continue
+            timeout = self.get_tool_timeout(name.lower())
+            submitted_at = time.time()
+            future = self._get_tools_executor().submit(
+                self._invoke_tool,
+                tools_map[name.lower()],
+                tool.get('tool_input', {}),
+                position,
+                start_times,
+                submitted_at + timeout,
+            )
+            pending[future] = (position, name, timeout, submitted_at)
+
+        def get_deadline(position: int, timeout: float, submitted_at: float) -> float:
+            # a started tool has its timeout to finish, a waiting one has its timeout to start
+            return start_times.get(position, submitted_at) + timeout
+
+        while len(pending) > 0:
+            # the deadline of a waiting tool can only move later once it starts, so it is checked again then
+            next_deadline = min(
+                get_deadline(position, timeout, submitted_at) for position, _, timeout, submitted_at in pending.values()
+            )
+            done, _ = wait(pending, timeout=max(0.0, next_deadline - time.time()), return_when=FIRST_COMPLETED)
+            for future in done:
+                position, name, _, _ = pending.pop(future)
+                try:
+                    yield position, tool_msg.format(name=name, response=future.result())
+                except Exception as e:
+                    print(f'Tool {name} failed: {e}')
+                    yield position, tool_error_msg.format(name=name, error=str(e))
+            now = time.time()
+            for future, (position, name, timeout, submitted_at) in list(pending.items()):
+                if get_deadline(position, timeout, submitted_at) > now:
+                    continue
+                del pending[future]
+                if position in start_times:
+                    # the tool thread can not be interrupted, its result will be ignored
+                    print(f'Tool {name} timed out')
+                    yield position, tool_error_msg.format(name=name, error=f'timed out after {timeout}s')
+                else:
+                    # the tool is dropped from the queue of the executor, or gives up waiting for its lock
+                    future.cancel()
+                    print(f'Tool {name} did not start in time')
+                    yield position, tool_error_msg.format(name=name, error=f'did not start within {timeout}s')
+
+    def is_final_response(self, invoked_tools: List[Dict[str, Any]]) -> bool:
+        """
+        Check if the llm response is a final conversational response, and not a list of tool executions
+
+        Args:
+            invoked_tools (List[dict]): The list of tool executions generated by the LLM.
+        """
+        return len(invoked_tools) == 1 and invoked_tools[0]['tool'].lower() == 'conversationalresponse'
+
+    def execute(
+        self, invoked_tools: List[Dict[str, Any]], on_tool_result: Optional[Callable[[str], None]] = None
+    ) -> Tuple[bool, List[str]]:
+        """
+        Given a list of tool executions the llm return as required
+        execute them concurrently given the name with the mane in tools_map and the input arguments
+        if there is only one tool call and it is default conversational one, the response is marked as final response
+
+        Args:
+            invoked_tools (List[dict]): The list of tool executions generated by the LLM.
+            on_tool_result (Optional[Callable[[str], None]]): Function called with each tool response message
+                as soon as the tool finishes.
+
+        Returns:
+            Tuple[bool, List[str]]: Whether the response is final, and the tool response messages
+                in the order of the tool executions.
+        """
+        if self.is_final_response(invoked_tools):
             final_answer = True
             return final_answer, [invoked_tools[0]['tool_input']['response']]
-        for tool in invoked_tools:
-            final_answer = False
-            if tool['tool'].lower() != 'conversationalresponse':
-                print(f"\n\n---\nTool {tool['tool'].lower()} invoked with input {tool['tool_input']}\n")
-                response = tools_map[tool['tool'].lower()].invoke(tool['tool_input'])
-                print(f'Tool response: {str(response)}\n---\n\n')
-                tools_msgs.append(tool_msg.format(name=tool['tool'], response=str(response)))
-        return final_answer, tools_msgs
+        final_answer = False
+        tools_msgs: Dict[int, str] = {}
+        for position, message in self.iter_execute(invoked_tools):
+            tools_msgs[position] = message
+            if on_tool_result is not None:
+                on_tool_result(message)
+        return final_answer, [tools_msgs[position] for position in sorted(tools_msgs)]
 
     def jsonFinder(self, input_message: BaseMessage) -> Optional[str]:
         """
@@ -306,13 +466,24 @@ class FunctionCallingLlm:
             json_str = json.dumps(dummy_json_response)
         return json_str
 
-    def function_call_llm(self, query: str, max_it: int = 5) -> str:
+    def function_call_llm(
+        self,
+        query: str,
+        max_it: int = 5,
+        stream_tool_results: bool = False,
+        on_tool_result: Optional[Callable[[str], None]] = None,
+    ) -> str:
         """
         invocation method for function calling workflow
 
         Args:
             query (str): The query to execute.
             max_it (int, optional): The maximum number of iterations. Defaults to 5.
+            stream_tool_results (bool, optional): Whether to add each tool response to the conversation as its own
+                message as soon as the tool finishes, instead of a single message with all the tool responses
+                in the order of the tool executions. Defaults to False.
+            on_tool_result (Optional[Callable[[str], None]]): Function called with each tool response message
+                as soon as the tool finishes.
         """
         function_calling_chat_template = ChatPromptTemplate.from_messages([('system', self.system_prompt)])
         history = function_calling_chat_template.format_prompt(tools=self.tools_schemas).to_messages()
@@ -326,7 +497,14 @@ class FunctionCallingLlm:
             print(f'\nFunction calling LLM response: \n{llm_response}\n---\n')
             parsed_tools_llm_response = json_parsing_chain.invoke(llm_response)
             history.append(llm_response)
-            final_answer, tools_msgs = self.execute(parsed_tools_llm_response)
+            if stream_tool_results and not self.is_final_response(parsed_tools_llm_response):
+                for _, tool_msg in self.iter_execute(parsed_tools_llm_response):
+                    history.append(ToolMessage(tool_msg, tool_call_id=tool_call_id))
+                    tool_call_id += 1
+                    if on_tool_result is not None:
+                        on_tool_result(tool_msg)
+                continue
+            final_answer, tools_msgs = self.execute(parsed_tools_llm_response, on_tool_result=on_tool_result)
             if final_answer:  # if response was marked as final response in execution
                 final_response = tools_msgs[0]
                 print('\n\n---\nFinal function calling LLM history: \n')
@@ -14,12 +14,15 @@ Returns:
 import logging
 import os
 import sys
+import tempfile
 
 # from time import sleep
 import time
 import unittest
 from typing import Any, Dict, List, Type
 
+import yaml
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -32,7 +35,10 @@ repo_dir = os.path.abspath(os.path.join(kit_dir, '..'))  # absolute path for ai-
 sys.path.append(kit_dir)
 sys.path.append(repo_dir)
 
-from function_calling.src.function_calling import FunctionCallingLlm
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.tools import StructuredTool
+
+from function_calling.src.function_calling import CONFIG_PATH, FunctionCallingLlm
 from function_calling.src.tools import QueryDb, calculator, get_time, python_repl
 
 tools = ['get_time', 'calculator', 'python_repl', 'query_db']
@@ -110,6 +116,122 @@ class FCTestCase(unittest.TestCase):
         logger.info(f'Total execution time: {total_time:.2f} seconds')
 
 
+def sleep_tool(seconds: float) -> str:
+    """Sleep for some seconds and return the number of seconds."""
+    time.sleep(seconds)
+    return str(seconds)
+
+
+def failing_tool(message: str) -> str:
+    """Raise an error with the given message."""
+    raise ValueError(message)
+
+
+class OfflineFunctionCallingLlm(FunctionCallingLlm):
+    """Function calling llm without llm, to run the tools offline."""
+
+    def set_llm(self) -> BaseChatModel:
+        return None  # type: ignore
+
+
+class ParallelToolsTestCase(unittest.TestCase):
+    temp_dir: tempfile.TemporaryDirectory  # type: ignore
+    config_path: str
+
+    @classmethod
+    def setUpClass(cls: Type['ParallelToolsTestCase']) -> None:
+        with open(CONFIG_PATH) as yaml_file:
+            config = yaml.safe_load(yaml_file)
+        config['tool_execution'] = {
+            'max_concurrent_tools': 4,
+            'default_timeout': 5,
+            'timeouts': {'slow_tool': 0.3, 'hung_tool': 0.3},
+            'serialized_tools': ['serialized_tool', 'hung_tool'],
+        }
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.config_path = os.path.join(cls.temp_dir.name, 'config.yaml')
+        with open(cls.config_path, 'w') as yaml_file:
+            yaml.safe_dump(config, yaml_file)
+
+    @classmethod
+    def tearDownClass(cls: Type['ParallelToolsTestCase']) -> None:
+        cls.temp_dir.cleanup()
+
+    def get_fc(self) -> FunctionCallingLlm:
+        tools = [
+            StructuredTool.from_function(sleep_tool, name=name, description=f'{name} sleeping some seconds')
+            for name in ['sleep_tool', 'slow_tool', 'serialized_tool', 'hung_tool']
+        ]
+        tools.append(StructuredTool.from_function(failing_tool, name='failing_tool'))
+        return OfflineFunctionCallingLlm(tools=tools, config_path=self.config_path)  # type: ignore
+
+    def test_concurrent_execution_in_call_order(self) -> None:
+        fc = self.get_fc()
+        invoked_tools = [{'tool': 'sleep_tool', 'tool_input': {'seconds': 0.4 - 0.1 * index}} for index in range(4)]
+        time_start = time.time()
+        final_answer, messages = fc.execute(invoked_tools)
+        self.assertLess(time.time() - time_start, 0.8, 'the tools should run concurrently')
+        self.assertFalse(final_answer)
+        # the responses are in the order of the calls, not of completion
+        self.assertEqual(messages, [f"Tool 'sleep_tool'response: {0.4 - 0.1 * index}" for index in range(4)])
+
+    def test_yield_in_completion_order(self) -> None:
+        fc = self.get_fc()
+        invoked_tools = [{'tool': 'sleep_tool', 'tool_input': {'seconds': seconds}} for seconds in [0.3, 0.0]]
+        self.assertEqual([position for position, _ in fc.iter_execute(invoked_tools)], [1, 0])
+
+    def test_errors_and_timeouts(self) -> None:
+        fc = self.get_fc()
+        invoked_tools = [
+            {'tool': 'slow_tool', 'tool_input': {'seconds': 2}},
+            {'tool': 'failing_tool', 'tool_input': {'message': 'wrong input'}},
+            {'tool': 'unknown_tool', 'tool_input': {}},
+            {'tool': 'sleep_tool', 'tool_input': {'seconds': 0.1}},
+        ]
+        time_start = time.time()
+        _, messages = fc.execute(invoked_tools)
+        self.assertLess(time.time() - time_start, 1.5, 'the slow tool should time out')
+        self.assertEqual(messages[0], "Tool 'slow_tool' error: timed out after 0.3s")
+        self.assertEqual(messages[1], "Tool 'failing_tool' error: wrong input")
+        self.assertEqual(messages[2], "Tool 'unknown_tool' error: tool not found")
+        self.assertEqual(messages[3], "Tool 'sleep_tool'response: 0.1")
+
+    def test_serialized_tools(self) -> None:
+        fc = self.get_fc()
+        invoked_tools = [{'tool': 'serialized_tool', 'tool_input': {'seconds': 0.2}} for _ in range(3)]
+        time_start = time.time()
+        _, messages = fc.execute(invoked_tools)
+        self.assertGreaterEqual(time.time() - time_start, 0.6, 'the serialized tool should run one at a time')
+        # the timeout of a serialized tool starts when it runs, not while it waits for the other calls
+        self.assertEqual(messages, ["Tool 'serialized_tool'response: 0.2"] * 3)
+
+    def test_hung_serialized_tool(self) -> None:
+        fc = self.get_fc()
+        invoked_tools = [{'tool': 'hung_tool', 'tool_input': {'seconds': 2}} for _ in range(2)]
+        time_start = time.time()
+        _, messages = fc.execute(invoked_tools)
+        self.assertEqual(messages[0], "Tool 'hung_tool' error: timed out after 0.3s")
+        # the next runs do not wait forever behind the hung run holding the lock
+        _, next_messages = fc.execute(invoked_tools[:1])
+        self.assertLess(time.time() - time_start, 1.5, 'the runs waiting for the lock should time out')
+        for message in messages[1:] + next_messages:
+            self.assertTrue(message.startswith("Tool 'hung_tool' error:"), message)
+
+    def test_busy_workers(self) -> None:
+        fc = self.get_fc()
+        # the hung tools keep all the workers after their timeout
+        fc.execute([{'tool': 'slow_tool', 'tool_input': {'seconds': 1.5}} for _ in range(4)])
+        time_start = time.time()
+        _, messages = fc.execute([{'tool': 'slow_tool', 'tool_input': {'seconds': 0.1}}])
+        self.assertLess(time.time() - time_start, 0.8, 'the tool waiting for a worker should time out')
+        self.assertEqual(messages, ["Tool 'slow_tool' error: did not start within 0.3s"])
+
+    def test_final_response(self) -> None:
+        fc = self.get_fc()
+        invoked_tools = [{'tool': 'ConversationalResponse', 'tool_input': {'response': 'done'}}]
+        self.assertEqual(fc.execute(invoked_tools), (True, ['done']))
+
+
 class CustomTextTestResult(unittest.TextTestResult):
     test_results: List[Dict[str, Any]]
 
@@ -131,7 +253,12 @@ class CustomTextTestResult(unittest.TextTestResult):
 
 
 def main() -> int:
-    suite = unittest.TestLoader().loadTestsFromTestCase(FCTestCase)
+    suite = unittest.TestSuite(
+        [
+            unittest.TestLoader().loadTestsFromTestCase(FCTestCase),
+            unittest.TestLoader().loadTestsFromTestCase(ParallelToolsTestCase),
+        ]
+    )
     test_result = unittest.TextTestRunner(resultclass=CustomTextTestResult).run(suite)
 
     logger.info('\nTest Results:')
@@ -18,7 +18,8 @@ import json
 import shutil
 import tarfile
 import time
-from typing import Any, Dict, Optional
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
 import pandas as pd
 import requests
@@ -26,6 +27,8 @@ import yaml
 from dotenv import load_dotenv
 from pandas import DataFrame
 
+from utils.batch_inference.job_orchestrator import BatchJobOrchestrator, BatchJobResult, get_orchestrator_kwargs
+
 load_dotenv(os.path.join(repo_dir, '.env'))
 
 PENDING_RDU_JOB_STATUS = 'PENDING_RDU'
@@ -77,6 +80,8 @@ class BatchClipProcessor:
 
         self.output_path = self.config['clip']['output']['output_path']
 
+        self.orchestrator = BatchJobOrchestrator(self, **get_orchestrator_kwargs(self.config['clip']))
+
     def _load_config(self, file_path: str) -> Any:
         """Loads a YAML configuration file.
 
@@ -215,16 +220,37 @@ class BatchClipProcessor:
         Args:
             dataset_name (str): The name of the dataset to delete.
         """
-        dataset_id = self.search_dataset(dataset_name)
-        url = self.base_url + self.datasets_url + '/' + dataset_id
-        response = self._delete_call(url)
-        logging.info(response.text)
+        try:
+            dataset_id = self.search_dataset(dataset_name)
+            url = self.base_url + self.datasets_url + '/' + dataset_id
+            response = self._delete_call(url)
+            logging.info(response.text)
+        finally:
+            self._delete_local_dataset(dataset_name)
+
+    def _get_dataset_source_file(self, dataset_name: str) -> str:
+        """Get the path of the source file of a dataset, one per dataset, read by snapi when adding the dataset."""
+        source_file_root, source_file_extension = os.path.splitext(self.dataset_source_file)
+        return f'{source_file_root}_{dataset_name}{source_file_extension}'
+
+    def _delete_local_dataset(self, dataset_name: str) -> None:
+        """Delete the source file and the local copy of the files of a dataset.
+
+        Args:
+            dataset_name (str): The name of the dataset.
+        """
+        dataset_source_file = self._get_dataset_source_file(dataset_name)
+        if os.path.exists(dataset_source_file):
+            os.remove(dataset_source_file)
+        shutil.rmtree(os.path.join(self.datasets_path, dataset_name), ignore_errors=True)
 
-    def create_dataset(self, path: str) -> str:
+    def create_dataset(self, path: str, image_paths: Optional[List[str]] = None) -> str:
         """Create a dataset for openclip batch inference in SambaStudio.
 
         Args:
             path (str): The path to the audio files to create the dataset from.
+            image_paths (List[str], optional): The paths of the images to include, relative to `path`.
+                Defaults to all the files in `path`.
 
         Returns:
             dataset_name (str): The name of the created dataset.
@@ -232,24 +258,36 @@ class BatchClipProcessor:
 
         # create clip directory and source.json file
 
-        dataset_name = f'{self.dataset_name}_{int(time.time())}'
+        # unique name, so several datasets can be created concurrently
+        dataset_name = f'{self.dataset_name}_{int(time.time())}_{uuid.uuid4().hex[:8]}'
+        dataset_source_file = self._get_dataset_source_file(dataset_name)
 
         clip_directory = os.path.join(self.datasets_path, dataset_name)
 
-        if not os.path.isdir(self.datasets_path):
-            os.mkdir(self.datasets_path)
+        os.makedirs(self.datasets_path, exist_ok=True)
 
         if not os.path.isdir(clip_directory):
             logging.info(f'Datasets path: {clip_directory} not found')
 
             source_file_data = {'source_path': clip_directory}
 
-            with open(self.dataset_source_file, 'w') as json_file:
+            with open(dataset_source_file, 'w') as json_file:
                 json.dump(source_file_data, json_file)
 
-        shutil.copytree(path, clip_directory)
-
-        self._generate_csv(clip_directory)
+        try:
+            if image_paths is None:
+                shutil.copytree(path, clip_directory)
+            else:
+                for image_path in image_paths:
+                    destination_path = os.path.join(clip_directory, image_path)
+                    os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+                    shutil.copy2(os.path.join(path, image_path), destination_path)
+
+            self._generate_csv(clip_directory)
+        except Exception:
+            # the dataset is not created, so it is not deleted by delete_dataset
+            self._delete_local_dataset(dataset_name)
+            raise
 
         # create dataset
         command = f'echo yes | snapi dataset add \
@@ -257,7 +295,7 @@ class BatchClipProcessor:
             --job_type {self.job_type} \
             --apps {self.clip_app_id} \
             --source_type {self.dataset_source_type} \
-            --source_file {self.dataset_source_file} \
+            --source_file {dataset_source_file} \
             --description "{self.dataset_description}"'
 
         os.system(command)
@@ -318,7 +356,7 @@ class BatchClipProcessor:
         params = {
             'task': self.job_task,
             'job_type': self.job_type,
-            'job_name': f'{self.job_name}_{int(time.time())}',
+            'job_name': f'{self.job_name}_{int(time.time())}_{uuid.uuid4().hex[:8]}',
             'project': self.project_id,
             'model_checkpoint': self.model_checkpoint,
             'description': self.job_description,
@@ -331,6 +369,22 @@ class BatchClipProcessor:
 
         return job_id
 
+    def get_job_status(self, job_id: str) -> str:
+        """Get the status of a given job.
+
+        Args:
+            job_id (str): The id of the job to check.
+
+        Returns:
+            str: The status of the job.
+        """
+        url = self.base_url + self.projects_url + self.jobs_url.format(project_id=self.project_id) + '/' + job_id
+        response = self._get_call(url, success_message='Still waiting for job to finish')
+        parsed_reponse = json.loads(response.text)
+        status: str = parsed_reponse['data']['status']
+        logging.info(f'Job status: {status}')
+        return status
+
     def check_job_progress(self, job_id: str) -> bool:
         """Check job progress of a given job.
 
@@ -340,15 +394,9 @@ class BatchClipProcessor:
         Returns:
             bool: True when the job is finished.
         """
-
-        url = self.base_url + self.projects_url + self.jobs_url.format(project_id=self.project_id) + '/' + job_id
-
         status = PENDING_RDU_JOB_STATUS
         while status != SUCCESS_JOB_STATUS:
-            response = self._get_call(url, success_message='Still waiting for job to finish')
-            parsed_reponse = json.loads(response.text)
-            status = parsed_reponse['data']['status']
-            logging.info(f'Job status: {status}')
+            status = self.get_job_status(job_id)
             if status == SUCCESS_JOB_STATUS:
                 logging.info('Job finished!')
                 break
@@ -389,27 +437,30 @@ class BatchClipProcessor:
         df = self._get_df_output(response.content)
         return df
 
-    def process_images(self, path: str) -> DataFrame:
+    def process_images(self, path: str, image_paths: Optional[List[str]] = None) -> DataFrame:
         """Process and generate embedding for images in SambaStudio.
 
         Args:
             path (str): The path with contining images to process.
+            image_paths (List[str], optional): The paths of the images to process, relative to `path`.
+                Defaults to all the images in `path`.
         Returns:
             df (pandas.DataFrame): The results of the batch inference job.
         """
-        self.create_load_project()
-        dataset_name = self.create_dataset(path=path)
-        while not self.check_dataset_creation_progress(dataset_name):
-            print('waiting for dataset available')
-            time.sleep(5)
-        job_id = self.run_job(dataset_name)
-        job_finished = self.check_job_progress(job_id)
-        if job_finished:
-            df = self.retrieve_results(job_id)
-            self.delete_job(job_id)
-            self.delete_dataset(dataset_name)
-            return df
-        else:
-            self.delete_job(job_id)
-            self.delete_dataset(dataset_name)
-            raise Exception('Job failed!')
+        [result] = list(self.process_image_folders([path], image_paths=image_paths))
+        if result.error is not None:
+            raise Exception('Job failed!') from result.error
+        df: DataFrame = result.result
+        return df
+
+    def process_image_folders(self, paths: Iterable[str], **dataset_kwargs: Any) -> Iterator[BatchJobResult]:
+        """Process several image folders in SambaStudio, with one dataset and one job per folder running concurrently.
+
+        Args:
+            paths (Iterable[str]): The paths of the folders containing the images to process.
+            **dataset_kwargs: Additional arguments for the dataset creation of each folder.
+        Yields:
+            BatchJobResult: The result of each folder as soon as its job finishes, with the embeddings
+                dataframe in `result`, or the exception in `error` if the processing failed.
+        """
+        yield from self.orchestrator.run(paths, **dataset_kwargs)
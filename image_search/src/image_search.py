@@ -9,7 +9,10 @@ sys.path.append(kit_dir)
 sys.path.append(repo_dir)
 
 import io
-from typing import Any, List, Optional, Tuple, TypeVar, Union
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Iterator, List, Optional, Set, Tuple, TypeVar, Union
 
 import chromadb
 import numpy as np
@@ -20,37 +23,82 @@ from dotenv import load_dotenv
 from PIL import Image
 
 from image_search.src.clip_batch_inference import BatchClipProcessor
+from image_search.src.ingestion_index import ImageRecord, IngestionIndex
 
 load_dotenv(os.path.join(repo_dir, '.env'))
 
+CONFIG_PATH = os.path.join(kit_dir, 'config.yaml')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
 Embeddable = Union[Documents, Images]
 D = TypeVar('D', bound=Embeddable, contravariant=True)
 
 
 class ClipEmbbeding(EmbeddingFunction[D]):
-    def __init__(self) -> None:
-        pass
+    def __init__(self, max_workers: int = 8, image_size: int = 224) -> None:
+        # number of concurrent embedding requests
+        self.max_workers = max_workers
+        # images whose shortest side is larger than the CLIP input size are downscaled before the upload
+        self.image_size = image_size
+        self._local = threading.local()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def _get_session(self) -> requests.Session:
+        # one session per thread, so the connections to the endpoint are reused between requests
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def load_image_bytes(self, img_path: str) -> bytes:
+        with Image.open(img_path) as image:
+            width, height = image.size
+            scale = self.image_size / min(width, height)
+            if scale < 1:
+                size = (max(1, round(width * scale)), max(1, round(height * scale)))
+                # JPEG images are decoded directly at a reduced scale
+                image.draft('RGB', size)
+                resized_image = image.convert('RGB').resize(size, Image.Resampling.BICUBIC)
+                buffer = io.BytesIO()
+                resized_image.save(buffer, format='JPEG', quality=95)
+                return buffer.getvalue()
+        # send the raw file, without decoding and re-encoding it
+        with open(img_path, 'rb') as file:
+            return file.read()
 
     def embed_image(self, img_path: Optional[str] = None, img: Optional[Any] = None) -> Any:
         base_url = os.environ.get('CLIP_BASE_URL', '')
         api_key = os.environ.get('CLIP_API_KEY', '')
         url = base_url.replace('nlp', 'file')
         if img_path:
-            files = {'predict_file': open(img_path, 'rb')}
+            files = {'predict_file': self.load_image_bytes(img_path)}
         elif img:
             files = {'predict_file': img}
         else:
             raise Exception('please provide a image path or a bytes image file')
         headers = {'key': api_key}
-        response = requests.post(url, files=files, headers=headers)
+        response = self._get_session().post(url, files=files, headers=headers)
+        response.raise_for_status()
         return response.json()['data'][0]
 
+    def embed_image_paths(self, img_paths: List[str]) -> Embeddings:
+        # embed the images concurrently, keeping the order of the paths
+        return list(self._get_executor().map(lambda img_path: self.embed_image(img_path=img_path), img_paths))
+
     def embed_text(self, text: Any) -> Any:
         base_url = os.environ.get('CLIP_BASE_URL', '')
         api_key = os.environ.get('CLIP_API_KEY', '')
         input_data = {'inputs': [text]}
         headers = {'key': api_key, 'Content-Type': 'application/json'}
-        response = requests.post(base_url, json=input_data, headers=headers)
+        response = self._get_session().post(base_url, json=input_data, headers=headers)
         return response.json()['data'][0]
 
     def __call__(self, input: D) -> Any:
@@ -68,12 +116,21 @@ class ClipEmbbeding(EmbeddingFunction[D]):
 
 
 class ImageSearch:
-    def __init__(self, path: Optional[str] = None, embbeding: ClipEmbbeding[Any] = ClipEmbbeding()) -> None:
+    def __init__(self, path: Optional[str] = None, embbeding: Optional[ClipEmbbeding[Any]] = None) -> None:
         if path is None:
-            self.client = chromadb.PersistentClient(path=os.path.join(kit_dir, 'data', 'vector_db'))
-        else:
-            self.client = chromadb.PersistentClient(path=path)
+            path = os.path.join(kit_dir, 'data', 'vector_db')
+        self.db_path = path
+        self.client = chromadb.PersistentClient(path=path)
+        with open(CONFIG_PATH, 'r') as file:
+            self.clip_config = yaml.safe_load(file)['clip']
+        online_config = self.clip_config.get('online_inference', {})
+        if embbeding is None:
+            embbeding = ClipEmbbeding(
+                max_workers=online_config.get('max_workers', 8), image_size=online_config.get('image_size', 224)
+            )
         self.embedding_function = embbeding
+        # number of images embedded and added to the collection at once
+        self.batch_size = online_config.get('batch_size', 64)
 
     def init_collection(self, name: str = 'image_collection', distance: str = 'l2') -> None:
         # try:
@@ -84,41 +141,79 @@ class ImageSearch:
             name=name, embedding_function=self.embedding_function, metadata={'hnsw:space': distance}
         )
         # collection.get()
+        # index of the embedded images, used to skip them when the folder is ingested again
+        self.ingestion_index = IngestionIndex(os.path.join(self.db_path, f'{name}_ingestion_index.sqlite'))
+        if self.collection.count() == 0:
+            self.ingestion_index.clear()
 
-    def get_images(self, folder_path: Optional[str] = None) -> Tuple[List[str], Any]:
+    def iter_image_paths(self, folder_path: Optional[str] = None) -> Iterator[str]:
         if folder_path is None:
             folder_path = os.path.join(kit_dir, 'data', 'images')
-        images = []
-        paths = []
         for root, _dirs, files in os.walk(folder_path):
             for file in files:
-                if file.endswith('.jpg') or file.endswith('.jpeg') or file.endswith('.png'):
-                    path = os.path.join(root, file)
-                    paths.append(path)
-                    image = np.array(Image.open(os.path.join(root, file)))
-                    images.append(image)
+                if file.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(root, file)
+
+    def get_images(self, folder_path: Optional[str] = None) -> Tuple[List[str], Any]:
+        # decodes all the images in memory, use add_images to ingest large folders
+        paths = list(self.iter_image_paths(folder_path))
+        images = [np.array(Image.open(path)) for path in paths]
         print(f'got {len (images)} images')
         return paths, images
 
     def add_images(self, path: Optional[str] = None) -> None:
         if path is None:
             path = os.path.join(kit_dir, 'data', 'images')
-        config_path = os.path.join(kit_dir, 'config.yaml')
-        with open(config_path, 'r') as file:
-            ingestion_mode = yaml.safe_load(file)['clip']['ingestion_mode']
+        # normalized, so the paths of the index, of the collection and of the batch job output match
+        path = os.path.abspath(path)
+        ingestion_mode = self.clip_config['ingestion_mode']
+        if ingestion_mode not in ['batch_inference_job', 'online_inference']:
+            raise Exception(f'ingestion mode {ingestion_mode} not supported')
+
+        # only the new or changed images are embedded
+        seen_paths: Set[str] = set()
+        changed_images = self.ingestion_index.iter_changed_images(self.iter_image_paths(path), seen_paths)
+        num_images = 0
         if ingestion_mode == 'batch_inference_job':
-            clip = BatchClipProcessor(config_path=config_path)
-            df = clip.process_images(path)
-            embeddings = [element['image_vec'] for element in list(df['predictions'])]
-            paths = list(df['image_path'].apply(lambda x: os.path.join(path, x)))
-            self.collection.add(
-                embeddings=embeddings, metadatas=[{'source': path} for path in paths], ids=paths, uris=paths
-            )
-        elif ingestion_mode == 'online_inference':
-            paths, images = self.get_images(path)
-            self.collection.add(images=images, metadatas=[{'source': path} for path in paths], ids=paths, uris=paths)
+            records = {os.path.normpath(record.path): record for record in changed_images}
+            if len(records) > 0:
+                clip = BatchClipProcessor(config_path=CONFIG_PATH)
+                df = clip.process_images(
+                    path, image_paths=[os.path.relpath(record_path, path) for record_path in records]
+                )
+                embeddings = [element['image_vec'] for element in list(df['predictions'])]
+                paths = list(df['image_path'].apply(lambda x: os.path.normpath(os.path.join(path, x))))
+                for start in range(0, len(paths), self.batch_size):
+                    batch_paths = paths[start : start + self.batch_size]
+                    self._upsert_images(
+                        [records[batch_path] for batch_path in batch_paths],
+                        embeddings[start : start + self.batch_size],
+                    )
+                    num_images += len(batch_paths)
+                    print(f'added {num_images} images')
         else:
-            raise Exception(f'ingestion mode {ingestion_mode} not supported')
+            # stream the images in fixed-size batches, so the memory does not grow with the folder size
+            while batch_records := list(islice(changed_images, self.batch_size)):
+                embeddings = self.embedding_function.embed_image_paths([record.path for record in batch_records])
+                self._upsert_images(batch_records, embeddings)
+                num_images += len(batch_records)
+                print(f'added {num_images} images')
+
+        # remove the images deleted from the folder
+        removed_paths = self.ingestion_index.get_removed_paths(path, seen_paths)
+        for start in range(0, len(removed_paths), self.batch_size):
+            batch_paths = removed_paths[start : start + self.batch_size]
+            self.collection.delete(ids=batch_paths)
+            self.ingestion_index.remove(batch_paths)
+        print(f'{len(seen_paths) - num_images} images up to date, {len(removed_paths)} images removed')
+
+    def _upsert_images(self, records: List[ImageRecord], embeddings: Any) -> None:
+        paths = [record.path for record in records]
+        self.collection.upsert(
+            embeddings=embeddings, metadatas=[{'source': path} for path in paths], ids=paths, uris=paths
+        )
+        # checkpoint the ingestion, so an interrupted ingestion resumes after the last upserted batch
+        self.ingestion_index.commit(records)
 
     def search_image_by_text(self, query: str, n: int = 5) -> Any:
         result = self.collection.query(query_texts=[query], include=['uris', 'distances'], n_results=n)
@@ -0,0 +1,143 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Set
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class ImageRecord(NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
+    content_hash: str
+
+
+def hash_file(path: str) -> str:
+    """Compute the SHA-256 hash of the content of a file.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        str: The hexadecimal hash of the file content.
+    """
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+class IngestionIndex:
+    def __init__(self, index_path: str) -> None:
+        """
+        Initialize the index of the images already embedded in a collection.
+
+        The index is a SQLite database storing the path, size, modification time, and content hash
+        of each image, so that only the new or changed images are embedded again.
+
+        Args:
+            index_path (str): The path of the SQLite database, stored alongside the Chroma collection.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+        self.index_path = index_path
+        # the index can be used from the different threads of the streamlit app
+        self._connection = sqlite3.connect(index_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS images '
+                '(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, content_hash TEXT)'
+            )
+
+    def _get_record(self, path: str) -> Optional[ImageRecord]:
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT path, size, mtime_ns, content_hash FROM images WHERE path = ?', (path,)
+            ).fetchone()
+        return ImageRecord(*row) if row is not None else None
+
+    def check_image(self, path: str) -> Optional[ImageRecord]:
+        """Check if an image is new or changed since it was indexed.
+
+        The content is only hashed when the size or the modification time changed.
+
+        Args:
+            path (str): The path of the image.
+
+        Returns:
+            ImageRecord: The record of the image to embed, or None if the indexed image is up to date.
+        """
+        stat = os.stat(path)
+        indexed_record = self._get_record(path)
+        if (
+            indexed_record is not None
+            and indexed_record.size == stat.st_size
+            and indexed_record.mtime_ns == stat.st_mtime_ns
+        ):
+            return None
+
+        record = ImageRecord(path, stat.st_size, stat.st_mtime_ns, hash_file(path))
+        if indexed_record is not None and indexed_record.content_hash == record.content_hash:
+            # the file was touched or copied without changing its content
+            self.commit([record])
+            return None
+        return record
+
+    def iter_changed_images(self, image_paths: Iterable[str], seen_paths: Set[str]) -> Iterator[ImageRecord]:
+        """Lazily yield the new or changed images.
+
+        Args:
+            image_paths (Iterable[str]): The paths of the images to check.
+            seen_paths (Set[str]): The set to which the checked paths are added, to find the removed images.
+
+        Yields:
+            ImageRecord: The records of the images to embed.
+        """
+        for path in image_paths:
+            seen_paths.add(path)
+            record = self.check_image(path)
+            if record is not None:
+                yield record
+
+    def commit(self, records: List[ImageRecord]) -> None:
+        """Record images as embedded, checkpointing the ingestion.
+
+        Args:
+            records (List[ImageRecord]): The records of the embedded images.
+        """
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO images (path, size, mtime_ns, content_hash) VALUES (?, ?, ?, ?)', records
+            )
+
+    def get_removed_paths(self, folder_path: str, seen_paths: Set[str]) -> List[str]:
+        """Get the indexed images of a folder which are not in it anymore.
+
+        Args:
+            folder_path (str): The path of the ingested folder.
+            seen_paths (Set[str]): The paths of the images found in the folder.
+
+        Returns:
+            List[str]: The paths of the removed images.
+        """
+        folder_prefix = os.path.join(folder_path, '')
+        with self._lock:
+            indexed_paths = [row[0] for row in self._connection.execute('SELECT path FROM images')]
+        return [path for path in indexed_paths if path.startswith(folder_prefix) and path not in seen_paths]
+
+    def remove(self, paths: List[str]) -> None:
+        """Remove images from the index.
+
+        Args:
+            paths (List[str]): The paths of the images to remove.
+        """
+        with self._lock, self._connection:
+            self._connection.executemany('DELETE FROM images WHERE path = ?', [(path,) for path in paths])
+
+    def clear(self) -> None:
+        """Remove all the images from the index."""
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM images')
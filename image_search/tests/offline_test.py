@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Image Search Offline Test Script
+
+This script tests the ingestion of the Image Search kit using unittest, with a fake CLIP embedding instead of the
+CLIP endpoint.
+
+Test cases:
+    StreamingIngestionTestCase: checks the downscaling of the uploaded images and the ingestion in batches
+    IngestionIndexTestCase: checks that only the new or changed images are embedded again
+
+Usage:
+    python tests/offline_test.py
+
+Returns:
+    0 if all tests pass, or 1 otherwise.
+"""
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from typing import Any, List, Optional
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+kit_dir = os.path.abspath(os.path.join(current_dir, '..'))
+repo_dir = os.path.abspath(os.path.join(kit_dir, '..'))
+
+sys.path.append(kit_dir)
+sys.path.append(repo_dir)
+
+from PIL import Image
+
+from image_search.src.image_search import ClipEmbbeding, ImageSearch
+
+IMAGE_TEST_DATA_PATH = os.path.join(kit_dir, 'tests', 'data')
+NUM_IMAGES = 5
+
+
+class FakeClipEmbedding(ClipEmbbeding[Any]):
+    """CLIP embedding returning a vector computed from the image size, and recording the embedded images."""
+
+    def __init__(self) -> None:
+        super().__init__(max_workers=2)
+        self.embedded_paths: List[str] = []
+        self._paths_lock = threading.Lock()
+
+    def embed_image(self, img_path: Optional[str] = None, img: Optional[Any] = None) -> Any:
+        assert img_path is not None
+        with self._paths_lock:
+            self.embedded_paths.append(img_path)
+        return [float(os.path.getsize(img_path)), 1.0]
+
+
+class IngestionTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.images_path = os.path.join(self.temp_dir.name, 'images')
+        os.makedirs(os.path.join(self.images_path, 'nested'))
+        sample_paths = [os.path.join(IMAGE_TEST_DATA_PATH, name) for name in ['sample.png', 'sample2.jpg']]
+        for index in range(NUM_IMAGES):
+            _, extension = os.path.splitext(sample_paths[index % 2])
+            folder = self.images_path if index % 2 == 0 else os.path.join(self.images_path, 'nested')
+            shutil.copy(sample_paths[index % 2], os.path.join(folder, f'image_{index}{extension}'))
+        with open(os.path.join(self.images_path, 'notes.txt'), 'w') as file:
+            file.write('not an image')
+
+        self.embedding = FakeClipEmbedding()
+        self.image_search = ImageSearch(path=os.path.join(self.temp_dir.name, 'vector_db'), embbeding=self.embedding)
+        self.image_search.clip_config['ingestion_mode'] = 'online_inference'
+        self.image_search.batch_size = 2
+        self.image_search.init_collection()
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+
+class StreamingIngestionTestCase(IngestionTestCase):
+    def test_load_image_bytes_downscales(self) -> None:
+        embedding = ClipEmbbeding(image_size=16)
+        for name in ['sample.png', 'sample2.jpg']:
+            with Image.open(io.BytesIO(embedding.load_image_bytes(os.path.join(IMAGE_TEST_DATA_PATH, name)))) as image:
+                self.assertEqual(min(image.size), 16)
+
+    def test_load_image_bytes_keeps_small_images(self) -> None:
+        embedding = ClipEmbbeding(image_size=100000)
+        image_path = os.path.join(IMAGE_TEST_DATA_PATH, 'sample.png')
+        with open(image_path, 'rb') as file:
+            self.assertEqual(embedding.load_image_bytes(image_path), file.read())
+
+    def test_embed_image_paths_keeps_order(self) -> None:
+        image_paths = sorted(self.image_search.iter_image_paths(self.images_path))
+        embeddings = self.embedding.embed_image_paths(image_paths)
+        self.assertEqual(embeddings, [[float(os.path.getsize(path)), 1.0] for path in image_paths])
+
+    def test_add_images_in_batches(self) -> None:
+        self.image_search.add_images(self.images_path)
+        self.assertEqual(self.image_search.collection.count(), NUM_IMAGES)
+        self.assertEqual(
+            sorted(self.embedding.embedded_paths), sorted(self.image_search.iter_image_paths(self.images_path))
+        )
+
+
+class IngestionIndexTestCase(IngestionTestCase):
+    def test_skip_indexed_images(self) -> None:
+        self.image_search.add_images(self.images_path)
+        self.embedding.embedded_paths.clear()
+        # a relative folder with a trailing slash is the same folder
+        self.image_search.add_images(os.path.join(os.path.relpath(self.images_path), ''))
+        self.assertEqual(self.embedding.embedded_paths, [])
+        self.assertEqual(self.image_search.collection.count(), NUM_IMAGES)
+
+    def test_touched_image_not_embedded(self) -> None:
+        self.image_search.add_images(self.images_path)
+        self.embedding.embedded_paths.clear()
+        # the modification time changes, but not the content
+        image_path = os.path.join(self.images_path, 'image_0.png')
+        os.utime(image_path, ns=(0, 0))
+        self.image_search.add_images(self.images_path)
+        self.assertEqual(self.embedding.embedded_paths, [])
+
+    def test_changed_added_and_removed_images(self) -> None:
+        self.image_search.add_images(self.images_path)
+        self.embedding.embedded_paths.clear()
+        changed_path = os.path.join(self.images_path, 'image_0.png')
+        with open(changed_path, 'ab') as file:
+            file.write(b'\0')
+        added_path = os.path.join(self.images_path, 'image_new.png')
+        shutil.copy(os.path.join(IMAGE_TEST_DATA_PATH, 'sample.png'), added_path)
+        removed_path = os.path.join(self.images_path, 'nested', 'image_1.jpg')
+        os.remove(removed_path)
+
+        self.image_search.add_images(self.images_path)
+        self.assertEqual(sorted(self.embedding.embedded_paths), sorted([changed_path, added_path]))
+        self.assertEqual(self.image_search.collection.count(), NUM_IMAGES)
+        self.assertEqual(self.image_search.collection.get(ids=[removed_path])['ids'], [])
+
+    def test_resume_interrupted_ingestion(self) -> None:
+        original_upsert = self.image_search._upsert_images
+        num_batches = 0
+
+        def interrupted_upsert(records: Any, embeddings: Any) -> None:
+            nonlocal num_batches
+            if num_batches == 1:
+                raise RuntimeError('ingestion interrupted')
+            num_batches += 1
+            original_upsert(records, embeddings)
+
+        self.image_search._upsert_images = interrupted_upsert  # type: ignore
+        with self.assertRaises(RuntimeError):
+            self.image_search.add_images(self.images_path)
+        self.image_search._upsert_images = original_upsert  # type: ignore
+        self.embedding.embedded_paths.clear()
+
+        # only the images of the batches which were not upserted are embedded again
+        self.image_search.add_images(self.images_path)
+        self.assertEqual(len(self.embedding.embedded_paths), NUM_IMAGES - self.image_search.batch_size)
+        self.assertEqual(self.image_search.collection.count(), NUM_IMAGES)
+
+
+if __name__ == '__main__':
+    test_program = unittest.main(exit=False)
+    sys.exit(0 if test_program.result.wasSuccessful() else 1)
@@ -13,12 +13,16 @@ from dotenv import load_dotenv
 load_dotenv(os.path.join(repo_dir, '.env'))
 
 import concurrent.futures
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Any, Dict, List, Tuple
 
+import pandas as pd
 import yaml
-from langchain.chains import LLMChain, ReduceDocumentsChain
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains.combine_documents.stuff import StuffDocumentsChain
 from langchain.chains.retrieval import create_retrieval_chain
 from langchain.output_parsers import (
     CommaSeparatedListOutputParser,
@@ -26,13 +30,16 @@ from langchain.output_parsers import (
     ResponseSchema,
     StructuredOutputParser,
 )
-from langchain.prompts import load_prompt
+from langchain.prompts import BasePromptTemplate, load_prompt
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.language_models.llms import LLM
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import Runnable
 
 from utils.model_wrappers.api_gateway import APIGateway
+from utils.summarization.map_reduce import MapReduceSummarizer
 from utils.vectordb.vector_db import VectorDb
 
 CONFIG_PATH = os.path.join(kit_dir, 'config.yaml')
@@ -42,6 +49,8 @@ with open(CONFIG_PATH, 'r') as yaml_file:
 llm_info = config['llm']
 retrieval_info = config['retrieval']
 embedding_model_info = config['embedding_model']
+analysis_info = config.get('analysis', {})
+summarization_info = config.get('summarization', {})
 model = APIGateway.load_llm(
     type=llm_info['api'],
     streaming=True,
@@ -53,6 +62,59 @@ model = APIGateway.load_llm(
     process_prompt=False,
 )
 
+# Global budget of concurrent LLM calls, shared by all the calls being analysed
+llm_call_budget = threading.BoundedSemaphore(analysis_info.get('max_concurrent_llm_calls', 8))
+
+# Facts retrievers, keyed by the fingerprint of their sources
+retrievers: OrderedDict[str, Any] = OrderedDict()
+retrievers_lock = threading.Lock()
+retriever_build_locks: Dict[str, threading.Lock] = {}
+
+# Callback handlers attached to every chain invocation, e.g. to count the generated tokens of a batch analysis
+llm_callbacks: List[BaseCallbackHandler] = []
+
+
+def invoke_with_budget(runnable: Runnable[Any, Any], input: Any) -> Any:
+    """
+    Invoke a chain once a slot of the global LLM call budget is available.
+
+    Args:
+        runnable (Runnable): The chain to invoke.
+        input (Any): The input of the chain.
+
+    Returns:
+        Any: The output of the chain.
+    """
+    with llm_call_budget:
+        return runnable.invoke(input, config={'callbacks': list(llm_callbacks)})
+
+
+@lru_cache(maxsize=None)
+def get_prompt(prompt_name: str) -> BasePromptTemplate:
+    """
+    Load a prompt of the kit once per process.
+
+    Args:
+        prompt_name (str): The name of the prompt file in the prompts directory, without extension.
+
+    Returns:
+        BasePromptTemplate: The loaded prompt.
+    """
+    return load_prompt(os.path.join(kit_dir, f'prompts/{prompt_name}.yaml'))
+
+
+def convert_to_dialogue_structure(transcription: pd.DataFrame) -> str:
+    """Convert a transcription to a dialogue, with one `speaker: text` line per turn
+
+    Args:
+        transcription (pd.DataFrame): The transcription, with `speaker` and `text` columns.
+
+    Returns:
+        str: The dialogue.
+    """
+    lines = transcription['speaker'].astype(str) + ': ' + transcription['text'].astype(str) + '\n'
+    return ''.join(lines)
+
 
 def load_conversation(transcription: str, transcription_path: str) -> List[Document]:
     """Load a conversation as langchain Document
@@ -68,9 +130,32 @@ def load_conversation(transcription: str, transcription_path: str) -> List[Docum
     return [doc]
 
 
+@lru_cache(maxsize=None)
+def get_call_reducer() -> MapReduceSummarizer:
+    """
+    Get the map-reduce summarizer shortening the conversations, shared by all the calls being analysed.
+
+    Returns:
+        MapReduceSummarizer: The summarizer using the reduce prompt.
+    """
+    reduce_prompt = get_prompt('reduce')
+    return MapReduceSummarizer(
+        llm=model,
+        map_prompt=reduce_prompt,
+        reduce_prompt=reduce_prompt,
+        text_variable='transcription_chunks',
+        chunk_size=summarization_info.get('chunk_size', 1000),
+        chunk_overlap=summarization_info.get('chunk_overlap', 50),
+        max_reduce_tokens=summarization_info.get('max_reduce_tokens', 1200),
+        max_concurrency=summarization_info.get('max_concurrency', 8),
+        cache_size=summarization_info.get('cache_size', 1024),
+        invoke_function=invoke_with_budget,
+    )
+
+
 def reduce_call(conversation: List[Document]) -> Any:
     """
-    Reduce the conversation by applying the ReduceDocumentsChain.
+    Reduce the conversation, shortening its chunks concurrently and merging them hierarchically.
 
     Args:
         conversation (List[Document]): The conversation to reduce.
@@ -78,20 +163,8 @@ def reduce_call(conversation: List[Document]) -> Any:
     Returns:
         str: The reduced conversation.
     """
-    reduce_prompt = load_prompt(os.path.join(kit_dir, 'prompts/reduce.yaml'))
-    reduce_chain = LLMChain(llm=model, prompt=reduce_prompt)
-    combine_documents_chain = StuffDocumentsChain(llm_chain=reduce_chain, document_variable_name='transcription_chunks')
-    # Combines and iteratively reduces the documents
-    reduce_documents_chain = ReduceDocumentsChain(
-        # This is final chain that is called.
-        combine_documents_chain=combine_documents_chain,
-        # If documents exceed context for `StuffDocumentsChain`
-        collapse_documents_chain=combine_documents_chain,
-        # The maximum number of tokens to group documents into.
-        token_max=1200,
-    )
     print('reducing call')
-    new_document = reduce_documents_chain.invoke(conversation)['output_text']
+    new_document = get_call_reducer().summarize([document.page_content for document in conversation])
     print('call reduced')
     return new_document
 
@@ -108,12 +181,12 @@ def get_summary(conversation: str, model: LLM = model) -> str:
     Returns:
         str: The summary of the conversation.
     """
-    summarization_prompt = load_prompt(os.path.join(kit_dir, 'prompts/summarization.yaml'))
+    summarization_prompt = get_prompt('summarization')
     output_parser = StrOutputParser()
     summarization_chain = summarization_prompt | model | output_parser
     input_variables = {'conversation': conversation}
     print('summarizing')
-    summarization_response = summarization_chain.invoke(input_variables)
+    summarization_response = invoke_with_budget(summarization_chain, input_variables)
     print('summarizing done')
     return summarization_response
 
@@ -131,7 +204,7 @@ def classify_main_topic(conversation: str, classes: List[str], model: LLM = mode
     Returns:
         List[str]: The list of classes that the conversation was classified into.
     """
-    topic_classification_prompt = load_prompt(os.path.join(kit_dir, 'prompts/topic_classification.yaml'))
+    topic_classification_prompt = get_prompt('topic_classification')
     list_output_parser = CommaSeparatedListOutputParser()
     list_format_instructions = list_output_parser.get_format_instructions()
     list_fixing_output_parser = OutputFixingParser.from_llm(parser=list_output_parser, llm=model)
@@ -142,7 +215,7 @@ def classify_main_topic(conversation: str, classes: List[str], model: LLM = mode
         'format_instructions': list_format_instructions,
     }
     print('classification')
-    topic_classification_response = topic_classification_chain.invoke(input_variables)
+    topic_classification_response = invoke_with_budget(topic_classification_chain, input_variables)
     print('classification done')
     return topic_classification_response
 
@@ -160,7 +233,7 @@ def get_entities(conversation: str, entities: List[str], model: LLM = model) ->
         Dict[str, Any]: A dictionary containing the extracted entities.
             The keys are the entity names, and the values are the extracted entities.
     """
-    ner_prompt = load_prompt(os.path.join(kit_dir, 'prompts/ner.yaml'))
+    ner_prompt = get_prompt('ner')
     response_schemas = []
     for entity in entities:
         response_schemas.append(ResponseSchema(name=entity, description=f'{entity}s find in conversation', type='list'))
@@ -173,7 +246,7 @@ def get_entities(conversation: str, entities: List[str], model: LLM = model) ->
         'format_instructions': entities_output_parser.get_format_instructions(),
     }
     print('extracting entities')
-    ner_response = ner_chain.invoke(input_variables)
+    ner_response = invoke_with_budget(ner_chain, input_variables)
     print('extracting entities done')
     return ner_response
 
@@ -191,7 +264,7 @@ def get_sentiment(conversation: str, sentiments: List[Any], model: LLM = model)
     Returns:
         str: The overall sentiment of the user.
     """
-    sentiment_analysis_prompt = load_prompt(os.path.join(kit_dir, 'prompts/sentiment_analysis.yaml'))
+    sentiment_analysis_prompt = get_prompt('sentiment_analysis')
     list_output_parser = CommaSeparatedListOutputParser()
     list_format_instructions = list_output_parser.get_format_instructions()
     list_fixing_output_parser = OutputFixingParser.from_llm(parser=list_output_parser, llm=model)
@@ -202,11 +275,78 @@ def get_sentiment(conversation: str, sentiments: List[Any], model: LLM = model)
         'format_instructions': list_format_instructions,
     }
     print('sentiment analysis')
-    sentiment_analysis_response = sentiment_analysis_chain.invoke(input_variables)
+    sentiment_analysis_response = invoke_with_budget(sentiment_analysis_chain, input_variables)
     print('sentiment analysis done')
     return sentiment_analysis_response[0]
 
 
+def get_topic_entities_sentiment(
+    conversation: str, classes: List[str], entities: List[str], sentiments: List[str], model: LLM = model
+) -> Tuple[List[str], Dict[str, Any], str]:
+    """
+    Classify the topic, extract the entities, and get the overall sentiment of the user in a single LLM call.
+
+    Falls back to one call per task if the model output can not be parsed as the combined structured output.
+
+    Args:
+        conversation (str): The conversation to analyse.
+        classes (List[str]): The list of classes to classify the conversation into.
+        entities (List[str]): The list of entities to extract.
+        sentiments (List[str]): The list of possible sentiments to classify.
+        model (Langchain LLM Model, optional): The language model to use for the analysis.
+            Defaults to a SambaStudio model.
+
+    Returns:
+        tuple: The classes that the conversation was classified into, a dictionary containing the extracted
+            entities, and the overall sentiment of the user.
+    """
+    combined_analysis_prompt = get_prompt('combined_analysis')
+    response_schemas = [
+        ResponseSchema(
+            name='classification', description='list of the main topic classes of the conversation', type='list'
+        ),
+        ResponseSchema(
+            name='entities',
+            description='dictionary with the keys '
+            + ', '.join(f'"{entity}"' for entity in entities)
+            + ', each one with the list of the values of this entity found in the conversation',
+            type='dict',
+        ),
+        ResponseSchema(name='sentiment', description='the overall sentiment of the customer', type='string'),
+    ]
+    combined_output_parser = StructuredOutputParser.from_response_schemas(response_schemas)
+    combined_analysis_chain = combined_analysis_prompt | model | combined_output_parser
+    input_variables = {
+        'conversation': conversation,
+        'topic_classes': '\n\t- '.join(classes),
+        'entities': '\n\t- '.join(entities),
+        'sentiments': sentiments,
+        'format_instructions': combined_output_parser.get_format_instructions(),
+    }
+    print('combined analysis')
+    try:
+        combined_response = invoke_with_budget(combined_analysis_chain, input_variables)
+        classification = combined_response['classification']
+        extracted_entities = combined_response['entities']
+        sentiment = combined_response['sentiment']
+        if isinstance(classification, str):
+            classification = [classification]
+        if not isinstance(classification, list) or not isinstance(extracted_entities, dict) or not sentiment:
+            raise ValueError(f'Invalid combined analysis output: {combined_response}')
+    except Exception as e:
+        print(f'combined analysis failed, running separate analyses: {e}')
+        classification = classify_main_topic(conversation, classes, model)
+        extracted_entities = get_entities(conversation, entities, model)
+        sentiment = get_sentiment(conversation, sentiments, model)
+        return classification, extracted_entities, sentiment
+    print('combined analysis done')
+    return (
+        [str(topic_class) for topic_class in classification],
+        {entity: extracted_entities.get(entity, []) for entity in entities},
+        str(sentiment),
+    )
+
+
 def get_nps(conversation: str, model: LLM = model) -> Dict[str, Any]:
     """get a prediction of a possible net promoter score for a given conversation
 
@@ -225,11 +365,11 @@ def get_nps(conversation: str, model: LLM = model) -> Dict[str, Any]:
     nps_output_parser = StructuredOutputParser.from_response_schemas(nps_response_schemas)
     format_instructions = nps_output_parser.get_format_instructions()
     nps_fixing_output_parser = OutputFixingParser.from_llm(parser=nps_output_parser, llm=model)
-    nps_prompt = load_prompt(os.path.join(kit_dir, 'prompts/nps.yaml'))
+    nps_prompt = get_prompt('nps')
     nps_chain = nps_prompt | model | nps_fixing_output_parser
     input_variables = {'conversation': conversation, 'format_instructions': format_instructions}
     print(f'predicting nps')
-    nps = nps_chain.invoke(input_variables)
+    nps = invoke_with_budget(nps_chain, input_variables)
     print(f'nps chain finished')
     return nps
 
@@ -298,6 +438,67 @@ def set_retriever(documents_path: str, urls: List[str]) -> Any:
     return retriever
 
 
+def get_sources_fingerprint(documents_path: str, urls: List[str]) -> str:
+    """
+    Compute a fingerprint of the sources of a retriever, which changes when a document or the configuration changes.
+
+    Args:
+        documents_path (str): The path to the directory containing the documents.
+        urls (List[str]): The list of Urls to scrape and load.
+
+    Returns:
+        str: The hexadecimal fingerprint of the sources.
+    """
+    documents = []
+    if os.path.isfile(documents_path):
+        document_paths = [documents_path]
+    else:
+        document_paths = [os.path.join(root, file) for root, _dirs, files in os.walk(documents_path) for file in files]
+    for document_path in sorted(document_paths):
+        stat = os.stat(document_path)
+        documents.append([document_path, stat.st_size, stat.st_mtime_ns])
+    sources = {
+        'documents_path': os.path.abspath(documents_path),
+        'documents': documents,
+        'urls': sorted(urls),
+        'retrieval': retrieval_info,
+        'embedding_model': embedding_model_info,
+    }
+    return hashlib.sha256(json.dumps(sources, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def get_retriever(documents_path: str, urls: List[str]) -> Any:
+    """
+    Get the Faiss retriever of the given sources, building it only once per process and per sources version.
+
+    Args:
+        documents_path (str): The path to the directory containing the documents.
+        urls (List[str]): The list of Urls to scrape and load.
+
+    Returns:
+        langchain retriever: The Faiss retriever to be used whit lang chain retrieval chains.
+    """
+    fingerprint = get_sources_fingerprint(documents_path, urls)
+    with retrievers_lock:
+        if fingerprint in retrievers:
+            retrievers.move_to_end(fingerprint)
+            return retrievers[fingerprint]
+        build_lock = retriever_build_locks.setdefault(fingerprint, threading.Lock())
+
+    # Concurrent analyses of calls with the same sources wait for a single build
+    with build_lock:
+        with retrievers_lock:
+            if fingerprint in retrievers:
+                return retrievers[fingerprint]
+        retriever = set_retriever(documents_path=documents_path, urls=urls)
+        with retrievers_lock:
+            retrievers[fingerprint] = retriever
+            while len(retrievers) > analysis_info.get('max_cached_retrievers', 4):
+                retrievers.popitem(last=False)
+            retriever_build_locks.pop(fingerprint, None)
+    return retriever
+
+
 def factual_accuracy_analysis(conversation: str, retriever: Any, model: LLM = model) -> Dict[str, Any]:
     """
     Analyse the factual accuracy of the given conversation.
@@ -332,13 +533,15 @@ def factual_accuracy_analysis(conversation: str, retriever: Any, model: LLM = mo
     factual_accuracy_analysis_fixing_output_parser = OutputFixingParser.from_llm(
         parser=factual_accuracy_analysis_output_parser, llm=model
     )
-    retrieval_qa_chat_prompt = load_prompt(os.path.join(kit_dir, 'prompts/factual_accuracy_analysis.yaml'))
+    retrieval_qa_chat_prompt = get_prompt('factual_accuracy_analysis')
     combine_docs_chain = create_stuff_documents_chain(model, retrieval_qa_chat_prompt)
     retrieval_chain = create_retrieval_chain(retriever, combine_docs_chain)
     input_variables = {'input': conversation, 'format_instructions': format_instructions}
-    model_response = retrieval_chain.invoke(input_variables)['answer']
+    model_response = invoke_with_budget(retrieval_chain, input_variables)['answer']
     print('factual check')
-    factual_accuracy_analysis_response = factual_accuracy_analysis_fixing_output_parser.invoke(model_response)
+    factual_accuracy_analysis_response = invoke_with_budget(
+        factual_accuracy_analysis_fixing_output_parser, model_response
+    )
     print('factual check done')
     return factual_accuracy_analysis_response
 
@@ -378,13 +581,13 @@ def procedural_accuracy_analysis(conversation: str, procedures_path: str, model:
     procedures_analysis_fixing_output_parser = OutputFixingParser.from_llm(
         parser=procedures_analysis_output_parser, llm=model
     )
-    procedures_prompt = load_prompt(os.path.join(kit_dir, 'prompts/procedures_analysis.yaml'))
+    procedures_prompt = get_prompt('procedures_analysis')
     with open(procedures_path, 'r') as file:
         procedures = file.readlines()
     procedures_chain = procedures_prompt | model | procedures_analysis_fixing_output_parser
     input_variables = {'input': conversation, 'procedures': procedures, 'format_instructions': format_instructions}
     print('proceduress check')
-    procedures_analysis_response = procedures_chain.invoke(input_variables)
+    procedures_analysis_response = invoke_with_budget(procedures_chain, input_variables)
     print('proceduress check done')
     return procedures_analysis_response
 
@@ -437,26 +640,40 @@ def call_analysis_parallel(
     with concurrent.futures.ThreadPoolExecutor() as executor:
         # Submitting tasks to executor
         reduced_conversation_future = executor.submit(reduce_call, conversation=conversation)
-        retriever = set_retriever(documents_path=documents_path, urls=facts_urls)
+        retriever_future = executor.submit(get_retriever, documents_path=documents_path, urls=facts_urls)
         reduced_conversation = reduced_conversation_future.result()
         summary_future = executor.submit(get_summary, conversation=reduced_conversation)
-        classification_future = executor.submit(
-            classify_main_topic, conversation=reduced_conversation, classes=classes_list
-        )
-        entities_future = executor.submit(get_entities, conversation=reduced_conversation, entities=entities_list)
-        sentiment_future = executor.submit(get_sentiment, conversation=reduced_conversation, sentiments=sentiment_list)
-        factual_analysis_future = executor.submit(
-            factual_accuracy_analysis, conversation=reduced_conversation, retriever=retriever
-        )
+        if analysis_info.get('combined_extraction', True):
+            combined_future = executor.submit(
+                get_topic_entities_sentiment,
+                conversation=reduced_conversation,
+                classes=classes_list,
+                entities=entities_list,
+                sentiments=sentiment_list,
+            )
+        else:
+            classification_future = executor.submit(
+                classify_main_topic, conversation=reduced_conversation, classes=classes_list
+            )
+            entities_future = executor.submit(get_entities, conversation=reduced_conversation, entities=entities_list)
+            sentiment_future = executor.submit(
+                get_sentiment, conversation=reduced_conversation, sentiments=sentiment_list
+            )
         procedural_analysis_future = executor.submit(
             procedural_accuracy_analysis, conversation=reduced_conversation, procedures_path=procedures_path
         )
+        factual_analysis_future = executor.submit(
+            factual_accuracy_analysis, conversation=reduced_conversation, retriever=retriever_future.result()
+        )
 
         # Retrieving results
         summary = summary_future.result()
-        classification = classification_future.result()
-        entities = entities_future.result()
-        sentiment = sentiment_future.result()
+        if analysis_info.get('combined_extraction', True):
+            classification, entities, sentiment = combined_future.result()
+        else:
+            classification = classification_future.result()
+            entities = entities_future.result()
+            sentiment = sentiment_future.result()
         factual_analysis = factual_analysis_future.result()
         procedural_analysis = procedural_analysis_future.result()
     quality_score, nps_analysis, nps_score = get_call_quality_assessment(
@@ -474,3 +691,47 @@ def call_analysis_parallel(
         'nps_score': nps_score,
         'quality_score': quality_score,
     }
+
+
+def call_analysis_batch(
+    conversations: List[List[Document]],
+    documents_path: str,
+    facts_urls: List[str],
+    procedures_path: str,
+    classes_list: List[str],
+    entities_list: List[str],
+    sentiment_list: List[str],
+) -> List[Dict[str, Any]]:
+    """
+    Analyse several calls at the same time, sharing the facts retriever and the global LLM call budget.
+
+    Args:
+        conversations (List[List[Document]]): The conversations to analyse.
+        documents_path (str): The path to the directory containing the fact or procedure documents.
+        facts_urls (List[str]): The list of URL to load facts from
+        procedures_path (str): The path to the file containing the procedures.
+        classes_list (List[str]): The list of classes to classify the conversations into.
+        entities_list (List[str]): The list of entities to extract.
+        sentiment_list (List[str]): The list of sentiments to analyse.
+
+    Returns:
+        List[dict]: The analysis results of each conversation, in the same order, as returned by
+            `call_analysis_parallel`.
+    """
+    # Build the retriever once before the analyses start
+    get_retriever(documents_path=documents_path, urls=facts_urls)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=analysis_info.get('max_concurrent_calls', 4)) as executor:
+        futures = [
+            executor.submit(
+                call_analysis_parallel,
+                conversation,
+                documents_path=documents_path,
+                facts_urls=facts_urls,
+                procedures_path=procedures_path,
+                classes_list=classes_list,
+                entities_list=entities_list,
+                sentiment_list=sentiment_list,
+            )
+            for conversation in conversations
+        ]
+        return [future.result() for future in futures]
@@ -14,13 +14,16 @@ import logging
 import shutil
 import tarfile
 import time
-from typing import Any, Dict, Optional
+import uuid
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, Optional, Union
 
 import pandas as pd
 import requests
 import yaml
 from dotenv import load_dotenv
 
+from utils.batch_inference.job_orchestrator import BatchJobOrchestrator, BatchJobResult, get_orchestrator_kwargs
+
 load_dotenv(os.path.join(repo_dir, '.env'))
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -28,6 +31,16 @@ logger.setLevel(logging.INFO)
 PENDING_RDU_JOB_STATUS = 'PENDING_RDU'
 SUCCESS_JOB_STATUS = 'EXIT_WITH_0'
 FAILED_JOB_STATUS = 'FAILED'
+AUDIO_SAMPLE_RATE = 16000
+ASR_OUTPUT_COLUMNS = [
+    'audio_path',
+    'results_path',
+    'speaker',
+    'start_time',
+    'sample_duration',
+    'unformatted_transcript',
+    'formatted_transcript',
+]
 
 
 class BatchASRProcessor:
@@ -74,6 +87,10 @@ class BatchASRProcessor:
         self.model_checkpoint = self.config['asr']['jobs']['model_checkpoint']
 
         self.output_path = self.config['asr']['output']['output_path']
+        # optional directory where the transcripts of the processed audio files are saved as Parquet
+        self.parquet_output_dir = self.config['asr']['output'].get('parquet_output_dir')
+
+        self.orchestrator = BatchJobOrchestrator(self, **get_orchestrator_kwargs(self.config['asr']))
 
     def _load_config(self, file_path: str) -> Any:
         """Loads a YAML configuration file.
@@ -89,7 +106,11 @@ class BatchASRProcessor:
         return config
 
     def _get_call(
-        self, url: str, params: Optional[Dict[str, Any]] = None, success_message: Optional[str] = None
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        success_message: Optional[str] = None,
+        stream: bool = False,
     ) -> requests.Response:
         """Make a GET request to the specified URL.
 
@@ -99,17 +120,20 @@ class BatchASRProcessor:
                 Defaults to None.
             success_message (Optional[str], optional): A message to log upon successful completion of the
                 GET request. Defaults to None.
+            stream (bool, optional): Whether to stream the response content instead of downloading it at once.
+                Defaults to False.
 
         Returns:
             requests.Response: The response from the GET request.
 
         """
-        response = requests.get(url, params=params, headers=self.headers)
+        response = requests.get(url, params=params, headers=self.headers, stream=stream)
 
         if response.status_code == 200:
             logging.info('GET request successful!')
             logging.info(success_message)
-            logging.debug(f'Response: {response.text}')
+            if not stream:
+                logging.debug(f'Response: {response.text}')
         else:
             logging.error(f'GET request failed with status code: {response.status_code}')
             logging.error(f'Error message: {response.text}')
@@ -161,52 +185,59 @@ class BatchASRProcessor:
             raise Exception(f'Error message: {response.text}')
         return response
 
-    def _time_to_seconds(self, time_str: str) -> int:
-        """Convert a time string to seconds.
+    def _times_to_seconds(self, time_strs: pd.Series) -> pd.Series:
+        """Convert a series of time strings to seconds, without parsing each row in Python.
 
         Args:
-            time_str (str): The time string to convert.
+            time_strs (pandas.Series): The time strings to convert, formatted as `minutes:seconds`
+                (or `hours:minutes:seconds`).
 
         Returns:
-            int: The time in seconds.
+            pandas.Series: The times in seconds.
         """
-        minutes, seconds = map(int, time_str.split(':'))
-        return minutes * 60 + seconds
+        # reversed, so the seconds, minutes and hours are in the same column whatever the format of each time
+        reversed_parts = time_strs.astype(str).str.split(':').str[::-1]
+        time_parts = pd.DataFrame(reversed_parts.tolist(), index=time_strs.index).fillna(0).astype(int)
+        return time_parts.mul([60**position for position in range(len(time_parts.columns))]).sum(axis=1)
 
-    def _get_df_output(self, response_content: bytes) -> pd.DataFrame:
+    def _get_df_output(self, response_content: Union[bytes, BinaryIO]) -> pd.DataFrame:
         """Parse the response from the ASR job.
 
+        The archive is read as a stream, so only the transcript file is loaded in memory.
+
         Args:
-            response_content (str): The response from the ASR job.
+            response_content (bytes or file object): The response from the ASR job,
+                or a file object streaming it.
 
         Returns:
             DataFrame: A DataFrame containing the parsed output from the ASR job.
         """
-        compressed_bytes = io.BytesIO(response_content)
-
-        with tarfile.open(fileobj=compressed_bytes, mode='r:gz') as tar:
-            output_tar_member = tar.getmember(self.output_path)
-            output_file = tar.extractfile(output_tar_member)
-            assert output_file is not None
-            output_df = pd.read_csv(
-                io.BytesIO(output_file.read()),
-                names=[
-                    'audio_path',
-                    'results_path',
-                    'speaker',
-                    'start_time',
-                    'sample_duration',
-                    'unformatted_transcript',
-                    'formatted_transcript',
-                ],
-            )
-            output_df['start_time'] = output_df.apply(lambda x: self._time_to_seconds(x['start_time']), axis=1)
-            output_df['end_time'] = output_df.apply(
-                lambda x: x['start_time'] + int(x['sample_duration']) / 16000, axis=1
-            )
-            output_df = output_df[['start_time', 'end_time', 'speaker', 'formatted_transcript']].rename(
-                columns={'formatted_transcript': 'text'}
-            )
+        if isinstance(response_content, bytes):
+            response_content = io.BytesIO(response_content)
+
+        output_df = None
+        with tarfile.open(fileobj=response_content, mode='r|gz') as tar:
+            for tar_member in tar:
+                if os.path.normpath(tar_member.name) != os.path.normpath(self.output_path):
+                    continue
+                output_file = tar.extractfile(tar_member)
+                assert output_file is not None
+                # the members of a streamed archive are not seekable, as required by the CSV parser
+                output_df = pd.read_csv(
+                    io.BytesIO(output_file.read()),
+                    names=ASR_OUTPUT_COLUMNS,
+                    usecols=['speaker', 'start_time', 'sample_duration', 'formatted_transcript'],
+                    dtype={'start_time': str},
+                )
+                break
+        if output_df is None:
+            raise KeyError(f'filename {self.output_path} not found')
+
+        output_df['start_time'] = self._times_to_seconds(output_df['start_time'])
+        output_df['end_time'] = output_df['start_time'] + output_df['sample_duration'].astype(int) / AUDIO_SAMPLE_RATE
+        output_df = output_df[['start_time', 'end_time', 'speaker', 'formatted_transcript']].rename(
+            columns={'formatted_transcript': 'text'}
+        )
 
         return output_df
 
@@ -229,10 +260,29 @@ class BatchASRProcessor:
         Args:
             dataset_name (str): The name of the dataset to delete.
         """
-        dataset_id = self.search_dataset(dataset_name)
-        url = self.base_url + self.datasets_url + '/' + dataset_id
-        response = self._delete_call(url)
-        logging.info(response.text)
+        try:
+            dataset_id = self.search_dataset(dataset_name)
+            url = self.base_url + self.datasets_url + '/' + dataset_id
+            response = self._delete_call(url)
+            logging.info(response.text)
+        finally:
+            self._delete_local_dataset(dataset_name)
+
+    def _get_dataset_source_file(self, dataset_name: str) -> str:
+        """Get the path of the source file of a dataset, one per dataset, read by snapi when adding the dataset."""
+        source_file_root, source_file_extension = os.path.splitext(self.dataset_source_file)
+        return f'{source_file_root}_{dataset_name}{source_file_extension}'
+
+    def _delete_local_dataset(self, dataset_name: str) -> None:
+        """Delete the source file and the local copy of the files of a dataset.
+
+        Args:
+            dataset_name (str): The name of the dataset.
+        """
+        dataset_source_file = self._get_dataset_source_file(dataset_name)
+        if os.path.exists(dataset_source_file):
+            os.remove(dataset_source_file)
+        shutil.rmtree(os.path.join(self.datasets_path, dataset_name), ignore_errors=True)
 
     def create_dataset(self, path: str) -> str:
         """Create a dataset in SambaStudio.
@@ -244,19 +294,20 @@ class BatchASRProcessor:
             dataset_name (str): The name of the created dataset.
         """
 
-        dataset_name = f'{self.dataset_name}_{int(time.time())}'
+        # unique name, so several datasets can be created concurrently
+        dataset_name = f'{self.dataset_name}_{int(time.time())}_{uuid.uuid4().hex[:8]}'
+        dataset_source_file = self._get_dataset_source_file(dataset_name)
 
         # create pca directory and source.json file
         pca_directory = self.datasets_path + '/' + dataset_name
 
-        if not os.path.isdir(self.datasets_path):
-            os.mkdir(self.datasets_path)
+        os.makedirs(self.datasets_path, exist_ok=True)
 
         if not os.path.isdir(pca_directory):
             logging.info(f"Datasets path: {pca_directory} wan't found")
 
             source_file_data = {'source_path': pca_directory}
-            with open(self.dataset_source_file, 'w') as json_file:
+            with open(dataset_source_file, 'w') as json_file:
                 json.dump(source_file_data, json_file)
             os.mkdir(pca_directory)
 
@@ -265,12 +316,17 @@ class BatchASRProcessor:
         # validate audio file
         audio_format = path.split('.')[-1]
 
-        if audio_format == 'mp3':
-            shutil.copyfile(path, pca_directory + '/pca_file.mp3')
-        elif audio_format == 'wav':
-            shutil.copyfile(path, pca_directory + '/pca_file.wav')
-        else:
-            raise Exception('Only mp3 and wav audio files supported')
+        try:
+            if audio_format == 'mp3':
+                shutil.copyfile(path, pca_directory + '/pca_file.mp3')
+            elif audio_format == 'wav':
+                shutil.copyfile(path, pca_directory + '/pca_file.wav')
+            else:
+                raise Exception('Only mp3 and wav audio files supported')
+        except Exception:
+            # the dataset is not created, so it is not deleted by delete_dataset
+            self._delete_local_dataset(dataset_name)
+            raise
 
         # create dataset
         command = f'echo yes | snapi dataset add \
@@ -278,7 +334,7 @@ class BatchASRProcessor:
             --job_type {self.job_type} \
             --apps {self.asr_with_diarization_app_id} \
             --source_type {self.dataset_source_type} \
-            --source_file {self.dataset_source_file} \
+            --source_file {dataset_source_file} \
             --language {self.dataset_language} \
             --description "{self.dataset_description}"'
 
@@ -342,7 +398,7 @@ class BatchASRProcessor:
         params = {
             'task': self.job_task,
             'job_type': self.job_type,
-            'job_name': f'{self.job_name}_{int(time.time())}',
+            'job_name': f'{self.job_name}_{int(time.time())}_{uuid.uuid4().hex[:8]}',
             'project': self.project_id,
             'model_checkpoint': self.model_checkpoint,
             'description': self.job_description,
@@ -355,6 +411,22 @@ class BatchASRProcessor:
 
         return job_id
 
+    def get_job_status(self, job_id: str) -> str:
+        """Get the status of a given job.
+
+        Args:
+            job_id (str): The id of the job to check.
+
+        Returns:
+            str: The status of the job.
+        """
+        url = self.base_url + self.projects_url + self.jobs_url.format(project_id=self.project_id) + '/' + job_id
+        response = self._get_call(url, success_message='Still waiting for job to finish')
+        parsed_reponse = json.loads(response.text)
+        status: str = parsed_reponse['data']['status']
+        logging.info(f'Job status: {status}')
+        return status
+
     def check_job_progress(self, job_id: str) -> bool:
         """Check job progress of a given job.
 
@@ -364,15 +436,9 @@ class BatchASRProcessor:
         Returns:
             bool: True when the job is finished.
         """
-
-        url = self.base_url + self.projects_url + self.jobs_url.format(project_id=self.project_id) + '/' + job_id
-
         status = PENDING_RDU_JOB_STATUS
         while status != SUCCESS_JOB_STATUS:
-            response = self._get_call(url, success_message='Still waiting for job to finish')
-            parsed_reponse = json.loads(response.text)
-            status = parsed_reponse['data']['status']
-            logging.info(f'Job status: {status}')
+            status = self.get_job_status(job_id)
             if status == SUCCESS_JOB_STATUS:
                 logging.info('Job finished!')
                 break
@@ -409,8 +475,10 @@ class BatchASRProcessor:
             + job_id
             + self.download_results_url
         )
-        response = self._get_call(url, success_message='Results downloaded!')
-        df = self._get_df_output(response.content)
+        with self._get_call(url, success_message='Results downloaded!', stream=True) as response:
+            # decode the transfer encoding, if any, while streaming the archive
+            response.raw.decode_content = True
+            df = self._get_df_output(response.raw)
         return df
 
     def process_audio(self, path: str) -> pd.DataFrame:
@@ -421,19 +489,38 @@ class BatchASRProcessor:
         Returns:
             df (pandas.DataFrame): The results of the batch inference job.
         """
-        self.create_load_project()
-        dataset_name = self.create_dataset(path=path)
-        while not self.check_dataset_creation_progress(dataset_name):
-            print('waiting for dataset available')
-            time.sleep(5)
-        job_id = self.run_job(dataset_name)
-        job_finished = self.check_job_progress(job_id)
-        if job_finished:
-            df = self.retrieve_results(job_id)
-            self.delete_job(job_id)
-            self.delete_dataset(dataset_name)
-            return df
-        else:
-            self.delete_job(job_id)
-            self.delete_dataset(dataset_name)
-            raise Exception('Job failed!')
+        [result] = list(self.process_audios([path]))
+        if result.error is not None:
+            raise Exception('Job failed!') from result.error
+        df: pd.DataFrame = result.result
+        return df
+
+    def process_audios(self, paths: Iterable[str]) -> Iterator[BatchJobResult]:
+        """Process several audio files in SambaStudio, with one dataset and one job per file running concurrently.
+
+        Args:
+            paths (Iterable[str]): The paths to the audio files to process.
+        Yields:
+            BatchJobResult: The result of each audio file as soon as its job finishes, with the transcription
+                dataframe in `result`, or the exception in `error` if the processing failed.
+        """
+        for result in self.orchestrator.run(paths):
+            if result.error is None and self.parquet_output_dir is not None:
+                self.save_parquet(result.result, result.input_path)
+            yield result
+
+    def save_parquet(self, df: pd.DataFrame, audio_path: str) -> str:
+        """Save the transcript of an audio file as Parquet in the configured output directory.
+
+        Args:
+            df (pandas.DataFrame): The transcript of the audio file.
+            audio_path (str): The path to the audio file.
+        Returns:
+            str: The path to the Parquet file.
+        """
+        assert self.parquet_output_dir is not None
+        os.makedirs(self.parquet_output_dir, exist_ok=True)
+        filename, _ = os.path.splitext(os.path.basename(audio_path))
+        parquet_path = os.path.join(self.parquet_output_dir, f'{filename}.parquet')
+        df.to_parquet(parquet_path, index=False)
+        return parquet_path
@@ -0,0 +1,557 @@
+"""
+Bulk Post-Call Analysis Script
+
+This standalone script runs the post-call analysis over many calls, e.g. the daily volume of a contact center,
+instead of one conversation at a time from the Streamlit app.
+
+Key Features:
+- Takes a folder or a manifest of call transcripts (CSV files with `speaker` and `text` columns) or audio files
+  (WAV files, transcribed with the ASR batch inference jobs of SambaStudio)
+- Reduces each call and runs all the analyses, with a bounded pool of calls analysed at the same time
+- Retries the failed calls with an exponential backoff
+- Saves the results incrementally, so an interrupted run resumes by skipping the calls already analysed
+- Reports the throughput of the run in calls per minute and generated tokens per second
+
+Input Requirements:
+- A folder containing the transcripts and/or audio files, searched recursively, or a manifest (.csv or .jsonl)
+  with a `path` column and an optional `call_id` column, relative paths being resolved from the manifest folder
+
+Output:
+- `results.jsonl` in the output folder, with one line per analysed call, written as soon as the call is analysed
+- `parquet/` in the output folder, with the results of the succeeded calls in Parquet part files
+- `transcription/` in the output folder, with the transcripts of the audio files
+
+Usage:
+    python batch_analysis.py <input_path> <output_dir> [--facts-path <facts_path>] [--procedures-path <path>]
+
+Example:
+    python batch_analysis.py ./data/conversations/transcription ./results/batch_analysis
+"""
+
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+kit_dir = os.path.abspath(os.path.join(current_dir, '..'))
+repo_dir = os.path.abspath(os.path.join(kit_dir, '..'))
+
+sys.path.append(kit_dir)
+sys.path.append(repo_dir)
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+from uuid import UUID
+
+import pandas as pd
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from post_call_analysis.src import analysis
+
+TRANSCRIPT_EXTENSIONS = ('.csv',)
+AUDIO_EXTENSIONS = ('.wav',)
+MANIFEST_EXTENSIONS = ('.csv', '.jsonl')
+RESULTS_FILE_NAME = 'results.jsonl'
+PARQUET_DIR_NAME = 'parquet'
+TRANSCRIPTS_DIR_NAME = 'transcription'
+# Rough number of characters per token, used when the endpoint does not report the token usage
+CHARACTERS_PER_TOKEN = 4
+
+DEFAULT_CLASSES = ['undefined', 'emergency', 'general information', 'sales', 'complains']
+DEFAULT_ENTITIES = ['name', 'address', 'city', 'phone number']
+DEFAULT_SENTIMENTS = ['positive', 'neutral', 'negative']
+
+
+class CallInput(NamedTuple):
+    call_id: str
+    path: str
+
+
+@dataclass
+class BatchAnalysisReport:
+    """The throughput of a batch analysis run."""
+
+    num_calls: int = 0
+    num_succeeded: int = 0
+    num_failed: int = 0
+    num_skipped: int = 0
+    generated_tokens: int = 0
+    duration: float = 0.0
+
+    @property
+    def calls_per_minute(self) -> float:
+        """The number of calls analysed per minute, failed calls included."""
+        return 60 * (self.num_succeeded + self.num_failed) / self.duration if self.duration > 0 else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        """The number of tokens generated per second by the LLM, across all the calls."""
+        return self.generated_tokens / self.duration if self.duration > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f'{self.num_succeeded} calls analysed, {self.num_failed} failed, {self.num_skipped} already analysed '
+            f'in {self.duration:.1f}s: {self.calls_per_minute:.2f} calls/min, {self.tokens_per_second:.1f} tokens/s'
+        )
+
+
+class TokenCounter(BaseCallbackHandler):
+    """Count the tokens generated by all the LLM calls, which can run in different threads."""
+
+    def __init__(self) -> None:
+        self.generated_tokens = 0
+        self._streamed_tokens: Dict[UUID, int] = {}
+        self._lock = threading.Lock()
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._streamed_tokens[run_id] = self._streamed_tokens.get(run_id, 0) + 1
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        llm_output = response.llm_output or {}
+        usage = llm_output.get('token_usage') or llm_output.get('usage') or {}
+        with self._lock:
+            streamed_tokens = self._streamed_tokens.pop(run_id, 0)
+            if usage.get('completion_tokens'):
+                self.generated_tokens += usage['completion_tokens']
+            elif streamed_tokens > 0:
+                self.generated_tokens += streamed_tokens
+            else:
+                text = ''.join(generation.text for generations in response.generations for generation in generations)
+                self.generated_tokens += len(text) // CHARACTERS_PER_TOKEN
+
+
+class ResultsWriter:
+    def __init__(self, output_dir: str, parquet: bool = True, parquet_flush_every: int = 50) -> None:
+        """
+        Initialize the writer of the results of a batch analysis.
+
+        Every result is appended to the JSONL file as soon as the call is analysed, while the results of the
+        succeeded calls are buffered and written in Parquet part files of `parquet_flush_every` calls.
+
+        Args:
+            output_dir (str): The folder where the results are saved.
+            parquet (bool): Whether to also save the results of the succeeded calls as Parquet.
+            parquet_flush_every (int): The number of results written in each Parquet part file.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        self.results_path = os.path.join(output_dir, RESULTS_FILE_NAME)
+        self.parquet_dir = os.path.join(output_dir, PARQUET_DIR_NAME) if parquet else None
+        self.parquet_flush_every = parquet_flush_every
+        # terminate the last line of an interrupted run, so the next results are not appended to it
+        if os.path.exists(self.results_path) and os.path.getsize(self.results_path) > 0:
+            with open(self.results_path, 'rb+') as file:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b'\n':
+                    file.write(b'\n')
+        # the part files of different runs do not overwrite each other
+        self._run_id = f'{time.strftime("%Y%m%d%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        self._num_parts = 0
+        self._parquet_buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def get_analysed_call_ids(self) -> Set[str]:
+        """
+        Get the calls successfully analysed by the previous runs.
+
+        Returns:
+            Set[str]: The ids of the analysed calls.
+        """
+        call_ids: Set[str] = set()
+        if not os.path.exists(self.results_path):
+            return call_ids
+        with open(self.results_path, 'r') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # last line of an interrupted run
+                    continue
+                if record.get('status') == 'succeeded':
+                    call_ids.add(record['call_id'])
+        return call_ids
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """
+        Save the result of a call.
+
+        Args:
+            record (Dict[str, Any]): The result of the call, as returned by `analyse_call`.
+        """
+        with self._lock:
+            with open(self.results_path, 'a') as file:
+                file.write(json.dumps(record, default=str) + '\n')
+            if self.parquet_dir is not None and record['status'] == 'succeeded':
+                self._parquet_buffer.append(record)
+                if len(self._parquet_buffer) >= self.parquet_flush_every:
+                    self._flush_parquet()
+
+    def close(self) -> None:
+        """Write the remaining buffered results."""
+        with self._lock:
+            self._flush_parquet()
+
+    def _flush_parquet(self) -> None:
+        if self.parquet_dir is None or len(self._parquet_buffer) == 0:
+            return
+        os.makedirs(self.parquet_dir, exist_ok=True)
+        # the nested results (lists and dicts) have a different structure in each call, so are stored as JSON
+        df = pd.DataFrame(
+            [
+                {
+                    key: json.dumps(value, default=str) if isinstance(value, (dict, list)) else value
+                    for key, value in record.items()
+                }
+                for record in self._parquet_buffer
+            ]
+        )
+        df.to_parquet(os.path.join(self.parquet_dir, f'part-{self._run_id}-{self._num_parts:05d}.parquet'), index=False)
+        self._num_parts += 1
+        self._parquet_buffer = []
+
+
+def get_call_inputs(input_path: str) -> List[CallInput]:
+    """
+    Get the calls to analyse from a folder or a manifest.
+
+    Args:
+        input_path (str): The folder containing the transcripts and audio files, or the manifest listing them.
+
+    Returns:
+        List[CallInput]: The calls to analyse, identified by their path relative to the folder without extension,
+            or by the `call_id` column of the manifest.
+    """
+    input_path = os.path.abspath(input_path)
+    call_inputs: List[CallInput] = []
+    if os.path.isdir(input_path):
+        for root, _dirs, files in os.walk(input_path):
+            for file in sorted(files):
+                if file.lower().endswith(TRANSCRIPT_EXTENSIONS + AUDIO_EXTENSIONS):
+                    path = os.path.join(root, file)
+                    call_id = os.path.splitext(os.path.relpath(path, input_path))[0].replace(os.sep, '/')
+                    call_inputs.append(CallInput(call_id, path))
+        call_inputs.sort()
+    elif input_path.lower().endswith(MANIFEST_EXTENSIONS):
+        if input_path.lower().endswith('.jsonl'):
+            manifest = pd.read_json(input_path, lines=True)
+        else:
+            manifest = pd.read_csv(input_path)
+        if 'path' not in manifest.columns:
+            raise ValueError(f'The manifest {input_path} must have a path column')
+        manifest_dir = os.path.dirname(input_path)
+        paths = [os.path.join(manifest_dir, str(path)) for path in manifest['path']]
+        if 'call_id' in manifest.columns:
+            call_ids = manifest['call_id'].astype(str).tolist()
+        else:
+            call_ids = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+        call_inputs = [CallInput(call_id, path) for call_id, path in zip(call_ids, paths)]
+    else:
+        raise ValueError(f'{input_path} is neither a folder nor a {" or ".join(MANIFEST_EXTENSIONS)} manifest')
+
+    call_ids = [call_input.call_id for call_input in call_inputs]
+    if len(set(call_ids)) != len(call_ids):
+        raise ValueError('The calls to analyse must have unique ids')
+    return call_inputs
+
+
+def iter_transcriptions(
+    call_inputs: List[CallInput], transcripts_dir: str, max_retries: int = 2
+) -> Iterator[Tuple[CallInput, Union[pd.DataFrame, Exception]]]:
+    """
+    Lazily load the transcripts of the calls, transcribing the audio files concurrently in SambaStudio.
+
+    The transcripts of the audio files are saved, so they are not transcribed again when a run is resumed.
+
+    Args:
+        call_inputs (List[CallInput]): The calls to transcribe.
+        transcripts_dir (str): The folder where the transcripts of the audio files are saved.
+        max_retries (int): The number of times the transcription of an audio file is retried.
+
+    Yields:
+        Tuple[CallInput, Union[pd.DataFrame, Exception]]: Each call with its transcript, or with the exception
+            if it could not be loaded or transcribed.
+    """
+    pending_audios: Dict[str, CallInput] = {}
+    for call_input in call_inputs:
+        path = call_input.path
+        if path.lower().endswith(AUDIO_EXTENSIONS):
+            transcript_path = os.path.join(transcripts_dir, f'{call_input.call_id}.csv')
+            if not os.path.exists(transcript_path):
+                pending_audios[path] = call_input
+                continue
+            path = transcript_path
+        try:
+            yield call_input, pd.read_csv(path)
+        except Exception as error:
+            yield call_input, error
+
+    if len(pending_audios) == 0:
+        return
+    from post_call_analysis.src import asr
+
+    audio_processor = asr.BatchASRProcessor()
+    for attempt in range(max_retries + 1):
+        failed_audios: Dict[str, Tuple[CallInput, Exception]] = {}
+        for result in audio_processor.process_audios(list(pending_audios)):
+            call_input = pending_audios[result.input_path]
+            if result.error is not None:
+                assert isinstance(result.error, Exception)
+                failed_audios[result.input_path] = (call_input, result.error)
+                continue
+            transcript_path = os.path.join(transcripts_dir, f'{call_input.call_id}.csv')
+            os.makedirs(os.path.dirname(transcript_path), exist_ok=True)
+            result.result.to_csv(transcript_path, index=False)
+            yield call_input, result.result
+        if len(failed_audios) == 0:
+            return
+        if attempt < max_retries:
+            print(f'retrying the transcription of {len(failed_audios)} audio files')
+            pending_audios = {path: call_input for path, (call_input, _) in failed_audios.items()}
+    for call_input, error in failed_audios.values():
+        yield call_input, error
+
+
+def analyse_call(
+    call_input: CallInput,
+    transcription: pd.DataFrame,
+    documents_path: str,
+    facts_urls: List[str],
+    procedures_path: str,
+    classes_list: List[str],
+    entities_list: List[str],
+    sentiment_list: List[str],
+    max_retries: int = 2,
+    retry_delay: float = 5.0,
+) -> Dict[str, Any]:
+    """
+    Reduce a call and run all the analyses, retrying with an exponential backoff if the analysis fails.
+
+    Args:
+        call_input (CallInput): The call to analyse.
+        transcription (pd.DataFrame): The transcript of the call, with `speaker` and `text` columns.
+        documents_path (str): The path to the directory containing the fact or procedure documents.
+        facts_urls (List[str]): The list of URL to load facts from
+        procedures_path (str): The path to the file containing the procedures.
+        classes_list (List[str]): The list of classes to classify the conversation into.
+        entities_list (List[str]): The list of entities to extract.
+        sentiment_list (List[str]): The list of sentiments to analyse.
+        max_retries (int): The number of times the analysis is retried.
+        retry_delay (float): The number of seconds before the first retry, doubled at each retry.
+
+    Returns:
+        dict: The record of the call, with its id, source, status, error, number of attempts and duration,
+            and the analysis results as returned by `call_analysis_parallel` if the analysis succeeded.
+    """
+    start_time = time.time()
+    record: Dict[str, Any] = {'call_id': call_input.call_id, 'source': call_input.path}
+    error: Optional[Exception] = None
+    for attempt in range(1, max_retries + 2):
+        try:
+            dialogue = analysis.convert_to_dialogue_structure(transcription)
+            conversation = analysis.load_conversation(dialogue, call_input.path)
+            results = analysis.call_analysis_parallel(
+                analysis.get_chunks(conversation),
+                documents_path=documents_path,
+                facts_urls=facts_urls,
+                procedures_path=procedures_path,
+                classes_list=classes_list,
+                entities_list=entities_list,
+                sentiment_list=sentiment_list,
+            )
+            record.update(status='succeeded', error=None, attempts=attempt, duration=time.time() - start_time)
+            record.update(results)
+            return record
+        except Exception as e:
+            error = e
+            print(f'analysis of call {call_input.call_id} failed (attempt {attempt}): {e}')
+            if attempt <= max_retries:
+                time.sleep(retry_delay * 2 ** (attempt - 1))
+    return get_failed_record(call_input, error, attempts=max_retries + 1, duration=time.time() - start_time)
+
+
+def get_failed_record(
+    call_input: CallInput, error: Optional[BaseException], attempts: int, duration: float
+) -> Dict[str, Any]:
+    """
+    Get the record of a call whose transcription or analysis failed.
+
+    Args:
+        call_input (CallInput): The call.
+        error (BaseException, optional): The error of the last attempt.
+        attempts (int): The number of analysis attempts.
+        duration (float): The number of seconds spent on the call.
+
+    Returns:
+        dict: The record of the call, with its id, source, status, error, number of attempts and duration.
+    """
+    return {
+        'call_id': call_input.call_id,
+        'source': call_input.path,
+        'status': 'failed',
+        'error': repr(error),
+        'attempts': attempts,
+        'duration': duration,
+    }
+
+
+def run_batch_analysis(
+    input_path: str,
+    output_dir: str,
+    documents_path: str,
+    facts_urls: List[str],
+    procedures_path: str,
+    classes_list: List[str],
+    entities_list: List[str],
+    sentiment_list: List[str],
+    parquet: bool = True,
+) -> BatchAnalysisReport:
+    """
+    Analyse all the calls of a folder or a manifest, saving the results incrementally.
+
+    The calls already analysed in the output folder are skipped, so an interrupted run can be resumed.
+    The number of calls analysed at the same time, the retries and the Parquet part size are set in the
+    `analysis` section of the config file.
+
+    Args:
+        input_path (str): The folder containing the transcripts and audio files, or the manifest listing them.
+        output_dir (str): The folder where the results are saved.
+        documents_path (str): The path to the directory containing the fact or procedure documents.
+        facts_urls (List[str]): The list of URL to load facts from
+        procedures_path (str): The path to the file containing the procedures.
+        classes_list (List[str]): The list of classes to classify the conversations into.
+        entities_list (List[str]): The list of entities to extract.
+        sentiment_list (List[str]): The list of sentiments to analyse.
+        parquet (bool): Whether to also save the results of the succeeded calls as Parquet.
+
+    Returns:
+        BatchAnalysisReport: The number of analysed calls and the throughput of the run.
+    """
+    analysis_info = analysis.analysis_info
+    max_concurrent_calls = analysis_info.get('max_concurrent_calls', 4)
+    max_retries = analysis_info.get('max_retries', 2)
+    retry_delay = analysis_info.get('retry_delay', 5)
+
+    writer = ResultsWriter(
+        output_dir, parquet=parquet, parquet_flush_every=analysis_info.get('parquet_flush_every', 50)
+    )
+    analysed_call_ids = writer.get_analysed_call_ids()
+    call_inputs = get_call_inputs(input_path)
+    pending_calls = [call_input for call_input in call_inputs if call_input.call_id not in analysed_call_ids]
+    report = BatchAnalysisReport(num_calls=len(call_inputs), num_skipped=len(call_inputs) - len(pending_calls))
+    print(f'{len(pending_calls)} calls to analyse, {report.num_skipped} already analysed')
+    if len(pending_calls) == 0:
+        return report
+
+    token_counter = TokenCounter()
+    analysis.llm_callbacks.append(token_counter)
+    # bounds the loaded transcripts waiting for a worker, so the memory does not grow with the number of calls
+    call_slots = threading.BoundedSemaphore(2 * max_concurrent_calls)
+    report_lock = threading.Lock()
+    start_time = time.time()
+
+    def save_record(record: Dict[str, Any]) -> None:
+        writer.write(record)
+        with report_lock:
+            if record['status'] == 'succeeded':
+                report.num_succeeded += 1
+            else:
+                report.num_failed += 1
+            num_done = report.num_succeeded + report.num_failed
+        print(f'{num_done}/{len(pending_calls)} calls done, call {record["call_id"]} {record["status"]}')
+
+    def analyse_and_save(call_input: CallInput, transcription: pd.DataFrame) -> None:
+        try:
+            call_start_time = time.time()
+            try:
+                record = analyse_call(
+                    call_input,
+                    transcription,
+                    documents_path=documents_path,
+                    facts_urls=facts_urls,
+                    procedures_path=procedures_path,
+                    classes_list=classes_list,
+                    entities_list=entities_list,
+                    sentiment_list=sentiment_list,
+                    max_retries=max_retries,
+                    retry_delay=retry_delay,
+                )
+            except Exception as e:
+                # an unexpected error outside of the retried analysis, the call is recorded as failed
+                print(f'analysis of call {call_input.call_id} failed: {e}')
+                record = get_failed_record(call_input, e, attempts=1, duration=time.time() - call_start_time)
+            save_record(record)
+        finally:
+            call_slots.release()
+
+    # errors of the workers which could not save their record, e.g. a write error, raised at the end of the run
+    worker_errors: List[BaseException] = []
+
+    def check_worker(future: Future[None]) -> None:
+        error = future.exception()
+        if error is not None:
+            print(f'a call analysis worker failed: {error!r}')
+            worker_errors.append(error)
+
+    try:
+        # Build the retriever once before the analyses start
+        analysis.get_retriever(documents_path=documents_path, urls=facts_urls)
+        with ThreadPoolExecutor(max_workers=max_concurrent_calls) as executor:
+            transcripts_dir = os.path.join(output_dir, TRANSCRIPTS_DIR_NAME)
+            for call_input, transcription in iter_transcriptions(pending_calls, transcripts_dir, max_retries):
+                if isinstance(transcription, Exception):
+                    save_record(get_failed_record(call_input, transcription, attempts=0, duration=0.0))
+                    continue
+                call_slots.acquire()
+                executor.submit(analyse_and_save, call_input, transcription).add_done_callback(check_worker)
+        if len(worker_errors) > 0:
+            raise worker_errors[0]
+    finally:
+        analysis.llm_callbacks.remove(token_counter)
+        writer.close()
+        report.duration = time.time() - start_time
+        report.generated_tokens = token_counter.generated_tokens
+
+    print(report)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the post-call analysis over a folder or manifest of calls')
+    parser.add_argument('input_path', type=str, help='folder or .csv/.jsonl manifest of transcripts and audio files')
+    parser.add_argument('output_dir', type=str, help='folder where the results are saved')
+    parser.add_argument(
+        '--facts-path',
+        type=str,
+        default=os.path.join(kit_dir, 'data/documents/facts'),
+        help='folder containing the facts documents',
+    )
+    parser.add_argument('--facts-urls', type=str, nargs='*', default=[], help='urls to load facts from')
+    parser.add_argument(
+        '--procedures-path',
+        type=str,
+        default=os.path.join(kit_dir, 'data/documents/example_procedures.txt'),
+        help='file containing the procedures',
+    )
+    parser.add_argument('--classes', type=str, nargs='+', default=DEFAULT_CLASSES, help='classes of the calls')
+    parser.add_argument('--entities', type=str, nargs='+', default=DEFAULT_ENTITIES, help='entities to extract')
+    parser.add_argument('--sentiments', type=str, nargs='+', default=DEFAULT_SENTIMENTS, help='sentiments of the calls')
+    parser.add_argument('--no-parquet', action='store_true', help='only save the results as JSONL')
+    args = parser.parse_args()
+
+    run_batch_analysis(
+        args.input_path,
+        args.output_dir,
+        documents_path=args.facts_path,
+        facts_urls=args.facts_urls,
+        procedures_path=args.procedures_path,
+        classes_list=args.classes,
+        entities_list=args.entities,
+        sentiment_list=args.sentiments,
+        parquet=not args.no_parquet,
+    )
@@ -21,15 +21,6 @@ audio_save_location = os.path.join(kit_dir, 'data/conversations/audio')
 transcript_save_location = os.path.join(kit_dir, 'data/conversations/transcription')
 
 
-def convert_to_dialogue_structure(transcription: pd.DataFrame) -> str:
-    dialogue = ''
-    for _, row in transcription.iterrows():
-        speaker = str(row['speaker'])
-        text = str(row['text'])
-        dialogue += speaker + ': ' + text + '\n'
-    return dialogue
-
-
 def process_audio(audio_path: str) -> pd.DataFrame:
     audio_processor = asr.BatchASRProcessor()
     df = audio_processor.process_audio(audio_path)
@@ -48,7 +39,7 @@ def analyse_transcription(
     entities: List[str],
     sentiments: List[str],
 ) -> Dict[str, Any]:
-    dialogue = convert_to_dialogue_structure(transcription)
+    dialogue = analysis.convert_to_dialogue_structure(transcription)
     conversation = analysis.load_conversation(dialogue, transcription_path)
     conversation_chunks = analysis.get_chunks(conversation)
     result = analysis.call_analysis_parallel(
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Post Call Analysis (PCA) Offline Test Script
+
+This script tests the parts of the Post Call Analysis which do not call the LLM or SambaStudio, using unittest.
+
+Test cases:
+    ASRResultsTestCase: checks the parsing of the results archive of the ASR batch inference jobs
+    AnalysisContextTestCase: checks the dialogue conversion, the retriever fingerprint and the combined extraction
+    BatchAnalysisTestCase: checks the listing of the calls to analyse and the resumption of an interrupted run
+
+Usage:
+    python tests/offline_test.py
+
+Returns:
+    0 if all tests pass, or 1 otherwise.
+"""
+
+import io
+import json
+import os
+import sys
+import tarfile
+import tempfile
+import time
+import unittest
+from typing import Dict
+
+import pandas as pd
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+kit_dir = os.path.abspath(os.path.join(current_dir, '..'))
+repo_dir = os.path.abspath(os.path.join(kit_dir, '..'))
+
+sys.path.append(kit_dir)
+sys.path.append(repo_dir)
+
+from langchain_core.language_models.fake import FakeListLLM
+
+from post_call_analysis.src import analysis
+from post_call_analysis.src.asr import AUDIO_SAMPLE_RATE, BatchASRProcessor
+from post_call_analysis.src.batch_analysis import CallInput, ResultsWriter, get_call_inputs, get_failed_record
+
+ASR_OUTPUT_ROWS = [
+    ['pca_file.mp3', 'results', 'SPEAKER_00', '0:05', AUDIO_SAMPLE_RATE * 2, 'hello', 'Hello.'],
+    ['pca_file.mp3', 'results', 'SPEAKER_01', '1:02:03', AUDIO_SAMPLE_RATE // 2, 'hi', 'Hi!'],
+]
+
+
+def get_results_archive(members: Dict[str, bytes]) -> bytes:
+    """Get a tar.gz archive with the given file names and contents."""
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode='w:gz') as tar:
+        for name, content in members.items():
+            member = tarfile.TarInfo(name)
+            member.size = len(content)
+            tar.addfile(member, io.BytesIO(content))
+    return archive.getvalue()
+
+
+class ASRResultsTestCase(unittest.TestCase):
+    processor: BatchASRProcessor
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.processor = BatchASRProcessor()
+
+    def test_times_to_seconds(self) -> None:
+        seconds = self.processor._times_to_seconds(pd.Series(['0:05', '2:30', '1:02:03']))
+        self.assertEqual(seconds.tolist(), [5, 150, 3723])
+
+    def test_get_df_output(self) -> None:
+        csv_content = pd.DataFrame(ASR_OUTPUT_ROWS).to_csv(header=False, index=False).encode('utf-8')
+        archive = get_results_archive({'other.csv': b'not,the,transcript', self.processor.output_path: csv_content})
+        for response_content in [archive, io.BytesIO(archive)]:
+            df = self.processor._get_df_output(response_content)
+            self.assertEqual(df.columns.tolist(), ['start_time', 'end_time', 'speaker', 'text'])
+            self.assertEqual(df['start_time'].tolist(), [5, 3723])
+            self.assertEqual(df['end_time'].tolist(), [7.0, 3723.5])
+            self.assertEqual(df['text'].tolist(), ['Hello.', 'Hi!'])
+
+    def test_get_df_output_missing_transcript(self) -> None:
+        with self.assertRaises(KeyError):
+            self.processor._get_df_output(get_results_archive({'other.csv': b'a,b'}))
+
+
+class AnalysisContextTestCase(unittest.TestCase):
+    def test_convert_to_dialogue_structure(self) -> None:
+        transcription = pd.DataFrame({'speaker': ['agent', 'customer'], 'text': ['Hello.', 'Hi!']})
+        self.assertEqual(analysis.convert_to_dialogue_structure(transcription), 'agent: Hello.\ncustomer: Hi!\n')
+
+    def test_sources_fingerprint(self) -> None:
+        with tempfile.TemporaryDirectory() as documents_path:
+            document_path = os.path.join(documents_path, 'facts.txt')
+            with open(document_path, 'w') as file:
+                file.write('The store opens at 9am.')
+            fingerprint = analysis.get_sources_fingerprint(documents_path, [])
+            self.assertEqual(analysis.get_sources_fingerprint(documents_path, []), fingerprint)
+            self.assertNotEqual(analysis.get_sources_fingerprint(documents_path, ['https://example.com']), fingerprint)
+            # a changed document changes the fingerprint, so the retriever is built again
+            time.sleep(0.01)
+            with open(document_path, 'a') as file:
+                file.write(' It closes at 6pm.')
+            self.assertNotEqual(analysis.get_sources_fingerprint(documents_path, []), fingerprint)
+
+    def test_combined_extraction(self) -> None:
+        combined_response = {
+            'classification': 'sales',
+            'entities': {'name': ['Jane']},
+            'sentiment': 'positive',
+        }
+        model = FakeListLLM(responses=[f'```json\n{json.dumps(combined_response)}\n```'])
+        classification, entities, sentiment = analysis.get_topic_entities_sentiment(
+            'customer: I want to buy a phone, I am Jane', ['sales', 'complains'], ['name', 'city'], ['positive'], model
+        )
+        self.assertEqual(classification, ['sales'])
+        # the entities missing from the model output are empty
+        self.assertEqual(entities, {'name': ['Jane'], 'city': []})
+        self.assertEqual(sentiment, 'positive')
+
+
+class BatchAnalysisTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.input_dir = os.path.join(self.temp_dir.name, 'calls')
+        for path in ['b.csv', 'a.wav', 'day1/c.CSV', 'notes.txt']:
+            os.makedirs(os.path.dirname(os.path.join(self.input_dir, path)), exist_ok=True)
+            with open(os.path.join(self.input_dir, path), 'w') as file:
+                file.write('speaker,text\n')
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_get_call_inputs_from_folder(self) -> None:
+        call_inputs = get_call_inputs(self.input_dir)
+        self.assertEqual([call_input.call_id for call_input in call_inputs], ['a', 'b', 'day1/c'])
+        self.assertTrue(all(os.path.isabs(call_input.path) for call_input in call_inputs))
+
+    def test_get_call_inputs_from_manifest(self) -> None:
+        manifest_path = os.path.join(self.temp_dir.name, 'manifest.jsonl')
+        with open(manifest_path, 'w') as file:
+            file.write(json.dumps({'path': 'calls/b.csv', 'call_id': 1}) + '\n')
+            file.write(json.dumps({'path': 'calls/a.wav', 'call_id': 2}) + '\n')
+        call_inputs = get_call_inputs(manifest_path)
+        self.assertEqual(call_inputs[0], CallInput('1', os.path.join(self.temp_dir.name, 'calls/b.csv')))
+        self.assertEqual(len(call_inputs), 2)
+
+    def test_get_call_inputs_duplicated_ids(self) -> None:
+        manifest_path = os.path.join(self.temp_dir.name, 'manifest.csv')
+        pd.DataFrame({'path': ['calls/b.csv', 'other/b.csv']}).to_csv(manifest_path, index=False)
+        with self.assertRaises(ValueError):
+            get_call_inputs(manifest_path)
+
+    def test_resume_interrupted_run(self) -> None:
+        output_dir = os.path.join(self.temp_dir.name, 'results')
+        writer = ResultsWriter(output_dir, parquet=False)
+        writer.write({'call_id': 'a', 'status': 'succeeded'})
+        writer.write(get_failed_record(CallInput('b', 'b.csv'), ValueError('bad output'), attempts=3, duration=1.0))
+        writer.close()
+        # the run is interrupted while writing a result
+        with open(writer.results_path, 'a') as file:
+            file.write('{"call_id": "c", "sta')
+
+        writer = ResultsWriter(output_dir, parquet=False)
+        # only the succeeded calls are skipped, the failed ones are analysed again
+        self.assertEqual(writer.get_analysed_call_ids(), {'a'})
+        writer.write({'call_id': 'c', 'status': 'succeeded'})
+        self.assertEqual(writer.get_analysed_call_ids(), {'a', 'c'})
+
+
+if __name__ == '__main__':
+    test_program = unittest.main(exit=False)
+    sys.exit(0 if test_program.result.wasSuccessful() else 1)
@@ -0,0 +1,227 @@
+import os
+import re
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from io import BytesIO
+from typing import Iterator, List, NamedTuple, Optional, Tuple, Union
+
+SILENCE_START_PATTERN = re.compile(r'silence_start: (-?[\d.]+)')
+SILENCE_END_PATTERN = re.compile(r'silence_end: (-?[\d.]+)')
+# Minimum number of repeated words to consider that two consecutive chunk transcripts overlap
+MIN_OVERLAP_WORDS = 2
+
+
+class AudioChunk(NamedTuple):
+    index: int
+    start: float
+    end: float
+
+
+@contextmanager
+def audio_file_path(audio: Union[BytesIO, str]) -> Iterator[str]:
+    """
+    Get a path to the audio on disk, so the chunks can be read with ffmpeg without copying the whole audio.
+
+    Args:
+        audio (Union[BytesIO, str]): The path to the audio file, or the in memory audio file.
+
+    Yields:
+        str: The path to the audio file, a temporary file deleted on exit for in memory audio files.
+    """
+    if isinstance(audio, str):
+        yield audio
+        return
+    _, extension = os.path.splitext(getattr(audio, 'name', '') or '')
+    with tempfile.NamedTemporaryFile(suffix=extension or '.mp3', delete=False) as temp_file:
+        # write the underlying buffer directly, without moving the position of the shared BytesIO
+        temp_file.write(audio.getbuffer())
+    try:
+        yield temp_file.name
+    finally:
+        os.remove(temp_file.name)
+
+
+def run_ffmpeg(command: List[str]) -> subprocess.CompletedProcess[bytes]:
+    """
+    Run an ffmpeg or ffprobe command.
+
+    Args:
+        command (List[str]): The command and its arguments.
+
+    Returns:
+        subprocess.CompletedProcess: The completed process, with the captured stdout and stderr.
+    """
+    try:
+        return subprocess.run(command, capture_output=True, check=True)
+    except FileNotFoundError as e:
+        raise Exception(f'{command[0]} not found, please install ffmpeg to process long audios') from e
+    except subprocess.CalledProcessError as e:
+        raise Exception(f'{command[0]} failed: {e.stderr.decode(errors="ignore")[-500:]}') from e
+
+
+def get_audio_duration(path: str) -> float:
+    """
+    Get the duration of an audio file.
+
+    Args:
+        path (str): The path to the audio file.
+
+    Returns:
+        float: The duration of the audio in seconds.
+    """
+    result = run_ffmpeg(
+        [
+            'ffprobe',
+            '-v',
+            'error',
+            '-show_entries',
+            'format=duration',
+            '-of',
+            'default=noprint_wrappers=1:nokey=1',
+            path,
+        ]
+    )
+    return float(result.stdout.decode().strip())
+
+
+def detect_silences(
+    path: str, silence_threshold: float = -30, min_silence_duration: float = 0.5
+) -> List[Tuple[float, float]]:
+    """
+    Detect the silences of an audio file with the ffmpeg silencedetect filter.
+
+    Args:
+        path (str): The path to the audio file.
+        silence_threshold (float): The volume in dB under which the audio is considered silent.
+        min_silence_duration (float): The minimum duration in seconds of a silence.
+
+    Returns:
+        List[Tuple[float, float]]: The start and end in seconds of each silence.
+    """
+    result = run_ffmpeg(
+        [
+            'ffmpeg',
+            '-hide_banner',
+            '-nostats',
+            '-i',
+            path,
+            '-af',
+            f'silencedetect=noise={silence_threshold}dB:d={min_silence_duration}',
+            '-f',
+            'null',
+            '-',
+        ]
+    )
+    output = result.stderr.decode(errors='ignore')
+    starts = [float(start) for start in SILENCE_START_PATTERN.findall(output)]
+    ends = [float(end) for end in SILENCE_END_PATTERN.findall(output)]
+    # a silence lasting until the end of the audio has no end
+    return list(zip(starts, ends))
+
+
+def plan_chunks(
+    duration: float,
+    chunk_duration: float,
+    overlap: float,
+    silences: Optional[List[Tuple[float, float]]] = None,
+) -> List[AudioChunk]:
+    """
+    Split an audio in chunks, preferably on silences, otherwise in fixed windows overlapping each other.
+
+    A chunk is cut in the middle of the last silence of the second half of its window, so no word is split and
+    the next chunk starts there. When there is no silence, the chunk is cut at the end of its window and the next
+    chunk starts `overlap` seconds before, so the words at the boundary are fully in one of the chunks.
+
+    Args:
+        duration (float): The duration of the audio in seconds.
+        chunk_duration (float): The maximum duration of a chunk in seconds.
+        overlap (float): The overlap in seconds between two chunks cut outside a silence.
+        silences (List[Tuple[float, float]], optional): The start and end in seconds of the silences of the audio.
+
+    Returns:
+        List[AudioChunk]: The chunks of the audio, in order.
+    """
+    if chunk_duration <= overlap:
+        raise ValueError('The chunk duration must be greater than the overlap')
+    silence_midpoints = sorted((start + end) / 2 for start, end in silences or [])
+    chunks: List[AudioChunk] = []
+    start = 0.0
+    while True:
+        window_end = start + chunk_duration
+        if window_end >= duration:
+            chunks.append(AudioChunk(len(chunks), start, duration))
+            return chunks
+        cut_points = [
+            midpoint for midpoint in silence_midpoints if start + chunk_duration / 2 <= midpoint <= window_end
+        ]
+        if len(cut_points) > 0:
+            chunks.append(AudioChunk(len(chunks), start, cut_points[-1]))
+            start = cut_points[-1]
+        else:
+            chunks.append(AudioChunk(len(chunks), start, window_end))
+            start = window_end - overlap
+
+
+def read_audio_chunk(path: str, chunk: AudioChunk) -> bytes:
+    """
+    Read a chunk of an audio file from disk, encoded as mp3.
+
+    Args:
+        path (str): The path to the audio file.
+        chunk (AudioChunk): The chunk to read.
+
+    Returns:
+        bytes: The mp3 encoded audio of the chunk.
+    """
+    result = run_ffmpeg(
+        [
+            'ffmpeg',
+            '-hide_banner',
+            '-loglevel',
+            'error',
+            '-ss',
+            f'{chunk.start:.3f}',
+            '-t',
+            f'{chunk.end - chunk.start:.3f}',
+            '-i',
+            path,
+            '-vn',
+            '-f',
+            'mp3',
+            'pipe:1',
+        ]
+    )
+    return result.stdout
+
+
+def normalize_word(word: str) -> str:
+    return re.sub(r'[^\w]', '', word.lower())
+
+
+def stitch_transcripts(previous: str, current: str, max_overlap_words: int) -> str:
+    """
+    Append the transcript of a chunk to the transcript of the previous chunks, removing the words repeated
+    at their boundary because of the overlap of the chunks.
+
+    Args:
+        previous (str): The transcript of the previous chunks.
+        current (str): The transcript of the chunk to append.
+        max_overlap_words (int): The maximum number of words which can be repeated at the boundary.
+
+    Returns:
+        str: The stitched transcript.
+    """
+    current_words = current.split()
+    if len(previous.strip()) == 0:
+        return ' '.join(current_words)
+    previous_tail = [normalize_word(word) for word in previous.rsplit(maxsplit=max_overlap_words)[-max_overlap_words:]]
+    current_head = [normalize_word(word) for word in current_words[:max_overlap_words]]
+    # the longest sequence of words ending the previous transcript and starting the current one
+    for num_words in range(min(len(previous_tail), len(current_head)), MIN_OVERLAP_WORDS - 1, -1):
+        if previous_tail[-num_words:] == current_head[:num_words]:
+            current_words = current_words[num_words:]
+            break
+    if len(current_words) == 0:
+        return previous
+    return f'{previous.rstrip()} {" ".join(current_words)}'
@@ -0,0 +1,240 @@
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from io import BytesIO
+from typing import Dict, Optional, Union
+from urllib.parse import parse_qs, urlparse
+
+HASH_CHUNK_SIZE = 1024 * 1024
+YOUTUBE_VIDEO_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{11}$')
+YOUTUBE_PATH_PREFIXES = ('shorts', 'embed', 'live', 'v')
+
+# Number of users of each stored audio, by path, shared by the stores of the process, e.g. one per app session
+_audio_leases: Dict[str, int] = {}
+_audio_leases_lock = threading.Lock()
+
+
+def get_youtube_video_id(url: str) -> Optional[str]:
+    """
+    Get the id of a YouTube video from its url.
+
+    Args:
+        url (str): The YouTube url, e.g. https://www.youtube.com/watch?v=<id> or https://youtu.be/<id>.
+
+    Returns:
+        str: The id of the video, or None if the url is not a YouTube video url.
+    """
+    parsed_url = urlparse(url.strip())
+    host = (parsed_url.hostname or '').lower()
+    path_parts = [part for part in parsed_url.path.split('/') if part]
+    video_id = None
+    if host == 'youtu.be' and len(path_parts) > 0:
+        video_id = path_parts[0]
+    elif host.endswith('youtube.com'):
+        if 'v' in parse_qs(parsed_url.query):
+            video_id = parse_qs(parsed_url.query)['v'][0]
+        elif len(path_parts) > 1 and path_parts[0] in YOUTUBE_PATH_PREFIXES:
+            video_id = path_parts[1]
+    if video_id is not None and YOUTUBE_VIDEO_ID_PATTERN.match(video_id):
+        return video_id
+    return None
+
+
+def hash_audio(audio: Union[BytesIO, str]) -> str:
+    """
+    Compute the SHA-256 hash of the content of an audio.
+
+    Args:
+        audio (Union[BytesIO, str]): The path to the audio file, or the in memory audio file.
+
+    Returns:
+        str: The hexadecimal hash of the audio content.
+    """
+    if not isinstance(audio, str):
+        # hash the underlying buffer, without moving the position of the shared BytesIO
+        return hashlib.sha256(audio.getbuffer()).hexdigest()
+    audio_hash = hashlib.sha256()
+    with open(audio, 'rb') as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            audio_hash.update(chunk)
+    return audio_hash.hexdigest()
+
+
+class MediaStore:
+    def __init__(self, store_path: str, max_size: int) -> None:
+        """
+        Initialize the persistent store of the downloaded audios and of the transcripts.
+
+        The audios are stored by source key, e.g. `youtube:<video id>`, and the transcripts by the hash
+        of the audio content. When the stored audios and transcripts exceed `max_size` bytes, the least
+        recently used ones are evicted, except the audios still in use, which are leased by `get_audio_path`
+        and `add_audio` until `release_audio`.
+
+        Args:
+            store_path (str): The folder of the stored audios and of the SQLite index.
+            max_size (int): The maximum size in bytes of the stored audios and transcripts.
+        """
+        self.store_path = os.path.abspath(store_path)
+        self.audios_path = os.path.join(self.store_path, 'audios')
+        self.downloads_path = os.path.join(self.store_path, 'downloads')
+        os.makedirs(self.audios_path, exist_ok=True)
+        os.makedirs(self.downloads_path, exist_ok=True)
+        self.max_size = max_size
+        # the store is shared by the sessions of the streamlit app, which run in different threads
+        self._connection = sqlite3.connect(os.path.join(self.store_path, 'index.sqlite'), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS audios (key TEXT PRIMARY KEY, path TEXT, size INTEGER, last_access REAL)'
+            )
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS transcripts '
+                '(content_hash TEXT PRIMARY KEY, transcript TEXT, size INTEGER, last_access REAL)'
+            )
+
+    def get_audio_path(self, key: str) -> Optional[str]:
+        """
+        Get a stored audio, leased until `release_audio` is called with its path, so it is not evicted while in use.
+
+        Args:
+            key (str): The source key of the audio, e.g. `youtube:<video id>`.
+
+        Returns:
+            str: The path to the stored audio, or None if the audio is not stored.
+        """
+        with self._lock, self._connection:
+            row = self._connection.execute('SELECT path FROM audios WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            with _audio_leases_lock:
+                if not os.path.exists(row[0]):
+                    self._connection.execute('DELETE FROM audios WHERE key = ?', (key,))
+                    return None
+                _audio_leases[row[0]] = _audio_leases.get(row[0], 0) + 1
+            self._connection.execute('UPDATE audios SET last_access = ? WHERE key = ?', (time.time(), key))
+        path: str = row[0]
+        return path
+
+    def add_audio(self, key: str, path: str) -> str:
+        """
+        Move an audio file into the store, leased until `release_audio` is called with its stored path.
+
+        Args:
+            key (str): The source key of the audio, e.g. `youtube:<video id>`.
+            path (str): The path to the audio file, which is moved into the store.
+
+        Returns:
+            str: The path to the stored audio.
+        """
+        _, extension = os.path.splitext(path)
+        file_name = hashlib.sha256(key.encode('utf-8')).hexdigest() + extension
+        stored_path = os.path.join(self.audios_path, file_name)
+        shutil.move(path, stored_path)
+        with _audio_leases_lock:
+            _audio_leases[stored_path] = _audio_leases.get(stored_path, 0) + 1
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO audios (key, path, size, last_access) VALUES (?, ?, ?, ?)',
+                (key, stored_path, os.path.getsize(stored_path), time.time()),
+            )
+        self.evict(keep_key=key)
+        return stored_path
+
+    def release_audio(self, path: str) -> None:
+        """
+        Release a stored audio returned by `get_audio_path` or `add_audio`, so it can be evicted.
+
+        Args:
+            path (str): The path to the stored audio.
+        """
+        with _audio_leases_lock:
+            num_leases = _audio_leases.get(path, 0) - 1
+            if num_leases > 0:
+                _audio_leases[path] = num_leases
+            else:
+                _audio_leases.pop(path, None)
+
+    def is_stored_audio(self, path: str) -> bool:
+        """
+        Check if a file is an audio of the store, which must not be deleted by its users.
+
+        Args:
+            path (str): The path to the file.
+
+        Returns:
+            bool: Whether the file is in the store.
+        """
+        return os.path.dirname(os.path.abspath(path)) == self.audios_path
+
+    def get_transcript(self, content_hash: str) -> Optional[str]:
+        """
+        Get the stored transcript of an audio.
+
+        Args:
+            content_hash (str): The hash of the audio content, as returned by `hash_audio`.
+
+        Returns:
+            str: The transcript of the audio, or None if the audio was never transcribed.
+        """
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                'SELECT transcript FROM transcripts WHERE content_hash = ?', (content_hash,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                'UPDATE transcripts SET last_access = ? WHERE content_hash = ?', (time.time(), content_hash)
+            )
+        transcript: str = row[0]
+        return transcript
+
+    def add_transcript(self, content_hash: str, transcript: str) -> None:
+        """
+        Store the transcript of an audio.
+
+        Args:
+            content_hash (str): The hash of the audio content, as returned by `hash_audio`.
+            transcript (str): The transcript of the audio.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO transcripts (content_hash, transcript, size, last_access) VALUES (?, ?, ?, ?)',
+                (content_hash, transcript, len(transcript.encode('utf-8')), time.time()),
+            )
+        self.evict(keep_key=content_hash)
+
+    def evict(self, keep_key: Optional[str] = None) -> None:
+        """
+        Remove the least recently used audios and transcripts until the store fits in its maximum size.
+        The audios still in use are kept.
+
+        Args:
+            keep_key (str, optional): The key of an audio or a transcript which must not be evicted, e.g. the one
+                just added.
+        """
+        with self._lock, self._connection:
+            entries = self._connection.execute(
+                "SELECT 'audios', key, path, size, last_access FROM audios "
+                "UNION ALL SELECT 'transcripts', content_hash, NULL, size, last_access FROM transcripts "
+                'ORDER BY last_access'
+            ).fetchall()
+            total_size = sum(entry[3] for entry in entries)
+            for table, key, path, size, _ in entries:
+                if total_size <= self.max_size:
+                    break
+                if key == keep_key:
+                    continue
+                if table == 'audios':
+                    with _audio_leases_lock:
+                        if _audio_leases.get(path, 0) > 0:
+                            continue
+                        self._connection.execute('DELETE FROM audios WHERE key = ?', (key,))
+                        if os.path.exists(path):
+                            os.remove(path)
+                else:
+                    self._connection.execute('DELETE FROM transcripts WHERE content_hash = ?', (key,))
+                total_size -= size
@@ -1,11 +1,10 @@
 import argparse
 import base64
 import concurrent.futures
-import copy
 import os
 import sys
 from io import BytesIO
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
 import yaml
 import yt_dlp
@@ -25,12 +24,25 @@ repo_dir = os.path.abspath(os.path.join(kit_dir, '..'))
 sys.path.append(kit_dir)
 sys.path.append(repo_dir)
 
+from sambanova_scribe.src.audio_chunking import (
+    MIN_OVERLAP_WORDS,
+    audio_file_path,
+    detect_silences,
+    get_audio_duration,
+    plan_chunks,
+    read_audio_chunk,
+    stitch_transcripts,
+)
+from sambanova_scribe.src.media_store import MediaStore, get_youtube_video_id, hash_audio
 from utils.model_wrappers.api_gateway import APIGateway
+from utils.summarization.map_reduce import MapReduceSummarizer
 
 load_dotenv(os.path.join(repo_dir, '.env'))
 
 CONFIG_PATH = os.path.join(kit_dir, 'config.yaml')
 MAX_FILE_SIZE = 25 * 1024 * 1024  # 25 MB in bytes
+# Approximate number of words spoken per second, used to bound the words repeated in the overlap of two chunks
+WORDS_PER_SECOND = 4
 
 
 class FileSizeExceededError(Exception):
@@ -59,12 +71,19 @@ class Scribe:
         self.llm_info = config[0]
         self.audio_model_info = config[1]
         self.prod_mode = config[2]
+        self.long_audio_info = config[3]
+        self.summarization_info = config[4]
+        self.media_store_info = config[5]
         self.sambanova_api_key: Optional[str] = sambanova_api_key
         self.audio_model = self.set_audio_model()
         self.llm = self.set_llm()
+        self.summarizer = self.set_summarizer()
+        self.media_store = self.set_media_store()
         self.reset_query_audio_conversation()
 
-    def get_config_info(self) -> Tuple[Dict[str, Any], Dict[str, Any], bool]:
+    def get_config_info(
+        self,
+    ) -> Tuple[Dict[str, Any], Dict[str, Any], bool, Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
         """
         Loads json config file
         """
@@ -73,8 +92,11 @@ class Scribe:
         llm_info = config['llm']
         audio_model_info = config['audio_model']
         prod_mode = config['prod_mode']
+        long_audio_info = config.get('long_audio', {})
+        summarization_info = config.get('summarization', {})
+        media_store_info = config.get('media_store', {})
 
-        return llm_info, audio_model_info, prod_mode
+        return llm_info, audio_model_info, prod_mode, long_audio_info, summarization_info, media_store_info
 
     def set_audio_model(self) -> BaseChatModel:
         """
@@ -113,6 +135,41 @@ class Scribe:
         )
         return llm
 
+    def set_summarizer(self) -> MapReduceSummarizer:
+        """
+        Sets the map-reduce summarizer, splitting the long transcripts in chunks summarized concurrently.
+
+        Returns:
+        MapReduceSummarizer: The summarizer using the LLM.
+        """
+        summarizer = MapReduceSummarizer(
+            llm=self.llm,
+            map_prompt=load_prompt(os.path.join(kit_dir, 'prompts', 'chunk_summary.yaml')),
+            reduce_prompt=load_prompt(os.path.join(kit_dir, 'prompts', 'summary.yaml')),
+            text_variable='text',
+            chunk_size=self.summarization_info.get('chunk_size', 2000),
+            chunk_overlap=self.summarization_info.get('chunk_overlap', 100),
+            max_reduce_tokens=self.summarization_info.get('max_reduce_tokens', 4000),
+            max_concurrency=self.summarization_info.get('max_concurrency', 8),
+            cache_size=self.summarization_info.get('cache_size', 1024),
+        )
+        return summarizer
+
+    def set_media_store(self) -> Optional[MediaStore]:
+        """
+        Sets the persistent store of the downloaded audios and of the transcripts.
+
+        Returns:
+        MediaStore: The media store, or None if it is disabled in the config.
+        """
+        if not self.media_store_info.get('enabled', False):
+            return None
+        media_store = MediaStore(
+            store_path=os.path.join(kit_dir, self.media_store_info.get('path', 'data/media_store')),
+            max_size=int(self.media_store_info.get('max_size_mb', 1024) * 1024 * 1024),
+        )
+        return media_store
+
     def summarize(self, text: str, num: int = 5) -> str:
         """
         /Crete a bullet points summarY of the text input.
@@ -124,9 +181,7 @@ class Scribe:
         Returns:
             str: The bullet points summary of the text.
         """
-        prompt_template = load_prompt(os.path.join(kit_dir, 'prompts', 'summary.yaml'))
-        chain = prompt_template | self.llm | StrOutputParser()
-        summary = chain.invoke({'text': text, 'num': num})
+        summary = self.summarizer.summarize(text, num=num)
         return summary
 
     def reset_query_audio_conversation(self) -> None:
@@ -191,14 +246,21 @@ class Scribe:
             with open(audio, 'rb') as file:
                 audio_bytes = file.read()
         else:
-            # make a copy given BytesIO object is not thread safe
-            audio_copy = copy.deepcopy(audio)
-            audio_bytes = audio_copy.read()
+            # getvalue does not move the position of the BytesIO object, which is shared between threads
+            audio_bytes = audio.getvalue()
         b64_audio = self.encode_to_base64(content=audio_bytes)
         return b64_audio
 
-    def transcribe_audio(self, audio_file: Union[BytesIO, str]) -> str:
-        b64_audio = self.load_encode_audio(audio_file)
+    def transcribe_encoded_audio(self, b64_audio: str) -> str:
+        """
+        Transcribe a base64 encoded mp3 audio in a single request to the audio model.
+
+        Args:
+            b64_audio (str): The base64 encoded audio.
+
+        Returns:
+            str: The transcript of the audio.
+        """
         conversation = [
             AIMessage('You are Automatic Speech Recognition tool'),
             HumanMessage(
@@ -223,12 +285,120 @@ class Scribe:
 
         return chain.invoke(conversation).transcript  # type: ignore
 
+    def transcribe_audio(self, audio_file: Union[BytesIO, str]) -> str:
+        """
+        Transcribe an audio, splitting it in chunks transcribed concurrently if it is longer than
+        the `long_audio` `min_duration` config.
+
+        Args:
+            audio_file (Union[BytesIO, str]): The path to the audio file, or the in memory audio file.
+
+        Returns:
+            str: The transcript of the audio.
+        """
+        transcript = ''
+        for transcript in self.stream_transcribe_audio(audio_file):
+            pass
+        return transcript
+
+    def stream_transcribe_audio(self, audio_file: Union[BytesIO, str]) -> Iterator[str]:
+        """
+        Transcribe an audio, yielding the partial transcript each time the transcript of a chunk is stitched to it.
+
+        The transcripts are stored by the hash of the audio content, so an audio already transcribed is not
+        sent to the audio model again.
+
+        Args:
+            audio_file (Union[BytesIO, str]): The path to the audio file, or the in memory audio file.
+
+        Yields:
+            str: The transcript of the beginning of the audio, the last one being the transcript of the whole audio.
+        """
+        content_hash = None
+        if self.media_store is not None:
+            content_hash = hash_audio(audio_file)
+            stored_transcript = self.media_store.get_transcript(content_hash)
+            if stored_transcript is not None:
+                yield stored_transcript
+                return
+
+        transcript = ''
+        for transcript in self.stream_transcribe_new_audio(audio_file):
+            yield transcript
+        if self.media_store is not None and content_hash is not None:
+            self.media_store.add_transcript(content_hash, transcript)
+
+    def stream_transcribe_new_audio(self, audio_file: Union[BytesIO, str]) -> Iterator[str]:
+        """
+        Transcribe an audio with the audio model, yielding the partial transcript each time the transcript
+        of a chunk is stitched to it.
+
+        The audios longer than the `long_audio` `min_duration` config are split on silences or in overlapping
+        fixed windows. The chunks are read from disk and transcribed concurrently, then stitched in order,
+        removing the words repeated in the overlap of two chunks.
+
+        Args:
+            audio_file (Union[BytesIO, str]): The path to the audio file, or the in memory audio file.
+
+        Yields:
+            str: The transcript of the beginning of the audio, the last one being the transcript of the whole audio.
+        """
+        min_duration = self.long_audio_info.get('min_duration')
+        if min_duration is None:
+            yield self.transcribe_encoded_audio(self.load_encode_audio(audio_file))
+            return
+
+        with audio_file_path(audio_file) as audio_path:
+            duration = get_audio_duration(audio_path)
+            if duration <= min_duration:
+                yield self.transcribe_encoded_audio(self.load_encode_audio(audio_path))
+                return
+
+            chunk_duration = self.long_audio_info.get('chunk_duration', 60)
+            overlap = self.long_audio_info.get('overlap', 2)
+            silences = None
+            if self.long_audio_info.get('split_on_silence', True):
+                silences = detect_silences(
+                    audio_path,
+                    silence_threshold=self.long_audio_info.get('silence_threshold', -30),
+                    min_silence_duration=self.long_audio_info.get('min_silence_duration', 0.5),
+                )
+            chunks = plan_chunks(duration, chunk_duration, overlap, silences)
+            max_overlap_words = max(2 * MIN_OVERLAP_WORDS, int(overlap * WORDS_PER_SECOND * 2))
+
+            def transcribe_chunk(chunk_index: int) -> str:
+                chunk_audio = read_audio_chunk(audio_path, chunks[chunk_index])
+                return self.transcribe_encoded_audio(self.encode_to_base64(chunk_audio))
+
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.long_audio_info.get('max_workers', 4))
+            try:
+                futures = {executor.submit(transcribe_chunk, chunk.index): chunk.index for chunk in chunks}
+                chunk_transcripts: Dict[int, str] = {}
+                next_index = 0
+                transcript = ''
+                for future in concurrent.futures.as_completed(futures):
+                    chunk_transcripts[futures[future]] = future.result()
+                    # stitch the chunks in order, as soon as all the previous chunks are transcribed
+                    if next_index in chunk_transcripts:
+                        while next_index in chunk_transcripts:
+                            transcript = stitch_transcripts(
+                                transcript, chunk_transcripts.pop(next_index), max_overlap_words
+                            )
+                            next_index += 1
+                        yield transcript
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+
     def download_youtube_audio(
         self, url: str, output_path: Optional[str] = None, max_filesize: int = MAX_FILE_SIZE
     ) -> Optional[str]:
         """
         Downloads the audio from a YouTube URL and saves it to the specified output path.
 
+        When the media store is enabled, the audio is kept in the store and the stored audio is returned
+        for the next requests of the same video, without downloading it again. The stored audio is not evicted
+        until `delete_downloaded_file` is called with its path.
+
         Args:
             url (str): The YouTube URL to download.
             output_path (str, optional): The path to save the downloaded audio. Defaults to ./data.
@@ -237,6 +407,14 @@ class Scribe:
         Returns:
             str: The path of the downloaded audio if successful, otherwise None.
         """
+        video_id = get_youtube_video_id(url)
+        if self.media_store is not None and video_id is not None:
+            stored_path = self.media_store.get_audio_path(f'youtube:{video_id}')
+            if stored_path is not None:
+                print(f'Using the stored audio of: {url}')
+                return stored_path
+            if output_path is None:
+                output_path = self.media_store.downloads_path
         if output_path is None:
             output_path = os.path.join(kit_dir, 'data')
         downloaded_filename = None
@@ -283,6 +461,10 @@ class Scribe:
                 if os.path.exists(new_filename):
                     downloaded_filename = new_filename
 
+            # keep the audio, so the next requests of the same video do not download it again
+            if self.media_store is not None and video_id is not None and downloaded_filename is not None:
+                downloaded_filename = self.media_store.add_audio(f'youtube:{video_id}', downloaded_filename)
+
             return downloaded_filename
 
         except FileSizeExceededError as e:
@@ -302,6 +484,11 @@ class Scribe:
             file_path (str): The path of the file to delete.
         """
         try:
+            if self.media_store is not None and self.media_store.is_stored_audio(file_path):
+                # the stored audio is no longer used, so it can be evicted
+                self.media_store.release_audio(file_path)
+                print(f"File '{file_path}' kept in the media store.")
+                return
             # Check if the file exists
             if os.path.exists(file_path):
                 os.remove(file_path)
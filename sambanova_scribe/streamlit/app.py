@@ -236,9 +236,14 @@ def main() -> None:
                                 audio_file = process_audio(audio_file, input_method, youtube_link)  # type: ignore
                                 if audio_file:
                                     st.write('Transcribing audio in background...')
-                                    st.session_state.transcription_text = (
-                                        st.session_state.sambanova_scribe.transcribe_audio(audio_file)
-                                    )
+                                    # long audios are transcribed in chunks, show the transcript as it grows
+                                    partial_transcript = st.empty()
+                                    for transcript in st.session_state.sambanova_scribe.stream_transcribe_audio(
+                                        audio_file
+                                    ):
+                                        partial_transcript.text(transcript)
+                                        st.session_state.transcription_text = transcript
+                                    partial_transcript.empty()
                                     st.toast('Transcription complete!')
                     if st.session_state.transcription_text is not None:
                         st.markdown(r'$\Large{\textsf{Transcription}}$')
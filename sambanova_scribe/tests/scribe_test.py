@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+SambaNova Scribe Test Script
+
+This script tests the audio chunking and the media store of the SambaNova Scribe kit using unittest, without
+calling the transcription models, ffmpeg or YouTube.
+
+Test cases:
+    AudioChunkingTestCase: checks the planning of the chunks of long audios and the stitching of their transcripts
+    MediaStoreTestCase: checks the YouTube video ids, and the storage and eviction of the audios and transcripts
+
+Usage:
+    python tests/scribe_test.py
+
+Returns:
+    0 if all tests pass, or 1 otherwise.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from io import BytesIO
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+kit_dir = os.path.abspath(os.path.join(current_dir, '..'))
+repo_dir = os.path.abspath(os.path.join(kit_dir, '..'))
+
+sys.path.append(kit_dir)
+sys.path.append(repo_dir)
+
+from sambanova_scribe.src.audio_chunking import AudioChunk, plan_chunks, stitch_transcripts
+from sambanova_scribe.src.media_store import MediaStore, get_youtube_video_id, hash_audio
+
+VIDEO_ID = 'dQw4w9WgXcQ'
+
+
+class AudioChunkingTestCase(unittest.TestCase):
+    def test_plan_chunks_short_audio(self) -> None:
+        self.assertEqual(plan_chunks(30, chunk_duration=60, overlap=2), [AudioChunk(0, 0.0, 30)])
+
+    def test_plan_chunks_without_silences(self) -> None:
+        chunks = plan_chunks(150, chunk_duration=60, overlap=2)
+        self.assertEqual(chunks, [AudioChunk(0, 0.0, 60.0), AudioChunk(1, 58.0, 118.0), AudioChunk(2, 116.0, 150)])
+
+    def test_plan_chunks_cut_on_silences(self) -> None:
+        # the last silence of the second half of the window is used, the one of the first half is ignored
+        silences = [(10.0, 12.0), (40.0, 42.0), (50.0, 52.0), (100.0, 104.0)]
+        chunks = plan_chunks(130, chunk_duration=60, overlap=2, silences=silences)
+        self.assertEqual(chunks, [AudioChunk(0, 0.0, 51.0), AudioChunk(1, 51.0, 102.0), AudioChunk(2, 102.0, 130)])
+
+    def test_plan_chunks_invalid_overlap(self) -> None:
+        with self.assertRaises(ValueError):
+            plan_chunks(100, chunk_duration=2, overlap=2)
+
+    def test_stitch_transcripts_removes_overlap(self) -> None:
+        stitched = stitch_transcripts('We will meet on Monday morning.', 'monday morning at the office', 5)
+        self.assertEqual(stitched, 'We will meet on Monday morning. at the office')
+
+    def test_stitch_transcripts_without_overlap(self) -> None:
+        self.assertEqual(stitch_transcripts('Hello there.', 'How are you?', 5), 'Hello there. How are you?')
+        # a single repeated word is not considered an overlap
+        self.assertEqual(stitch_transcripts('I said yes', 'yes I did', 5), 'I said yes yes I did')
+        self.assertEqual(stitch_transcripts('', '  first   chunk ', 5), 'first chunk')
+
+    def test_stitch_transcripts_full_overlap(self) -> None:
+        self.assertEqual(stitch_transcripts('see you later', 'you later', 5), 'see you later')
+
+
+class MediaStoreTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store_path = os.path.join(self.temp_dir.name, 'store')
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def write_audio(self, name: str, size: int) -> str:
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, 'wb') as file:
+            file.write(b'0' * size)
+        return path
+
+    def test_get_youtube_video_id(self) -> None:
+        for url in [
+            f'https://www.youtube.com/watch?v={VIDEO_ID}',
+            f'https://youtube.com/watch?feature=share&v={VIDEO_ID}',
+            f'https://youtu.be/{VIDEO_ID}?t=10',
+            f'https://m.youtube.com/shorts/{VIDEO_ID}',
+            f' https://www.youtube.com/embed/{VIDEO_ID} ',
+        ]:
+            self.assertEqual(get_youtube_video_id(url), VIDEO_ID, url)
+        for url in ['https://www.youtube.com/watch?v=short', 'https://example.com/watch?v=' + VIDEO_ID, 'not a url']:
+            self.assertIsNone(get_youtube_video_id(url), url)
+
+    def test_hash_audio(self) -> None:
+        path = self.write_audio('audio.mp3', 10)
+        audio = BytesIO(b'0' * 10)
+        audio.seek(3)
+        self.assertEqual(hash_audio(audio), hash_audio(path))
+        # the position of the shared in memory audio is not moved
+        self.assertEqual(audio.tell(), 3)
+
+    def test_audio_and_transcript_storage(self) -> None:
+        store = MediaStore(self.store_path, max_size=1000)
+        stored_path = store.add_audio(f'youtube:{VIDEO_ID}', self.write_audio('audio.mp3', 10))
+        store.release_audio(stored_path)
+        self.assertTrue(store.is_stored_audio(stored_path))
+        # the audio is found by another store of the same folder, e.g. after a restart of the app
+        self.assertEqual(MediaStore(self.store_path, max_size=1000).get_audio_path(f'youtube:{VIDEO_ID}'), stored_path)
+        store.release_audio(stored_path)
+        self.assertIsNone(store.get_audio_path('youtube:unknown'))
+
+        store.add_transcript('hash', 'the transcript')
+        self.assertEqual(store.get_transcript('hash'), 'the transcript')
+        self.assertIsNone(store.get_transcript('other hash'))
+
+    def test_evict_least_recently_used(self) -> None:
+        store = MediaStore(self.store_path, max_size=25)
+        first_path = store.add_audio('youtube:first', self.write_audio('first.mp3', 10))
+        store.release_audio(first_path)
+        second_path = store.add_audio('youtube:second', self.write_audio('second.mp3', 10))
+        store.release_audio(second_path)
+        # the third audio exceeds the maximum size, so the least recently used audio is evicted
+        third_path = store.add_audio('youtube:third', self.write_audio('third.mp3', 10))
+        store.release_audio(third_path)
+        self.assertIsNone(store.get_audio_path('youtube:first'))
+        self.assertFalse(os.path.exists(first_path))
+        for key in ['youtube:second', 'youtube:third']:
+            path = store.get_audio_path(key)
+            self.assertIsNotNone(path)
+            assert path is not None
+            store.release_audio(path)
+
+    def test_evict_skips_audios_in_use(self) -> None:
+        store = MediaStore(self.store_path, max_size=15)
+        first_path = store.add_audio('youtube:first', self.write_audio('first.mp3', 10))
+        # the first audio is still leased, e.g. being transcribed by another session
+        second_path = store.add_audio('youtube:second', self.write_audio('second.mp3', 10))
+        self.assertTrue(os.path.exists(first_path))
+        self.assertTrue(os.path.exists(second_path))
+        store.release_audio(first_path)
+        store.release_audio(second_path)
+        store.evict()
+        self.assertFalse(os.path.exists(first_path))
+        self.assertTrue(os.path.exists(second_path))
+
+
+if __name__ == '__main__':
+    test_program = unittest.main(exit=False)
+    sys.exit(0 if test_program.result.wasSuccessful() else 1)
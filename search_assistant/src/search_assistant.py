@@ -15,7 +15,6 @@ from langchain.memory import ConversationSummaryMemory
 from langchain.output_parsers import ResponseSchema, StructuredOutputParser
 from langchain.prompts import load_prompt
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import AsyncHtmlLoader, UnstructuredURLLoader
 from langchain_community.document_transformers import Html2TextTransformer
 from langchain_core.language_models.llms import LLM
 
@@ -30,8 +29,11 @@ from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
 from serpapi import GoogleSearch
 
 from utils.model_wrappers.api_gateway import APIGateway
+from utils.vectordb.deduplication import get_deduplicator
 from utils.vectordb.vector_db import VectorDb
 from utils.visual.env_utils import get_wandb_key
+from utils.web.crawler import get_crawler_params, get_shared_crawler
+from utils.web.http_cache import get_http_cache_from_config, get_http_cache_ttl, make_cache_key
 
 CONFIG_PATH = os.path.join(kit_dir, 'config.yaml')
 PERSIST_DIRECTORY = os.path.join(kit_dir, 'data/my-vector-db')
@@ -86,16 +88,22 @@ class SearchAssistant:
         self.web_crawling_params = config_info[3]
         self.extra_loaders: List[str] = config_info[4]
         self.prod_mode = config_info[5]
+        self.http_cache_params = config_info[6]
         self.documents: Sequence[Document]
         self.urls: List[Any] = []
         self.llm = self.init_llm_model()
         self.vectordb = VectorDb()
+        self.deduplicator = get_deduplicator(self.retrieval_info)
+        self.http_cache = get_http_cache_from_config(self.http_cache_params, kit_dir)
+        self.crawler = get_shared_crawler(
+            http_cache=self.http_cache, **get_crawler_params(self.web_crawling_params, self.http_cache_params)
+        )
         self.qa_chain: Optional[ConversationalRetrievalChain] = None
         self.memory: Optional[ConversationSummaryMemory] = None
 
     def _get_config_info(
         self, config_path: str
-    ) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any], Dict[str, Any], List[str], bool]:
+    ) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any], Dict[str, Any], List[str], bool, Dict[str, Any]]:
         """
         Loads json config file
 
@@ -110,6 +118,7 @@ class SearchAssistant:
         extra_loaders (list): list containing extra loader to use when doing web crawling (only pdf available
         in base kit)
         prod_mode (bool): Boolean indicating whether the app is in production mode
+        http_cache_params (dict): Dictionary containing the on-disk HTTP cache parameters
         """
         with open(config_path, 'r') as yaml_file:
             config = yaml.safe_load(yaml_file)
@@ -119,8 +128,17 @@ class SearchAssistant:
         web_crawling_params = config['web_crawling']
         extra_loaders = config['extra_loaders']
         prod_mode = config['prod_mode']
-
-        return embedding_model_info, llm_info, retrieval_info, web_crawling_params, extra_loaders, prod_mode
+        http_cache_params = config.get('http_cache', {})
+
+        return (
+            embedding_model_info,
+            llm_info,
+            retrieval_info,
+            web_crawling_params,
+            extra_loaders,
+            prod_mode,
+            http_cache_params,
+        )
 
     def init_memory(self) -> None:
         """
@@ -237,10 +255,17 @@ class SearchAssistant:
         payload = json.dumps({'q': query, 'num': limit})
         headers = {'X-API-KEY': os.environ.get('SERPER_API_KEY'), 'Content-Type': 'application/json'}
 
+        cache_key = make_cache_key('serper', query, {'num': limit})
+
         try:
-            response = requests.post(url, headers=headers, data=payload)
-            if response.status_code == 200:
-                results = response.json().get('organic', [])
+            results = self.http_cache.get(cache_key)
+            response: Optional[requests.Response] = None
+            if results is None:
+                response = requests.post(url, headers=headers, data=payload)
+                if response.status_code == 200:
+                    results = response.json().get('organic', [])
+                    self.http_cache.set(cache_key, results, get_http_cache_ttl(self.http_cache_params, 'search_ttl'))
+            if results is not None:
                 if len(results) > 0:
                     links = [r['link'] for r in results]
                     context_list = []
@@ -259,6 +284,7 @@ class SearchAssistant:
                     links = []
                     self.logger.info(f'No answer found for query: {query}')
             else:
+                assert response is not None
                 context = 'Answer not found'
                 links = []
                 self.logger.error(f'Request failed with status code: {response.status_code}')
@@ -304,10 +330,17 @@ class SearchAssistant:
         url = f'http://127.0.0.1:7000/{engine}/search'
         params = {'lang': 'EN', 'limit': limit, 'text': query}
 
+        cache_key = make_cache_key('openserp', query, {'engine': engine, 'lang': 'EN', 'limit': limit})
+
         try:
-            response = requests.get(url, params=params)
-            if response.status_code == 200:
-                results = response.json()
+            results = self.http_cache.get(cache_key)
+            response: Optional[requests.Response] = None
+            if results is None:
+                response = requests.get(url, params=params)
+                if response.status_code == 200:
+                    results = response.json()
+                    self.http_cache.set(cache_key, results, get_http_cache_ttl(self.http_cache_params, 'search_ttl'))
+            if results is not None:
                 if len(results) > 0:
                     links = [r['url'] for r in results]
                     context_list = []
@@ -322,6 +355,7 @@ class SearchAssistant:
                     links = []
                     self.logger.info(f'No answer found for query: {query}')
             else:
+                assert response is not None
                 context = 'Answer not found'
                 links = []
                 self.logger.error(f'Request failed with status code: {response.status_code}')
@@ -364,9 +398,15 @@ class SearchAssistant:
             raise ValueError('engine must be either google or bing')
         params = {'q': query, 'num': limit, 'engine': engine, 'api_key': self.serpapi_api_key}
 
+        cache_key = make_cache_key('serpapi', query, {'num': limit, 'engine': engine})
+
         try:
-            search = GoogleSearch(params)
-            response = search.get_dict()
+            response = self.http_cache.get(cache_key)
+            if response is None:
+                search = GoogleSearch(params)
+                response = search.get_dict()
+                if 'error' not in response:
+                    self.http_cache.set(cache_key, response, get_http_cache_ttl(self.http_cache_params, 'search_ttl'))
 
             knowledge_graph = response.get('knowledge_graph', None)
             results = response.get('organic_results', [])
@@ -396,39 +436,18 @@ class SearchAssistant:
         else:
             return context, links
 
-    def load_remote_pdf(self, url: str) -> List[Document]:
-        """
-        Load PDF files from the given URL.
-        Args:
-            url (str): URL to load pdf document from.
-        Returns:
-            list: A list of loaded pdf documents.
-        """
-        loader = UnstructuredURLLoader(urls=[url])
-        docs = loader.load()
-        return docs
-
     def load_htmls(self, urls: List[str], extra_loaders: Optional[List[str]] = None) -> List[Document]:
         """
-        Load HTML documents from the given URLs.
+        Concurrently load HTML documents from the given URLs.
         Args:
             urls (list): A list of URLs to load HTML documents from.
+            extra_loaders (list, optional): A list of extra loaders to use (only pdf available). Defaults to None.
         Returns:
             list: A list of loaded HTML documents.
         """
         if extra_loaders is None:
             extra_loaders = []
-        docs = []
-        for url in urls:
-            if url.endswith('.pdf'):
-                if 'pdf' in extra_loaders:
-                    docs.extend(self.load_remote_pdf(url))
-                else:
-                    continue
-            else:
-                loader = AsyncHtmlLoader(url, verify_ssl=False)
-                docs.extend(loader.load())
-        return docs
+        return self.crawler.load(urls, load_pdfs='pdf' in extra_loaders)
 
     def link_filter(self, all_links: List[str], excluded_links: Set[str]) -> Set[str]:
         """
@@ -494,6 +513,9 @@ class SearchAssistant:
         scrapped_urls.extend(urls)
 
         docs = self.clean_docs(scraped_docs)
+        # Remove mirror pages before chunking and embedding
+        if self.deduplicator is not None:
+            docs = self.deduplicator.deduplicate(list(docs))
         self.documents = docs
         self.urls = scrapped_urls
 
@@ -517,6 +539,9 @@ class SearchAssistant:
         )
         sources = {site: i + 1 for i, site in enumerate(self.urls)}
         chunks = text_splitter.split_documents(docs)
+        # Remove boilerplate chunks shared across sites before adding the references
+        if self.deduplicator is not None:
+            chunks = self.deduplicator.deduplicate(chunks)
         for chunk in chunks:
             reference = chunk.metadata['source']  # get the number in the dict
             chunk.page_content = f'[reference:{sources[reference]}] {chunk.page_content}\n\n'
@@ -0,0 +1,297 @@
+import heapq
+import itertools
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Protocol, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+utils_dir = os.path.abspath(os.path.join(current_dir, '..'))
+repo_dir = os.path.abspath(os.path.join(utils_dir, '..'))
+sys.path.append(utils_dir)
+sys.path.append(repo_dir)
+
+logger = logging.getLogger(__name__)
+
+SUCCESS_JOB_STATUS = 'EXIT_WITH_0'
+FAILED_JOB_STATUS = 'FAILED'
+
+DEFAULT_MAX_CONCURRENT_JOBS = 4
+DEFAULT_INITIAL_POLL_INTERVAL = 5.0
+DEFAULT_MAX_POLL_INTERVAL = 60.0
+DEFAULT_BACKOFF_FACTOR = 2.0
+
+
+class BatchJobProcessor(Protocol):
+    """The SambaStudio batch inference operations used by the orchestrator, e.g. `BatchASRProcessor`."""
+
+    def create_load_project(self) -> Any: ...
+
+    def create_dataset(self, path: str, **kwargs: Any) -> str: ...
+
+    def check_dataset_creation_progress(self, dataset_name: str) -> bool: ...
+
+    def run_job(self, dataset_name: str) -> Any: ...
+
+    def get_job_status(self, job_id: str) -> str: ...
+
+    def retrieve_results(self, job_id: str) -> Any: ...
+
+    def delete_job(self, job_id: str) -> None: ...
+
+    def delete_dataset(self, dataset_name: str) -> None: ...
+
+
+@dataclass
+class BatchJobResult:
+    """The outcome of the batch inference job of one input."""
+
+    input_path: str
+    result: Any = None
+    error: Optional[BaseException] = None
+    dataset_name: Optional[str] = None
+    job_id: Optional[str] = None
+    duration: float = 0.0
+
+    @property
+    def succeeded(self) -> bool:
+        """Whether the job returned results."""
+        return self.error is None
+
+
+@dataclass
+class _JobState:
+    input_path: str
+    start_time: float
+    stage: str = 'creating_dataset'
+    dataset_name: Optional[str] = None
+    job_id: Optional[str] = None
+    poll_interval: float = 0.0
+    next_poll_time: float = 0.0
+    future: Optional[Future[Any]] = field(default=None, repr=False)
+
+
+class BatchJobOrchestrator:
+    """
+    Run many SambaStudio batch inference jobs concurrently, polling them from a single scheduler.
+
+    Each input goes through: dataset creation → dataset availability → job run → job completion →
+    results download → job and dataset deletion. The blocking steps (dataset upload and results download) run
+    in a thread pool, while the status of all the pending datasets and jobs is polled from the calling thread,
+    with an exponential backoff per job. The results are yielded as soon as each job finishes.
+    """
+
+    def __init__(
+        self,
+        processor: BatchJobProcessor,
+        max_concurrent_jobs: int = DEFAULT_MAX_CONCURRENT_JOBS,
+        initial_poll_interval: float = DEFAULT_INITIAL_POLL_INTERVAL,
+        max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+    ) -> None:
+        """
+        Initialize the orchestrator.
+
+        Args:
+            processor: The batch processor creating the datasets and the jobs.
+            max_concurrent_jobs: Maximum number of inputs being processed at the same time.
+            initial_poll_interval: Seconds before the first status check of a dataset or a job.
+            max_poll_interval: Maximum number of seconds between two status checks.
+            backoff_factor: Factor by which the interval between two status checks grows.
+        """
+        self.processor = processor
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.initial_poll_interval = initial_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.backoff_factor = backoff_factor
+
+    def run(self, input_paths: Iterable[str], **dataset_kwargs: Any) -> Iterator[BatchJobResult]:
+        """
+        Process the inputs concurrently, yielding the result of each input as soon as its job finishes.
+
+        Args:
+            input_paths: The paths of the inputs, each one is processed in its own dataset and job.
+            **dataset_kwargs: Additional arguments for the dataset creation of each input.
+
+        Yields:
+            The result of each input, in completion order.
+        """
+        self.processor.create_load_project()
+
+        pending_inputs = iter(input_paths)
+        active_jobs: List[_JobState] = []
+        # Heap of the next status checks, the counter breaks the ties between jobs
+        poll_queue: List[Tuple[float, int, _JobState]] = []
+        counter = itertools.count()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrent_jobs) as executor:
+                while True:
+                    # Start new inputs while there is room
+                    while len(active_jobs) < self.max_concurrent_jobs:
+                        input_path = next(pending_inputs, None)
+                        if input_path is None:
+                            break
+                        job = _JobState(input_path=input_path, start_time=time.time())
+                        job.future = executor.submit(self.processor.create_dataset, path=input_path, **dataset_kwargs)
+                        active_jobs.append(job)
+                        logger.info(f'Creating the dataset of {input_path}')
+
+                    if len(active_jobs) == 0:
+                        return
+
+                    # Advance the jobs whose blocking step is over
+                    for job in [job for job in active_jobs if job.future is not None and job.future.done()]:
+                        finished_result = self._complete_step(job, poll_queue, counter)
+                        if finished_result is not None:
+                            active_jobs.remove(job)
+                            yield finished_result
+
+                    # Check the status of the datasets and jobs which are due
+                    now = time.time()
+                    while len(poll_queue) > 0 and poll_queue[0][0] <= now:
+                        _, _, job = heapq.heappop(poll_queue)
+                        finished_result = self._poll(job, executor, poll_queue, counter)
+                        if finished_result is not None:
+                            active_jobs.remove(job)
+                            yield finished_result
+
+                    # Wait for the next blocking step to finish or for the next status check
+                    running_futures = [job.future for job in active_jobs if job.future is not None]
+                    if any(future.done() for future in running_futures):
+                        continue
+                    timeout = max(0.0, poll_queue[0][0] - time.time()) if len(poll_queue) > 0 else None
+                    if running_futures:
+                        wait(running_futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                    elif timeout is not None:
+                        time.sleep(timeout)
+        finally:
+            # The caller stopped iterating or an error was raised, delete the datasets and jobs not finished
+            for job in active_jobs:
+                self._abandon(job)
+
+    def _schedule_poll(
+        self, job: _JobState, poll_queue: List[Tuple[float, int, _JobState]], counter: Iterator[int]
+    ) -> None:
+        """Schedule the next status check of a job, backing off exponentially."""
+        if job.poll_interval == 0:
+            job.poll_interval = self.initial_poll_interval
+        else:
+            job.poll_interval = min(job.poll_interval * self.backoff_factor, self.max_poll_interval)
+        job.next_poll_time = time.time() + job.poll_interval
+        heapq.heappush(poll_queue, (job.next_poll_time, next(counter), job))
+
+    def _complete_step(
+        self, job: _JobState, poll_queue: List[Tuple[float, int, _JobState]], counter: Iterator[int]
+    ) -> Optional[BatchJobResult]:
+        """Handle the end of the blocking step of a job, returning its result if the job is over."""
+        assert job.future is not None
+        future, job.future = job.future, None
+        try:
+            value = future.result()
+        except Exception as error:
+            logger.error(f'Processing of {job.input_path} failed during {job.stage}: {error}')
+            self._cleanup(job)
+            return self._make_result(job, error=error)
+
+        if job.stage == 'creating_dataset':
+            job.dataset_name = value
+            job.stage = 'waiting_dataset'
+            self._schedule_poll(job, poll_queue, counter)
+            return None
+
+        # The results have been downloaded
+        self._cleanup(job)
+        return self._make_result(job, result=value)
+
+    def _poll(
+        self,
+        job: _JobState,
+        executor: ThreadPoolExecutor,
+        poll_queue: List[Tuple[float, int, _JobState]],
+        counter: Iterator[int],
+    ) -> Optional[BatchJobResult]:
+        """Check the status of the dataset or of the job, returning its result if the job is over."""
+        try:
+            if job.stage == 'waiting_dataset':
+                assert job.dataset_name is not None
+                if not self.processor.check_dataset_creation_progress(job.dataset_name):
+                    self._schedule_poll(job, poll_queue, counter)
+                    return None
+                job.job_id = self.processor.run_job(job.dataset_name)
+                job.stage = 'running_job'
+                job.poll_interval = 0
+                logger.info(f'Job {job.job_id} of {job.input_path} running')
+                self._schedule_poll(job, poll_queue, counter)
+                return None
+
+            assert job.job_id is not None
+            status = self.processor.get_job_status(job.job_id)
+            if status == SUCCESS_JOB_STATUS:
+                job.stage = 'retrieving_results'
+                job.future = executor.submit(self.processor.retrieve_results, job.job_id)
+                logger.info(f'Job {job.job_id} of {job.input_path} finished')
+                return None
+            if status == FAILED_JOB_STATUS:
+                raise Exception(f'Job {job.job_id} failed!')
+            self._schedule_poll(job, poll_queue, counter)
+            return None
+
+        except Exception as error:
+            logger.error(f'Processing of {job.input_path} failed during {job.stage}: {error}')
+            self._cleanup(job)
+            return self._make_result(job, error=error)
+
+    def _cleanup(self, job: _JobState) -> None:
+        """Delete the job and the dataset of an input from SambaStudio."""
+        if job.job_id is not None:
+            try:
+                self.processor.delete_job(job.job_id)
+            except Exception as error:
+                logger.warning(f'Job {job.job_id} could not be deleted: {error}')
+        if job.dataset_name is not None:
+            try:
+                self.processor.delete_dataset(job.dataset_name)
+            except Exception as error:
+                logger.warning(f'Dataset {job.dataset_name} could not be deleted: {error}')
+
+    def _abandon(self, job: _JobState) -> None:
+        """Clean up a job which is not over, once its blocking step has finished."""
+        if job.future is not None and job.stage == 'creating_dataset':
+            future, job.future = job.future, None
+            if not future.cancelled() and future.exception() is None:
+                job.dataset_name = future.result()
+        logger.info(f'Processing of {job.input_path} abandoned during {job.stage}')
+        self._cleanup(job)
+
+    def _make_result(self, job: _JobState, result: Any = None, error: Optional[BaseException] = None) -> BatchJobResult:
+        return BatchJobResult(
+            input_path=job.input_path,
+            result=result,
+            error=error,
+            dataset_name=job.dataset_name,
+            job_id=job.job_id,
+            duration=time.time() - job.start_time,
+        )
+
+
+def get_orchestrator_kwargs(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Get the orchestrator parameters from the `orchestration` section of a kit configuration.
+
+    Args:
+        config: The batch inference configuration, e.g. the `asr` section of the kit configuration.
+
+    Returns:
+        The keyword arguments of `BatchJobOrchestrator`, with the defaults for the missing values.
+    """
+    orchestration_config = config.get('orchestration', {}) or {}
+    return {
+        'max_concurrent_jobs': orchestration_config.get('max_concurrent_jobs', DEFAULT_MAX_CONCURRENT_JOBS),
+        'initial_poll_interval': orchestration_config.get('initial_poll_interval', DEFAULT_INITIAL_POLL_INTERVAL),
+        'max_poll_interval': orchestration_config.get('max_poll_interval', DEFAULT_MAX_POLL_INTERVAL),
+        'backoff_factor': orchestration_config.get('backoff_factor', DEFAULT_BACKOFF_FACTOR),
+    }
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.runnables import Runnable
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+utils_dir = os.path.abspath(os.path.join(current_dir, '..'))
+repo_dir = os.path.abspath(os.path.join(utils_dir, '..'))
+sys.path.append(utils_dir)
+sys.path.append(repo_dir)
+
+logger = logging.getLogger(__name__)
+
+# Rough number of characters per token of the Llama tokenizers on English text
+CHARACTERS_PER_TOKEN = 4
+
+DEFAULT_CHUNK_SIZE = 2000
+DEFAULT_CHUNK_OVERLAP = 100
+DEFAULT_MAX_REDUCE_TOKENS = 4000
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_CACHE_SIZE = 1024
+SEPARATOR = '\n\n'
+
+
+def estimate_num_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens of a text, without loading a tokenizer.
+
+    Args:
+        text: The text.
+
+    Returns:
+        The estimated number of tokens.
+    """
+    return len(text) // CHARACTERS_PER_TOKEN + 1
+
+
+def invoke_runnable(runnable: Runnable[Any, Any], input: Any) -> Any:
+    return runnable.invoke(input)
+
+
+class MapReduceSummarizer:
+    """
+    Summarize long texts with concurrent map calls and a hierarchical reduce.
+
+    A text fitting in `max_reduce_tokens` is summarized in a single call of the reduce prompt. Longer texts are
+    split in chunks of `chunk_size` tokens, which are summarized concurrently with the map prompt. The chunk
+    summaries are then grouped in parts of at most `max_reduce_tokens`, which are collapsed concurrently with the
+    collapse prompt, level by level, until they fit in the final reduce call. The map and collapse results are
+    cached by the hash of their prompt and input, so a text summarized again only runs the changed chunks.
+    """
+
+    def __init__(
+        self,
+        llm: BaseLanguageModel[Any],
+        map_prompt: BasePromptTemplate,
+        reduce_prompt: BasePromptTemplate,
+        collapse_prompt: Optional[BasePromptTemplate] = None,
+        text_variable: str = 'text',
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+        max_reduce_tokens: int = DEFAULT_MAX_REDUCE_TOKENS,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        length_function: Callable[[str], int] = estimate_num_tokens,
+        invoke_function: Callable[[Runnable[Any, Any], Any], Any] = invoke_runnable,
+    ) -> None:
+        """
+        Initialize the summarizer.
+
+        Args:
+            llm: The model used for all the calls.
+            map_prompt: The prompt summarizing a chunk of the text.
+            reduce_prompt: The prompt producing the final summary.
+            collapse_prompt: The prompt merging several summaries into one, the map prompt by default.
+            text_variable: The input variable of the prompts receiving the text.
+            chunk_size: Maximum number of tokens of a chunk of the text.
+            chunk_overlap: Number of tokens shared by two consecutive chunks split from the same text.
+            max_reduce_tokens: Maximum number of tokens of the input of a reduce or collapse call.
+            max_concurrency: Maximum number of map or collapse calls running at the same time.
+            cache_size: Maximum number of map and collapse results kept in the cache.
+            length_function: Function counting the tokens of a text.
+            invoke_function: Function invoking a chain with its input, e.g. to apply a global budget of calls.
+        """
+        if max_reduce_tokens < chunk_size:
+            raise ValueError('max_reduce_tokens must be greater than or equal to chunk_size')
+        self.llm = llm
+        self.map_prompt = map_prompt
+        self.reduce_prompt = reduce_prompt
+        self.collapse_prompt = collapse_prompt if collapse_prompt is not None else map_prompt
+        self.text_variable = text_variable
+        self.chunk_size = chunk_size
+        self.max_reduce_tokens = max_reduce_tokens
+        self.max_concurrency = max_concurrency
+        self.cache_size = cache_size
+        self.length_function = length_function
+        self.invoke_function = invoke_function
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=length_function
+        )
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def summarize(self, text: Union[str, List[str]], **prompt_kwargs: Any) -> str:
+        """
+        Summarize a text.
+
+        Args:
+            text: The text, or its consecutive parts, e.g. the chunks of a transcript, which are packed into
+                chunks of `chunk_size` tokens.
+            **prompt_kwargs: The other input variables of the prompts, e.g. the number of bullet points.
+
+        Returns:
+            The summary of the text.
+        """
+        parts = [text] if isinstance(text, str) else text
+        if sum(self.length_function(part) for part in parts) <= self.max_reduce_tokens:
+            return self._invoke(self.reduce_prompt, SEPARATOR.join(parts), prompt_kwargs)
+
+        chunks = self._pack(parts)
+        logger.info(f'Summarizing {len(chunks)} chunks')
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            summaries = list(
+                executor.map(lambda chunk: self._cached_invoke(self.map_prompt, chunk, prompt_kwargs), chunks)
+            )
+            level = 0
+            # Collapse the summaries until they fit in the final reduce call
+            while sum(self.length_function(summary) for summary in summaries) > self.max_reduce_tokens:
+                groups = self._group(summaries)
+                level += 1
+                logger.info(f'Collapsing {len(summaries)} summaries into {len(groups)} at level {level}')
+                previous_num_tokens = sum(self.length_function(summary) for summary in summaries)
+                summaries = list(
+                    executor.map(
+                        lambda group: self._cached_invoke(self.collapse_prompt, SEPARATOR.join(group), prompt_kwargs),
+                        groups,
+                    )
+                )
+                if (
+                    len(groups) == 1
+                    or sum(self.length_function(summary) for summary in summaries) >= previous_num_tokens
+                ):
+                    # the summaries are not getting shorter, stop collapsing and let the final call handle them
+                    break
+        return self._invoke(self.reduce_prompt, SEPARATOR.join(summaries), prompt_kwargs)
+
+    def _pack(self, parts: List[str]) -> List[str]:
+        """Split the long parts and merge the consecutive short ones into chunks of at most `chunk_size` tokens."""
+        pieces: List[str] = []
+        for part in parts:
+            if self.length_function(part) > self.chunk_size:
+                pieces.extend(self.text_splitter.split_text(part))
+            else:
+                pieces.append(part)
+        return [SEPARATOR.join(group) for group in self._group(pieces, self.chunk_size)]
+
+    def _group(self, texts: List[str], max_tokens: Optional[int] = None) -> List[List[str]]:
+        """Group consecutive texts, each group having at most `max_tokens` tokens, unless it has a single text."""
+        if max_tokens is None:
+            max_tokens = self.max_reduce_tokens
+        groups: List[List[str]] = []
+        group_num_tokens = 0
+        for text in texts:
+            num_tokens = self.length_function(text)
+            if len(groups) == 0 or group_num_tokens + num_tokens > max_tokens:
+                groups.append([text])
+                group_num_tokens = num_tokens
+            else:
+                groups[-1].append(text)
+                group_num_tokens += num_tokens
+        return groups
+
+    def _invoke(self, prompt: BasePromptTemplate, text: str, prompt_kwargs: Dict[str, Any]) -> str:
+        chain = prompt | self.llm | StrOutputParser()
+        inputs = {key: value for key, value in prompt_kwargs.items() if key in prompt.input_variables}
+        inputs[self.text_variable] = text
+        result: str = self.invoke_function(chain, inputs)
+        return result
+
+    def _cached_invoke(self, prompt: BasePromptTemplate, text: str, prompt_kwargs: Dict[str, Any]) -> str:
+        key = self._get_cache_key(prompt, text, prompt_kwargs)
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        result = self._invoke(prompt, text, prompt_kwargs)
+        with self._cache_lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _get_cache_key(self, prompt: BasePromptTemplate, text: str, prompt_kwargs: Dict[str, Any]) -> str:
+        prompt_inputs = {key: value for key, value in prompt_kwargs.items() if key in prompt.input_variables}
+        key_data = json.dumps(
+            [prompt.model_dump_json(), prompt_inputs, text], sort_keys=True, default=str, ensure_ascii=False
+        )
+        return hashlib.sha256(key_data.encode('utf-8')).hexdigest()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Web crawler Test Script
+
+This script tests the connection limits, the politeness delay, the robots.txt cache and the conditional GET of the
+async web crawler using unittest, with a stub HTTP session instead of the network.
+
+Usage:
+    python utils/tests/crawler_test.py
+
+Returns:
+    0 if all tests pass, or 1 otherwise.
+"""
+
+import asyncio
+import os
+import sys
+import time
+import unittest
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+# Setup paths
+current_dir = os.path.dirname(os.path.abspath(__file__))
+utils_dir = os.path.abspath(os.path.join(current_dir, '..'))
+repo_dir = os.path.abspath(os.path.join(utils_dir, '..'))
+
+sys.path.append(utils_dir)
+sys.path.append(repo_dir)
+
+from utils.web.crawler import AsyncWebCrawler
+from utils.web.http_cache import HttpCache
+
+ROBOTS_TXT = 'User-agent: *\nDisallow: /private\n'
+
+
+class FakeResponse:
+    """Stub of an `aiohttp` response."""
+
+    def __init__(self, status: int, content: str = '', headers: Optional[Dict[str, str]] = None) -> None:
+        self.status = status
+        self.content = content
+        self.headers = headers or {}
+
+    async def text(self, errors: str = 'strict') -> str:
+        return self.content
+
+
+class FakeSession:
+    """Stub of an `aiohttp.ClientSession` serving fixed responses, which records the requests it receives."""
+
+    def __init__(self, responses: Dict[str, FakeResponse], latency: float = 0.0) -> None:
+        self.responses = responses
+        self.latency = latency
+        self.closed = False
+        self.requests: List[Tuple[str, Dict[str, str], float]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @asynccontextmanager
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> AsyncIterator[FakeResponse]:
+        self.requests.append((url, dict(headers or {}), time.monotonic()))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            yield self.responses.get(url, FakeResponse(404))
+        finally:
+            self.in_flight -= 1
+
+    async def close(self) -> None:
+        self.closed = True
+
+    def get_requested_urls(self) -> List[str]:
+        return [url for url, _, _ in self.requests]
+
+
+class AsyncWebCrawlerTestCase(unittest.TestCase):
+    def get_crawler(self, session: Optional[FakeSession] = None, **crawler_params: Any) -> AsyncWebCrawler:
+        crawler_params.setdefault('politeness_delay', 0)
+        crawler_params.setdefault('respect_robots_txt', False)
+        crawler_params.setdefault('http_cache', HttpCache())
+        crawler = AsyncWebCrawler(**crawler_params)
+        self.addCleanup(crawler.close)
+        if session is not None:
+            crawler._session = session  # type: ignore[assignment]
+        return crawler
+
+    def test_connection_limits(self) -> None:
+        crawler = self.get_crawler(max_concurrency=8, max_connections_per_host=2)
+        session = crawler._run(crawler._get_session())
+        self.assertEqual(session.connector.limit, 8)  # type: ignore[union-attr]
+        self.assertEqual(session.connector.limit_per_host, 2)  # type: ignore[union-attr]
+        # the connection pool is shared by all the loads
+        self.assertIs(crawler._run(crawler._get_session()), session)
+
+    def test_parallel_fetch(self) -> None:
+        urls = [f'https://site{index}.com/page' for index in range(5)]
+        session = FakeSession({url: FakeResponse(200, f'<html>{url}</html>') for url in urls}, latency=0.3)
+        crawler = self.get_crawler(session)
+
+        time_start = time.monotonic()
+        docs = crawler.load(urls)
+        elapsed = time.monotonic() - time_start
+
+        # the documents are in the order of the URLs, and the pages were fetched concurrently
+        self.assertEqual([doc.metadata['source'] for doc in docs], urls)
+        self.assertEqual(session.max_in_flight, len(urls))
+        self.assertLess(elapsed, 0.3 * len(urls) / 2)
+
+    def test_politeness_delay(self) -> None:
+        urls = ['https://a.com/1', 'https://a.com/2', 'https://a.com/3', 'https://b.com/1']
+        session = FakeSession({url: FakeResponse(200, url) for url in urls})
+        crawler = self.get_crawler(session, politeness_delay=0.2)
+
+        time_start = time.monotonic()
+        crawler.load(urls)
+
+        request_times = {url: request_time for url, _, request_time in session.requests}
+        host_a_times = sorted(request_times[url] for url in urls[:3])
+        for previous_time, next_time in zip(host_a_times, host_a_times[1:]):
+            self.assertGreaterEqual(next_time - previous_time, 0.19)
+        # the other host does not wait for the first one
+        self.assertLess(request_times['https://b.com/1'] - time_start, 0.1)
+
+    def test_robots_txt(self) -> None:
+        responses = {
+            'https://a.com/robots.txt': FakeResponse(200, ROBOTS_TXT),
+            'https://a.com/public': FakeResponse(200, 'public'),
+            'https://a.com/private/page': FakeResponse(200, 'private'),
+            'https://a.com/other': FakeResponse(200, 'other'),
+        }
+        session = FakeSession(responses)
+        crawler = self.get_crawler(session, respect_robots_txt=True)
+
+        docs = crawler.load(['https://a.com/public', 'https://a.com/private/page'])
+        self.assertEqual([doc.page_content for doc in docs], ['public'])
+        docs = crawler.load(['https://a.com/other'])
+        self.assertEqual([doc.page_content for doc in docs], ['other'])
+
+        # robots.txt is fetched once per host, and the disallowed page is never requested
+        requested_urls = session.get_requested_urls()
+        self.assertEqual(requested_urls.count('https://a.com/robots.txt'), 1)
+        self.assertNotIn('https://a.com/private/page', requested_urls)
+
+    def test_conditional_get(self) -> None:
+        url = 'https://a.com/page'
+        headers = {'ETag': '"v1"', 'Last-Modified': 'Mon, 19 Oct 2026 10:00:00 GMT'}
+        session = FakeSession({url: FakeResponse(200, 'original content', headers)})
+        # the pages expire immediately, so they are revalidated on each load
+        crawler = self.get_crawler(session, page_ttl=0)
+        self.assertEqual(crawler.load([url])[0].page_content, 'original content')
+
+        session.responses[url] = FakeResponse(304)
+        docs = crawler.load([url])
+
+        # the validators of the cached page are sent, and its content is reused on 304
+        _, request_headers, _ = session.requests[-1]
+        self.assertEqual(request_headers['If-None-Match'], '"v1"')
+        self.assertEqual(request_headers['If-Modified-Since'], headers['Last-Modified'])
+        self.assertEqual(docs[0].page_content, 'original content')
+
+    def test_fresh_page_not_requested(self) -> None:
+        url = 'https://a.com/page'
+        session = FakeSession({url: FakeResponse(200, 'content')})
+        crawler = self.get_crawler(session, page_ttl=60)
+
+        self.assertEqual(crawler.load([url])[0].page_content, 'content')
+        self.assertEqual(crawler.load([url])[0].page_content, 'content')
+        self.assertEqual(session.get_requested_urls(), [url])
+
+
+if __name__ == '__main__':
+    test_program = unittest.main(exit=False)
+    sys.exit(0 if test_program.result.wasSuccessful() else 1)
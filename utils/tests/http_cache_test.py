@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+HTTP cache Test Script
+
+This script tests the expiration, the size bounded eviction and the metrics of the HTTP cache using unittest,
+without sending any request.
+
+Usage:
+    python utils/tests/http_cache_test.py
+
+Returns:
+    0 if all tests pass, or 1 otherwise.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+# Setup paths
+current_dir = os.path.dirname(os.path.abspath(__file__))
+utils_dir = os.path.abspath(os.path.join(current_dir, '..'))
+repo_dir = os.path.abspath(os.path.join(utils_dir, '..'))
+
+sys.path.append(utils_dir)
+sys.path.append(repo_dir)
+
+from utils.web.http_cache import HttpCache, cached_get, get_http_cache_from_config, make_cache_key
+
+# Serialized size of each cached value, in bytes
+VALUE_SIZE = 100
+
+
+def get_value(label: str) -> str:
+    """Build a value whose serialized size is `VALUE_SIZE` bytes."""
+    return label.ljust(VALUE_SIZE - 2, '.')
+
+
+class HttpCacheTestCase(unittest.TestCase):
+    def test_ttl_expiry(self) -> None:
+        cache = HttpCache()
+        cache.set('short', 'value', ttl=0.05)
+        cache.set('long', 'value', ttl=60)
+        self.assertEqual(cache.get('short'), 'value')
+
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('short'))
+        self.assertEqual(cache.get('long'), 'value')
+        # an expired entry can still be looked up to be revalidated
+        entry = cache.lookup('short')
+        assert entry is not None
+        self.assertFalse(entry.is_fresh)
+        self.assertEqual(entry.value, 'value')
+
+        # touching the entry makes it fresh again
+        cache.touch('short', ttl=60)
+        self.assertEqual(cache.get('short'), 'value')
+
+    def test_lru_size_eviction(self) -> None:
+        cache = HttpCache(max_size_mb=3 * VALUE_SIZE / (1024 * 1024))
+        for label in ['a', 'b', 'c']:
+            cache.set(label, get_value(label))
+            time.sleep(0.01)
+        # reading the oldest entry makes the second one the least recently used
+        self.assertIsNotNone(cache.get('a'))
+        time.sleep(0.01)
+
+        cache.set('d', get_value('d'))
+        self.assertIsNone(cache.get('b'))
+        for label in ['a', 'c', 'd']:
+            self.assertEqual(cache.get(label), get_value(label))
+        self.assertEqual(cache.stats()['size_bytes'], 3 * VALUE_SIZE)
+
+    def test_expired_entries_evicted_first(self) -> None:
+        cache = HttpCache(max_size_mb=3 * VALUE_SIZE / (1024 * 1024))
+        cache.set('a', get_value('a'))
+        cache.set('b', get_value('b'), ttl=0.05)
+        cache.set('c', get_value('c'))
+        time.sleep(0.1)
+
+        cache.set('d', get_value('d'))
+        self.assertIsNone(cache.lookup('b'))
+        self.assertEqual(cache.get('a'), get_value('a'))
+
+    def test_stats(self) -> None:
+        cache = HttpCache(max_size_mb=2 * VALUE_SIZE / (1024 * 1024))
+        cache.set('a', get_value('a'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('missing'))
+        self.assertIsNone(cache.get('missing'))
+        time.sleep(0.01)
+        cache.set('b', get_value('b'))
+        time.sleep(0.01)
+        cache.set('c', get_value('c'))
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+        self.assertAlmostEqual(stats['hit_rate'], 1 / 3)
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['size_bytes'], 2 * VALUE_SIZE)
+
+    def test_persistence(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            cache = HttpCache(directory)
+            cache.set('key', {'content': 'page'})
+            cache.close()
+            cache = HttpCache(directory)
+            self.assertEqual(cache.get('key'), {'content': 'page'})
+            cache.close()
+
+    def test_disabled_cache(self) -> None:
+        with tempfile.TemporaryDirectory() as base_dir:
+            cache = get_http_cache_from_config({'enabled': False, 'directory': 'http_cache'}, base_dir)
+            cache.set('key', 'value')
+            cache.touch('key')
+            self.assertIsNone(cache.lookup('key'))
+            self.assertEqual(cache.stats()['entries'], 0)
+            self.assertFalse(os.path.exists(os.path.join(base_dir, 'http_cache')))
+
+    def test_cached_get_params(self) -> None:
+        cache = HttpCache()
+        session = mock.Mock()
+        session.get.side_effect = lambda url, params=None, **kwargs: SimpleNamespace(
+            status_code=200, text=f'results of {params["q"]}', headers={}
+        )
+        url = 'https://api.example.com/search'
+
+        self.assertEqual(cached_get(url, cache, session=session, params={'q': 'first'}), 'results of first')
+        # other parameters are a different request
+        self.assertEqual(cached_get(url, cache, session=session, params={'q': 'second'}), 'results of second')
+        self.assertEqual(cached_get(url, cache, session=session, params={'q': 'first'}), 'results of first')
+        self.assertEqual(session.get.call_count, 2)
+        self.assertNotEqual(make_cache_key('page', url, {'q': 'first'}), make_cache_key('page', url))
+
+
+if __name__ == '__main__':
+    test_program = unittest.main(exit=False)
+    sys.exit(0 if test_program.result.wasSuccessful() else 1)
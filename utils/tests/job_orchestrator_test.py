@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Batch inference job orchestrator Test Script
+
+This script tests the SambaStudio batch inference job orchestrator using unittest, with a fake processor instead of
+SambaStudio.
+
+Usage:
+    python utils/tests/job_orchestrator_test.py
+
+Returns:
+    0 if all tests pass, or 1 otherwise.
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+from typing import Any, Dict, List
+
+# Setup paths
+current_dir = os.path.dirname(os.path.abspath(__file__))
+utils_dir = os.path.abspath(os.path.join(current_dir, '..'))
+repo_dir = os.path.abspath(os.path.join(utils_dir, '..'))
+
+sys.path.append(utils_dir)
+sys.path.append(repo_dir)
+
+from utils.batch_inference.job_orchestrator import (
+    FAILED_JOB_STATUS,
+    SUCCESS_JOB_STATUS,
+    BatchJobOrchestrator,
+    get_orchestrator_kwargs,
+)
+
+
+class FakeProcessor:
+    """
+    Fake batch processor, whose job of an input succeeds after `num_polls[input]` status checks, or fails if the
+    input starts with `failed`.
+    """
+
+    def __init__(self, num_polls: Dict[str, int], dataset_delay: float = 0.0) -> None:
+        self.num_polls = num_polls
+        self.dataset_delay = dataset_delay
+        self.status_checks: Dict[str, int] = {}
+        self.deleted: List[str] = []
+        self.num_active_datasets = 0
+        self.max_active_datasets = 0
+        self._lock = threading.Lock()
+
+    def create_load_project(self) -> None:
+        pass
+
+    def create_dataset(self, path: str, **kwargs: Any) -> str:
+        with self._lock:
+            self.num_active_datasets += 1
+            self.max_active_datasets = max(self.max_active_datasets, self.num_active_datasets)
+        time.sleep(self.dataset_delay)
+        if path.startswith('invalid'):
+            raise Exception(f'Invalid input {path}')
+        return f'dataset_{path}'
+
+    def check_dataset_creation_progress(self, dataset_name: str) -> bool:
+        return True
+
+    def run_job(self, dataset_name: str) -> str:
+        return dataset_name.replace('dataset_', 'job_')
+
+    def get_job_status(self, job_id: str) -> str:
+        input_path = job_id.replace('job_', '')
+        if input_path.startswith('failed'):
+            return FAILED_JOB_STATUS
+        self.status_checks[job_id] = self.status_checks.get(job_id, 0) + 1
+        return SUCCESS_JOB_STATUS if self.status_checks[job_id] >= self.num_polls[input_path] else 'RUNNING'
+
+    def retrieve_results(self, job_id: str) -> str:
+        return f'results_{job_id}'
+
+    def delete_job(self, job_id: str) -> None:
+        self.deleted.append(job_id)
+
+    def delete_dataset(self, dataset_name: str) -> None:
+        with self._lock:
+            self.num_active_datasets -= 1
+        self.deleted.append(dataset_name)
+
+
+class BatchJobOrchestratorTestCase(unittest.TestCase):
+    def get_orchestrator(self, processor: FakeProcessor, max_concurrent_jobs: int = 4) -> BatchJobOrchestrator:
+        return BatchJobOrchestrator(
+            processor, max_concurrent_jobs=max_concurrent_jobs, initial_poll_interval=0.01, max_poll_interval=0.02
+        )
+
+    def test_results_in_completion_order(self) -> None:
+        processor = FakeProcessor({'slow': 5, 'fast': 1})
+        results = list(self.get_orchestrator(processor).run(['slow', 'fast']))
+        self.assertEqual([result.input_path for result in results], ['fast', 'slow'])
+        self.assertTrue(all(result.succeeded for result in results))
+        self.assertEqual(results[0].result, 'results_job_fast')
+        self.assertEqual(sorted(processor.deleted), ['dataset_fast', 'dataset_slow', 'job_fast', 'job_slow'])
+
+    def test_failures_are_returned(self) -> None:
+        processor = FakeProcessor({'ok': 1})
+        results = {
+            result.input_path: result for result in self.get_orchestrator(processor).run(['ok', 'failed', 'invalid'])
+        }
+        self.assertTrue(results['ok'].succeeded)
+        self.assertFalse(results['failed'].succeeded)
+        self.assertIn('failed', str(results['failed'].error))
+        self.assertFalse(results['invalid'].succeeded)
+        # the failed job and its dataset are deleted too, the invalid input has no dataset
+        self.assertIn('job_failed', processor.deleted)
+        self.assertIn('dataset_failed', processor.deleted)
+        self.assertNotIn('dataset_invalid', processor.deleted)
+
+    def test_max_concurrent_jobs(self) -> None:
+        processor = FakeProcessor({str(index): 2 for index in range(6)}, dataset_delay=0.02)
+        results = list(self.get_orchestrator(processor, max_concurrent_jobs=2).run([str(index) for index in range(6)]))
+        self.assertEqual(len(results), 6)
+        self.assertLessEqual(processor.max_active_datasets, 2)
+
+    def test_cleanup_on_close(self) -> None:
+        processor = FakeProcessor({'fast': 1, 'slow': 1000})
+        results = self.get_orchestrator(processor).run(['fast', 'slow'])
+        self.assertEqual(next(results).input_path, 'fast')
+        # the caller stops iterating, the job and the dataset still running are deleted
+        results.close()
+        self.assertIn('job_slow', processor.deleted)
+        self.assertIn('dataset_slow', processor.deleted)
+
+    def test_get_orchestrator_kwargs(self) -> None:
+        kwargs = get_orchestrator_kwargs({'orchestration': {'max_concurrent_jobs': 2}})
+        self.assertEqual(kwargs['max_concurrent_jobs'], 2)
+        self.assertEqual(get_orchestrator_kwargs({'orchestration': None}), get_orchestrator_kwargs({}))
+
+
+if __name__ == '__main__':
+    test_program = unittest.main(exit=False)
+    sys.exit(0 if test_program.result.wasSuccessful() else 1)
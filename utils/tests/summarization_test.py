@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Summarization utilities Test Script
+
+This script tests the map-reduce summarizer using unittest, with a fake model instead of an LLM.
+
+Usage:
+    python utils/tests/summarization_test.py
+
+Returns:
+    0 if all tests pass, or 1 otherwise.
+"""
+
+import os
+import sys
+import unittest
+from typing import Any, List, Optional
+
+# Setup paths
+current_dir = os.path.dirname(os.path.abspath(__file__))
+utils_dir = os.path.abspath(os.path.join(current_dir, '..'))
+repo_dir = os.path.abspath(os.path.join(utils_dir, '..'))
+
+sys.path.append(utils_dir)
+sys.path.append(repo_dir)
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM
+from langchain_core.prompts import PromptTemplate
+
+from utils.summarization.map_reduce import MapReduceSummarizer
+
+
+class ShortSummaryLLM(LLM):
+    """Fake model summarizing its input into its first words, and recording its prompts."""
+
+    prompts: List[str] = []
+    num_words: int = 2
+
+    @property
+    def _llm_type(self) -> str:
+        return 'short_summary'
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        self.prompts.append(prompt)
+        _, text = prompt.split(':', 1)
+        return ' '.join(text.split()[: self.num_words])
+
+
+class MapReduceSummarizerTestCase(unittest.TestCase):
+    def get_summarizer(self, llm: LLM, **kwargs: Any) -> MapReduceSummarizer:
+        return MapReduceSummarizer(
+            llm=llm,
+            map_prompt=PromptTemplate.from_template('map:{text}'),
+            reduce_prompt=PromptTemplate.from_template('reduce {num}:{text}'),
+            collapse_prompt=PromptTemplate.from_template('collapse:{text}'),
+            length_function=lambda text: len(text.split()),
+            **kwargs,
+        )
+
+    def test_group(self) -> None:
+        summarizer = self.get_summarizer(ShortSummaryLLM(), chunk_size=3, chunk_overlap=0, max_reduce_tokens=5)
+        texts = ['a b', 'c d', 'e', 'f g h i j k', 'l']
+        self.assertEqual(summarizer._group(texts), [['a b', 'c d', 'e'], ['f g h i j k'], ['l']])
+        self.assertEqual(summarizer._group(texts, max_tokens=3), [['a b'], ['c d', 'e'], ['f g h i j k'], ['l']])
+
+    def test_pack(self) -> None:
+        summarizer = self.get_summarizer(ShortSummaryLLM(), chunk_size=3, chunk_overlap=0, max_reduce_tokens=5)
+        # the short parts are merged and the long part is split, each chunk having at most 3 words
+        chunks = summarizer._pack(['a', 'b', 'c d e f g', 'h'])
+        self.assertEqual([len(chunk.split()) for chunk in chunks], [2, 3, 3])
+        self.assertEqual(' '.join(chunks).split(), 'a b c d e f g h'.split())
+
+    def test_invalid_sizes(self) -> None:
+        with self.assertRaises(ValueError):
+            self.get_summarizer(ShortSummaryLLM(), chunk_size=10, chunk_overlap=0, max_reduce_tokens=5)
+
+    def test_short_text_single_call(self) -> None:
+        llm = ShortSummaryLLM(prompts=[])
+        summarizer = self.get_summarizer(llm, chunk_size=3, chunk_overlap=0, max_reduce_tokens=5)
+        self.assertEqual(summarizer.summarize('one two three', num=1), 'one two')
+        self.assertEqual(llm.prompts, ['reduce 1:one two three'])
+
+    def test_map_collapse_reduce(self) -> None:
+        llm = ShortSummaryLLM(prompts=[])
+        summarizer = self.get_summarizer(llm, chunk_size=3, chunk_overlap=0, max_reduce_tokens=4)
+        parts = [f'w{index}' for index in range(12)]
+        summary = summarizer.summarize(parts, num=1)
+        self.assertEqual(summary, 'w0 w1')
+        # 4 map calls, whose summaries of 2 words are collapsed by 2 before the final reduce call
+        self.assertEqual(sum(prompt.startswith('map:') for prompt in llm.prompts), 4)
+        self.assertEqual(sum(prompt.startswith('collapse:') for prompt in llm.prompts), 2)
+        self.assertTrue(llm.prompts[-1].startswith('reduce 1:'))
+
+    def test_cached_map_calls(self) -> None:
+        llm = ShortSummaryLLM(prompts=[])
+        summarizer = self.get_summarizer(llm, chunk_size=3, chunk_overlap=0, max_reduce_tokens=4)
+        parts = [f'w{index}' for index in range(12)]
+        summarizer.summarize(parts, num=1)
+        num_calls = len(llm.prompts)
+        # only the changed chunk and the reduce calls depending on it run again
+        summarizer.summarize(parts[:-1] + ['changed'], num=1)
+        self.assertEqual(sum(prompt.startswith('map:') for prompt in llm.prompts[num_calls:]), 1)
+
+
+if __name__ == '__main__':
+    test_program = unittest.main(exit=False)
+    sys.exit(0 if test_program.result.wasSuccessful() else 1)
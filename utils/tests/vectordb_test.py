@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Vector DB utilities Test Script
+
+This script tests the deduplication, the hybrid retrieval and the query cache of the vector db utilities using
+unittest, without calling any model.
+
+Usage:
+    python utils/tests/vectordb_test.py
+
+Returns:
+    0 if all tests pass, or 1 otherwise.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from typing import Any, List, Set, Tuple
+
+# Setup paths
+current_dir = os.path.dirname(os.path.abspath(__file__))
+utils_dir = os.path.abspath(os.path.join(current_dir, '..'))
+repo_dir = os.path.abspath(os.path.join(utils_dir, '..'))
+
+sys.path.append(utils_dir)
+sys.path.append(repo_dir)
+
+from langchain.docstore.document import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+from utils.vectordb.deduplication import MinHashDeduplicator
+from utils.vectordb.hybrid_retrieval import CHUNK_ID_KEY, BM25Index, HybridRetriever, assign_chunk_ids
+from utils.vectordb.query_cache import QueryResultCache
+
+BASE_TEXT = (
+    'The quarterly report shows that the revenue of the company grew by twelve percent compared to the previous '
+    'year, driven by the strong demand for cloud services in Europe and in North America, while the operating '
+    'costs remained stable thanks to the automation of the supply chain and the renegotiation of the contracts '
+    'with the main suppliers of the data centers.'
+)
+OTHER_TEXT = (
+    'Install the package with pip, then set the API key in the environment file and run the starter kit with '
+    'streamlit, the application opens in the browser and lets you upload documents and ask questions about them.'
+)
+
+
+class FixedRetriever(BaseRetriever):
+    """Dense retriever returning a fixed ranking."""
+
+    docs: List[Document]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, **kwargs: Any
+    ) -> List[Document]:
+        return self.docs
+
+
+class DeduplicationTestCase(unittest.TestCase):
+    def test_lsh_params(self) -> None:
+        deduplicator = MinHashDeduplicator(threshold=0.85, num_perm=128)
+        self.assertEqual(deduplicator.bands * deduplicator.rows, 128)
+        # the LSH detection threshold is close to the similarity threshold
+        lsh_threshold = (1 / deduplicator.bands) ** (1 / deduplicator.rows)
+        self.assertAlmostEqual(lsh_threshold, 0.85, delta=0.1)
+
+    def test_near_duplicates_share_a_band(self) -> None:
+        deduplicator = MinHashDeduplicator(threshold=0.8)
+        near_duplicate = BASE_TEXT.replace('twelve', 'eleven')
+        signature = deduplicator.get_signature(BASE_TEXT)
+        near_duplicate_signature = deduplicator.get_signature(near_duplicate)
+        other_signature = deduplicator.get_signature(OTHER_TEXT)
+
+        def get_band_keys(signature: Any) -> Set[Tuple[int, bytes]]:
+            rows = deduplicator.rows
+            return {(band, signature[band * rows : (band + 1) * rows].tobytes()) for band in range(deduplicator.bands)}
+
+        self.assertTrue(get_band_keys(signature) & get_band_keys(near_duplicate_signature))
+        self.assertFalse(get_band_keys(signature) & get_band_keys(other_signature))
+
+    def test_get_duplicate_indices(self) -> None:
+        deduplicator = MinHashDeduplicator(threshold=0.8)
+        texts = [
+            BASE_TEXT,
+            OTHER_TEXT,
+            BASE_TEXT.upper(),
+            BASE_TEXT.replace('twelve', 'eleven'),
+            BASE_TEXT[: len(BASE_TEXT) // 2],
+        ]
+        # exact duplicate up to case, near duplicate, and a half of the text which is not a near duplicate
+        self.assertEqual(deduplicator.get_duplicate_indices(texts), [2, 3])
+
+    def test_deduplicate_keeps_first_occurrence(self) -> None:
+        deduplicator = MinHashDeduplicator(threshold=0.8)
+        docs = [
+            Document(page_content=BASE_TEXT, metadata={'source': 'a'}),
+            Document(page_content=BASE_TEXT, metadata={'source': 'b'}),
+            Document(page_content=OTHER_TEXT, metadata={'source': 'c'}),
+        ]
+        self.assertEqual([doc.metadata['source'] for doc in deduplicator.deduplicate(docs)], ['a', 'c'])
+
+
+class HybridRetrievalTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.docs = [
+            Document(page_content='The error code E-4512 means the sensor is disconnected.', metadata={'page': 1}),
+            Document(page_content='Restart the device to clear most errors.', metadata={'page': 2}),
+            Document(page_content='The battery lasts ten hours.', metadata={'page': 3}),
+        ]
+        assign_chunk_ids(self.docs)
+        self.bm25_index = BM25Index()
+        self.bm25_index.add_documents(self.docs)
+
+    def tearDown(self) -> None:
+        self.bm25_index.close()
+
+    def test_bm25_exact_term(self) -> None:
+        results = self.bm25_index.search('what is e-4512', k=2)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0][0].metadata['page'], 1)
+
+    def test_bm25_add_is_idempotent(self) -> None:
+        self.bm25_index.add_documents(self.docs)
+        self.assertEqual(len(self.bm25_index), 3)
+
+    def test_rrf_fusion(self) -> None:
+        # the dense retriever misses the exact term, and the stored metadata differ from the indexed ones
+        dense_docs = [
+            Document(page_content=doc.page_content, metadata={CHUNK_ID_KEY: doc.metadata[CHUNK_ID_KEY]})
+            for doc in [self.docs[1], self.docs[2], self.docs[0]]
+        ]
+        retriever = HybridRetriever(
+            vector_retriever=FixedRetriever(docs=dense_docs), bm25_index=self.bm25_index, k=2, bm25_k=2
+        )
+        results = retriever.invoke('error e-4512')
+        # the chunk ranked by both retrievers comes first, and the same chunk is never returned twice
+        self.assertEqual([doc.page_content for doc in results], [self.docs[0].page_content, self.docs[1].page_content])
+
+    def test_rrf_bm25_weight(self) -> None:
+        dense_docs = [self.docs[2], self.docs[1]]
+        retriever = HybridRetriever(
+            vector_retriever=FixedRetriever(docs=dense_docs), bm25_index=self.bm25_index, k=1, bm25_weight=2.0
+        )
+        self.assertEqual(retriever.invoke('e-4512')[0].metadata['page'], 1)
+
+    def test_update_vdb_chunk_ids(self) -> None:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+
+        from utils.vectordb.vector_db import VectorDb
+
+        vectordb = VectorDb()
+        embeddings = DeterministicFakeEmbedding(size=8)
+        with tempfile.TemporaryDirectory() as persist_directory:
+            # the repeated boilerplate chunk is only stored once, and no chunk id is stored without BM25 index
+            chunks = [Document(page_content=text) for text in ['Copyright ACME.', 'The battery.', 'Copyright ACME.']]
+            vector_store = vectordb.update_vdb(chunks, embeddings, 'chroma', input_db=persist_directory)
+            self.assertEqual(len(vector_store.get()['ids']), 2)
+            self.assertFalse(any(CHUNK_ID_KEY in chunk.metadata for chunk in chunks))
+
+            hybrid_chunks = [Document(page_content=text) for text in ['Copyright ACME.', 'The warranty.']]
+            vector_store = vectordb.update_vdb(
+                hybrid_chunks, embeddings, 'chroma', input_db=persist_directory, hybrid=True
+            )
+            self.assertTrue(all(CHUNK_ID_KEY in chunk.metadata for chunk in hybrid_chunks))
+            self.assertEqual(len(vectordb.bm25_index), 2)
+            vectordb.bm25_index.close()
+
+
+class QueryCacheTestCase(unittest.TestCase):
+    def test_exact_match(self) -> None:
+        cache = QueryResultCache()
+        cache.set('What is the revenue?', 'v1', {'answer': '10'})
+        self.assertEqual(cache.get('  what is the REVENUE ', 'v1'), {'answer': '10'})
+        self.assertIsNone(cache.get('What is the margin?', 'v1'))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_version_change_invalidates(self) -> None:
+        cache = QueryResultCache()
+        cache.set('What is the revenue?', 'v1', {'answer': '10'})
+        self.assertIsNone(cache.get('What is the revenue?', 'v2'))
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_vdb_update_invalidates(self) -> None:
+        from utils.vectordb.vector_db import VectorDb
+
+        vectordb = VectorDb()
+        cache = QueryResultCache()
+        with tempfile.TemporaryDirectory() as persist_directory:
+            with open(os.path.join(persist_directory, 'index.bin'), 'w') as file:
+                file.write('index')
+            vdb_version = vectordb.get_vdb_version(persist_directory)
+            # loading the unchanged vector db gives the same version
+            self.assertEqual(vectordb.get_vdb_version(persist_directory), vdb_version)
+            cache.set('What is the revenue?', vdb_version, {'answer': '10'})
+            self.assertIsNotNone(cache.get('What is the revenue?', vdb_version))
+
+            # updating the vector db changes its version, and drops the cached results
+            time.sleep(0.01)
+            with open(os.path.join(persist_directory, 'index.bin'), 'a') as file:
+                file.write(' updated')
+            updated_vdb_version = vectordb.get_vdb_version(persist_directory)
+            self.assertNotEqual(updated_vdb_version, vdb_version)
+            self.assertIsNone(cache.get('What is the revenue?', updated_vdb_version))
+
+
+if __name__ == '__main__':
+    test_program = unittest.main(exit=False)
+    sys.exit(0 if test_program.result.wasSuccessful() else 1)
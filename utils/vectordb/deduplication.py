@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import os
+import re
+import sys
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+vectordb_dir = os.path.dirname(os.path.abspath(__file__))
+utils_dir = os.path.abspath(os.path.join(vectordb_dir, '..'))
+repo_dir = os.path.abspath(os.path.join(utils_dir, '..'))
+
+sys.path.append(repo_dir)
+sys.path.append(utils_dir)
+
+logger = logging.getLogger(__name__)
+
+# Mersenne prime used by the MinHash universal hash functions
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+# Number of shingles hashed at once, to bound the memory of the signature computation
+SHINGLE_BATCH_SIZE = 4096
+
+
+class MinHashDeduplicator:
+    """
+    Near-duplicate document remover based on MinHash signatures and locality sensitive hashing (LSH).
+
+    Each document is represented by the set of its word shingles, whose Jaccard similarity is estimated with
+    MinHash signatures. LSH banding is used to only compare candidate pairs, so deduplication stays roughly linear
+    in the number of documents. The first occurrence of each group of near-duplicates is kept.
+
+    Args:
+        threshold (float): Jaccard similarity above which two documents are considered duplicates.
+        num_perm (int): Number of hash functions of the MinHash signatures.
+        shingle_size (int): Number of words of each shingle.
+        seed (int): Seed of the hash functions.
+    """
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, shingle_size: int = 5, seed: int = 42) -> None:
+        if not 0 < threshold <= 1:
+            raise ValueError(f'threshold must be in (0, 1]. Got {threshold}.')
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        # Coefficients are kept below 2**32 so that `a * x` never overflows for 32 bits shingle hashes `x`
+        generator = np.random.RandomState(seed)
+        self._a = generator.randint(1, 1 << 32, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self._b = generator.randint(0, 1 << 32, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self.bands, self.rows = self._get_lsh_params(threshold, num_perm)
+
+    @staticmethod
+    def _get_lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+        """
+        Choose the number of LSH bands and rows per band whose detection threshold is the closest to the
+        similarity threshold, favouring recall.
+
+        Args:
+            threshold (float): The similarity threshold.
+            num_perm (int): The number of hash functions.
+
+        Returns:
+            tuple: The number of bands and the number of rows per band.
+        """
+        best_params = (num_perm, 1)
+        best_error = float('inf')
+        for rows in range(1, num_perm + 1):
+            if num_perm % rows != 0:
+                continue
+            bands = num_perm // rows
+            lsh_threshold = (1 / bands) ** (1 / rows)
+            # Slightly penalize LSH thresholds above the similarity threshold, which would miss duplicates
+            error = abs(lsh_threshold - threshold) * (2 if lsh_threshold > threshold else 1)
+            if error < best_error:
+                best_params, best_error = (bands, rows), error
+        return best_params
+
+    def _get_shingles(self, text: str) -> np.ndarray:
+        """
+        Get the hashes of the word shingles of a text.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            np.ndarray: The unique 32 bits hashes of the shingles.
+        """
+        words = re.findall(r'\w+', text.lower())
+        if len(words) < self.shingle_size:
+            shingles = {' '.join(words)}
+        else:
+            shingles = {' '.join(words[i : i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+        return np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles), dtype=np.uint64)
+
+    def get_signature(self, text: str) -> np.ndarray:
+        """
+        Compute the MinHash signature of a text.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            np.ndarray: The MinHash signature, of length `num_perm`.
+        """
+        shingles = self._get_shingles(text)
+        signature = np.full(self.num_perm, MAX_HASH, dtype=np.uint64)
+        for start in range(0, len(shingles), SHINGLE_BATCH_SIZE):
+            batch = shingles[start : start + SHINGLE_BATCH_SIZE]
+            hashes = ((np.outer(self._a, batch) % MERSENNE_PRIME + self._b[:, None]) % MERSENNE_PRIME) & MAX_HASH
+            signature = np.minimum(signature, hashes.min(axis=1))
+        return signature
+
+    def get_duplicate_indices(self, texts: Sequence[str]) -> List[int]:
+        """
+        Find the indices of the texts that are exact or near duplicates of a previous text.
+
+        Args:
+            texts (list): The texts.
+
+        Returns:
+            list: The indices of the duplicated texts.
+        """
+        duplicate_indices = []
+        exact_hashes = set()
+        kept_signatures: Dict[int, np.ndarray] = {}
+        buckets: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+        for index, text in enumerate(texts):
+            # Exact duplicates (up to whitespace and case) are removed without computing signatures
+            exact_hash = hashlib.sha1(' '.join(text.lower().split()).encode('utf-8')).digest()
+            if exact_hash in exact_hashes:
+                duplicate_indices.append(index)
+                continue
+
+            signature = self.get_signature(text)
+            band_keys = [
+                (band, signature[band * self.rows : (band + 1) * self.rows].tobytes()) for band in range(self.bands)
+            ]
+            candidates = {candidate for band_key in band_keys for candidate in buckets.get(band_key, [])}
+            if any(np.mean(kept_signatures[candidate] == signature) >= self.threshold for candidate in candidates):
+                duplicate_indices.append(index)
+                continue
+
+            exact_hashes.add(exact_hash)
+            kept_signatures[index] = signature
+            for band_key in band_keys:
+                buckets[band_key].append(index)
+        return duplicate_indices
+
+    def deduplicate(self, docs: List[Any]) -> List[Any]:
+        """
+        Remove the exact and near-duplicate langchain documents, keeping the first occurrence.
+
+        Args:
+            docs (list): The langchain documents.
+
+        Returns:
+            list: The deduplicated documents.
+        """
+        duplicate_indices = set(self.get_duplicate_indices([doc.page_content for doc in docs]))
+        if len(duplicate_indices) > 0:
+            logger.info(f'Deduplication: removed {len(duplicate_indices)} near-duplicates out of {len(docs)} documents')
+        return [doc for index, doc in enumerate(docs) if index not in duplicate_indices]
+
+
+def get_deduplicator(retrieval_info: Dict[str, Any]) -> Optional[MinHashDeduplicator]:
+    """
+    Get the deduplicator described by the `retrieval` section of a kit config.
+
+    Args:
+        retrieval_info (dict): The `retrieval` section of a kit config, with the optional keys `deduplicate`
+            and `dedup_threshold`.
+
+    Returns:
+        MinHashDeduplicator: The deduplicator, or None if deduplication is disabled.
+    """
+    if not retrieval_info.get('deduplicate', False):
+        return None
+    return MinHashDeduplicator(threshold=retrieval_info.get('dedup_threshold', 0.85))
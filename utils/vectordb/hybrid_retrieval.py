@@ -0,0 +1,302 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain.docstore.document import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+vectordb_dir = os.path.dirname(os.path.abspath(__file__))
+utils_dir = os.path.abspath(os.path.join(vectordb_dir, '..'))
+repo_dir = os.path.abspath(os.path.join(utils_dir, '..'))
+
+sys.path.append(repo_dir)
+sys.path.append(utils_dir)
+
+logger = logging.getLogger(__name__)
+
+BM25_INDEX_FILE_NAME = 'bm25_index.sqlite'
+# Metadata key of the stable id assigned to each chunk when it is indexed
+CHUNK_ID_KEY = 'chunk_id'
+
+# Tokens keep inner dashes, dots and underscores, so that part numbers, tickers and error codes stay whole
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+(?:[-_.][a-z0-9]+)*')
+STOP_WORDS = set(
+    'a an and are as at be by for from has how in is it its of on or that the these this to was were what which who '
+    'will with'.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split a text into lowercased BM25 terms, removing the stop words.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        list: The terms of the text.
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def get_document_id(doc: Document) -> str:
+    """
+    Get a stable id of a langchain document, so that indexing the same chunk twice is a no-op and the same chunk
+    retrieved by different retrievers can be matched.
+
+    The id is the chunk id assigned by `assign_chunk_ids` when the chunk was indexed, or else the hash of the
+    content and metadata of the document.
+
+    Args:
+        doc (Document): The langchain document.
+
+    Returns:
+        str: The document id.
+    """
+    if doc.metadata.get(CHUNK_ID_KEY):
+        return str(doc.metadata[CHUNK_ID_KEY])
+    doc_data = json.dumps({'content': doc.page_content, 'metadata': doc.metadata}, sort_keys=True, default=str)
+    return hashlib.sha1(doc_data.encode('utf-8')).hexdigest()
+
+
+def assign_chunk_ids(docs: Sequence[Document]) -> List[str]:
+    """
+    Store the stable id of each chunk in its metadata, before indexing the chunks in the vector store and in the
+    BM25 index, so the rankings of both can be fused even if the stores change the other metadata.
+
+    Args:
+        docs (list): The langchain documents, updated in place.
+
+    Returns:
+        list: The ids of the documents.
+    """
+    for doc in docs:
+        doc.metadata[CHUNK_ID_KEY] = get_document_id(doc)
+    return [doc.metadata[CHUNK_ID_KEY] for doc in docs]
+
+
+def get_fusion_key(doc: Document) -> str:
+    """
+    Get the key matching the same chunk retrieved by different retrievers: its chunk id, or the hash of its
+    content for chunks indexed without chunk id, since the stores may not return the same metadata.
+
+    Args:
+        doc (Document): The langchain document.
+
+    Returns:
+        str: The fusion key.
+    """
+    if doc.metadata.get(CHUNK_ID_KEY):
+        return str(doc.metadata[CHUNK_ID_KEY])
+    return hashlib.sha1(doc.page_content.encode('utf-8')).hexdigest()
+
+
+class BM25Index:
+    """
+    Persistent BM25 inverted index stored in a SQLite file next to a vector database.
+
+    Documents can be added and deleted incrementally, so the index follows the ingestion of the vector database.
+
+    Args:
+        persist_directory (str, optional): The directory of the vector database, where the index is stored.
+            If None, the index is kept in memory.
+        k1 (float): BM25 term frequency saturation parameter.
+        b (float): BM25 document length normalization parameter.
+    """
+
+    def __init__(self, persist_directory: Optional[str] = None, k1: float = 1.5, b: float = 0.75) -> None:
+        self.persist_directory = persist_directory
+        self.k1 = k1
+        self.b = b
+        if persist_directory is not None:
+            os.makedirs(persist_directory, exist_ok=True)
+            database = os.path.join(persist_directory, BM25_INDEX_FILE_NAME)
+        else:
+            database = ':memory:'
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(database, check_same_thread=False)
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                length INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_doc_id ON postings (doc_id);
+            """
+        )
+        self._connection.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(self._connection.execute('SELECT COUNT(*) FROM documents').fetchone()[0])
+
+    def add_documents(self, docs: Sequence[Document]) -> List[str]:
+        """
+        Add documents to the index, skipping the ones already indexed.
+
+        Args:
+            docs (list): The langchain documents to index.
+
+        Returns:
+            list: The ids of the documents.
+        """
+        doc_ids = [get_document_id(doc) for doc in docs]
+        num_indexed = 0
+        with self._lock:
+            for doc_id, doc in zip(doc_ids, docs):
+                exists = self._connection.execute('SELECT 1 FROM documents WHERE doc_id = ?', (doc_id,)).fetchone()
+                if exists:
+                    continue
+                num_indexed += 1
+                terms = Counter(tokenize(doc.page_content))
+                self._connection.execute(
+                    'INSERT INTO documents (doc_id, length, content, metadata) VALUES (?, ?, ?, ?)',
+                    (doc_id, sum(terms.values()), doc.page_content, json.dumps(doc.metadata, default=str)),
+                )
+                self._connection.executemany(
+                    'INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)',
+                    [(term, doc_id, tf) for term, tf in terms.items()],
+                )
+            self._connection.commit()
+        logger.info(f'BM25 index: {num_indexed} new documents indexed')
+        return doc_ids
+
+    def get_documents(self) -> List[Document]:
+        """
+        Get all the indexed documents.
+
+        Returns:
+            list: The indexed langchain documents.
+        """
+        with self._lock:
+            rows = self._connection.execute('SELECT content, metadata FROM documents').fetchall()
+        return [Document(page_content=content, metadata=json.loads(metadata)) for content, metadata in rows]
+
+    def delete(self, doc_ids: Sequence[str]) -> None:
+        """
+        Remove documents from the index.
+
+        Args:
+            doc_ids (list): The ids of the documents to remove.
+        """
+        with self._lock:
+            self._connection.executemany('DELETE FROM postings WHERE doc_id = ?', [(doc_id,) for doc_id in doc_ids])
+            self._connection.executemany('DELETE FROM documents WHERE doc_id = ?', [(doc_id,) for doc_id in doc_ids])
+            self._connection.commit()
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """
+        Get the documents with the highest BM25 score for a query.
+
+        Args:
+            query (str): The query.
+            k (int): The number of documents to return.
+
+        Returns:
+            list: The documents and their BM25 scores, sorted by decreasing score.
+        """
+        terms = list(set(tokenize(query)))
+        if len(terms) == 0:
+            return []
+        placeholders = ','.join('?' * len(terms))
+        with self._lock:
+            num_docs, avg_length = self._connection.execute('SELECT COUNT(*), AVG(length) FROM documents').fetchone()
+            if num_docs == 0:
+                return []
+            document_frequencies = dict(
+                self._connection.execute(
+                    f'SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term', terms
+                ).fetchall()
+            )
+            postings = self._connection.execute(
+                f"""
+                SELECT postings.term, postings.doc_id, postings.tf, documents.length
+                FROM postings JOIN documents ON postings.doc_id = documents.doc_id
+                WHERE postings.term IN ({placeholders})
+                """,
+                terms,
+            ).fetchall()
+
+            scores: Dict[str, float] = defaultdict(float)
+            avg_length = avg_length or 1.0
+            for term, doc_id, tf, length in postings:
+                df = document_frequencies[term]
+                idf = math.log((num_docs - df + 0.5) / (df + 0.5) + 1)
+                length_norm = 1 - self.b + self.b * length / avg_length
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+
+            top_doc_ids = sorted(scores, key=scores.__getitem__, reverse=True)[:k]
+            results = []
+            for doc_id in top_doc_ids:
+                content, metadata = self._connection.execute(
+                    'SELECT content, metadata FROM documents WHERE doc_id = ?', (doc_id,)
+                ).fetchone()
+                results.append((Document(page_content=content, metadata=json.loads(metadata)), scores[doc_id]))
+        return results
+
+    def close(self) -> None:
+        """Close the index database."""
+        with self._lock:
+            self._connection.close()
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever fusing the rankings of a dense vector store retriever and a BM25 index with
+    Reciprocal Rank Fusion (RRF).
+
+    Exact-term queries (part numbers, ticker symbols, error codes) are matched by the BM25 index even when the dense
+    similarity misses them, so a smaller `k` can be used and the reranker has less documents to score.
+
+    Args:
+        vector_retriever (BaseRetriever): The dense retriever.
+        bm25_index (BM25Index): The BM25 index of the same documents.
+        k (int): The number of documents to return.
+        bm25_k (int, optional): The number of documents retrieved from the BM25 index. Defaults to `k`.
+        rrf_k (int): The RRF rank constant.
+        bm25_weight (float): The weight of the BM25 ranking in the fusion, relative to the dense ranking.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector_retriever: BaseRetriever
+    bm25_index: BM25Index
+    k: int = 4
+    bm25_k: Optional[int] = None
+    rrf_k: int = 60
+    bm25_weight: float = 1.0
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, **kwargs: Any
+    ) -> List[Document]:
+        dense_docs = self.vector_retriever.invoke(query, config={'callbacks': run_manager.get_child()})
+        sparse_docs = [doc for doc, _ in self.bm25_index.search(query, self.bm25_k or self.k)]
+
+        fused_scores: Dict[str, float] = defaultdict(float)
+        docs_by_id: Dict[str, Document] = {}
+        for weight, ranking in [(1.0, dense_docs), (self.bm25_weight, sparse_docs)]:
+            for rank, doc in enumerate(ranking):
+                doc_id = get_fusion_key(doc)
+                fused_scores[doc_id] += weight / (self.rrf_k + rank + 1)
+                docs_by_id.setdefault(doc_id, doc)
+
+        top_doc_ids = sorted(fused_scores, key=fused_scores.__getitem__, reverse=True)[: self.k]
+        return [docs_by_id[doc_id] for doc_id in top_doc_ids]
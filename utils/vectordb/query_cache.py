@@ -0,0 +1,173 @@
+import logging
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+vectordb_dir = os.path.dirname(os.path.abspath(__file__))
+utils_dir = os.path.abspath(os.path.join(vectordb_dir, '..'))
+repo_dir = os.path.abspath(os.path.join(utils_dir, '..'))
+
+sys.path.append(repo_dir)
+sys.path.append(utils_dir)
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalize a question for exact-match caching: lowercase, trailing punctuation and extra whitespace removed.
+
+    Args:
+        question (str): The question.
+
+    Returns:
+        str: The normalized question.
+    """
+    question = re.sub(r'\s+', ' ', question.lower()).strip()
+    return question.rstrip(' ?!.')
+
+
+class QueryResultCache:
+    """
+    Two-tier cache of RAG chain results.
+
+    The first tier is an exact-match cache on the normalized question. The second, optional, tier is a semantic cache
+    returning the result of a previous question whose embedding is within `similarity_threshold` cosine similarity
+    of the new one. All the entries are tied to a vector database version, and are dropped as soon as a different
+    version is queried, so the cache never serves answers computed over an outdated vector database.
+
+    The semantic tier can return a wrong answer for questions differing only by a number or a date, e.g. the revenue
+    in 2022 and in 2023 have very close embeddings, so it should only be enabled with a strict threshold.
+
+    Args:
+        embeddings (Embeddings, optional): The embedding model of the semantic cache. If None, only the exact-match
+            cache is used.
+        similarity_threshold (float): Cosine similarity above which two questions share the same answer.
+        max_entries (int): Maximum number of cached results, the least recently used ones are evicted first.
+    """
+
+    def __init__(
+        self,
+        embeddings: Optional[Embeddings] = None,
+        similarity_threshold: float = 0.95,
+        max_entries: int = 1024,
+    ) -> None:
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.vdb_version: Optional[str] = None
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._results: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+        self._question_embeddings: OrderedDict[str, np.ndarray] = OrderedDict()
+
+    def _check_version(self, vdb_version: str) -> None:
+        """Drop all the cached results if the vector database version changed."""
+        if vdb_version != self.vdb_version:
+            if self.vdb_version is not None:
+                logger.info('Vector database updated, query cache invalidated')
+            self.clear()
+            self.vdb_version = vdb_version
+
+    def _embed(self, question: str) -> np.ndarray:
+        """Get the normalized embedding of a normalized question, computing it only once."""
+        embedding = self._question_embeddings.get(question)
+        if embedding is None:
+            assert self.embeddings is not None
+            embedding = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+            embedding /= np.linalg.norm(embedding) or 1.0
+            self._question_embeddings[question] = embedding
+        return embedding
+
+    def _get_semantic_match(self, question: str) -> Optional[str]:
+        """Get the cached question most similar to the given question, if it is above the similarity threshold."""
+        cached_questions: List[Tuple[str, np.ndarray]] = [
+            (cached_question, self._question_embeddings[cached_question])
+            for cached_question in self._results
+            if cached_question in self._question_embeddings
+        ]
+        if len(cached_questions) == 0:
+            return None
+        similarities = np.stack([embedding for _, embedding in cached_questions]) @ self._embed(question)
+        best_index = int(np.argmax(similarities))
+        if similarities[best_index] >= self.similarity_threshold:
+            return cached_questions[best_index][0]
+        return None
+
+    def get(self, question: str, vdb_version: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the cached result of a question.
+
+        Args:
+            question (str): The question.
+            vdb_version (str): The version of the vector database the question is answered over.
+
+        Returns:
+            dict: The cached result, or None on a cache miss.
+        """
+        normalized_question = normalize_question(question)
+        with self._lock:
+            self._check_version(vdb_version)
+            cached_question: Optional[str] = normalized_question if normalized_question in self._results else None
+            if cached_question is not None:
+                self.hits += 1
+            elif self.embeddings is not None:
+                cached_question = self._get_semantic_match(normalized_question)
+                if cached_question is not None:
+                    self.semantic_hits += 1
+            if cached_question is None:
+                self.misses += 1
+                return None
+            self._results.move_to_end(cached_question)
+            logger.info(f'Query cache hit for question: {question}')
+            return self._results[cached_question]
+
+    def set(self, question: str, vdb_version: str, result: Dict[str, Any]) -> None:
+        """
+        Cache the result of a question.
+
+        Args:
+            question (str): The question.
+            vdb_version (str): The version of the vector database the question was answered over.
+            result (dict): The chain result.
+        """
+        normalized_question = normalize_question(question)
+        with self._lock:
+            self._check_version(vdb_version)
+            self._results[normalized_question] = result
+            self._results.move_to_end(normalized_question)
+            if self.embeddings is not None:
+                self._embed(normalized_question)
+            while len(self._results) > self.max_entries:
+                evicted_question, _ = self._results.popitem(last=False)
+                self._question_embeddings.pop(evicted_question, None)
+            # Embeddings of questions whose result was not cached are bounded too
+            while len(self._question_embeddings) > 2 * self.max_entries:
+                self._question_embeddings.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all the cached results."""
+        self._results.clear()
+        self._question_embeddings.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the cache metrics.
+
+        Returns:
+            dict: The number of exact hits, semantic hits and misses, and the number of cached results.
+        """
+        return {
+            'hits': self.hits,
+            'semantic_hits': self.semantic_hits,
+            'misses': self.misses,
+            'entries': len(self._results),
+        }
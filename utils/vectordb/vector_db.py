@@ -17,10 +17,12 @@ Optional arguments:
 """
 
 import argparse
+import hashlib
 import logging
 import os
+import shutil
 import sys
-from typing import Any, List, Optional, Set
+from typing import Any, Dict, List, Optional, Set
 
 from langchain.text_splitter import CharacterTextSplitter, RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import DirectoryLoader, UnstructuredURLLoader
@@ -37,6 +39,13 @@ sys.path.append(utils_dir)
 import uuid
 
 from utils.model_wrappers.api_gateway import APIGateway
+from utils.vectordb.hybrid_retrieval import (
+    BM25_INDEX_FILE_NAME,
+    BM25Index,
+    HybridRetriever,
+    assign_chunk_ids,
+    get_document_id,
+)
 
 EMBEDDING_MODEL = 'intfloat/e5-large-v2'
 NORMALIZE_EMBEDDINGS = True
@@ -75,11 +84,17 @@ class VectorDb:
         load_vdb: load a previous stored vector database
         update_vdb: Update an existing vector store with new chunks
         create_vdb: Create a vector database from the raw files in a specific input directory
+        load_bm25_index: Load the BM25 index stored next to a vector database
+        get_vdb_version: Get an identifier of the current content of a vector database
+        get_hybrid_retriever: Create a retriever fusing dense and BM25 rankings
     """
 
     def __init__(self) -> None:
         self.collection_id = str(uuid.uuid4())
         self.vector_collections: Set[Any] = set()
+        self.bm25_index: Optional[BM25Index] = None
+        # Identifier of the content of the last created, updated or loaded vector db, used to invalidate query caches
+        self.vdb_version: Optional[str] = None
 
     def load_files(
         self,
@@ -185,6 +200,7 @@ class VectorDb:
         db_type: str,
         output_db: Optional[str] = None,
         collection_name: Optional[str] = None,
+        hybrid: bool = False,
     ) -> Any:
         """Creates a vector store
 
@@ -193,11 +209,17 @@ class VectorDb:
             embeddings (HuggingFaceInstructEmbeddings): embedding model
             db_type (str): vector db type
             output_db (str, optional): output path to save the vector db. Defaults to None.
+            hybrid (bool, optional): whether to also index the chunks in a BM25 index saved next to the vector db,
+                to use with `get_hybrid_retriever`. Defaults to False.
         """
         if collection_name is None:
             collection_name = f'collection_{self.collection_id}'
             logger.info(f'This is the collection name: {collection_name}')
 
+        # The chunk ids match the chunks of the vector store and of the BM25 index
+        if hybrid:
+            assign_chunk_ids(chunks)
+
         vector_store: FAISS | Qdrant | Chroma | Milvus
         if db_type == 'faiss':
             vector_store = FAISS.from_documents(documents=chunks, embedding=embeddings)
@@ -254,6 +276,12 @@ class VectorDb:
 
         logger.info(f'Vector store saved to {output_db}')
 
+        if hybrid:
+            self.bm25_index = BM25Index(output_db)
+            self.bm25_index.add_documents(chunks)
+
+        self.vdb_version = self.get_vdb_version(output_db)
+
         return vector_store
 
     def load_vdb(
@@ -299,6 +327,8 @@ class VectorDb:
         else:
             raise ValueError(f'Unsupported database type: {db_type}')
 
+        self.vdb_version = self.get_vdb_version(persist_directory)
+
         return vector_store
 
     def update_vdb(
@@ -308,7 +338,30 @@ class VectorDb:
         db_type: str,
         input_db: Optional[str] = None,
         output_db: Optional[str] = None,
+        hybrid: bool = False,
+        collection_name: Optional[str] = None,
     ) -> Any:
+        """Updates an existing vector store with new chunks
+
+        The BM25 index stored next to the vector db is updated too, if it exists or if `hybrid` is True.
+
+        Args:
+            chunks (list): list of new chunks
+            embeddings (HuggingFaceInstructEmbeddings): embedding model
+            db_type (str): vector db type
+            input_db (str, optional): path of the vector db to update
+            output_db (str, optional): output path to save the updated vector db. Defaults to `input_db`.
+            hybrid (bool, optional): whether to also index the chunks in a BM25 index saved next to the vector db,
+                to use with `get_hybrid_retriever`. Defaults to False.
+            collection_name (str, optional): name of the chroma collection to update. Defaults to the chroma one.
+        """
+        update_bm25_index = db_type in ['faiss', 'chroma'] and (
+            hybrid or (input_db is not None and os.path.exists(os.path.join(input_db, BM25_INDEX_FILE_NAME)))
+        )
+        # The chunk ids match the chunks of the vector store and of the BM25 index
+        if update_bm25_index:
+            assign_chunk_ids(chunks)
+
         if db_type == 'faiss':
             vector_store = FAISS.load_local(input_db, embeddings, allow_dangerous_deserialization=True)  # type: ignore
             new_vector_store = self.create_vector_store(chunks, embeddings, db_type, None)
@@ -317,8 +370,23 @@ class VectorDb:
                 vector_store.save_local(output_db)
 
         elif db_type == 'chroma':
-            # TODO implement update method for chroma
-            pass
+            if output_db and input_db and output_db != input_db:
+                shutil.copytree(input_db, output_db, dirs_exist_ok=True)
+            persist_directory = output_db or input_db
+            if collection_name:
+                vector_store = Chroma(
+                    persist_directory=persist_directory,
+                    embedding_function=embeddings,
+                    collection_name=collection_name,
+                )
+            else:
+                vector_store = Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+            # The document ids are used as chroma ids, so the chunks already in the collection are not duplicated,
+            # and identical chunks, e.g. repeated boilerplate paragraphs, are only added once
+            unique_chunks: Dict[str, Any] = dict()
+            for chunk in chunks:
+                unique_chunks.setdefault(get_document_id(chunk), chunk)
+            vector_store.add_documents(list(unique_chunks.values()), ids=list(unique_chunks.keys()))
         elif db_type == 'qdrant':
             # TODO implement update method for qdrant
             pass
@@ -326,8 +394,86 @@ class VectorDb:
             # TODO implement update method for milvus
             pass
 
+        if update_bm25_index:
+            # The BM25 index is updated incrementally, copying the input index first if the output db is new
+            self.bm25_index = BM25Index(output_db or input_db)
+            if output_db and output_db != input_db:
+                self.bm25_index.add_documents(BM25Index(input_db).get_documents())
+            self.bm25_index.add_documents(chunks)
+
+        self.vdb_version = self.get_vdb_version(output_db or input_db)
+
         return vector_store
 
+    def get_vdb_version(self, persist_directory: Optional[str]) -> str:
+        """Gets an identifier of the current content of a vector database
+
+        The identifier of a persisted vector db is a fingerprint of its files, so it is the same each time an
+        unchanged vector db is loaded, and changes as soon as the vector db is updated.
+
+        Args:
+            persist_directory (str, optional): path of the vector db. If None, a new random identifier is returned.
+
+        Returns:
+            str: The vector db version
+        """
+        if persist_directory is None or not os.path.exists(persist_directory):
+            return str(uuid.uuid4())
+        if persist_directory.endswith('.db'):
+            persist_directory = os.path.dirname(persist_directory)
+        fingerprint = hashlib.sha1()
+        for root, _, files in sorted(os.walk(persist_directory)):
+            for file_name in sorted(files):
+                file_stat = os.stat(os.path.join(root, file_name))
+                file_path = os.path.relpath(os.path.join(root, file_name), persist_directory)
+                fingerprint.update(f'{file_path}:{file_stat.st_size}:{file_stat.st_mtime_ns};'.encode('utf-8'))
+        return fingerprint.hexdigest()
+
+    def load_bm25_index(self, persist_directory: Optional[str]) -> BM25Index:
+        """Loads the BM25 index stored next to a vector database
+
+        Args:
+            persist_directory (str, optional): path of the vector db. If None, an empty in-memory index is created.
+
+        Returns:
+            BM25Index: the BM25 index
+        """
+        if persist_directory is not None and persist_directory.endswith('.db'):
+            persist_directory = os.path.dirname(persist_directory)
+        self.bm25_index = BM25Index(persist_directory)
+        logger.info(f'BM25 index loaded with {len(self.bm25_index)} documents')
+        return self.bm25_index
+
+    def get_hybrid_retriever(
+        self,
+        vector_store: Any,
+        k: int,
+        search_kwargs: Optional[Dict[str, Any]] = None,
+        search_type: str = 'similarity',
+        bm25_index: Optional[BM25Index] = None,
+        rrf_k: int = 60,
+    ) -> HybridRetriever:
+        """Creates a retriever fusing the vector store ranking and the BM25 ranking with Reciprocal Rank Fusion
+
+        Args:
+            vector_store: vector store to use as dense retriever
+            k (int): number of documents to retrieve
+            search_kwargs (dict, optional): search kwargs of the dense retriever. Defaults to {'k': k}.
+            search_type (str, optional): search type of the dense retriever. Defaults to 'similarity'.
+            bm25_index (BM25Index, optional): BM25 index of the same documents.
+                Defaults to the last index created or loaded.
+            rrf_k (int, optional): RRF rank constant. Defaults to 60.
+
+        Returns:
+            HybridRetriever: the hybrid retriever
+        """
+        if bm25_index is None:
+            bm25_index = self.bm25_index
+        if bm25_index is None:
+            raise ValueError('No BM25 index created or loaded, use `hybrid=True` or `load_bm25_index` first')
+        vector_retriever = vector_store.as_retriever(search_type=search_type, search_kwargs=search_kwargs or {'k': k})
+        return HybridRetriever(vector_retriever=vector_retriever, bm25_index=bm25_index, k=k, rrf_k=rrf_k)
+
     def create_vdb(
         self,
         input_path: str,
@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Coroutine, Dict, Iterable, List, Optional, Tuple, TypeVar
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+import aiohttp
+from langchain.docstore.document import Document
+from langchain_community.document_loaders import UnstructuredURLLoader
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+utils_dir = os.path.abspath(os.path.join(current_dir, '..'))
+repo_dir = os.path.abspath(os.path.join(utils_dir, '..'))
+sys.path.append(utils_dir)
+sys.path.append(repo_dir)
+
+from utils.web.http_cache import (
+    HttpCache,
+    get_http_cache_ttl,
+    get_shared_http_cache,
+    make_cache_key,
+    page_cache_value,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (compatible; SambaNovaAIStarterKitCrawler/1.0)'
+
+
+class AsyncWebCrawler:
+    """
+    Concurrent web page loader backed by a single `aiohttp` connection pool.
+
+    All the requests are issued from one background event loop, so the connection pool is shared by every call
+    to `load`, and the pages of a crawl level are fetched in parallel instead of one after another.
+
+    Features:
+        - Global and per host connection limits.
+        - Politeness delay between two requests to the same host (or the robots.txt `Crawl-delay`, if larger).
+        - robots.txt fetched once per host and cached.
+        - Fetched pages kept in an `HttpCache`: fresh pages are served without any request, and expired ones are
+          revalidated with a conditional GET using their `ETag` and `Last-Modified` validators.
+        - Remote PDFs loaded concurrently in a thread pool with `UnstructuredURLLoader`.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        max_connections_per_host: int = 4,
+        politeness_delay: float = 0.5,
+        respect_robots_txt: bool = True,
+        request_timeout: float = 30,
+        verify_ssl: bool = False,
+        user_agent: str = DEFAULT_USER_AGENT,
+        http_cache: Optional[HttpCache] = None,
+        page_ttl: Optional[float] = None,
+    ) -> None:
+        """
+        Initialize the crawler and start its background event loop.
+
+        Args:
+            max_concurrency: Maximum number of simultaneous connections.
+            max_connections_per_host: Maximum number of simultaneous connections to the same host.
+            politeness_delay: Minimum number of seconds between two requests to the same host.
+            respect_robots_txt: Whether to skip the URLs disallowed by the robots.txt of their host.
+            request_timeout: Total timeout in seconds of each request.
+            verify_ssl: Whether to verify the SSL certificates.
+            user_agent: User agent sent with each request.
+            http_cache: The cache of fetched pages. Defaults to an in-memory cache whose pages are always revalidated.
+            page_ttl: Time to live of the cached pages, in seconds. Defaults to the cache `default_ttl`, or to 0
+                with the default in-memory cache.
+        """
+        self.max_concurrency = max_concurrency
+        self.max_connections_per_host = max_connections_per_host
+        self.politeness_delay = politeness_delay
+        self.respect_robots_txt = respect_robots_txt
+        self.request_timeout = request_timeout
+        self.verify_ssl = verify_ssl
+        self.user_agent = user_agent
+        if http_cache is None:
+            http_cache = get_shared_http_cache(None)
+            page_ttl = page_ttl if page_ttl is not None else 0
+        self.http_cache = http_cache
+        self.page_ttl = page_ttl
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._host_locks: Dict[str, asyncio.Lock] = {}
+        self._host_last_request: Dict[str, float] = {}
+        self._robots: Dict[str, 'asyncio.Task[Optional[RobotFileParser]]'] = {}
+        self._pdf_executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency // 2))
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='web-crawler-loop', daemon=True)
+        self._thread.start()
+
+    def _run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        """Run a coroutine in the crawler event loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Lazily create the shared HTTP session (it must be created inside the crawler event loop)."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency,
+                limit_per_host=self.max_connections_per_host,
+                ssl=None if self.verify_ssl else False,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+                headers={'User-Agent': self.user_agent},
+            )
+        return self._session
+
+    async def _fetch_robots(self, session: aiohttp.ClientSession, host_url: str) -> Optional[RobotFileParser]:
+        """
+        Fetch and parse the robots.txt of a host.
+
+        Args:
+            session: The HTTP session.
+            host_url: The scheme and network location of the host.
+
+        Returns:
+            The parsed robots.txt, or None if it is not available.
+        """
+        try:
+            async with session.get(f'{host_url}/robots.txt') as response:
+                if response.status != 200:
+                    return None
+                content = await response.text(errors='replace')
+        except Exception as e:
+            logger.warning(f'Could not fetch robots.txt of {host_url}: {e}')
+            return None
+        robots = RobotFileParser()
+        robots.parse(content.splitlines())
+        return robots
+
+    async def _get_robots(self, session: aiohttp.ClientSession, url: str) -> Optional[RobotFileParser]:
+        """Return the cached robots.txt of the host of the given URL, fetching it only once per host."""
+        parsed_url = urlparse(url)
+        host_url = f'{parsed_url.scheme}://{parsed_url.netloc}'
+        if host_url not in self._robots:
+            self._robots[host_url] = asyncio.ensure_future(self._fetch_robots(session, host_url))
+        return await self._robots[host_url]
+
+    async def _wait_politeness_delay(self, host: str, robots: Optional[RobotFileParser]) -> None:
+        """Wait until the politeness delay since the last request to the given host has elapsed."""
+        delay = self.politeness_delay
+        if robots is not None:
+            crawl_delay = robots.crawl_delay(self.user_agent)
+            if crawl_delay is not None:
+                delay = max(delay, float(crawl_delay))
+        if delay <= 0:
+            return
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            elapsed = time.monotonic() - self._host_last_request.get(host, 0.0)
+            if elapsed < delay:
+                await asyncio.sleep(delay - elapsed)
+            self._host_last_request[host] = time.monotonic()
+
+    async def _is_allowed(self, session: aiohttp.ClientSession, url: str) -> Tuple[bool, Optional[RobotFileParser]]:
+        """Check the robots.txt rules of the given URL."""
+        if not self.respect_robots_txt:
+            return True, None
+        robots = await self._get_robots(session, url)
+        if robots is not None and not robots.can_fetch(self.user_agent, url):
+            logger.info(f'Skipping {url}: disallowed by robots.txt')
+            return False, robots
+        return True, robots
+
+    async def _fetch_html(self, url: str) -> List[Document]:
+        """
+        Fetch a single HTML page.
+
+        Args:
+            url: The URL of the page.
+
+        Returns:
+            A list with the loaded document, or an empty list if the page could not be fetched.
+        """
+        cache_key = make_cache_key('page', url)
+        cached_page = self.http_cache.lookup(cache_key)
+        if cached_page is not None and cached_page.is_fresh:
+            return [Document(page_content=cached_page.value['content'], metadata={'source': url})]
+
+        session = await self._get_session()
+        allowed, robots = await self._is_allowed(session, url)
+        if not allowed:
+            return []
+        await self._wait_politeness_delay(urlparse(url).netloc, robots)
+
+        headers = {}
+        if cached_page is not None:
+            if cached_page.value['etag']:
+                headers['If-None-Match'] = cached_page.value['etag']
+            if cached_page.value['last_modified']:
+                headers['If-Modified-Since'] = cached_page.value['last_modified']
+
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304 and cached_page is not None:
+                    logger.info(f'{url} not modified, reusing cached content')
+                    content = cached_page.value['content']
+                    self.http_cache.touch(cache_key, self.page_ttl)
+                elif response.status == 200:
+                    content = await response.text(errors='replace')
+                    self.http_cache.set(cache_key, page_cache_value(content, response.headers), self.page_ttl)
+                else:
+                    logger.warning(f'Request to {url} failed with status code: {response.status}')
+                    return []
+        except Exception as e:
+            logger.warning(f'Error fetching {url}: {e}')
+            return []
+
+        return [Document(page_content=content, metadata={'source': url})]
+
+    async def _fetch_pdf(self, url: str) -> List[Document]:
+        """
+        Load a remote PDF file in the crawler thread pool.
+
+        Args:
+            url: The URL of the PDF file.
+
+        Returns:
+            A list of loaded pdf documents.
+        """
+        session = await self._get_session()
+        allowed, robots = await self._is_allowed(session, url)
+        if not allowed:
+            return []
+        await self._wait_politeness_delay(urlparse(url).netloc, robots)
+        try:
+            return await self._loop.run_in_executor(self._pdf_executor, UnstructuredURLLoader(urls=[url]).load)
+        except Exception as e:
+            logger.warning(f'Error loading pdf {url}: {e}')
+            return []
+
+    async def aload(self, urls: Iterable[str], load_pdfs: bool = False) -> List[Document]:
+        """
+        Concurrently load the given URLs.
+
+        Args:
+            urls: The URLs to load.
+            load_pdfs: Whether to load the URLs ending in `.pdf`. If False they are skipped.
+
+        Returns:
+            The loaded documents, in the same order as the given URLs.
+        """
+        tasks = []
+        for url in urls:
+            if url.endswith('.pdf'):
+                if load_pdfs:
+                    tasks.append(self._fetch_pdf(url))
+            else:
+                tasks.append(self._fetch_html(url))
+        results = await asyncio.gather(*tasks)
+        return [doc for docs in results for doc in docs]
+
+    def load(self, urls: Iterable[str], load_pdfs: bool = False) -> List[Document]:
+        """
+        Concurrently load the given URLs, blocking until all of them are loaded.
+
+        Args:
+            urls: The URLs to load.
+            load_pdfs: Whether to load the URLs ending in `.pdf`. If False they are skipped.
+
+        Returns:
+            The loaded documents, in the same order as the given URLs.
+        """
+        return self._run(self.aload(list(urls), load_pdfs=load_pdfs))
+
+    async def _aclose(self) -> None:
+        """Close the shared HTTP session."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def close(self) -> None:
+        """Close the shared HTTP session and stop the crawler event loop."""
+        self._run(self._aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._pdf_executor.shutdown(wait=False)
+
+
+_shared_crawlers: Dict[Tuple[Tuple[str, Any], ...], AsyncWebCrawler] = {}
+_shared_crawlers_lock = threading.Lock()
+
+
+def get_shared_crawler(**crawler_params: Any) -> AsyncWebCrawler:
+    """
+    Get the process wide crawler for the given parameters, creating it on first use.
+
+    Args:
+        **crawler_params: Keyword arguments of `AsyncWebCrawler`.
+
+    Returns:
+        The shared crawler.
+    """
+    key = tuple(sorted(crawler_params.items()))
+    with _shared_crawlers_lock:
+        if key not in _shared_crawlers:
+            _shared_crawlers[key] = AsyncWebCrawler(**crawler_params)
+        return _shared_crawlers[key]
+
+
+def get_crawler_params(
+    web_crawling_params: Dict[str, Any], http_cache_params: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Extract the `AsyncWebCrawler` parameters from a kit `web_crawling` config section.
+
+    Args:
+        web_crawling_params: The `web_crawling` section of a kit config.
+        http_cache_params: The `http_cache` section of the kit config, whose `ttl` is the default `page_ttl`.
+
+    Returns:
+        The keyword arguments of `AsyncWebCrawler` set in the config.
+    """
+    crawler_keys = [
+        'max_concurrency',
+        'max_connections_per_host',
+        'politeness_delay',
+        'respect_robots_txt',
+        'request_timeout',
+        'page_ttl',
+    ]
+    crawler_params = {key: web_crawling_params[key] for key in crawler_keys if key in web_crawling_params}
+    if http_cache_params is not None:
+        crawler_params.setdefault('page_ttl', get_http_cache_ttl(http_cache_params))
+    return crawler_params
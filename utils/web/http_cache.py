@@ -0,0 +1,408 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+import requests
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+utils_dir = os.path.abspath(os.path.join(current_dir, '..'))
+repo_dir = os.path.abspath(os.path.join(utils_dir, '..'))
+sys.path.append(utils_dir)
+sys.path.append(repo_dir)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 3600
+DEFAULT_MAX_SIZE_MB = 256
+CACHE_DB_FILE_NAME = 'http_cache.sqlite'
+
+# Query parameters that do not change the content of a page
+TRACKING_QUERY_PARAMS = {'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content', 'gclid', 'fbclid'}
+
+
+@dataclass
+class CacheEntry:
+    """A cached value with its expiration time."""
+
+    value: Any
+    expires_at: float
+
+    @property
+    def is_fresh(self) -> bool:
+        """Whether the entry has not expired yet."""
+        return time.time() < self.expires_at
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalize a URL so that equivalent URLs share the same cache key.
+
+    The scheme and host are lowercased, default ports, fragments and tracking parameters are removed,
+    and the query parameters are sorted.
+
+    Args:
+        url: The URL to normalize.
+
+    Returns:
+        The normalized URL.
+    """
+    parsed_url = urlparse(url.strip())
+    scheme = parsed_url.scheme.lower()
+    netloc = parsed_url.netloc.lower()
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    query_params = sorted(
+        (key, value)
+        for key, value in parse_qsl(parsed_url.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_QUERY_PARAMS
+    )
+    path = parsed_url.path or '/'
+    return urlunparse((scheme, netloc, path, parsed_url.params, urlencode(query_params), ''))
+
+
+def make_cache_key(namespace: str, target: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Build a cache key from a namespace, a URL or search query, and its request parameters.
+
+    URLs are normalized with `normalize_url`, and search queries are lowercased and stripped of extra whitespace.
+
+    Args:
+        namespace: The kind of cached request, e.g. `page` or `serper`.
+        target: The URL or the search query.
+        params: The request parameters that change the response.
+
+    Returns:
+        The cache key.
+    """
+    if target.startswith(('http://', 'https://')):
+        normalized_target = normalize_url(target)
+    else:
+        normalized_target = ' '.join(target.lower().split())
+    key_data = json.dumps({'namespace': namespace, 'target': normalized_target, 'params': params or {}}, sort_keys=True)
+    return hashlib.sha256(key_data.encode('utf-8')).hexdigest()
+
+
+class HttpCache:
+    """
+    TTL based on-disk cache for HTTP responses and search results, backed by SQLite.
+
+    The cache is bounded in size: when it grows over `max_size_mb`, the expired entries are removed first
+    and then the least recently used ones. Hits, misses and evictions are counted and exposed by `stats`.
+    A disabled cache stores nothing, so that each lookup is a miss.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        default_ttl: float = DEFAULT_TTL,
+        max_size_mb: float = DEFAULT_MAX_SIZE_MB,
+        enabled: bool = True,
+    ) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            directory: The directory where the cache database is stored. If None, the cache is kept in memory.
+            default_ttl: Default time to live of the entries, in seconds.
+            max_size_mb: Maximum size of the cached values, in megabytes.
+            enabled: Whether to store the entries. If False, `set` and `touch` do nothing.
+        """
+        self.directory = directory
+        self.enabled = enabled
+        self.default_ttl = default_ttl
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        if directory is not None and enabled:
+            os.makedirs(directory, exist_ok=True)
+            database = os.path.join(directory, CACHE_DB_FILE_NAME)
+        else:
+            database = ':memory:'
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(database, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute('CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)')
+        self._connection.commit()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def lookup(self, key: str) -> Optional[CacheEntry]:
+        """
+        Get an entry, even if it has expired, e.g. to revalidate it with a conditional request.
+
+        Only fresh entries are counted as cache hits.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            The cache entry, or None if the key is not cached.
+        """
+        if not self.enabled:
+            with self._lock:
+                self._misses += 1
+            return None
+        with self._lock:
+            row = self._connection.execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self._misses += 1
+                return None
+            self._connection.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            self._connection.commit()
+            entry = CacheEntry(value=json.loads(row[0]), expires_at=row[1])
+            if entry.is_fresh:
+                self._hits += 1
+            else:
+                self._misses += 1
+        return entry
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Get a value if it is cached and has not expired.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            The cached value, or None on a cache miss.
+        """
+        entry = self.lookup(key)
+        if entry is not None and entry.is_fresh:
+            return entry.value
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a JSON serializable value.
+
+        Args:
+            key: The cache key.
+            value: The value to store.
+            ttl: Time to live of the entry, in seconds. Defaults to `default_ttl`.
+        """
+        if not self.enabled:
+            return
+        if ttl is None:
+            ttl = self.default_ttl
+        serialized_value = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO cache (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+                (key, serialized_value, len(serialized_value), now + ttl, now),
+            )
+            self._evict()
+            self._connection.commit()
+
+    def touch(self, key: str, ttl: Optional[float] = None) -> None:
+        """
+        Extend the expiration time of an entry, e.g. after a `304 Not Modified` response.
+
+        Args:
+            key: The cache key.
+            ttl: New time to live of the entry, in seconds. Defaults to `default_ttl`.
+        """
+        if not self.enabled:
+            return
+        if ttl is None:
+            ttl = self.default_ttl
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                'UPDATE cache SET expires_at = ?, accessed_at = ? WHERE key = ?', (now + ttl, now, key)
+            )
+            self._connection.commit()
+
+    def delete(self, key: str) -> None:
+        """Remove an entry from the cache."""
+        with self._lock:
+            self._connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+            self._connection.commit()
+
+    def clear(self) -> None:
+        """Remove all the entries from the cache."""
+        with self._lock:
+            self._connection.execute('DELETE FROM cache')
+            self._connection.commit()
+
+    def _get_size(self) -> int:
+        """Total size of the cached values, in bytes."""
+        return int(self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0])
+
+    def _evict(self) -> None:
+        """Remove expired and then least recently used entries until the cache fits in `max_size_bytes`."""
+        if self.max_size_bytes <= 0 or self._get_size() <= self.max_size_bytes:
+            return
+        cursor = self._connection.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+        self._evictions += max(cursor.rowcount, 0)
+        size = self._get_size()
+        while size > self.max_size_bytes:
+            rows = self._connection.execute('SELECT key, size FROM cache ORDER BY accessed_at LIMIT 64').fetchall()
+            if not rows:
+                break
+            for key, entry_size in rows:
+                self._connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+                self._evictions += 1
+                size -= entry_size
+                if size <= self.max_size_bytes:
+                    break
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the cache metrics.
+
+        Returns:
+            A dictionary with the number of hits, misses and evictions, the hit rate,
+            the number of entries and the total size of the cached values in bytes.
+        """
+        with self._lock:
+            entries = self._connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+            size = self._get_size()
+        requests_count = self._hits + self._misses
+        return {
+            'hits': self._hits,
+            'misses': self._misses,
+            'hit_rate': self._hits / requests_count if requests_count > 0 else 0.0,
+            'evictions': self._evictions,
+            'entries': entries,
+            'size_bytes': size,
+        }
+
+    def close(self) -> None:
+        """Close the cache database."""
+        with self._lock:
+            self._connection.close()
+
+
+_shared_caches: Dict[Tuple[Optional[str], float], HttpCache] = {}
+_shared_caches_lock = threading.Lock()
+
+
+def get_shared_http_cache(directory: Optional[str] = None, max_size_mb: float = DEFAULT_MAX_SIZE_MB) -> HttpCache:
+    """
+    Get the process wide HTTP cache stored in the given directory, creating it on first use.
+
+    The cache is shared by all the users of the directory, so its entries have the default time to live: each user
+    passes its own time to live to `set`, `touch` and `cached_get`.
+
+    Args:
+        directory: The directory where the cache database is stored. If None, the cache is kept in memory.
+        max_size_mb: Maximum size of the cached values, in megabytes.
+
+    Returns:
+        The shared HTTP cache.
+    """
+    key = (os.path.abspath(directory) if directory is not None else None, max_size_mb)
+    with _shared_caches_lock:
+        if key not in _shared_caches:
+            _shared_caches[key] = HttpCache(directory, max_size_mb=max_size_mb)
+        return _shared_caches[key]
+
+
+def get_http_cache_from_config(http_cache_params: Optional[Dict[str, Any]], base_dir: str) -> HttpCache:
+    """
+    Get the shared HTTP cache described by an `http_cache` kit config section.
+
+    Args:
+        http_cache_params: The `http_cache` section of a kit config, with the keys `enabled`, `directory`
+            (relative to `base_dir`) and `max_size_mb`. If None or disabled, nothing is cached.
+            Its `ttl` is passed to the users of the cache, see `get_http_cache_ttl`.
+        base_dir: The kit directory.
+
+    Returns:
+        The shared HTTP cache, or a disabled cache.
+    """
+    if not http_cache_params or not http_cache_params.get('enabled', True):
+        return HttpCache(enabled=False)
+    return get_shared_http_cache(
+        os.path.join(base_dir, http_cache_params.get('directory', 'data/http_cache')),
+        max_size_mb=http_cache_params.get('max_size_mb', DEFAULT_MAX_SIZE_MB),
+    )
+
+
+def get_http_cache_ttl(http_cache_params: Optional[Dict[str, Any]], key: str = 'ttl') -> float:
+    """
+    Get a time to live set in an `http_cache` kit config section.
+
+    Args:
+        http_cache_params: The `http_cache` section of a kit config. If None or disabled, the entries expire
+            immediately, so they are always revalidated.
+        key: The key of the time to live, e.g. `ttl` for the pages or `search_ttl` for the search results.
+
+    Returns:
+        The time to live, in seconds.
+    """
+    if not http_cache_params or not http_cache_params.get('enabled', True):
+        return 0
+    ttl: float = http_cache_params.get(key, http_cache_params.get('ttl', DEFAULT_TTL))
+    return ttl
+
+
+def cached_get(
+    url: str,
+    http_cache: HttpCache,
+    ttl: Optional[float] = None,
+    session: Optional[requests.Session] = None,
+    **kwargs: Any,
+) -> Optional[str]:
+    """
+    Send a GET request, reusing the cached response body if it has not expired.
+
+    Only successful responses are cached, keyed by the URL and the query `params` of the request.
+
+    Args:
+        url: The URL to request.
+        http_cache: The HTTP cache.
+        ttl: Time to live of the cached response, in seconds. Defaults to the cache `default_ttl`.
+        session: The `requests` session to use. Defaults to a bare `requests.get`.
+        **kwargs: Extra keyword arguments of `requests.get`.
+
+    Returns:
+        The response body, or None if the request failed.
+    """
+    cache_key = make_cache_key('page', url, kwargs.get('params'))
+    page = http_cache.get(cache_key)
+    if page is not None:
+        return str(page['content'])
+    response = (session or requests).get(url, **kwargs)
+    if response.status_code != 200:
+        logger.warning(f'Failed to retrieve {url}. Status code: {response.status_code}')
+        return None
+    http_cache.set(cache_key, page_cache_value(response.text, response.headers), ttl)
+    return response.text
+
+
+def page_cache_value(content: str, headers: Any) -> Dict[str, str]:
+    """
+    Build the cached value of a fetched page, keeping its `ETag`/`Last-Modified` validators for conditional GET.
+
+    Args:
+        content: The page content.
+        headers: The response headers.
+
+    Returns:
+        The value to store in the cache.
+    """
+    return {
+        'content': content,
+        'etag': headers.get('ETag') or '',
+        'last_modified': headers.get('Last-Modified') or '',
+    }
@@ -9,10 +9,8 @@ from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 from langchain.chains import RetrievalQA
 from langchain.docstore.document import Document
-from langchain.document_loaders import AsyncHtmlLoader
 from langchain.document_transformers import Html2TextTransformer
 from langchain.prompts import load_prompt
-from langchain_community.document_loaders import UnstructuredURLLoader
 
 from utils.model_wrappers.api_gateway import APIGateway
 
@@ -25,7 +23,10 @@ sys.path.append(repo_dir)
 
 from typing import Any, Dict, List
 
+from utils.vectordb.deduplication import get_deduplicator
 from utils.vectordb.vector_db import VectorDb
+from utils.web.crawler import AsyncWebCrawler, get_crawler_params, get_shared_crawler
+from utils.web.http_cache import get_http_cache_from_config
 
 load_dotenv(os.path.join(repo_dir, '.env'))
 nest_asyncio.apply()
@@ -58,11 +59,17 @@ class WebCrawlingRetrieval:
         self.retrieval_info = config_info[3]
         self.web_crawling_params = config_info[4]
         self.extra_loaders = config_info[5]
+        self.http_cache_params = config_info[6]
         self.vectordb = VectorDb()
+        self.deduplicator = get_deduplicator(self.retrieval_info)
+        self.http_cache = get_http_cache_from_config(self.http_cache_params, kit_dir)
+        self.crawler = get_shared_crawler(
+            http_cache=self.http_cache, **get_crawler_params(self.web_crawling_params, self.http_cache_params)
+        )
 
     def _get_config_info(
         self, config_path: Optional[str] = CONFIG_PATH
-    ) -> Tuple[str, Dict[str, Any], Dict[str, Any], Dict[str, Any], Dict[str, Any], List[str]]:
+    ) -> Tuple[str, Dict[str, Any], Dict[str, Any], Dict[str, Any], Dict[str, Any], List[str], Dict[str, Any]]:
         """
         Loads json config file
         Args:
@@ -75,6 +82,7 @@ class WebCrawlingRetrieval:
             web_crawling_params (dict): Dictionary containing web crawling parameters
             extra_loaders (list): list containing extra loader to use when doing web crawling
             (only pdf available in base kit)
+            http_cache_params (dict): Dictionary containing the on-disk HTTP cache parameters
         """
         # Read config file
         assert config_path is not None
@@ -86,44 +94,36 @@ class WebCrawlingRetrieval:
         retrieval_info = config['retrieval']
         web_crawling_params = config['web_crawling']
         extra_loaders = config['extra_loaders']
-
-        return api_info, embedding_model_info, llm_info, retrieval_info, web_crawling_params, extra_loaders
-
-    @staticmethod
-    def load_remote_pdf(url: str) -> List[Document]:
-        """
-        Load PDF files from the given URL.
-        Args:
-            url (str): URL to load pdf document from.
-        Returns:
-            list: A list of loaded pdf documents.
-        """
-        loader = UnstructuredURLLoader(urls=[url])
-        docs = loader.load()
-        return docs
+        http_cache_params = config.get('http_cache', {})
+
+        return (
+            api_info,
+            embedding_model_info,
+            llm_info,
+            retrieval_info,
+            web_crawling_params,
+            extra_loaders,
+            http_cache_params,
+        )
 
     @staticmethod
-    def load_htmls(urls: Set[str], extra_loaders: Optional[List[str]] = None) -> List[Document]:
+    def load_htmls(
+        urls: Set[str], extra_loaders: Optional[List[str]] = None, crawler: Optional[AsyncWebCrawler] = None
+    ) -> List[Document]:
         """
-        Load HTML documents from the given URLs.
+        Concurrently load HTML documents from the given URLs.
         Args:
             urls (list): A list of URLs to load HTML documents from.
+            extra_loaders (list, optional): A list of extra loaders to use (only pdf available). Defaults to None.
+            crawler (AsyncWebCrawler, optional): The crawler to use. Defaults to the shared crawler.
         Returns:
             list: A list of loaded HTML documents.
         """
         if extra_loaders is None:
             extra_loaders = []
-        docs = []
-        for url in urls:
-            if url.endswith('.pdf'):
-                if 'pdf' in extra_loaders:
-                    docs.extend(WebCrawlingRetrieval.load_remote_pdf(url))
-                else:
-                    continue
-            else:
-                loader = AsyncHtmlLoader(url, verify_ssl=False)
-                docs.extend(loader.load())
-        return docs
+        if crawler is None:
+            crawler = get_shared_crawler()
+        return crawler.load(urls, load_pdfs='pdf' in extra_loaders)
 
     @staticmethod
     def link_filter(all_links: Set[str], excluded_links: set[str]) -> Set[str]:
@@ -221,7 +221,8 @@ class WebCrawlingRetrieval:
                 list_urls = list(urls)[: self.web_crawling_params['max_scraped_websites'] - len(scraped_urls)]
                 urls = set(list_urls)
 
-            scraped_docs = WebCrawlingRetrieval.load_htmls(urls, self.extra_loaders)
+            # All the urls of the current crawl level are fetched concurrently
+            scraped_docs = WebCrawlingRetrieval.load_htmls(urls, self.extra_loaders, self.crawler)
             scraped_urls.extend(urls)
             urls = WebCrawlingRetrieval.find_links(scraped_docs, excluded_links)
 
@@ -232,6 +233,9 @@ class WebCrawlingRetrieval:
                 break
 
         docs = WebCrawlingRetrieval.clean_docs(raw_docs)
+        # Remove mirror pages before chunking and embedding
+        if self.deduplicator is not None:
+            docs = self.deduplicator.deduplicate(docs)
         return docs, scraped_urls
 
     def init_llm_model(self) -> None:
@@ -249,6 +253,22 @@ class WebCrawlingRetrieval:
             process_prompt=False,
         )
 
+    def get_text_chunks(self) -> List[Document]:
+        """
+        Split the documents into chunks, removing the near-duplicate chunks (e.g. navigation menus, footers or
+        cookie banners shared across the crawled sites) if deduplication is enabled.
+
+        Returns:
+            list: A list of langchain document chunks.
+        """
+        assert self.documents is not None
+        chunks = self.vectordb.get_text_chunks(
+            self.documents, self.retrieval_info['chunk_size'], self.retrieval_info['chunk_overlap']
+        )
+        if self.deduplicator is not None:
+            chunks = self.deduplicator.deduplicate(chunks)
+        return chunks
+
     def create_load_vector_store(self, force_reload: bool = False, update: bool = False) -> None:
         """
         Create a vector store based on the given documents.
@@ -272,9 +292,7 @@ class WebCrawlingRetrieval:
 
         elif os.path.exists(persist_directory) and update:
             assert self.documents is not None
-            self.chunks = self.vectordb.get_text_chunks(
-                self.documents, self.retrieval_info['chunk_size'], self.retrieval_info['chunk_overlap']
-            )
+            self.chunks = self.get_text_chunks()
             self.vector_store = self.vectordb.load_vdb(
                 persist_directory, self.embeddings, db_type=self.retrieval_info['db_type']
             )
@@ -284,9 +302,7 @@ class WebCrawlingRetrieval:
 
         else:
             assert self.documents is not None
-            self.chunks = self.vectordb.get_text_chunks(
-                self.documents, self.retrieval_info['chunk_size'], self.retrieval_info['chunk_overlap']
-            )
+            self.chunks = self.get_text_chunks()
             self.vector_store = self.vectordb.create_vector_store(
                 self.chunks, self.embeddings, self.retrieval_info['db_type'], None
             )
@@ -302,9 +318,7 @@ class WebCrawlingRetrieval:
             update (bool, optional): Whether to update the vector store. Defaults to False.
         """
         assert self.documents is not None
-        self.chunks = self.vectordb.get_text_chunks(
-            self.documents, self.retrieval_info['chunk_size'], self.retrieval_info['chunk_overlap']
-        )
+        self.chunks = self.get_text_chunks()
         self.embeddings = APIGateway.load_embedding_model(
             type=self.embedding_model_info['type'],
             batch_size=self.embedding_model_info['batch_size'],
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Web Crawling Offline Test Script
+
+This script tests the crawl of the Web Crawling Data Retriever kit using unittest, with a stub HTTP session
+instead of the network, and without calling any model.
+
+Usage:
+    python tests/offline_test.py
+
+Returns:
+    0 if all tests pass, or 1 otherwise.
+"""
+
+import asyncio
+import os
+import sys
+import time
+import unittest
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+from unittest import mock
+
+# Setup paths and global variables
+file_dir = os.path.dirname(os.path.abspath(__file__))
+kit_dir = os.path.abspath(os.path.join(file_dir, '..'))  # absolute path to kit directory
+repo_dir = os.path.abspath(os.path.join(kit_dir, '..'))  # absolute path to ai-starter-kit directory
+
+sys.path.append(kit_dir)
+sys.path.append(repo_dir)
+
+from web_crawled_data_retriever.src import web_crawling_retriever
+from web_crawled_data_retriever.src.web_crawling_retriever import WebCrawlingRetrieval
+from utils.web.crawler import AsyncWebCrawler
+from utils.web.http_cache import HttpCache
+
+ROOT_URL = 'https://root.com/'
+LINKED_URLS = [f'https://site{index}.com/article' for index in range(4)]
+PAGE_LATENCY = 0.3
+
+
+class FakeResponse:
+    """Stub of an `aiohttp` response."""
+
+    def __init__(self, status: int, content: str = '') -> None:
+        self.status = status
+        self.content = content
+        self.headers: Dict[str, str] = {}
+
+    async def text(self, errors: str = 'strict') -> str:
+        return self.content
+
+
+class FakeSession:
+    """Stub of an `aiohttp.ClientSession` serving fixed pages, which records the requests it receives."""
+
+    def __init__(self, pages: Dict[str, str]) -> None:
+        self.pages = pages
+        self.closed = False
+        self.requested_urls: List[str] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @asynccontextmanager
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> AsyncIterator[FakeResponse]:
+        self.requested_urls.append(url)
+        if url not in self.pages:
+            yield FakeResponse(404)
+            return
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(PAGE_LATENCY)
+            yield FakeResponse(200, self.pages[url])
+        finally:
+            self.in_flight -= 1
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def get_pages() -> Dict[str, str]:
+    """Build a site whose root page links to pages on other hosts, and to an excluded social network."""
+    links = ''.join(f'<a href="{url}">article {index}</a>' for index, url in enumerate(LINKED_URLS))
+    pages = {ROOT_URL: f'<html><main>{links}<a href="https://facebook.com/root">share</a></main></html>'}
+    for index, url in enumerate(LINKED_URLS):
+        pages[url] = (
+            f'<html><main><p>Article number {index} about topic {index * 7} of the site {url}</p></main></html>'
+        )
+    pages['https://facebook.com/root'] = '<html><main>social</main></html>'
+    return pages
+
+
+class WebCrawlOfflineTestCase(unittest.TestCase):
+    def test_parallel_frontier(self) -> None:
+        """The URLs of a crawl level are fetched concurrently by the crawler built from the kit config."""
+        session = FakeSession(get_pages())
+        crawlers: List[AsyncWebCrawler] = []
+
+        def get_shared_crawler(**crawler_params: Any) -> AsyncWebCrawler:
+            crawler = AsyncWebCrawler(**crawler_params)
+            crawler._session = session  # type: ignore[assignment]
+            crawlers.append(crawler)
+            return crawler
+
+        with (
+            mock.patch.object(web_crawling_retriever, 'get_http_cache_from_config', return_value=HttpCache()),
+            mock.patch.object(web_crawling_retriever, 'get_shared_crawler', side_effect=get_shared_crawler),
+            mock.patch.object(WebCrawlingRetrieval, 'clean_docs', side_effect=lambda docs: docs),
+        ):
+            retrieval = WebCrawlingRetrieval()
+            self.addCleanup(crawlers[0].close)
+            time_start = time.monotonic()
+            docs, scraped_urls = retrieval.web_crawl({ROOT_URL}, depth=2)
+            elapsed = time.monotonic() - time_start
+
+        self.assertEqual(set(scraped_urls), {ROOT_URL, *LINKED_URLS})
+        self.assertEqual({doc.metadata['source'] for doc in docs}, {ROOT_URL, *LINKED_URLS})
+        self.assertNotIn('https://facebook.com/root', session.requested_urls)
+        # the second level pages are on different hosts, so they are all in flight at the same time
+        self.assertEqual(session.max_in_flight, len(LINKED_URLS))
+        self.assertLess(elapsed, PAGE_LATENCY * (1 + len(LINKED_URLS)))
+
+
+if __name__ == '__main__':
+    test_program = unittest.main(exit=False)
+    sys.exit(0 if test_program.result.wasSuccessful() else 1)